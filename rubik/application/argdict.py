@@ -20,6 +20,7 @@ __author__ = "Simone Campagna"
 __all__ = [
            'ArgDict',
            'InputArgDict',
+           'InputListArgDict',
            'OutputArgDict',
            'ResultArgDict',
           ]
@@ -79,6 +80,28 @@ class ArgDict(Storage, OrderedDict):
 class InputArgDict(ArgDict):
     __formatter__ = 'i{ordinal}'
 
+class InputListArgDict(InputArgDict):
+    """InputListArgDict(...)
+       the values added more than once with the same label are accumulated:
+       get() returns the last one, get_list() all of them"""
+    def __init__(self, factory, formatter=None, default=None, separator='='):
+        InputArgDict.__init__(self, factory, formatter=formatter, default=default, separator=separator)
+        self._lists = {}
+
+    def add(self, value):
+        label, value = InputArgDict.add(self, value)
+        self._lists.setdefault(label, []).append(value)
+        return label, value
+
+    def get_list(self, label, ordinal=None):
+        if label in self._lists:
+            return list(self._lists[label])
+        value = self.get(label, ordinal)
+        if value is None:
+            return []
+        else:
+            return [value]
+
 class OutputArgDict(ArgDict):
     __formatter__ = 'o{ordinal}'
 
@@ -95,7 +95,7 @@ It is possible to read input files by using the following function:
 ## Output functions
 
 It is possible to print/view the results using the following functions:
-* write_cube(filename=None, label=None, cube=None, mode=None, offset=None, dtype=None, format=None, csv_separator=None, text_delimiter=None, text_newline=None, text_converter=None)
+* write_cube(filename=None, label=None, cube=None, mode=None, offset=None, dtype=None, format=None, csv_separator=None, text_delimiter=None, text_newline=None, text_converter=None, chunked_compression=None)
   This is automatically set by '--output-filename/-o' option (and related
   output labeled options)
 * print_cube()
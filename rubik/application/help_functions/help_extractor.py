@@ -55,4 +55,15 @@ For instance, if the shape is '8x1000x30':
   on the second dimension
 * '-x 3:x8:10x:5' will extract a subcube '5x2x5' (remember that, in a python
   slice, the start is always included and the stop is always excluded.
+
+# Regions
+
+Many regions can be extracted from the same input file by repeating the
+extractor with the input label; for instance:
+
+* '-i i0=a.raw -x i0=:2x:x: -x i0=4:x10:20x:'
+
+The input file is read in a single pass: the regions are merged, so
+overlapping regions are read only once. The input label refers to the list of
+the extracted cubes, for instance 'i0[1]' is the second region.
 """
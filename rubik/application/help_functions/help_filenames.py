@@ -88,7 +88,7 @@ will read 'a_8x10.raw' and write 'a_8x10.text'.
 
 # File formats
 
-Three file formats are available:
+Four file formats are available:
 * 'raw' is the default, for binary files; they are not portable across different
   platforms;
 * 'text' is for text files; they have sub-options:
@@ -99,4 +99,9 @@ Three file formats are available:
 * 'csv' is for text files consisting of values separated by a separator; you can
   set
   - separator (by default ',') the separator between values.
+* 'chunked' is for binary files split in chunks; the file header stores the
+  shape, the data type, the chunk shape and the offset of each chunk, and chunks
+  can be compressed. Extracting a subcube only reads the chunks it touches.
+  You can set
+  - compression (by default 'zlib') one of 'none', 'zlib', 'lzma'.
 """.format(ff='|'.join(conf.FILE_FORMATS))
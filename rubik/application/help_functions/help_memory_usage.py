@@ -32,47 +32,95 @@ class HelpMemoryUsage(HelpExample):
 # Memory usage
 
 A complete control of the memory usage is not possible, due to the possibility
-to execute generic expressions involving numpy arrays. Nevertheless rubik can
-check the amount of memory necessary to read input files and store the result.
-You can provide a limit for this amout of memory using the '--memory-limit/m'
-option.
+to execute generic expressions involving numpy arrays. Nevertheless rubik
+tracks the memory of the live cubes it allocates: input cubes, cubes created by
+functions such as 'cb.linear_cube', lazy cubes when they are evaluated, and the
+results of the expressions. You can provide a limit for this amount of memory
+using the '--memory-limit/m' option; the limit is checked before input files
+are read and cubes are created, and after each expression.
 
-For instance, with the option '--memory-limit 16gb', you will not allowed to
-read more than 16 gb of data. The default memory limit is '0', which means no
+For instance, with the option '--memory-limit 16gb', you will not be allowed to
+use more than 16 gb of data. The default memory limit is '0', which means no
 limit.
 
-# Optimized read vs direct read
-
-When loading input files, two algorithms are available:
-* optimized read
-* direct read
-The optimized read is memory efficient: if an extractor is used, it is applied
-directly during the read, so only the exact amount of memory to store the
-subcube is used. On the opposite, the direct read reads the full cube, and
-then applies the extractor in memory.
-
-The direct algorithm is used when the extractor is missing, or when the
-extracted subcube has the same size as the input cube. Moreover, the direct
-algorithm is used if the size of the input cube is lower than a limit that
-can be set through the '--read-threshold-size' option. For instance, if
-'--read-threshold-size 1gb', the direct algorithm is always used if the input
-file is less than 1gb. By default, the read_threshold_size is 100mb.
-
-The 'read_threshold_size' parameter can be used to switch from one algorithm to
-the other; when less than 'read_threshold_size' bytes have to be read, the
-direct read is used, otherwise the optimized read algorithm is performed.
-
-The optimized read&extract algorithm is iterative: when it is applied, only the
-necessary indices of the slowest dimension are read. For instance:
-
-* shape: "10x10x10"
-* extractor: "5:,::2,10"
-
-The slowest dimension extractor is '5:', so only these five indices are read;
-so, the algorithm is then applied to 5 "10x10" subcubes. The optimized algorithm
-is iterated until the subcube size is less than read_threshold_size (or the
-related extractor extracts all the subcube, i.e. it is ':' for all the
-dimensions): in this case, the full subcube is read, and then the related
-extractor is applied.
+If an input 'raw' file does not fit the memory limit, rubik falls back to
+out-of-core processing: without an extractor the file is read lazily (see
+'--lazy'), otherwise it is memory mapped (see '--mmap'). So, stats, diff and
+histograms of huge files are computed block by block instead of failing:
+
+* '-i huge.raw -s 1000x1000x1000 -m 1gb --stats'
+
+The histogram of a whole lazy or memory mapped input file is computed by
+reading the file block by block, using '--workers' processes:
+
+* '-i huge.raw -s 1000x1000x1000 -m 1gb --workers 8 --histogram'
+
+# Read strategies
+
+When loading input files with an extractor, the read strategy is chosen by a
+planner, which estimates, for each available strategy, the number of reads
+(each one needs a seek), the number of bytes read and the memory needed, and
+picks the cheapest one:
+* full: the full cube is read, then the extractor is applied in memory;
+* seek: only the necessary indices of the slowest dimension are read,
+  recursively, until the subcube is smaller than the '--read-threshold-size'
+  (by default, 100mb);
+* coalesced ('raw' files): the subcube is allocated once, and it is read as a
+  sequence of runs of elements which are contiguous in the file; runs separated
+  by small gaps are merged into a single read, so, for instance, extracting
+  '::2' along the fastest dimension reads the file in a few large blocks
+  instead of issuing a read per element;
+* mmap ('raw' files, with the '--mmap' option; see below);
+* chunked ('chunked' files): only the chunks touched by the extractor are read.
+
+For instance, with shape "10x10x10", dtype float64 and extractor "5:,::2,3",
+the coalesced strategy reads 3848 bytes with a single read, instead of the
+8000 bytes of the full cube.
+
+A null or negative '--read-threshold-size' forces the full read.
+
+The chosen strategy and its estimated cost are shown by '--dry-run' and by the
+report ('--report/-R').
+
+# Memory mapped read
+
+With the '--mmap' option, 'raw' input files are memory mapped instead of read.
+The extractor is applied to the mapped cube, so the result is a view on the
+file, and only the pages actually accessed are loaded. For instance, extracting
+a 2x2x2 corner of a huge cube costs only a few page faults.
+
+The map is copy-on-write: changing the extracted cube never modifies the input
+file.
+
+# Output buffer
+
+Output cubes are converted to the output dtype and written chunk by chunk,
+through a reusable buffer; so, writing a float64 cube as float32 needs only the
+cube and one chunk. The chunk size can be set with the '--write-buffer-size'
+option.
+
+# Lazy evaluation
+
+With the '--lazy' option, 'raw' input files without an extractor are not read.
+The input cubes are deferred cubes, and elementwise numpy operations on them
+build an expression. The expression is evaluated block by block only when it is
+written, or when its stats, histogram or differences ('--diff') are printed. For
+instance, "-e 'i0 * i1 + i2' -o d.raw" with three huge input cubes never keeps more than
+a few blocks of each cube in memory. Any other use of a deferred cube (indexing,
+reductions such as 'i0.sum()', ...) evaluates the whole cube.
+Deferred cubes are read-only: item assignments such as "-e 'i0[0] = 1'" and
+in-place methods such as 'i0.fill(0)' are errors. Evaluate the cube first
+("-e 'i0 = cb.evaluate(i0)'"), or do not use '--lazy'.
+
+# Stats cache
+
+With the '--stats-cache' option, the stats of 'raw' and 'chunked' input files
+are stored in a cache directory (by default, 'stats-cache' in the rubik
+directory); with '--stats-sidecar', they are stored next to the input files.
+The stats of each block of the file are stored, so the stats of an input cube
+extracted along the first dimensions are obtained by merging them. The cached
+stats are used until the file size or modification time changes. Together
+with '--lazy', printing the stats of an unchanged input file does not read it
+at all.
 
 """
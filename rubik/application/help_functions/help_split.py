@@ -55,5 +55,26 @@ is saved into a different file.
 
 The 'd1' key has been added to the available keys for the output filename
 interpolation.
+
+# Streaming split
+
+Usually the whole cube is in memory before it is split. With the '--lazy'
+option, a lazy result (see --help-memory-usage) written to 'raw' output files
+is split without evaluating it: the input file is read once, in file order,
+one block at a time, and each slab is appended to the output file of its
+subcube. For instance, splitting a huge 4D time series in one file per time
+step never keeps more than a block in memory:
+
+$ rubik -i a_{shape}.{format} -s 8x4x10 --split 1 -o l_{shape}.{d1}.{format} --lazy -v
+rubik: evaluating expression "read_cube(label='i0')"...
+rubik: lazy reading 320 'float32' elements (1280 bytes) from 'raw' file 'a_8x4x10.raw'...
+rubik: evaluating expression "write_cube(label='o0')"...
+rubik: writing 80 'float32' elements (320 bytes) to 'raw' file 'l_8x10.0.raw'...
+rubik: writing 80 'float32' elements (320 bytes) to 'raw' file 'l_8x10.1.raw'...
+rubik: writing 80 'float32' elements (320 bytes) to 'raw' file 'l_8x10.2.raw'...
+rubik: writing 80 'float32' elements (320 bytes) to 'raw' file 'l_8x10.3.raw'...
+$
+
+The block size is set by the '--write-buffer-size' option.
  
 """
@@ -146,6 +146,35 @@ rubik: evaluating expression "write_cube(label='o0')"...
 rubik: writing 800 'float32' elements (3200 bytes) to 'raw' file 'rj.5x8x20.raw'...
 $
 
+The same 'raw' file can be obtained with the '--join-files' option, which
+copies the input files (in the kernel, where possible) without reading them;
+with '--lazy', the input cubes are not read at all:
+
+$ rubik -i rsub_y0_{shape}.raw \
+        -i rsub_y1_{shape}.raw \
+        -i rsub_y2_{shape}.raw \
+        -i rsub_y3_{shape}.raw \
+        -i rsub_y4_{shape}.raw \
+        -s 8x20 \
+        --lazy \
+        --join-files rjf.{shape}.raw \
+        -v
+rubik: evaluating expression "read_cube(label='i0')"...
+rubik: lazy reading 160 'float32' elements (640 bytes) from 'raw' file 'rsub_y0_8x20.raw'...
+rubik: evaluating expression "read_cube(label='i1')"...
+rubik: lazy reading 160 'float32' elements (640 bytes) from 'raw' file 'rsub_y1_8x20.raw'...
+rubik: evaluating expression "read_cube(label='i2')"...
+rubik: lazy reading 160 'float32' elements (640 bytes) from 'raw' file 'rsub_y2_8x20.raw'...
+rubik: evaluating expression "read_cube(label='i3')"...
+rubik: lazy reading 160 'float32' elements (640 bytes) from 'raw' file 'rsub_y3_8x20.raw'...
+rubik: evaluating expression "read_cube(label='i4')"...
+rubik: lazy reading 160 'float32' elements (640 bytes) from 'raw' file 'rsub_y4_8x20.raw'...
+rubik: evaluating expression "join_files(label='o0')"...
+rubik: joining 5 'float32' cubes 8x20 (3200 bytes) to 'raw' file 'rjf.5x8x20.raw'...
+$
+$ cmp rj.5x8x20.raw rjf.5x8x20.raw
+$
+
 <<<BREAK>>>
 ### 10. Compute a linear combination of two input files:
 
@@ -204,12 +233,12 @@ $ rubik -i rsub_y2_8x20.raw -s 8x20 --stats
 shape     = 8x20
 #elements = 160
 %elements = 100.00%
-min       = 0.017823184
-min_index = (1, 10)
-max       = 0.99523103
-max_index = (5, 18)
-sum       = 79.3741
-ave       = 0.496088
+min       = 0.016587794
+min_index = (3, 16)
+max       = 0.99870855
+max_index = (6, 15)
+sum       = 81.6176
+ave       = 0.51011
 #zero     = 0
 %zero     = 0.00%
 #nonzero  = 160
@@ -230,23 +259,23 @@ compared cubes:
 $ rubik -r 100 -e 'cb.random_cube("6x9x32")' -C \\
                -e 'cb.random_cube("6x9x32")' -C \\
                -e 'cb.random_cube("6x18x33")' -C
-shape     = 6x9x32        6x9x32        6x18x33
-#elements = 1728          1728          3564
-%elements = 100.00%       100.00%       100.00%
-min       = 0.00048675947 1.4618569e-05 1.7200797e-05
-min_index = (1, 3, 13)    (1, 1, 13)    (1, 17, 0)
-max       = 0.99947917    0.99867839    0.99991566
-max_index = (2, 0, 11)    (0, 5, 20)    (5, 6, 8)
-sum       = 842.425       860.055       1801.83
-ave       = 0.487515      0.497717      0.505563
-#zero     = 0             0             0
-%zero     = 0.00%         0.00%         0.00%
-#nonzero  = 1728          1728          3564
-%nonzero  = 100.00%       100.00%       100.00%
-#nan      = 0             0             0
-%nan      = 0.00%         0.00%         0.00%
-#inf      = 0             0             0
-%inf      = 0.00%         0.00%         0.00%
+shape     = 6x9x32       6x9x32        6x18x33
+#elements = 1728         1728          3564
+%elements = 100.00%      100.00%       100.00%
+min       = 0.0005671382 0.00018328428 0.00021106005
+min_index = (5, 3, 15)   (0, 6, 11)    (4, 6, 6)
+max       = 0.99979615   0.9995331     0.999779
+max_index = (0, 1, 15)   (4, 6, 6)     (0, 1, 7)
+sum       = 869.341      847.563       1793.84
+ave       = 0.503091     0.490488      0.503323
+#zero     = 0            0             0
+%zero     = 0.00%        0.00%         0.00%
+#nonzero  = 1728         1728          3564
+%nonzero  = 100.00%      100.00%       100.00%
+#nan      = 0            0             0
+%nan      = 0.00%        0.00%         0.00%
+#inf      = 0            0             0
+%inf      = 0.00%        0.00%         0.00%
 $
 
 <<<BREAK>>>
@@ -261,24 +290,24 @@ exactly two cubes. Statistics info is shown for
 
 $ rubik -r 100 -e 'cb.random_cube("6x9x32")' -D \\
                -e 'cb.random_cube("6x9x32")' -D
-name      = LEFT          RIGHT         REL_DIFF      ABS_DIFF
-shape     = 6x9x32        6x9x32        6x9x32        6x9x32
-#elements = 1728          1728          1728          1728
-%elements = 100.00%       100.00%       100.00%       100.00%
-min       = 0.00048675947 1.4618569e-05 0.00038759335 0.00025051832
-min_index = (1, 3, 13)    (1, 1, 13)    (4, 5, 19)    (4, 5, 19)
-max       = 0.99947917    0.99867839    402.01849     0.98762667
-max_index = (2, 0, 11)    (0, 5, 20)    (0, 3, 27)    (3, 3, 4)
-sum       = 842.425       860.055       5523.73       588.99
-ave       = 0.487515      0.497717      3.19661       0.340851
-#zero     = 0             0             0             0
-%zero     = 0.00%         0.00%         0.00%         0.00%
-#nonzero  = 1728          1728          1728          1728
-%nonzero  = 100.00%       100.00%       100.00%       100.00%
-#nan      = 0             0             0             0
-%nan      = 0.00%         0.00%         0.00%         0.00%
-#inf      = 0             0             0             0
-%inf      = 0.00%         0.00%         0.00%         0.00%
+name      = LEFT         RIGHT         REL_DIFF      ABS_DIFF
+shape     = 6x9x32       6x9x32        6x9x32        6x9x32
+#elements = 1728         1728          1728          1728
+%elements = 100.00%      100.00%       100.00%       100.00%
+min       = 0.0005671382 0.00018328428 0.00013578395 0.00013047457
+min_index = (5, 3, 15)   (0, 6, 11)    (5, 0, 13)    (5, 0, 13)
+max       = 0.99979615   0.9995331     1295.8337     0.9857909
+max_index = (0, 1, 15)   (4, 6, 6)     (0, 7, 8)     (4, 6, 6)
+sum       = 869.341      847.563       7245.72       579.01
+ave       = 0.503091     0.490488      4.19313       0.335075
+#zero     = 0            0             0             0
+%zero     = 0.00%        0.00%         0.00%         0.00%
+#nonzero  = 1728         1728          1728          1728
+%nonzero  = 100.00%      100.00%       100.00%       100.00%
+#nan      = 0            0             0             0
+%nan      = 0.00%        0.00%         0.00%         0.00%
+#inf      = 0            0             0             0
+%inf      = 0.00%        0.00%         0.00%         0.00%
 $
 
 This is quite equivalent to the command
@@ -287,23 +316,23 @@ $ rubik -r 100 -e 'c0=cb.random_cube("6x9x32")' -e 'c0' -C \\
                -e 'c1=cb.random_cube("6x9x32")' -e 'c1' -C \\
                -e 'cb.rel_diff_cube(c0, c1)' -C \\
                -e 'cb.abs_diff_cube(c0, c1)' -C
-shape     = 6x9x32        6x9x32        6x9x32        6x9x32
-#elements = 1728          1728          1728          1728
-%elements = 100.00%       100.00%       100.00%       100.00%
-min       = 0.00048675947 1.4618569e-05 0.00038759335 0.00025051832
-min_index = (1, 3, 13)    (1, 1, 13)    (4, 5, 19)    (4, 5, 19)
-max       = 0.99947917    0.99867839    402.01849     0.98762667
-max_index = (2, 0, 11)    (0, 5, 20)    (0, 3, 27)    (3, 3, 4)
-sum       = 842.425       860.055       5523.73       588.99
-ave       = 0.487515      0.497717      3.19661       0.340851
-#zero     = 0             0             0             0
-%zero     = 0.00%         0.00%         0.00%         0.00%
-#nonzero  = 1728          1728          1728          1728
-%nonzero  = 100.00%       100.00%       100.00%       100.00%
-#nan      = 0             0             0             0
-%nan      = 0.00%         0.00%         0.00%         0.00%
-#inf      = 0             0             0             0
-%inf      = 0.00%         0.00%         0.00%         0.00%
+shape     = 6x9x32       6x9x32        6x9x32        6x9x32
+#elements = 1728         1728          1728          1728
+%elements = 100.00%      100.00%       100.00%       100.00%
+min       = 0.0005671382 0.00018328428 0.00013578395 0.00013047457
+min_index = (5, 3, 15)   (0, 6, 11)    (5, 0, 13)    (5, 0, 13)
+max       = 0.99979615   0.9995331     1295.8337     0.9857909
+max_index = (0, 1, 15)   (4, 6, 6)     (0, 7, 8)     (4, 6, 6)
+sum       = 869.341      847.563       7245.72       579.01
+ave       = 0.503091     0.490488      4.19313       0.335075
+#zero     = 0            0             0             0
+%zero     = 0.00%        0.00%         0.00%         0.00%
+#nonzero  = 1728         1728          1728          1728
+%nonzero  = 100.00%      100.00%       100.00%       100.00%
+#nan      = 0            0             0             0
+%nan      = 0.00%        0.00%         0.00%         0.00%
+#inf      = 0            0             0             0
+%inf      = 0.00%        0.00%         0.00%         0.00%
 $
 
 or, better, to the command
@@ -316,24 +345,24 @@ $ rubik -r 100 -e 'c0=cb.random_cube("6x9x32")' \\
                -e 'compare_stats(title="REL_DIFF")' \\
                -e 'cb.abs_diff_cube(c0, c1)' \\
                -e 'compare_stats(title="ABS_DIFF")'
-name      = LEFT          RIGHT         REL_DIFF      ABS_DIFF
-shape     = 6x9x32        6x9x32        6x9x32        6x9x32
-#elements = 1728          1728          1728          1728
-%elements = 100.00%       100.00%       100.00%       100.00%
-min       = 0.00048675947 1.4618569e-05 0.00038759335 0.00025051832
-min_index = (1, 3, 13)    (1, 1, 13)    (4, 5, 19)    (4, 5, 19)
-max       = 0.99947917    0.99867839    402.01849     0.98762667
-max_index = (2, 0, 11)    (0, 5, 20)    (0, 3, 27)    (3, 3, 4)
-sum       = 842.425       860.055       5523.73       588.99
-ave       = 0.487515      0.497717      3.19661       0.340851
-#zero     = 0             0             0             0
-%zero     = 0.00%         0.00%         0.00%         0.00%
-#nonzero  = 1728          1728          1728          1728
-%nonzero  = 100.00%       100.00%       100.00%       100.00%
-#nan      = 0             0             0             0
-%nan      = 0.00%         0.00%         0.00%         0.00%
-#inf      = 0             0             0             0
-%inf      = 0.00%         0.00%         0.00%         0.00%
+name      = LEFT         RIGHT         REL_DIFF      ABS_DIFF
+shape     = 6x9x32       6x9x32        6x9x32        6x9x32
+#elements = 1728         1728          1728          1728
+%elements = 100.00%      100.00%       100.00%       100.00%
+min       = 0.0005671382 0.00018328428 0.00013578395 0.00013047457
+min_index = (5, 3, 15)   (0, 6, 11)    (5, 0, 13)    (5, 0, 13)
+max       = 0.99979615   0.9995331     1295.8337     0.9857909
+max_index = (0, 1, 15)   (4, 6, 6)     (0, 7, 8)     (4, 6, 6)
+sum       = 869.341      847.563       7245.72       579.01
+ave       = 0.503091     0.490488      4.19313       0.335075
+#zero     = 0            0             0             0
+%zero     = 0.00%        0.00%         0.00%         0.00%
+#nonzero  = 1728         1728          1728          1728
+%nonzero  = 100.00%      100.00%       100.00%       100.00%
+#nan      = 0            0             0             0
+%nan      = 0.00%        0.00%         0.00%         0.00%
+#inf      = 0            0             0             0
+%inf      = 0.00%        0.00%         0.00%         0.00%
 $
 
 <<<BREAK>>>
@@ -354,12 +383,12 @@ $ rubik -e 'cb.print_stats_file("big0_{shape}.{format}", shape="100x100x100", bu
 shape     = 100x100x100
 #elements = 262144
 %elements = 26.21%
-min       = 3.3105543e-06
-min_index = (8, 43, 41)
-max       = 0.99999899
-max_index = (19, 82, 53)
-sum       = 131122
-ave       = 0.500193
+min       = 1.1742115e-05
+min_index = (14, 8, 70)
+max       = 0.9999922
+max_index = (5, 99, 35)
+sum       = 131202
+ave       = 0.500498
 #zero     = 0
 %zero     = 0.00%
 #nonzero  = 262144
@@ -373,12 +402,12 @@ ave       = 0.500193
 shape     = 100x100x100
 #elements = 524288
 %elements = 52.43%
-min       = 2.9504163e-06
-min_index = (26, 39, 72)
-max       = 0.99999899
-max_index = (19, 82, 53)
-sum       = 262122
-ave       = 0.499959
+min       = 1.4305115e-06
+min_index = (51, 75, 39)
+max       = 0.999998
+max_index = (29, 26, 39)
+sum       = 262248
+ave       = 0.500199
 #zero     = 0
 %zero     = 0.00%
 #nonzero  = 524288
@@ -392,12 +421,12 @@ ave       = 0.499959
 shape     = 100x100x100
 #elements = 786432
 %elements = 78.64%
-min       = 7.0712031e-07
-min_index = (66, 15, 53)
-max       = 0.99999899
-max_index = (19, 82, 53)
-sum       = 393462
-ave       = 0.500313
+min       = 1.4305115e-06
+min_index = (51, 75, 39)
+max       = 0.999998
+max_index = (29, 26, 39)
+sum       = 393374
+ave       = 0.500201
 #zero     = 0
 %zero     = 0.00%
 #nonzero  = 786432
@@ -410,12 +439,12 @@ ave       = 0.500313
 shape     = 100x100x100
 #elements = 1000000
 %elements = 100.00%
-min       = 7.0712031e-07
-min_index = (66, 15, 53)
-max       = 0.9999997
-max_index = (80, 18, 7)
-sum       = 500388
-ave       = 0.500388
+min       = 3.5762787e-07
+min_index = (80, 37, 96)
+max       = 0.9999992
+max_index = (92, 95, 56)
+sum       = 500036
+ave       = 0.500036
 #zero     = 0
 %zero     = 0.00%
 #nonzero  = 1000000
@@ -432,43 +461,71 @@ By default, the buffer_size is '1g'.
 
 $ rubik -e 'cb.print_diff_files("big0_{shape}.{format}", "big1_{shape}.{format}", shape="100x100x100", buffer_size="2m")'
 === 52.428800%
-name      = LEFT          RIGHT         REL_DIFF      ABS_DIFF
-shape     = 100x100x100   100x100x100   100x100x100   100x100x100
-#elements = 524288        524288        524288        524288
-%elements = 52.43%        52.43%        52.43%        52.43%
-min       = 2.9504163e-06 5.1598727e-06 3.5003384e-06 1.2069941e-06
-min_index = (26, 39, 72)  (38, 14, 65)  (28, 67, 21)  (0, 12, 99)
-max       = 0.99999899    0.99999821    283745.31     0.99896097
-max_index = (19, 82, 53)  (48, 17, 89)  (8, 43, 41)   (10, 79, 78)
-sum       = 262122        261960        3.3098e+06    174506
-ave       = 0.499959      0.499648      6.31295       0.332843
-#zero     = 0             0             0             0
-%zero     = 0.00%         0.00%         0.00%         0.00%
-#nonzero  = 524288        524288        524288        524288
-%nonzero  = 100.00%       100.00%       100.00%       100.00%
-#nan      = 0             0             0             0
-%nan      = 0.00%         0.00%         0.00%         0.00%
-#inf      = 0             0             0             0
-%inf      = 0.00%         0.00%         0.00%         0.00%
-
-name      = LEFT          RIGHT         REL_DIFF      ABS_DIFF
-shape     = 100x100x100   100x100x100   100x100x100   100x100x100
-#elements = 1000000       1000000       1000000       1000000
-%elements = 100.00%       100.00%       100.00%       100.00%
-min       = 7.0712031e-07 3.0077686e-07 1.5380414e-06 5.0663948e-07
-min_index = (66, 15, 53)  (73, 4, 25)   (98, 7, 97)   (55, 51, 68)
-max       = 0.9999997     0.99999958    879006.44     0.99896097
-max_index = (80, 18, 7)   (70, 21, 31)  (66, 15, 53)  (10, 79, 78)
-sum       = 500388        499948        7.3905e+06    332895
-ave       = 0.500388      0.499948      7.3905        0.332895
-#zero     = 0             0             0             0
-%zero     = 0.00%         0.00%         0.00%         0.00%
-#nonzero  = 1000000       1000000       1000000       1000000
-%nonzero  = 100.00%       100.00%       100.00%       100.00%
-#nan      = 0             0             0             0
-%nan      = 0.00%         0.00%         0.00%         0.00%
-#inf      = 0             0             0             0
-%inf      = 0.00%         0.00%         0.00%         0.00%
+name      = LEFT          RIGHT         REL_DIFF     ABS_DIFF
+shape     = 100x100x100   100x100x100   100x100x100  100x100x100
+#elements = 524288        524288        524288       524288
+%elements = 52.43%        52.43%        52.43%       52.43%
+min       = 1.4305115e-06 2.0861626e-06 4.906968e-06 2.1457672e-06
+min_index = (51, 75, 39)  (22, 82, 31)  (21, 22, 83) (21, 22, 83)
+max       = 0.999998      0.99999976    215983.28    0.9968803
+max_index = (29, 26, 39)  (16, 49, 81)  (38, 99, 15) (41, 85, 10)
+sum       = 262248        262451        3.56865e+06  174833
+ave       = 0.500199      0.500585      6.80666      0.333467
+#zero     = 0             0             0            0
+%zero     = 0.00%         0.00%         0.00%        0.00%
+#nonzero  = 524288        524288        524288       524288
+%nonzero  = 100.00%       100.00%       100.00%      100.00%
+#nan      = 0             0             0            0
+%nan      = 0.00%         0.00%         0.00%        0.00%
+#inf      = 0             0             0            0
+%inf      = 0.00%         0.00%         0.00%        0.00%
+
+name      = LEFT          RIGHT        REL_DIFF      ABS_DIFF
+shape     = 100x100x100   100x100x100  100x100x100   100x100x100
+#elements = 1000000       1000000      1000000       1000000
+%elements = 100.00%       100.00%      100.00%       100.00%
+min       = 3.5762787e-07 5.364418e-07 3.7839186e-07 3.5762787e-07
+min_index = (80, 37, 96)  (69, 16, 37) (94, 31, 64)  (94, 31, 64)
+max       = 0.9999992     0.99999976   2170278.8     0.99887174
+max_index = (92, 95, 56)  (16, 49, 81) (80, 37, 96)  (63, 92, 6)
+sum       = 500036        500398       9.46667e+06   333139
+ave       = 0.500036      0.500398     9.46667       0.333139
+#zero     = 0             0            0             0
+%zero     = 0.00%         0.00%        0.00%         0.00%
+#nonzero  = 1000000       1000000      1000000       1000000
+%nonzero  = 100.00%       100.00%      100.00%       100.00%
+#nan      = 0             0            0             0
+%nan      = 0.00%         0.00%        0.00%         0.00%
+#inf      = 0             0            0             0
+%inf      = 0.00%         0.00%        0.00%         0.00%
+$
+
+* show an histogram of the first cube out-of-core:
+
+$ rubik -e 'cb.print_histogram_file("big0_{shape}.{format}", shape="100x100x100", buffer_size="1m", mode="number")'
+[0.00, 0.10)|************************************************************|100046
+[0.10, 0.20)|************************************************************|100079
+[0.20, 0.30)|************************************************************| 99843
+[0.30, 0.40)|************************************************************| 99931
+[0.40, 0.50)|************************************************************| 99877
+[0.50, 0.60)|************************************************************|100144
+[0.60, 0.70)|************************************************************| 99771
+[0.70, 0.80)|************************************************************|100089
+[0.80, 0.90)|************************************************************|100529
+[0.90, 1.00]|*********************************************************** | 99691
+$
+
+If the histogram range is not given, a first out-of-core pass computes the
+min and max values of the file. The 'print_histogram_file()' function
+(without 'cb.') uses the '--histogram-*' options as defaults:
+
+$ rubik -e 'print_histogram_file("big0_{shape}.{format}", "100x100x100", buffer_size="1m")' \\
+        --histogram-bins 5 --histogram-range 0.0 0.5
+[0.0, 0.1)|**************************************************************|100046
+[0.1, 0.2)|**************************************************************|100079
+[0.2, 0.3)|**************************************************************| 99843
+[0.3, 0.4)|**************************************************************| 99931
+[0.4, 0.5]|**************************************************************| 99877
 $
 
 <<<BREAK>>>
@@ -488,9 +545,9 @@ $ rubik -e 'cb.random_cube("3x5", min=-5, max=5)' \\
         --dtype int32 \\
         --random-seed 100 \\
         --print
-[[ 0 -2  0  3 -4]
- [-3  1  3 -3  0]
- [ 3 -2 -3 -3 -2]]
+[[ 2  1  2  2 -1]
+ [-3  0 -4  0 -3]
+ [ 3  0  2  0  0]]
 $
 
 The '--random-seed 100' option sets the random seed; it has been added to make
@@ -512,20 +569,20 @@ $ rubik -t int32 \\
         -e 'cb.random_cube("3x4x5", min=0.0, max=10.0)' \\
         -e '_r[:, 1, :] = -5' \\
         --print
-[[[ 5  2  4  8  0]
+[[[ 7  6  7  7  3]
   [-5 -5 -5 -5 -5]
-  [ 8  2  1  1  2]
-  [ 9  8  1  8  2]]
+  [ 8  4  7  4  4]
+  [ 8  6  4  8  2]]
 
- [[ 4  9  8  3  1]
+ [[ 3  6  0  9  7]
   [-5 -5 -5 -5 -5]
-  [ 5  6  1  3  0]
-  [ 8  9  0  8  5]]
+  [ 9  5  8  5  0]
+  [ 2  8  0  6  4]]
 
- [[ 7  6  5  0  2]
+ [[ 3  9  1  8  1]
   [-5 -5 -5 -5 -5]
-  [ 9  8  3  5  3]
-  [ 3  1  2  0  5]]]
+  [ 0  3  0  3  8]
+  [ 9  4  5  1  9]]]
 $
 
 <<<BREAK>>>
@@ -556,10 +613,11 @@ $
 <<<BREAK>>>
 ## 21. Create a big cube out of core:
 
-Two functions are available to create big cubes out of core:
+Some functions are available to create big cubes out of core:
 * write_linear_cube(file, shape, start=0.0, increment=1.0, buffer_size=None)
 * write_random_cube(file, shape, min=0.0, max=1.0, buffer_size=None)
 * write_const_cube(file, shape, value=0.0, buffer_size=None)
+* write_const_blocks_cube(file, shape, start=0.0, increment=1.0, const_dims=(-2, -1), buffer_size=None)
 
 
 $ rubik -e 'cb.write_linear_cube("l.{shape}.raw", "3x4x5", buffer_size=2, start=-1, increment=0.5)'
@@ -691,28 +749,28 @@ $
 ## 24. Printing the histogram of a cube
 
 $ rubik -e 'cb.random_cube("6x4x5")' --random-seed 100 -H
-[0.00, 0.10)|****************************************                        |10
-[0.10, 0.20)|********************************************************        |14
-[0.20, 0.30)|****************************************************************|16
-[0.30, 0.40)|****************************************************************|16
-[0.40, 0.50)|********************                                            | 5
-[0.50, 0.60)|********************************************                    |11
-[0.60, 0.70)|********************************************************        |14
-[0.70, 0.79)|********************************                                | 8
-[0.79, 0.89)|****************************************************            |13
-[0.89, 0.99]|****************************************************            |13
+[0.01, 0.11)|**********************************                              | 8
+[0.11, 0.21)|************************************************************    |14
+[0.21, 0.31)|***********************************************                 |11
+[0.31, 0.41)|*******************************************************         |13
+[0.41, 0.51)|***************************************************             |12
+[0.51, 0.60)|****************************************************************|15
+[0.60, 0.70)|***************************************************             |12
+[0.70, 0.80)|*******************************************                     |10
+[0.80, 0.90)|***************************************************             |12
+[0.90, 1.00]|*******************************************************         |13
 $ rubik -e 'cb.random_cube("6x4x5")' --random-seed 100 -H -Hb 5 -Hr 0.0 1.0
-[0.0, 0.2)|**********************************************                    |23
-[0.2, 0.4)|******************************************************************|33
-[0.4, 0.6)|**************************************                            |19
-[0.6, 0.8)|****************************************                          |20
-[0.8, 1.0]|**************************************************                |25
+[0.0, 0.2)|****************************************************              |22
+[0.2, 0.4)|******************************************************            |23
+[0.4, 0.6)|******************************************************************|28
+[0.6, 0.8)|****************************************************              |22
+[0.8, 1.0]|***********************************************************       |25
 $ rubik -e 'cb.random_cube("6x4x5")' --random-seed 100 -H -Hb 5 -Hr 0.0 1.0 -Hp
-[0.0, 0.2)|*******************************************                   |19.17%
-[0.2, 0.4)|**************************************************************|27.50%
-[0.4, 0.6)|************************************                          |15.83%
-[0.6, 0.8)|**************************************                        |16.67%
-[0.8, 1.0]|***********************************************               |20.83%
+[0.0, 0.2)|*************************************************             |18.33%
+[0.2, 0.4)|***************************************************           |19.17%
+[0.4, 0.6)|**************************************************************|23.33%
+[0.6, 0.8)|*************************************************             |18.33%
+[0.8, 1.0]|*******************************************************       |20.83%
 $
 
 """
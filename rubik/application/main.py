@@ -20,6 +20,7 @@ __author__ = "Simone Campagna"
 __all__ = [
            'main',
           ]
+import os
 import sys
 import argparse
 
@@ -40,7 +41,8 @@ from ..application import logo
 from ..application import help_functions
 from ..application.rubik import Rubik
 from ..application.config import get_config
-from ..cubes.api import set_random_seed
+from ..cubes.api import set_random_seed, ChunkWriter, StatsCache
+from ..cubes.chunked import COMPRESSIONS
 
 _EXPRNUM = 0
 def expression_type(value):
@@ -55,6 +57,12 @@ def key_value_type(value):
     k, v = value.split('=', 2)
     return k.strip(), v.strip()
 
+def positive_int_type(value):
+    i = int(value)
+    if i < 1:
+        raise argparse.ArgumentTypeError("invalid value {!r}: it must be >= 1".format(value))
+    return i
+
 class RubikAction(argparse.Action):
     RUBIK = None
 
@@ -143,6 +151,11 @@ class OutputAction(RubikAction):
             label, output_filename = self.RUBIK.output_filenames.add(value)
             self.RUBIK.expressions.store("write_cube(label={!r})".format(label))
 
+class JoinFilesAction(RubikAction):
+    def __call__(self, parser, namespace, values, option_string):
+        label, output_filename = self.RUBIK.output_filenames.add(values)
+        self.RUBIK.expressions.store("join_files(label={!r})".format(label))
+
 def main(arguments=None):
     if arguments is None:
         arguments = sys.argv[1:]
@@ -215,6 +228,18 @@ Global options""")
         default=rubik_config.default_report_level,
         help="increase report level")
 
+    global_group.add_argument("--timing",
+        dest="timing",
+        action="store_true",
+        default=False,
+        help="show wall and cpu time, bytes read/written and bandwidth of each read, expression and write")
+
+    global_group.add_argument("--timing-file",
+        metavar="F",
+        dest="timing_file",
+        default=None,
+        help="write the timing of each read, expression and write as JSON to file F")
+
     global_group.add_argument("--dry-run", "-d",
         dest="dry_run",
         action="store_true",
@@ -240,7 +265,47 @@ Global options""")
         dest="read_threshold_size",
         type=Memory,
         default=rubik_config.default_read_threshold_size,
-        help="set the threshold size for optimized read&extract algorithm: when reading less than S bytes, switch to traditional algorithm; a null or negative size means no optimization")
+        help="set the threshold size for the 'seek' read strategy: subcubes smaller than S bytes are read in a single read; a null or negative size forces the full read")
+
+    global_group.add_argument("--mmap",
+        dest="read_mmap",
+        action="store_true",
+        default=False,
+        help="memory map 'raw' input files: extracted cubes are views on the mapped files, and data are read only when accessed")
+
+    global_group.add_argument("--write-buffer-size",
+        metavar="S",
+        dest="write_buffer_size",
+        type=Memory,
+        default=None,
+        help="output cubes are converted to the output dtype and written S bytes at a time [default: {}]".format(ChunkWriter.DEFAULT_BUFFER_SIZE))
+
+    global_group.add_argument("--lazy",
+        dest="lazy",
+        action="store_true",
+        default=False,
+        help="lazy evaluation: 'raw' input files without extractors are not read; elementwise expressions on them are evaluated block by block when the result is written, or when stats/histogram are printed")
+
+    global_group.add_argument("--workers",
+        metavar="N",
+        dest="workers",
+        type=positive_int_type,
+        default=1,
+        help="number of worker processes used by out-of-core functions, such as cb.stats_file() and cb.diff_files(), and to parse and format 'text' and 'csv' files")
+
+    global_group.add_argument("--stats-cache",
+        metavar="D",
+        dest="stats_cache_dir",
+        nargs='?',
+        const=os.path.join(rubik_config.rubik_dir, 'stats-cache'),
+        default=None,
+        help="cache the stats of 'raw' and 'chunked' input files in directory D [default: {}]; unchanged input files are not read again by --stats".format(os.path.join(rubik_config.rubik_dir, 'stats-cache')))
+
+    global_group.add_argument("--stats-sidecar",
+        dest="stats_sidecar",
+        action="store_true",
+        default=False,
+        help="cache the stats of 'raw' and 'chunked' input files in sidecar files (the input filename plus '{}')".format(StatsCache.SIDECAR_SUFFIX))
 
     global_group.add_argument("--memory-limit", "-m",
         metavar="L[units]",
@@ -320,7 +385,7 @@ see --help-labeled-options for more information.""")
         metavar="X",
         dest="extractors",
         type=rubik.extractors.store,
-        help="subcube extractor (--help-extractor/-he for more information)")
+        help="subcube extractor; repeated for the same input label, the regions are read in a single pass (--help-extractor/-he for more information)")
 
     input_group.add_argument("--input-mode", "-Im",
         dest="input_modes",
@@ -385,6 +450,11 @@ Arguments for graphical visualization""")
         #type=rubik.output_filenames.store,
         help="output filename (--help-filename/-hf for an explanation about filenames)")
 
+    write_output_filename_group.add_argument("--join-files", "-J",
+        metavar='O',
+        action=JoinFilesAction,
+        help="join the 'raw' input files into the 'raw' output file O, without reading them (use '--lazy' to avoid reading the input files at all)")
+
     output_group.add_argument('--print-cube', '--print', '-P',
         action=PrintCubeAction,
         nargs=0,
@@ -563,6 +633,12 @@ Arguments for graphical visualization""")
         type=rubik.output_text_converters.store,
         help="converter to be used with '{0}' output file format (e.g. '%%.18e')".format(conf.FILE_FORMAT_TEXT))
 
+    file_output_group.add_argument("--output-chunked-compression", "-Oz",
+        metavar='Z',
+        dest="output_chunked_compressions",
+        type=rubik.output_chunked_compressions.store,
+        help="compression to be used with '{0}' output file format ({1})".format(conf.FILE_FORMAT_CHUNKED, '|'.join(COMPRESSIONS)))
+
     help_group = parser.add_argument_group(
         "help options",
         description="""\
@@ -701,11 +777,17 @@ Options to show help on specific topics """)
     rubik.set_logger(logger, report_logger)
     rubik.set_accept_bigger_raw_files(args.accept_bigger_raw_files)
     rubik.set_read_threshold_size(args.read_threshold_size)
+    rubik.set_read_mmap(args.read_mmap)
+    rubik.set_lazy(args.lazy)
+    rubik.set_write_buffer_size(args.write_buffer_size)
+    rubik.set_workers(args.workers)
+    rubik.set_stats_cache(cache_dir=args.stats_cache_dir, sidecar=args.stats_sidecar)
     rubik.set_memory_limit(args.memory_limit)
     rubik.set_split_dimensions(args.split_dimensions)
     rubik.set_clobber(args.clobber)
     rubik.set_visualizer_options(visualizer_type=args.visualizer_type, visualizer_attributes=utils.flatten_list(args.visualizer_attributes, depth=1), visualizer_attribute_files=args.visualizer_attribute_files)
     rubik.set_print_report(args.report_level > 0)
+    rubik.set_timing(args.timing, args.timing_file)
     rubik.set_histogram_options(
         bins=args.histogram_bins,
         range=args.histogram_range,
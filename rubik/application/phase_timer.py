@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+#
+# Copyright 2014 Simone Campagna
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+__author__ = "Simone Campagna"
+
+__all__ = [
+           'PhaseRecord',
+           'PhaseTimer',
+          ]
+
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+from ..units import Time, Bandwidth
+from ..table import Table
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+_process_time = getattr(time, 'process_time', time.clock if hasattr(time, 'clock') else time.time)
+
+def _cpu_time():
+    # terminated worker processes (for instance, the pools used by stats_file
+    # and by the text readers/writers) are included
+    times = os.times()
+    return _process_time() + times[2] + times[3]
+
+class PhaseRecord(object):
+    """PhaseRecord(phase, name)
+    The timing of a phase ('initialize', 'read', 'evaluate', 'write',
+    'finalize') of a rubik run: wall and cpu time, bytes read and written.
+    The 'self' times exclude the nested phases (for instance, the input
+    files read by an expression); 'read_wall_time' is the time spent
+    reading the bytes reported by the cubes read lazily or memory mapped.
+    """
+    def __init__(self, phase, name):
+        self.phase = phase
+        self.name = name
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.child_wall_time = 0.0
+        self.child_cpu_time = 0.0
+        self.read_bytes = 0
+        self.written_bytes = 0
+        self.read_wall_time = 0.0
+
+    def self_wall_time(self):
+        return max(0.0, self.wall_time - self.child_wall_time)
+
+    def self_cpu_time(self):
+        return max(0.0, self.cpu_time - self.child_cpu_time)
+
+    def io_bytes(self):
+        return self.read_bytes + self.written_bytes
+
+    def bandwidth(self):
+        """self.bandwidth() -> Bandwidth of the bytes read and written, or None"""
+        if self.io_bytes() == 0 or self.self_wall_time() <= 0.0:
+            return None
+        return Bandwidth(self.io_bytes() / self.self_wall_time(), 'b/s')
+
+    def as_dict(self):
+        dct = collections.OrderedDict()
+        dct['phase'] = self.phase
+        dct['name'] = self.name
+        dct['wall_time'] = self.wall_time
+        dct['cpu_time'] = self.cpu_time
+        dct['self_wall_time'] = self.self_wall_time()
+        dct['self_cpu_time'] = self.self_cpu_time()
+        dct['read_bytes'] = self.read_bytes
+        dct['written_bytes'] = self.written_bytes
+        dct['read_wall_time'] = self.read_wall_time
+        bandwidth = self.bandwidth()
+        if bandwidth is None:
+            dct['bytes_per_second'] = None
+        else:
+            dct['bytes_per_second'] = bandwidth.get_value('b/s')
+        return dct
+
+def _format_time(seconds):
+    duration = Time(float(seconds), 's')
+    if seconds >= 60.0:
+        duration = duration.human()
+    return "{:.3f}{}".format(duration.value(), duration.units())
+
+def _format_bandwidth(bandwidth):
+    if bandwidth is None:
+        return "-"
+    return "{:.2f}mb/s".format(bandwidth.get_value('mb/s'))
+
+class PhaseTimer(object):
+    """PhaseTimer()
+    Records the PhaseRecord of each phase of a rubik run; phases can be
+    nested.
+    """
+    PHASE_INITIALIZE = 'initialize'
+    PHASE_READ = 'read'
+    PHASE_EVALUATE = 'evaluate'
+    PHASE_WRITE = 'write'
+    PHASE_FINALIZE = 'finalize'
+    IO_PHASES = (PHASE_READ, PHASE_WRITE)
+    def __init__(self):
+        self.records = []
+        self._stack = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, phase, name=""):
+        """with self.phase(phase, name="") as record: ...
+           times the block; the bytes read and written are set on 'record'"""
+        record = PhaseRecord(phase, name)
+        self.records.append(record)
+        self._stack.append(record)
+        wall_start = _clock()
+        cpu_start = _cpu_time()
+        try:
+            yield record
+        finally:
+            record.wall_time = _clock() - wall_start
+            record.cpu_time = _cpu_time() - cpu_start
+            self._stack.pop()
+            if self._stack:
+                parent = self._stack[-1]
+                parent.child_wall_time += record.wall_time
+                parent.child_cpu_time += record.cpu_time
+
+    def add_read(self, num_bytes, seconds):
+        """self.add_read(num_bytes, seconds)
+           adds the bytes read, and the time spent reading them, to the
+           current phase"""
+        with self._lock:
+            if self._stack:
+                record = self._stack[-1]
+                record.read_bytes += num_bytes
+                record.read_wall_time += seconds
+
+    def totals(self):
+        """self.totals() -> OrderedDict phase -> PhaseRecord with the total self times and bytes"""
+        totals = collections.OrderedDict()
+        for record in self.records:
+            total = totals.get(record.phase)
+            if total is None:
+                total = totals[record.phase] = PhaseRecord(record.phase, "total")
+            total.wall_time += record.self_wall_time()
+            total.cpu_time += record.self_cpu_time()
+            total.read_bytes += record.read_bytes
+            total.written_bytes += record.written_bytes
+            total.read_wall_time += record.read_wall_time
+        return totals
+
+    def _io_wall_time(self, record):
+        if record.phase in self.IO_PHASES:
+            return record.self_wall_time()
+        else:
+            # lazy and memory mapped cubes are read by the phase consuming them
+            return min(record.read_wall_time, record.self_wall_time())
+
+    def io_wall_time(self):
+        return sum(self._io_wall_time(record) for record in self.records)
+
+    def compute_wall_time(self):
+        return sum(record.self_wall_time() - self._io_wall_time(record) for record in self.records)
+
+    def report(self):
+        """self.report() -> text table of the recorded phases, with totals"""
+        table = Table(headers=("phase", "name", "wall", "self wall", "cpu", "self cpu", "read", "written", "bandwidth"))
+        def _add_row(record):
+            table.add_row((record.phase, record.name,
+                           _format_time(record.wall_time), _format_time(record.self_wall_time()),
+                           _format_time(record.cpu_time), _format_time(record.self_cpu_time()),
+                           record.read_bytes, record.written_bytes,
+                           _format_bandwidth(record.bandwidth())))
+        for record in self.records:
+            _add_row(record)
+        for total in self.totals().values():
+            _add_row(total)
+        lines = [table.render()]
+        io_wall_time = self.io_wall_time()
+        compute_wall_time = self.compute_wall_time()
+        wall_time = io_wall_time + compute_wall_time
+        if wall_time > 0.0:
+            lines.append("I/O: {} ({:.1f}%), compute: {} ({:.1f}%)".format(
+                _format_time(io_wall_time), 100.0 * io_wall_time / wall_time,
+                _format_time(compute_wall_time), 100.0 * compute_wall_time / wall_time))
+        return '\n'.join(lines)
+
+    def as_dict(self):
+        dct = collections.OrderedDict()
+        dct['records'] = [record.as_dict() for record in self.records]
+        dct['totals'] = [total.as_dict() for total in self.totals().values()]
+        dct['io_wall_time'] = self.io_wall_time()
+        dct['compute_wall_time'] = self.compute_wall_time()
+        return dct
+
+    def dump(self, filename):
+        """self.dump(filename)
+           writes the recorded phases as JSON to 'filename'"""
+        with open(filename, 'w') as f_out:
+            json.dump(self.as_dict(), f_out, indent=2)
+            f_out.write('\n')
@@ -32,9 +32,10 @@ from ..units import Memory
 from ..errors import RubikError, RubikMemoryError, RubikExpressionError
 from ..shape import Shape
 from ..filename import InputFilename, OutputFilename, InputMode, OutputMode
-from ..application.argdict import ResultArgDict, InputArgDict, OutputArgDict
+from ..application.argdict import ResultArgDict, InputArgDict, InputListArgDict, OutputArgDict
 from ..application.arglist import ArgList
 from ..application.logo import RUBIK
+from ..application.phase_timer import PhaseTimer
 from ..extractor import Extractor
 from ..cubes.utilities import interpolate_filename
 from ..visualizer.controller_builder import controller_builder
@@ -61,7 +62,7 @@ class Rubik(object):
         self.input_csv_separators = InputArgDict(str, default=conf.FILE_FORMAT_CSV_SEPARATOR)
         self.input_text_delimiters = InputArgDict(str, default=conf.FILE_FORMAT_TEXT_DELIMITER)
         self.shapes = InputArgDict(Shape)
-        self.extractors = InputArgDict(Extractor, default=None)
+        self.extractors = InputListArgDict(Extractor, default=None)
 
         self.output_filenames = OutputArgDict(OutputFilename)
         self.output_modes = OutputArgDict(OutputMode)
@@ -72,6 +73,7 @@ class Rubik(object):
         self.output_text_delimiters = OutputArgDict(str, default=conf.FILE_FORMAT_TEXT_DELIMITER)
         self.output_text_newlines = OutputArgDict(str, default=conf.FILE_FORMAT_TEXT_NEWLINE)
         self.output_text_converters = OutputArgDict(str, default=conf.FILE_FORMAT_TEXT_CONVERTER)
+        self.output_chunked_compressions = OutputArgDict(str, default=conf.FILE_FORMAT_CHUNKED_COMPRESSION)
 
         self.expressions = ArgList(str)
 
@@ -80,6 +82,11 @@ class Rubik(object):
 
         self.set_accept_bigger_raw_files(False)
         self.set_read_threshold_size(self.config.default_read_threshold_size)
+        self.set_read_mmap(False)
+        self.set_lazy(False)
+        self.set_write_buffer_size(None)
+        self.set_workers(1)
+        self.set_stats_cache()
         self.set_memory_limit(self.config.default_memory_limit)
         self.set_split_dimensions(None)
         self.set_clobber(self.config.default_clobber)
@@ -87,10 +94,12 @@ class Rubik(object):
         self.set_print_report(False)
         self.set_histogram_options(False)
         self.set_dry_run(False)
+        self.set_timing(False)
         self.set_dtype(default_dtype)
 
         self.total_read_bytes = 0
         self.input_cubes = OrderedDict()
+        self.input_sources = OrderedDict()
 
         self._used_input_filenames = set()
         self._used_output_filenames = set()
@@ -99,6 +108,7 @@ class Rubik(object):
         self._locals = {}
         self._pointless_expressions = []
         cubes_internals.set_output_mode_callback(self.notify_output_mode)
+        cubes_internals.set_read_callback(self.notify_read)
 
         self._controller = None
         self._stats_infos = []
@@ -150,9 +160,34 @@ class Rubik(object):
     def set_read_threshold_size(self, read_threshold_size):
         self.read_threshold_size = read_threshold_size
 
+    def set_read_mmap(self, read_mmap):
+        self.read_mmap = read_mmap
+
+    def set_write_buffer_size(self, write_buffer_size):
+        if write_buffer_size is None:
+            write_buffer_size = cubes_api.ChunkWriter.DEFAULT_BUFFER_SIZE
+        self.write_buffer_size = write_buffer_size
+
+    def set_lazy(self, lazy):
+        self.lazy = lazy
+
+    def set_workers(self, workers):
+        cubes_internals.set_default_workers(workers)
+        self.workers = cubes_internals.get_default_workers()
+
+    def set_stats_cache(self, cache_dir=None, sidecar=False):
+        if sidecar:
+            self.stats_cache = cubes_api.StatsCache()
+        elif cache_dir is not None:
+            self.stats_cache = cubes_api.StatsCache(cache_dir)
+        else:
+            self.stats_cache = None
+
     def set_memory_limit(self, memory_limit):
         self.memory_limit = memory_limit
         self.memory_limit_bytes = memory_limit.get_bytes()
+        self.memory_governor = cubes_api.get_memory_governor()
+        self.memory_governor.set_limit(memory_limit)
 
     def set_split_dimensions(self, split_dimensions):
         if split_dimensions is None:
@@ -194,22 +229,50 @@ class Rubik(object):
     def set_print_report(self, print_report):
         self.print_report = print_report
 
+    def set_timing(self, timing, timing_file=None):
+        self.timing = timing
+        self.timing_file = timing_file
+        self.phase_timer = PhaseTimer()
+
     def run(self):
         if self.print_report:
             self.impl_print_report()
+        if self.dry_run and not (self.print_report and self.report_logger.isEnabledFor(logging.INFO)):
+            # the read plans are not in the report
+            self.print_read_plans()
         if not self.dry_run:
-            self.initialize()
+            with self.phase_timer.phase(PhaseTimer.PHASE_INITIALIZE):
+                self.initialize()
             self.evaluate_expressions(*self.expressions)
-            self.finalize()
+            with self.phase_timer.phase(PhaseTimer.PHASE_FINALIZE):
+                self.finalize()
+            self.print_timing()
         return 0
+
+    def print_timing(self):
+        if self.timing:
+            # shown at the default report level
+            self.report_logger.warning("### Timing")
+            for line in self.phase_timer.report().split('\n'):
+                self.report_logger.warning(line)
+        if self.timing_file:
+            self.log_info("writing timing to {!r}...".format(self.timing_file))
+            self.phase_timer.dump(self.timing_file)
     
     def get_dtype_bytes(self, dtype):
         if not dtype in self._cache_dtype_bytes:
             self._cache_dtype_bytes[dtype] = dtype().itemsize
         return self._cache_dtype_bytes[dtype]
 
-    def register_input_cube(self, input_label, input_filename, cube):
+    def register_input_cube(self, input_label, input_filename, cube, source=None):
         self.input_cubes[input_label] = cube
+        self.input_sources[input_label] = source
+
+    def get_input_source(self, cube):
+        for input_label, input_cube in self.input_cubes.items():
+            if input_cube is cube:
+                return self.input_sources[input_label]
+        return None
 
     def result(self):
         return self._result
@@ -265,7 +328,8 @@ class Rubik(object):
             input_text_delimiter=text_delimiter, 
         )
         input_label, input_filename = self.get_label_filename('read_cube', self.input_filenames, label, filename, attributes)
-        return self.read_cube_impl(input_label, input_filename, attributes=attributes)
+        with self.phase_timer.phase(PhaseTimer.PHASE_READ, input_filename.filename) as phase_record:
+            return self.read_cube_impl(input_label, input_filename, attributes=attributes, phase_record=phase_record)
 
     def initialize(self):
         pass
@@ -275,9 +339,12 @@ class Rubik(object):
         shape = self.shapes.get(input_label, input_ordinal)
         if shape is None:
             raise RubikError("missing shape for filename {0}".format(input_filename))
-        extractor = self.extractors.get(input_label, input_ordinal)
-        if extractor is not None:
-            count, sub_count = extractor.get_counts(shape)
+        extractors = self.extractors.get_list(input_label, input_ordinal)
+        if extractors:
+            sub_count = 0
+            for extractor in extractors:
+                count, extractor_sub_count = extractor.get_counts(shape)
+                sub_count += extractor_sub_count
         else:
             count = shape.count()
             sub_count = count
@@ -291,17 +358,30 @@ class Rubik(object):
                     input_bytes_read,
                     input_bytes_sub,
                     self.total_read_bytes))
-        if self.memory_limit_bytes > 0 and self.total_read_bytes + input_bytes_read > self.memory_limit_bytes:
-            raise RubikMemoryError("trying to read {0} + {1} = {2} bytes, more than memory limit {1}".format(
-                    self.total_read_bytes,
-                    input_bytes_read,
-                    self.total_read_bytes + input_bytes_read,
-                    self.memory_limit))
+        if not self.memory_governor.fits(input_bytes_read):
+            return False
         self.total_read_bytes += input_bytes_sub
+        return True
 
-    def read_cube_impl(self, input_label, input_filename, attributes):
-        self._check_memory_limit(input_label, input_filename)
-        self.log_debug("executing optimized read...")
+    def _memory_limit_error(self, input_label, input_filename):
+        return RubikMemoryError("cannot read input file {0!r}: {1} bytes already allocated, memory limit is {2}".format(
+                    input_filename,
+                    self.memory_governor.allocated(),
+                    self.memory_limit))
+
+    def _get_read_bytes(self, input_format, input_filename, input_offset):
+        """_get_read_bytes(...) -> bytes read: the size of the parsed file for
+           'text' and 'csv' files, otherwise 0 ('raw' and 'chunked' reads,
+           including lazy and memory mapped ones, report the bytes actually
+           read from the file through notify_read())"""
+        if input_format in (conf.FILE_FORMAT_TEXT, conf.FILE_FORMAT_CSV):
+            read_bytes = os.path.getsize(input_filename)
+            if input_offset is not None:
+                read_bytes -= input_offset.get_bytes()
+            return max(0, read_bytes)
+        return 0
+
+    def read_cube_impl(self, input_label, input_filename, attributes, phase_record=None):
         input_ordinal = self.input_filenames.get_ordinal(input_label)
         shape = self.get_attribute('shape', attributes, input_label, input_ordinal)
         if shape is None:
@@ -320,6 +400,10 @@ class Rubik(object):
             input_dtype = self.dtype
         input_dtype_bytes = self.get_dtype_bytes(input_dtype)
         extractor = self.get_attribute('extractor', attributes, input_label, input_ordinal)
+        if attributes.get('extractor', None) is None:
+            regions = self.extractors.get_list(input_label, input_ordinal)
+        else:
+            regions = [extractor]
         assert isinstance(input_filename, InputFilename), "not an InputFilename: {!r} [{}]".format(input_filename, type(input_filename))
         assert (extractor is None) or isinstance(extractor, Extractor), "not a valid extractor: {!r} [{}]".format(extractor, type(extractor))
         input_filename = input_filename.filename
@@ -345,10 +429,66 @@ class Rubik(object):
             input_text_delimiter = self.get_attribute('input_text_delimiter', attributes, input_label, input_ordinal)
             if input_text_delimiter is not None:
                 numpy_function_nargs['delimiter'] = input_text_delimiter
+        elif input_format == conf.FILE_FORMAT_CHUNKED:
+            msg_bytes = ''
         else:
             raise RubikError("invalid file format {0!r}".format(input_format))
         input_filename = interpolate_filename(input_filename, shape=shape.shape(), dtype=input_dtype, file_format=input_format)
         input_filename = self._check_input_filename(shape, input_format, input_filename, input_dtype, input_offset)
+        if input_format in (conf.FILE_FORMAT_RAW, conf.FILE_FORMAT_CHUNKED):
+            source = dict(filename=input_filename, shape=shape, dtype=input_dtype, file_format=input_format,
+                          offset=input_offset.get_bytes() if input_offset is not None else 0,
+                          extractor=extractor)
+        else:
+            source = None
+        read_mmap = self.read_mmap
+        out_of_core = False
+        if input_format == conf.FILE_FORMAT_RAW and (read_mmap or (self.lazy and extractor is None)):
+            # nothing is read now
+            pass
+        elif not self._check_memory_limit(input_label, input_filename):
+            # out-of-core fallback: lazy or memory mapped 'raw' cubes are
+            # processed block by block by stats, diff and histogram
+            if input_format == conf.FILE_FORMAT_RAW and len(regions) <= 1:
+                if extractor is None:
+                    out_of_core = True
+                    self.log_warning("memory limit {m}: input file {i!r} is read lazily".format(m=self.memory_limit, i=input_filename))
+                else:
+                    read_mmap = True
+                    self.log_warning("memory limit {m}: input file {i!r} is memory mapped".format(m=self.memory_limit, i=input_filename))
+            else:
+                raise self._memory_limit_error(input_label, input_filename)
+        if out_of_core or (self.lazy and input_format == conf.FILE_FORMAT_RAW and extractor is None):
+            if input_offset is not None:
+                offset = input_offset.get_bytes()
+            else:
+                offset = 0
+            self.log_info("lazy reading {c} {t!r} elements {b}from {f!r} file {i!r}...".format(
+                c=expected_read_count,
+                t=input_dtype.__name__,
+                b=msg_bytes,
+                f=input_format,
+                i=input_filename))
+            if out_of_core:
+                # the blocks of stats, diff and histogram fit the available
+                # memory: diff reads two cubes at once, and each block is
+                # read while the previous one is still alive; tiny blocks
+                # would make the reads far too slow
+                buffer_size = Memory(max(cubes_api.StatsInfo.CHUNK_SIZE, self.memory_governor.available() // 4), 'b')
+            else:
+                buffer_size = None
+            cube = cubes_api.lazy_read_cube_raw(input_filename, shape=shape, dtype=input_dtype, offset=offset,
+                                                buffer_size=buffer_size)
+            self.register_input_cube(input_label, input_filename, cube, source)
+            return cube
+        if len(regions) > 1:
+            cubes = self.read_cube_regions_impl(input_label, input_filename, shape, regions,
+                                                input_format, input_mode, input_offset, input_dtype,
+                                                numpy_function_nargs)
+            if phase_record is not None:
+                phase_record.read_bytes += self._get_read_bytes(input_format, input_filename, input_offset)
+            return cubes
+        self.log_debug("executing optimized read...")
         if extractor is None:
             extractor_msg = ''
         else:
@@ -368,10 +508,93 @@ class Rubik(object):
                     o=offset,
                 ))
                 f_in.seek(offset)
-            cube = numpy_function(input_format, f_in, shape=shape, extractor=extractor, dtype=input_dtype, threshold_size=self.read_threshold_size, *numpy_function_pargs, **numpy_function_nargs)
-        self.register_input_cube(input_label, input_filename, cube)
+            cube = numpy_function(input_format, f_in, shape=shape, extractor=extractor, dtype=input_dtype, threshold_size=self.read_threshold_size, mmap=read_mmap, *numpy_function_pargs, **numpy_function_nargs)
+        self.memory_governor.track(cube)
+        if phase_record is not None:
+            phase_record.read_bytes += self._get_read_bytes(input_format, input_filename, input_offset)
+        self.register_input_cube(input_label, input_filename, cube, source)
         return cube
 
+    def read_cube_regions_impl(self, input_label, input_filename, shape, regions,
+                               input_format, input_mode, input_offset, input_dtype,
+                               numpy_function_nargs):
+        """read_cube_regions_impl(...) -> list of cubes
+           reads all the regions of the input file in a single pass; the input
+           label refers to the list of the extracted cubes"""
+        for region_index, extractor in enumerate(regions):
+            count, sub_count = extractor.get_counts(shape)
+            if input_format == conf.FILE_FORMAT_RAW:
+                msg_bytes = "({b} bytes) ".format(b=sub_count * self.get_dtype_bytes(input_dtype))
+            else:
+                msg_bytes = ''
+            self.log_info("reading region {n}: {c} {t!r} elements {b}from {f!r} file {i!r}[{x}]...".format(
+                n=region_index,
+                c=sub_count,
+                t=input_dtype.__name__,
+                b=msg_bytes,
+                f=input_format,
+                i=input_filename,
+                x=extractor))
+        with open(input_filename, input_mode) as f_in:
+            if input_offset is not None:
+                offset = input_offset.get_bytes()
+                self.log_info("seeking {f!r}@{o}...".format(
+                    f=input_filename,
+                    o=offset,
+                ))
+                f_in.seek(offset)
+            cubes = cubes_api.read_cube_regions(input_format, f_in, shape=shape, extractors=regions, dtype=input_dtype, mmap=self.read_mmap, **numpy_function_nargs)
+        for cube in cubes:
+            self.memory_governor.track(cube)
+        self.register_input_cube(input_label, input_filename, cubes, None)
+        return cubes
+
+    def get_read_cost(self, input_label):
+        """get_read_cost(input_label) -> the estimated cost (ReadCost) of the
+           chosen read strategy, or None if the shape is missing"""
+        input_ordinal = self.input_filenames.get_ordinal(input_label)
+        shape = self.shapes.get(input_label, input_ordinal)
+        if shape is None:
+            return None
+        input_format = self.input_formats.get(input_label, input_ordinal)
+        if input_format is None:
+            input_format = conf.DEFAULT_FILE_FORMAT
+        input_dtype = self.input_dtypes.get(input_label, input_ordinal)
+        if input_dtype is None:
+            input_dtype = self.dtype
+        regions = self.extractors.get_list(input_label, input_ordinal)
+        if len(regions) > 1:
+            if input_format != conf.FILE_FORMAT_RAW or self.read_mmap:
+                return None
+            regions_read_plan = cubes_api.RegionsReadPlan(shape, input_dtype, regions)
+            read_bytes = regions_read_plan.read_bytes()
+            memory_bytes = sum(read_plan.count for read_plan in regions_read_plan.read_plans) * self.get_dtype_bytes(input_dtype)
+            return cubes_api.ReadCost(strategy='regions', reads=regions_read_plan.num_reads(), read_bytes=read_bytes,
+                                      memory_bytes=memory_bytes, cost=None)
+        if regions:
+            extractor = regions[0]
+            count, sub_count = extractor.get_counts(shape)
+        else:
+            extractor = None
+            sub_count = shape.count()
+        # out-of-core fallback (see read_cube_impl()): no ReadPlan is built
+        out_of_core = input_format == conf.FILE_FORMAT_RAW and not self.read_mmap and \
+                      not (self.lazy and not regions) and \
+                      not self.memory_governor.fits(sub_count * self.get_dtype_bytes(input_dtype))
+        if input_format == conf.FILE_FORMAT_RAW and not regions and (self.lazy or out_of_core):
+            return cubes_api.ReadCost(strategy='lazy', reads=0, read_bytes=0, memory_bytes=0, cost=0)
+        read_mmap = self.read_mmap or out_of_core
+        read_planner = cubes_api.ReadPlanner(input_format, shape, input_dtype, extractor,
+                                             threshold_size=self.read_threshold_size,
+                                             mmap=read_mmap and input_format == conf.FILE_FORMAT_RAW)
+        return read_planner.best()
+
+    def print_read_plans(self):
+        for input_label, input_filename in self.input_filenames.items():
+            read_cost = self.get_read_cost(input_label)
+            if read_cost is not None:
+                self.PRINT("read plan for input file {!r} [{}]: {}".format(input_filename.filename, input_label, read_cost))
+
     def get_attribute(self, attribute_name, attributes, label, ordinal):
         attribute_value = attributes.get(attribute_name, None)
         if attribute_value is not None:
@@ -391,6 +614,8 @@ class Rubik(object):
     def iterate_on_split(self, function, cube, *p_args, **n_args):
         if cube is None:
             cube = self._result
+        if self.split_dimensions:
+            cube = cubes_api.evaluate(cube)
         for cube, dlabels in self.split_over_dimensions(cube):
             function(cube=cube, dlabels=dlabels, *p_args, **n_args)
         
@@ -405,6 +630,9 @@ class Rubik(object):
     def notify_output_mode(self):
         del self._pointless_expressions[:]
 
+    def notify_read(self, num_bytes, seconds):
+        self.phase_timer.add_read(num_bytes, seconds)
+
     def write_cube(self, filename=None, label=None, cube=None,
         mode=None,
         offset=None,
@@ -414,6 +642,7 @@ class Rubik(object):
         text_delimiter=None,
         text_newline=None,
         text_converter=None,
+        chunked_compression=None,
     ):
         attributes = dict(
             output_mode=mode,
@@ -424,13 +653,138 @@ class Rubik(object):
             output_text_delimiter=text_delimiter,
             output_text_newline=text_newline,
             output_text_converter=text_converter,
+            output_chunked_compression=chunked_compression,
         )
         self.notify_output_mode()
         output_label, output_filename = self.get_label_filename('write_cube', self.output_filenames, label, filename, attributes)
         if cube is None:
             cube = self._result
+        if self.split_dimensions and cubes_api.is_lazy(cube):
+            if self.write_cube_split_raw(output_filename=output_filename, output_label=output_label, cube=cube, attributes=attributes):
+                return
         self.iterate_on_split(self.write_cube_impl, cube, output_label=output_label, output_filename=output_filename, attributes=attributes)
 
+    def write_cube_split_raw(self, output_filename, output_label, cube, attributes):
+        """write_cube_split_raw(...) -> True if the lazy cube has been split
+           the lazy cube is read once, and its slabs are streamed to the 'raw'
+           output files; only 'raw' outputs without offset are supported"""
+        output_ordinal = self.output_filenames.get_ordinal(output_label)
+        output_format = self.get_attribute('output_format', attributes, output_label, output_ordinal)
+        if output_format is None:
+            output_format = conf.DEFAULT_FILE_FORMAT
+        output_offset = self.get_attribute('output_offset', attributes, output_label, output_ordinal)
+        output_mode = self.get_attribute('output_mode', attributes, output_label, output_ordinal)
+        if output_mode is None:
+            output_mode = OutputMode("wb")
+        if output_format != conf.FILE_FORMAT_RAW or output_offset is not None or not output_mode.mode in ('wb', 'ab'):
+            return False
+        output_dtype = self.get_attribute('output_dtype', attributes, output_label, output_ordinal)
+        if output_dtype is None:
+            output_dtype = self.dtype
+        output_dtype_bytes = self.get_dtype_bytes(output_dtype)
+        assert isinstance(output_filename, OutputFilename), "not an OutputFilename: {!r} [{}]".format(output_filename, type(output_filename))
+        split_writer = cubes_api.SplitRawWriter(self.split_dimensions, dtype=output_dtype,
+                                                buffer_size=self.write_buffer_size, mode=output_mode.mode)
+        subshape = split_writer.get_subshape(cube.shape)
+        sub_count = 1
+        for dim in subshape:
+            sub_count *= dim
+        filenames = OrderedDict()
+        for axes_indices in split_writer.iter_axes_indices(cube.shape):
+            dlabels = OrderedDict(('d{0}'.format(i), j) for i, j in axes_indices)
+            filenames[axes_indices] = interpolate_filename(output_filename.filename, shape=subshape, dtype=output_dtype, file_format=output_format, keywords=dlabels)
+        if len(set(filenames.values())) != len(filenames):
+            # subcubes overwriting the same file
+            return False
+        if output_mode.is_append_mode():
+            omode = 'appending'
+        else:
+            omode = 'writing'
+        for filename in filenames.values():
+            self._check_output_filename(filename)
+            self.log_info("{m} {c} {t!r} elements ({b} bytes) to {f!r} file {o!r}...".format(
+                m=omode,
+                c=sub_count,
+                t=output_dtype.__name__,
+                b=sub_count * output_dtype_bytes,
+                f=output_format,
+                o=filename))
+        with self.phase_timer.phase(PhaseTimer.PHASE_WRITE, output_filename.filename) as phase_record:
+            split_writer.write(cube, filenames.__getitem__)
+            phase_record.written_bytes = len(filenames) * sub_count * output_dtype_bytes
+        return True
+
+    def join_files(self, filename=None, label=None):
+        """join_files(filename=None, label=None)
+           joins the 'raw' input files into the 'raw' output file, without
+           reading them (see cubes.join_files())"""
+        attributes = {}
+        self.notify_output_mode()
+        output_label, output_filename = self.get_label_filename('join_files', self.output_filenames, label, filename, attributes)
+        output_ordinal = self.output_filenames.get_ordinal(output_label)
+        output_format = self.get_attribute('output_format', attributes, output_label, output_ordinal)
+        if output_format is not None and output_format != conf.FILE_FORMAT_RAW:
+            raise RubikError("join_files: invalid output file format {0!r}: only {1!r} is supported".format(output_format, conf.FILE_FORMAT_RAW))
+        sources = []
+        for input_label, source in self.input_sources.items():
+            if source is None or source['file_format'] != conf.FILE_FORMAT_RAW or source['extractor'] is not None:
+                raise RubikError("join_files: input {0!r} is not a 'raw' file without extractor".format(input_label))
+            sources.append(source)
+        if not sources:
+            raise RubikError("join_files: no input files")
+        shape, dtype = sources[0]['shape'], sources[0]['dtype']
+        for source in sources[1:]:
+            if source['shape'] != shape or source['dtype'] != dtype:
+                raise RubikError("join_files: input files with different shapes/dtypes: {0} {1!r} and {2} {3!r}".format(
+                                 shape, dtype.__name__, source['shape'], source['dtype'].__name__))
+        output_dtype = self.get_attribute('output_dtype', attributes, output_label, output_ordinal)
+        if output_dtype is not None and output_dtype != dtype:
+            raise RubikError("join_files: cannot convert {0!r} files to {1!r}".format(dtype.__name__, output_dtype.__name__))
+        joined_shape = Shape((len(sources), ) + tuple(shape.shape()))
+        output_filename = interpolate_filename(output_filename.filename, shape=joined_shape, dtype=dtype, file_format=conf.FILE_FORMAT_RAW)
+        output_offset = self.get_attribute('output_offset', attributes, output_label, output_ordinal)
+        output_mode = self.get_attribute('output_mode', attributes, output_label, output_ordinal)
+        if output_mode is None:
+            if output_offset is not None:
+                if os.path.lexists(output_filename):
+                    output_mode = OutputMode("r+b")
+                else:
+                    output_mode = OutputMode("w+b")
+            else:
+                output_mode = OutputMode("wb")
+        self._check_output_filename(output_filename)
+        if output_mode.is_append_mode():
+            omode = 'appending'
+        else:
+            omode = 'writing'
+        self.log_info("joining {n} {t!r} cubes {s} ({b} bytes), {m} to 'raw' file {o!r}...".format(
+            m=omode,
+            n=len(sources),
+            t=dtype.__name__,
+            s=shape,
+            b=joined_shape.count() * self.get_dtype_bytes(dtype),
+            o=output_filename))
+        mode = output_mode.mode
+        if not 'b' in mode:
+            # the data are copied as bytes
+            mode += 'b'
+        with self.phase_timer.phase(PhaseTimer.PHASE_WRITE, output_filename) as phase_record, \
+             open(output_filename, mode) as f_out:
+            if output_offset is not None:
+                offset = output_offset.get_bytes()
+                self.log_info("seeking {f!r}@{o}...".format(
+                    f=output_filename,
+                    o=offset,
+                ))
+                f_out.seek(offset)
+            # appended or written at an offset: the rest of the file is kept
+            truncate = not (output_mode.is_append_mode() or output_offset is not None)
+            cubes_api.join_files([source['filename'] for source in sources], f_out,
+                                 shape=shape, dtype=dtype, offsets=[source['offset'] for source in sources],
+                                 accept_bigger_raw_files=True, buffer_size=self.write_buffer_size,
+                                 truncate=truncate)
+            phase_record.read_bytes = phase_record.written_bytes = joined_shape.count() * self.get_dtype_bytes(dtype)
+
     def write_cube_impl(self, output_filename, output_label, cube, dlabels, attributes):
         output_ordinal = self.output_filenames.get_ordinal(output_label)
         output_format = self.get_attribute('output_format', attributes, output_label, output_ordinal)
@@ -440,13 +794,8 @@ class Rubik(object):
         if output_dtype is None:
             output_dtype = self.dtype
         output_dtype_bytes = self.get_dtype_bytes(output_dtype)
-        if cube.dtype != output_dtype:
-            cube = cube.astype(output_dtype)
         assert isinstance(output_filename, OutputFilename), "not an OutputFilename: {!r} [{}]".format(output_filename, type(output_filename))
         output_filename = output_filename.filename
-        numpy_function = None
-        numpy_function_pargs = []
-        numpy_function_nargs = {}
         output_filename = interpolate_filename(output_filename, shape=cube.shape, dtype=output_dtype, file_format=output_format, keywords=dlabels)
         output_offset = self.get_attribute('output_offset', attributes, output_label, output_ordinal)
         output_mode = self.get_attribute('output_mode', attributes, output_label, output_ordinal)
@@ -459,35 +808,32 @@ class Rubik(object):
             else:
                 output_mode = OutputMode("wb")
         self._check_output_filename(output_filename)
+        if np.dtype(output_dtype) != cube.dtype:
+            # the cube is converted chunk by chunk
+            self.memory_governor.check(min(cube.size * output_dtype_bytes, Memory(self.write_buffer_size).get_bytes()),
+                                       what="converting to {!r}".format(output_dtype.__name__))
         if output_format == conf.FILE_FORMAT_RAW:
             num_bytes = cube.size * output_dtype_bytes
             msg_bytes = "({b} bytes) ".format(b=num_bytes)
-            numpy_function = cube.tofile
-            #numpy_function_pargs.append(output_filename)
+            chunk_writer = cubes_api.ChunkRawWriter(dtype=output_dtype, buffer_size=self.write_buffer_size)
         elif output_format == conf.FILE_FORMAT_CSV:
             msg_bytes = ''
-            numpy_function = cube.tofile
             output_csv_separator = self.get_attribute('output_csv_separator', attributes, output_label, output_ordinal)
-            numpy_function_nargs['sep'] = output_csv_separator
-            #numpy_function_pargs.append(output_filename)
+            chunk_writer = cubes_api.ChunkCsvWriter(dtype=output_dtype, buffer_size=self.write_buffer_size,
+                                                    sep=output_csv_separator)
         elif output_format == conf.FILE_FORMAT_TEXT:
             msg_bytes = ''
-            numpy_function = np.savetxt
-            #numpy_function_pargs.append(output_filename)
-            if len(cube.shape) <= 2:
-                c2d = cube
-            else:
-                c2d = cube.reshape((cube.shape[0], cube.size // cube.shape[0]))
-            numpy_function_pargs.append(c2d)
             output_text_delimiter = self.get_attribute('output_text_delimiter', attributes, output_label, output_ordinal)
             output_text_newline = self.get_attribute('output_text_newline', attributes, output_label, output_ordinal)
             output_text_converter = self.get_attribute('output_text_converter', attributes, output_label, output_ordinal)
-            if output_text_delimiter is not None:
-                numpy_function_nargs['delimiter'] = output_text_delimiter
-            if output_text_newline is not None:
-                numpy_function_nargs['newline'] = output_text_newline
-            if output_text_converter is not None:
-                numpy_function_nargs['fmt'] = output_text_convert
+            chunk_writer = cubes_api.ChunkTextWriter(dtype=output_dtype, buffer_size=self.write_buffer_size,
+                                                     delimiter=output_text_delimiter,
+                                                     newline=output_text_newline,
+                                                     fmt=output_text_converter)
+        elif output_format == conf.FILE_FORMAT_CHUNKED:
+            msg_bytes = ''
+            output_chunked_compression = self.get_attribute('output_chunked_compression', attributes, output_label, output_ordinal)
+            chunk_writer = cubes_api.ChunkedFileWriter(dtype=output_dtype, compression=output_chunked_compression)
         else:
             raise RubikError("invalid file format {0!r}".format(output_format))
         if output_mode.is_append_mode():
@@ -501,7 +847,8 @@ class Rubik(object):
             b=msg_bytes,
             f=output_format,
             o=output_filename))
-        with open(output_filename, output_mode.mode) as f_out:
+        with self.phase_timer.phase(PhaseTimer.PHASE_WRITE, output_filename) as phase_record, \
+             open(output_filename, output_mode.mode) as f_out:
             if output_offset is not None:
                 offset = output_offset.get_bytes()
                 self.log_info("seeking {f!r}@{o}...".format(
@@ -509,7 +856,9 @@ class Rubik(object):
                     o=offset,
                 ))
                 f_out.seek(offset)
-            numpy_function(f_out, *numpy_function_pargs, **numpy_function_nargs)
+            start = f_out.tell()
+            chunk_writer.write(cube, f_out)
+            phase_record.written_bytes = f_out.tell() - start
 
     def _log_dlabels(self, dlabels):
         if dlabels:
@@ -521,15 +870,22 @@ class Rubik(object):
         self.iterate_on_split(self.print_cube_impl, cube)
 
     def print_cube_impl(self, cube, dlabels):
-        self.PRINT(cube)
+        self.PRINT(cubes_api.evaluate(cube))
 
     def print_stats(self, cube=None):
         self.notify_output_mode()
         self.iterate_on_split(self.print_stats_impl, cube)
 
     def print_stats_impl(self, cube, dlabels):
-        if not isinstance(cube, np.ndarray):
+        if not isinstance(cube, (np.ndarray, cubes_api.LazyCube)):
             raise RubikError("cannot stat result of type {0}: it is not a numpy.ndarray".format(type(cube).__name__))
+        source = self.get_input_source(cube)
+        if self.stats_cache is not None and source is not None:
+            stats_info = self.stats_cache.stats_file(**source)
+            if stats_info is not None:
+                self.log_info("stats of {f!r} from {c!r}".format(f=source['filename'], c=self.stats_cache))
+                stats_info.print_report(print_function=self.PRINT)
+                return
         cubes_api.print_stats(cube, print_function=self.PRINT)
 
     def compare_stats(self, cube=None, title=""):
@@ -567,6 +923,36 @@ class Rubik(object):
         if mode is None:
             mode = self.histogram_mode
         hlength = self.histogram_length
+        source = self.get_input_source(cube)
+        if source is not None and source['extractor'] is None and source['offset'] == 0 and \
+           (isinstance(cube, cubes_api.LazyCube) or cubes_api.is_memory_mapped(cube)):
+            # the input file is not in memory: it is read block by block
+            # (by the --workers processes); the range can come from the
+            # stats cache
+            stats_info = None
+            if hrange is None and self.stats_cache is not None:
+                stats_info = self.stats_cache.stats_file(**source)
+            available = self.memory_governor.available()
+            if available is None:
+                max_memory = None
+            else:
+                max_memory = Memory(max(1, available), 'b')
+            self.log_info("histogram of input file {f!r}...".format(f=source['filename']))
+            cubes_api.print_histogram_file(
+                filename=source['filename'],
+                shape=source['shape'],
+                dtype=source['dtype'],
+                file_format=source['file_format'],
+                bins=bins,
+                hlength=hlength,
+                hrange=hrange,
+                decimals=decimals,
+                fmt=fmt,
+                mode=mode,
+                max_memory=max_memory,
+                stats_info=stats_info,
+                print_function=self.PRINT)
+            return
         cubes_api.print_histogram(
             cube=cube,
             bins=bins,
@@ -577,6 +963,35 @@ class Rubik(object):
             mode=mode,
             print_function=self.PRINT)
 
+    def print_histogram_file(self, filename, shape, dtype=None, bins=None, hlength=None, hrange=None, decimals=None, fmt=None, mode=None, **n_args):
+        self.notify_output_mode()
+        if dtype is None:
+            dtype = self.dtype
+        if bins is None:
+            bins = self.histogram_bins
+        if hrange is None:
+            hrange = self.histogram_range
+        if hlength is None:
+            hlength = self.histogram_length
+        if decimals is None:
+            decimals = self.histogram_decimals
+        if fmt is None:
+            fmt = self.histogram_fmt
+        if mode is None:
+            mode = self.histogram_mode
+        cubes_api.print_histogram_file(
+            filename=filename,
+            shape=shape,
+            dtype=dtype,
+            bins=bins,
+            hlength=hlength,
+            hrange=hrange,
+            decimals=decimals,
+            fmt=fmt,
+            mode=mode,
+            print_function=self.PRINT,
+            **n_args)
+
     def _check_output_filename(self, output_filename):
         if (not self.clobber) and os.path.exists(output_filename):
             raise RubikError("output file {0!r} already exists".format(output_filename))
@@ -630,9 +1045,11 @@ class Rubik(object):
             'cubes': cubes_api,
             'read_cube': self.read_cube,
             'write_cube': self.write_cube,
+            'join_files': self.join_files,
             'print_stats': self.print_stats,
             'print_cube': self.print_cube,
             'print_histogram': self.print_histogram,
+            'print_histogram_file': self.print_histogram_file,
             'compare_stats': self.compare_stats,
             'diff': self.diff,
             'view': self.view,
@@ -673,7 +1090,8 @@ class Rubik(object):
                         raise RubikError("cannot compile expression {0!r}: {1}: {2}".format(expression, type(err).__name__, err))
             try:
                 self.log_debug("executing {0!r} expression...".format(mode))
-                result = eval(compiled_expression, globals_d, locals_d)
+                with self.phase_timer.phase(PhaseTimer.PHASE_EVALUATE, expression):
+                    result = eval(compiled_expression, globals_d, locals_d)
                 if mode == 'eval':
                     if result is not None:
                         self._result = result
@@ -682,8 +1100,23 @@ class Rubik(object):
                     result = locals_d.get('_r', None)
                     if result is not None:
                         self._result = result
+            except RubikMemoryError:
+                raise
             except Exception as err:
                 raise RubikExpressionError("cannot evaluate expression {0!r}".format(expression))
+            self._track_expression_cubes(expression, [result] + list(locals_d.values()))
+
+    def _track_expression_cubes(self, expression, cubes):
+        """_track_expression_cubes(expression, cubes)
+           tracks the cubes computed by 'expression'; raises RubikMemoryError if
+           the memory limit is exceeded"""
+        for cube in cubes:
+            self.memory_governor.track(cube)
+        if self.memory_governor.exceeded():
+            raise RubikMemoryError("expression {0!r}: {1} bytes allocated, more than memory limit {2}".format(
+                expression,
+                self.memory_governor.allocated(),
+                self.memory_limit))
         
     def impl_print_report(self):
         def _log(condition):
@@ -695,6 +1128,12 @@ class Rubik(object):
         logger.info("### Settings")
         logger.info("Internal dtype: {}".format(self.dtype.__name__))
         logger.info("  bytes: {}".format(self.dtype_bytes))
+        logger.info("Read mmap: {}".format(self.read_mmap))
+        logger.info("Lazy: {}".format(self.lazy))
+        logger.info("Write buffer size: {}".format(self.write_buffer_size))
+        logger.info("Workers: {}".format(self.workers))
+        logger.info("Stats cache: {!r}".format(self.stats_cache))
+        logger.info("Memory limit: {}".format(self.memory_limit))
         logger.info("")
         if self.input_filenames:
             logger.info("### Input files")
@@ -716,6 +1155,12 @@ class Rubik(object):
                     input_count = input_shape.count()
                 logger.info("  shape = {!s} [{}]".format(input_shape, input_count))
                 _log(input_extractor)("  extractor = {!r}".format(str(input_extractor)))
+                input_regions = self.extractors.get_list(input_label, self.input_filenames.get_ordinal(input_label))
+                if len(input_regions) > 1:
+                    for region_index, input_region in enumerate(input_regions):
+                        logger.info("    region {} = {!r}".format(region_index, str(input_region)))
+                input_read_cost = self.get_read_cost(input_label)
+                _log(input_read_cost)("  read plan = {!s}".format(input_read_cost))
                 _log(input_mode)("  mode = {!s}".format(input_mode))
                 _log(input_offset)("  offset = {!s}".format(input_offset))
                 _log(input_dtype)("  dtype = {!s}".format(input_dtype))
@@ -737,6 +1182,7 @@ class Rubik(object):
                 output_text_delimiter = self.output_text_delimiters.get(output_filename, output_label)
                 output_text_newline = self.output_text_newlines.get(output_filename, output_label)
                 output_text_converter = self.output_text_converters.get(output_filename, output_label)
+                output_chunked_compression = self.output_chunked_compressions.get(output_filename, output_label)
                 logger.info("Output file {!r} [{}]".format(output_filename, output_label))
                 _log(output_mode)("  mode = {!s}".format(output_mode))
                 _log(output_offset)("  offset = {!s}".format(output_offset))
@@ -746,6 +1192,7 @@ class Rubik(object):
                 _log(output_format == conf.FILE_FORMAT_TEXT)("    text delimiter = {!r}".format(output_text_delimiter))
                 _log(output_format == conf.FILE_FORMAT_TEXT)("    text newline = {!r}".format(output_text_newline))
                 _log(output_format == conf.FILE_FORMAT_TEXT)("    text converter = {!r}".format(output_text_converter))
+                _log(output_format == conf.FILE_FORMAT_CHUNKED)("    chunked compression = {!r}".format(output_chunked_compression))
             logger.info("")
 
         if self.expressions:
@@ -798,7 +1245,7 @@ class Rubik(object):
             title=title,
             visualizer_type=visualizer_type,
             controller=self.controller,
-            data=cube,
+            data=cubes_api.evaluate(cube),
         )
       
     def run_controller(self): # pragma: no cover
@@ -31,6 +31,8 @@ __all__ = [
            'FILE_FORMAT_TEXT_DELIMITER',
            'FILE_FORMAT_TEXT_NEWLINE',
            'FILE_FORMAT_TEXT_CONVERTER',
+           'FILE_FORMAT_CHUNKED',
+           'FILE_FORMAT_CHUNKED_COMPRESSION',
            'FILE_FORMATS',
            'DEFAULT_MEMORY_LIMIT',
            'DEFAULT_READ_THRESHOLD_SIZE',
@@ -74,12 +76,14 @@ VERSION = "{major}.{minor}.{patch}".format(
 FILE_FORMAT_RAW = 'raw'
 FILE_FORMAT_CSV = 'csv'
 FILE_FORMAT_TEXT = 'text'
-FILE_FORMATS = (FILE_FORMAT_RAW, FILE_FORMAT_CSV, FILE_FORMAT_TEXT)
+FILE_FORMAT_CHUNKED = 'chunked'
+FILE_FORMATS = (FILE_FORMAT_RAW, FILE_FORMAT_CSV, FILE_FORMAT_TEXT, FILE_FORMAT_CHUNKED)
 DEFAULT_FILE_FORMAT = FILE_FORMATS[0]
 FILE_FORMAT_CSV_SEPARATOR = ','
 FILE_FORMAT_TEXT_DELIMITER = None
 FILE_FORMAT_TEXT_NEWLINE = None
 FILE_FORMAT_TEXT_CONVERTER = None
+FILE_FORMAT_CHUNKED_COMPRESSION = 'zlib'
 
 DEFAULT_MEMORY_LIMIT = Memory("0")
 DEFAULT_READ_THRESHOLD_SIZE = Memory("100mb")
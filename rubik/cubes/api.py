@@ -19,20 +19,47 @@ __author__ = "Simone Campagna"
 
 __all__ = [
            'linear_cube',
+           'linear_block',
            'random_cube',
+           'RandomFiller',
            'const_cube',
            'const_blocks_cube',
+           'const_blocks_block',
            'write_linear_cube',
            'write_random_cube',
            'write_const_cube',
+           'write_const_blocks_cube',
            'read_cube',
            'read_cube_raw',
            'read_cube_text',
            'read_cube_csv',
+           'read_cube_chunked',
+           'read_cube_regions',
+           'read_cube_raw_regions',
            'write_cube',
            'write_cube_raw',
            'write_cube_text',
            'write_cube_csv',
+           'write_cube_chunked',
+           'ChunkWriter',
+           'ChunkRawWriter',
+           'ChunkCsvWriter',
+           'ChunkTextWriter',
+           'SplitRawWriter',
+           'write_cube_split_raw',
+           'copy_file_data',
+           'join_files',
+           'ChunkedFile',
+           'ChunkedFileWriter',
+           'TextReader',
+           'ReadPlan',
+           'RegionsReadPlan',
+           'ReadCost',
+           'ReadPlanner',
+           'MemoryGovernor',
+           'get_memory_governor',
+           'set_memory_limit',
+           'is_memory_mapped',
            'not_equals_cube',
            'not_equals_num',
            'not_equals',
@@ -42,8 +69,10 @@ __all__ = [
            'rel_diff_cube',
            'threshold_cube',
            'abs_diff_cube',
+           'diff_cubes',
            'abs_threshold_cube',
            'where_indices',
+           'where_indices_file',
            'zero_cube',
            'nonzero_cube',
            'split',
@@ -58,9 +87,13 @@ __all__ = [
            'print_stats_file',
            'diff_files',
            'print_diff_files',
+           'StatsCache',
            'precise_sum',
            'precise_mean',
            'set_random_seed',
+           'get_random_seed_sequence',
+           'set_default_workers',
+           'get_default_workers',
            'get_dtype',
            'get_default_dtype',
            'get_dtype_name',
@@ -69,6 +102,12 @@ __all__ = [
            'interpolate_filename',
            'histogram',
            'print_histogram',
+           'histogram_file',
+           'print_histogram_file',
+           'LazyCube',
+           'lazy_read_cube_raw',
+           'is_lazy',
+           'evaluate',
           ]
 
 from .operation import \
@@ -77,22 +116,59 @@ from .operation import \
 
 from .creation import \
     linear_cube, \
+    linear_block, \
     random_cube, \
+    RandomFiller, \
     const_cube, \
-    const_blocks_cube
+    const_blocks_cube, \
+    const_blocks_block
 
 from .input_output import \
     read_cube, \
     read_cube_raw, \
     read_cube_text, \
     read_cube_csv, \
+    read_cube_chunked, \
+    read_cube_regions, \
+    read_cube_raw_regions, \
     write_cube, \
     write_cube_raw, \
     write_cube_text, \
     write_cube_csv, \
+    write_cube_chunked, \
+    ChunkWriter, \
+    ChunkRawWriter, \
+    ChunkCsvWriter, \
+    ChunkTextWriter, \
+    SplitRawWriter, \
+    write_cube_split_raw, \
+    copy_file_data, \
+    join_files, \
     write_linear_cube, \
     write_random_cube, \
-    write_const_cube
+    write_const_cube, \
+    write_const_blocks_cube
+
+from .chunked import \
+    ChunkedFile, \
+    ChunkedFileWriter
+
+from .text_reader import \
+    TextReader
+
+from .read_plan import \
+    ReadPlan, \
+    RegionsReadPlan
+
+from .read_planner import \
+    ReadCost, \
+    ReadPlanner
+
+from .memory_governor import \
+    MemoryGovernor, \
+    get_memory_governor, \
+    set_memory_limit, \
+    is_memory_mapped
 
 from .comparison import \
     not_equals_cube, \
@@ -104,8 +180,10 @@ from .comparison import \
     rel_diff_cube, \
     threshold_cube, \
     abs_diff_cube, \
+    diff_cubes, \
     abs_threshold_cube, \
     where_indices, \
+    where_indices_file, \
     zero_cube, \
     nonzero_cube
 
@@ -121,6 +199,9 @@ from .stats import \
     diff_files, \
     print_diff_files
 
+from .stats_cache import \
+    StatsCache
+
 from .dtypes import \
     best_precise_dtype, \
     get_dtype, \
@@ -129,7 +210,10 @@ from .dtypes import \
     as_dtype
 
 from .internals import \
-    set_random_seed
+    set_random_seed, \
+    get_random_seed_sequence, \
+    set_default_workers, \
+    get_default_workers
 
 from .utilities import \
     precise_sum, \
@@ -138,4 +222,12 @@ from .utilities import \
 
 from .histogram import \
     histogram, \
-    print_histogram
+    print_histogram, \
+    histogram_file, \
+    print_histogram_file
+
+from .lazy import \
+    LazyCube, \
+    lazy_read_cube_raw, \
+    is_lazy, \
+    evaluate
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+#
+# Copyright 2014 Simone Campagna
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+__author__ = "Simone Campagna"
+
+__all__ = [
+           'CHUNKED_MAGIC',
+           'CHUNKED_VERSION',
+           'COMPRESSIONS',
+           'default_chunk_shape',
+           'ChunkedFile',
+           'ChunkedFileWriter',
+          ]
+
+import collections
+import itertools
+import json
+import struct
+import zlib
+
+try:
+    import lzma
+except ImportError: # pragma: no cover
+    lzma = None
+
+import numpy as np
+
+from .. import conf
+from ..errors import RubikError
+from ..shape import Shape
+from ..units import Memory
+from .dtypes import get_dtype
+from .lazy import LazyCube
+from .internals import timed_read
+
+# Layout of a 'chunked' file:
+#   * CHUNKED_MAGIC;
+#   * the header length (little endian uint32), followed by the JSON header
+#     {version, shape, dtype, chunk_shape, compression};
+#   * the offset table: num_chunks + 1 little endian uint64 offsets, relative
+#     to the beginning of the file; chunk #i is stored in [offsets[i], offsets[i + 1]);
+#   * the chunks, in C order over the chunk grid; each chunk is a C order
+#     array (chunks on the border are clipped to the cube shape), possibly
+#     compressed.
+CHUNKED_MAGIC = b'RUBIKCHK'
+CHUNKED_VERSION = 1
+
+COMPRESSION_NONE = 'none'
+COMPRESSION_ZLIB = 'zlib'
+COMPRESSION_LZMA = 'lzma'
+COMPRESSIONS = (COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_LZMA)
+
+def _compressor(compression):
+    if compression == COMPRESSION_NONE:
+        return lambda data: data, lambda data: data
+    elif compression == COMPRESSION_ZLIB:
+        return zlib.compress, zlib.decompress
+    elif compression == COMPRESSION_LZMA:
+        if lzma is None:
+            raise RubikError("compression {0!r} is not available".format(compression))
+        return lzma.compress, lzma.decompress
+    else:
+        raise RubikError("invalid compression {0!r}: valid compressions are {1}".format(
+            compression, '|'.join(COMPRESSIONS)))
+
+def _count(shape):
+    count = 1
+    for dim in shape:
+        count *= dim
+    return count
+
+def _grid_shape(shape, chunk_shape):
+    return tuple((dim + chunk_dim - 1) // chunk_dim for dim, chunk_dim in zip(shape, chunk_shape))
+
+def default_chunk_shape(shape, itemsize, chunk_size=None):
+    """default_chunk_shape(shape, itemsize, chunk_size=None) -> chunk shape
+       returns the shape of chunks of about 'chunk_size' bytes (default
+       ChunkedFileWriter.DEFAULT_CHUNK_SIZE); chunks are slabs of contiguous
+       elements: the trailing dimensions are taken whole, the leading ones are 1
+    """
+    if chunk_size is None:
+        chunk_size = ChunkedFileWriter.DEFAULT_CHUNK_SIZE
+    count = max(1, Memory(chunk_size).get_bytes() // itemsize)
+    chunk_shape = []
+    for dim in reversed(tuple(shape)):
+        dim = max(1, dim)
+        if dim <= count:
+            chunk_shape.append(dim)
+            count //= dim
+        else:
+            chunk_shape.append(max(1, count))
+            count = 1
+    return tuple(reversed(chunk_shape))
+
+class ChunkedFile(object):
+    """ChunkedFile(file, filename=None, cache_size=None)
+    Reads a 'chunked' file from the file object 'file', starting at its current
+    position. Only the chunks needed by read_box()/read_flat() are read and
+    decompressed; the most recently used decompressed chunks are cached, up to
+    a slab of chunks along the first dimension and to 'cache_size' bytes
+    (default: ChunkedFile.DEFAULT_CACHE_SIZE), so that consecutive flat ranges
+    decompress each chunk once.
+    """
+    DEFAULT_CACHE_SIZE = Memory('64mb')
+    def __init__(self, file, filename=None, cache_size=None):
+        self.file = file
+        if filename is None:
+            filename = getattr(file, 'name', '<file>')
+        self.filename = filename
+        self.start = file.tell()
+        magic = file.read(len(CHUNKED_MAGIC))
+        if magic != CHUNKED_MAGIC:
+            raise RubikError("file {0}: not a {1!r} file".format(self.filename, conf.FILE_FORMAT_CHUNKED))
+        header_length, = struct.unpack('<I', file.read(4))
+        try:
+            header = json.loads(file.read(header_length).decode('utf-8'))
+            self.version = header['version']
+            self.shape = tuple(header['shape'])
+            self.dtype = np.dtype(str(header['dtype']))
+            self.chunk_shape = tuple(header['chunk_shape'])
+            self.compression = header['compression']
+        except (ValueError, KeyError, TypeError) as err:
+            raise RubikError("file {0}: invalid {1!r} header: {2}".format(self.filename, conf.FILE_FORMAT_CHUNKED, err))
+        if self.version > CHUNKED_VERSION:
+            raise RubikError("file {0}: unsupported {1!r} version {2}".format(self.filename, conf.FILE_FORMAT_CHUNKED, self.version))
+        self._decompress = _compressor(self.compression)[1]
+        self.grid_shape = _grid_shape(self.shape, self.chunk_shape)
+        num_chunks = _count(self.grid_shape)
+        table = file.read((num_chunks + 1) * 8)
+        if len(table) != (num_chunks + 1) * 8:
+            raise RubikError("file {0}: too short: truncated offset table".format(self.filename))
+        self.offsets = np.frombuffer(table, dtype='<u8').astype(np.int64)
+        if cache_size is None:
+            cache_size = self.DEFAULT_CACHE_SIZE
+        chunk_bytes = max(1, _count(self.chunk_shape) * self.dtype.itemsize)
+        self.max_cached_chunks = max(1, min(_count(self.grid_shape[1:]), Memory(cache_size).get_bytes() // chunk_bytes))
+        self._cache = collections.OrderedDict()
+
+    @property
+    def count(self):
+        return _count(self.shape)
+
+    def check_shape(self, shape):
+        """self.check_shape(shape)
+           raise an exception if the file shape is not 'shape'"""
+        if isinstance(shape, Shape):
+            shape = shape.shape()
+        if tuple(shape) != self.shape:
+            raise RubikError("file {0}: it contains a cube with shape {1}, expected {2}".format(
+                self.filename, Shape(self.shape), Shape(shape)))
+
+    def chunk_box(self, coord):
+        """self.chunk_box(coord) -> tuple of slices of the chunk at grid coordinates 'coord'"""
+        return tuple(slice(c * chunk_dim, min(dim, (c + 1) * chunk_dim))
+                     for c, chunk_dim, dim in zip(coord, self.chunk_shape, self.shape))
+
+    def read_chunk(self, coord):
+        """self.read_chunk(coord) -> chunk at grid coordinates 'coord'"""
+        index = int(np.ravel_multi_index(coord, self.grid_shape)) if coord else 0
+        chunk = self._cache.pop(index, None)
+        if chunk is None:
+            start, stop = self.offsets[index], self.offsets[index + 1]
+            with timed_read(stop - start):
+                self.file.seek(self.start + start)
+                data = self.file.read(stop - start)
+            if len(data) != stop - start:
+                raise RubikError("file {0}: too short: cannot read chunk #{1}".format(self.filename, index))
+            chunk_shape = tuple(s.stop - s.start for s in self.chunk_box(coord))
+            chunk = np.frombuffer(self._decompress(data), dtype=self.dtype)
+            if chunk.size != _count(chunk_shape):
+                raise RubikError("file {0}: chunk #{1} is corrupted".format(self.filename, index))
+            chunk = chunk.reshape(chunk_shape)
+            while len(self._cache) >= self.max_cached_chunks:
+                self._cache.popitem(last=False)
+        # the most recently used chunk is the last one
+        self._cache[index] = chunk
+        return chunk
+
+    def read_box(self, index_pickers=()):
+        """self.read_box(index_pickers=()) -> cube
+           returns the cube extracted by 'index_pickers' (a tuple of int and
+           slices, as returned by Extractor.index_pickers()); missing trailing
+           index pickers select the whole dimension"""
+        index_pickers = tuple(index_pickers)
+        if len(index_pickers) > len(self.shape):
+            raise RubikError("file {0}: too many indices {1} for shape {2}".format(
+                self.filename, index_pickers, Shape(self.shape)))
+        index_pickers += (slice(None), ) * (len(self.shape) - len(index_pickers))
+        dim_groups = []
+        box_shape = []
+        out_shape = []
+        for index_picker, dim, chunk_dim in zip(index_pickers, self.shape, self.chunk_shape):
+            try:
+                indices = np.atleast_1d(np.arange(dim)[index_picker])
+            except IndexError as err:
+                raise RubikError("file {0}: {1}".format(self.filename, err))
+            chunk_indices = indices // chunk_dim
+            groups = []
+            for c in np.unique(chunk_indices):
+                positions = np.nonzero(chunk_indices == c)[0]
+                groups.append((c, positions, indices[positions] - c * chunk_dim))
+            dim_groups.append(groups)
+            box_shape.append(indices.size)
+            if not isinstance(index_picker, (int, np.integer)):
+                out_shape.append(indices.size)
+        cube = np.empty(tuple(box_shape), dtype=self.dtype)
+        for groups in itertools.product(*dim_groups):
+            chunk = self.read_chunk(tuple(int(group[0]) for group in groups))
+            cube[np.ix_(*[group[1] for group in groups])] = chunk[np.ix_(*[group[2] for group in groups])]
+        return cube.reshape(out_shape)
+
+    def iter_flat_boxes(self, start, stop, shape=None):
+        """self.iter_flat_boxes(start, stop) -> iterates over boxes
+           decomposes the range [start, stop) of flat (C order) elements in
+           boxes (tuples of int and slices)"""
+        if shape is None:
+            shape = self.shape
+        if start >= stop:
+            return
+        if len(shape) <= 1:
+            yield (slice(start, stop), )
+            return
+        sub_count = _count(shape[1:])
+        i_start, r_start = divmod(start, sub_count)
+        i_stop, r_stop = divmod(stop, sub_count)
+        if i_start == i_stop:
+            for box in self.iter_flat_boxes(r_start, r_stop, shape[1:]):
+                yield (i_start, ) + box
+            return
+        if r_start:
+            for box in self.iter_flat_boxes(r_start, sub_count, shape[1:]):
+                yield (i_start, ) + box
+            i_start += 1
+        if i_stop > i_start:
+            yield (slice(i_start, i_stop), ) + (slice(None), ) * (len(shape) - 1)
+        if r_stop:
+            for box in self.iter_flat_boxes(0, r_stop, shape[1:]):
+                yield (i_stop, ) + box
+
+    def read_flat(self, start, stop):
+        """self.read_flat(start, stop) -> 1D numpy.ndarray
+           returns the flat (C order) elements [start, stop) of the cube"""
+        if not self.shape:
+            return self.read_box(()).reshape((1, ))[start:stop]
+        blocks = [self.read_box(box).ravel() for box in self.iter_flat_boxes(start, stop)]
+        if not blocks:
+            return np.empty((0, ), dtype=self.dtype)
+        elif len(blocks) == 1:
+            return blocks[0]
+        else:
+            return np.concatenate(blocks)
+
+    def seek_end(self):
+        """self.seek_end() -> moves the file position after the last chunk"""
+        self.file.seek(self.start + self.offsets[-1])
+
+class ChunkedFileWriter(object):
+    """ChunkedFileWriter(dtype=None, chunk_shape=None, compression=None, chunk_size=None)
+    Writes cubes as 'chunked' files; each chunk is converted to 'dtype' and
+    compressed with 'compression' (default conf.FILE_FORMAT_CHUNKED_COMPRESSION).
+    By default, chunks are slabs of about 'chunk_size' bytes
+    (see default_chunk_shape()); LazyCube objects are then written without
+    evaluating the whole cube.
+    """
+    DEFAULT_CHUNK_SIZE = Memory('1mb')
+    def __init__(self, dtype=None, chunk_shape=None, compression=None, chunk_size=None):
+        if dtype is not None:
+            dtype = get_dtype(dtype)
+        self.dtype = dtype
+        if isinstance(chunk_shape, (Shape, str)):
+            chunk_shape = Shape(chunk_shape).shape()
+        self.chunk_shape = chunk_shape
+        if compression is None:
+            compression = conf.FILE_FORMAT_CHUNKED_COMPRESSION
+        self._compress = _compressor(compression)[0]
+        self.compression = compression
+        if chunk_size is None:
+            chunk_size = self.DEFAULT_CHUNK_SIZE
+        self.chunk_size = Memory(chunk_size)
+
+    def get_dtype(self, cube):
+        if self.dtype is None:
+            return cube.dtype
+        else:
+            return np.dtype(self.dtype)
+
+    def get_chunk_shape(self, cube):
+        if self.chunk_shape is None:
+            return default_chunk_shape(cube.shape, self.get_dtype(cube).itemsize, self.chunk_size)
+        chunk_shape = tuple(self.chunk_shape)
+        if len(chunk_shape) != len(cube.shape) or min(chunk_shape + (1, )) < 1:
+            raise RubikError("invalid chunk shape {0} for shape {1}".format(Shape(chunk_shape), Shape(cube.shape)))
+        return chunk_shape
+
+    @classmethod
+    def is_slab(cls, shape, chunk_shape):
+        """ChunkedFileWriter.is_slab(shape, chunk_shape) -> True if all the chunks
+           are contiguous ranges of flat elements"""
+        for i, (dim, chunk_dim) in enumerate(zip(shape, chunk_shape)):
+            if chunk_dim != 1:
+                return tuple(chunk_shape[i + 1:]) == tuple(shape[i + 1:])
+        return True
+
+    def write(self, cube, file):
+        """self.write(cube, file)
+           writes 'cube' to the file object 'file'"""
+        if 'a' in getattr(file, 'mode', ''):
+            raise RubikError("cannot append to {0!r} files".format(conf.FILE_FORMAT_CHUNKED))
+        dtype = self.get_dtype(cube)
+        shape = tuple(cube.shape)
+        chunk_shape = self.get_chunk_shape(cube)
+        if isinstance(cube, LazyCube) and not self.is_slab(shape, chunk_shape):
+            cube = cube.evaluate()
+        grid_shape = _grid_shape(shape, chunk_shape)
+        header = json.dumps({
+            'version': CHUNKED_VERSION,
+            'shape': list(shape),
+            'dtype': dtype.str,
+            'chunk_shape': list(chunk_shape),
+            'compression': self.compression,
+        }, sort_keys=True).encode('utf-8')
+        start = file.tell()
+        file.write(CHUNKED_MAGIC)
+        file.write(struct.pack('<I', len(header)))
+        file.write(header)
+        offsets = np.zeros((_count(grid_shape) + 1, ), dtype='<u8')
+        table_position = file.tell()
+        file.write(offsets.tobytes())
+        offset = file.tell() - start
+        offsets[0] = offset
+        for index, coord in enumerate(np.ndindex(*grid_shape)):
+            box = tuple(slice(c * chunk_dim, min(dim, (c + 1) * chunk_dim))
+                        for c, chunk_dim, dim in zip(coord, chunk_shape, shape))
+            if isinstance(cube, LazyCube):
+                box_start = int(np.ravel_multi_index(tuple(s.start for s in box), shape)) if shape else 0
+                chunk = cube.read_block(box_start, box_start + _count(s.stop - s.start for s in box))
+            else:
+                chunk = cube[box]
+            data = self._compress(np.ascontiguousarray(chunk, dtype=dtype).tobytes())
+            file.write(data)
+            offset += len(data)
+            offsets[index + 1] = offset
+        end = file.tell()
+        file.seek(table_position)
+        file.write(offsets.tobytes())
+        file.seek(end)
@@ -21,12 +21,17 @@ __all__ = ['not_equals_cube', 'not_equals_num', 'not_equals',
            'equals_cube', 'equals_num', 'equals',
            'rel_diff_cube', 'threshold_cube',
            'abs_diff_cube', 'abs_threshold_cube',
-           'where_indices',
+           'diff_cubes',
+           'where_indices', 'where_indices_file',
            'zero_cube', 'nonzero_cube']
 
 import numpy as np
 
 from .dtypes import as_dtype
+from .lazy import evaluate
+from .out_of_core import BlockReader
+from .utilities import interpolate_filename
+from ..shape import Shape
 
 def not_equals_cube(cube_0, cube_1, tolerance=0.0):
     """not_equals_cube(cube_0, cube_1, tolerance=0.0) -> a cube with 1.0 where
@@ -80,23 +85,142 @@ def abs_threshold_cube(cube, threshold=0.0, value=0.0):
     """
     return np.where(np.abs(cube) > threshold, cube, value)
 
-def abs_diff_cube(cube_0, cube_1, in_threshold=None, out_threshold=None):
-    """abs_diff(cube_0, cube_1, in_threshold=None, out_threshold=None) ->
+DIFF_BUFFER_COUNT = 2 ** 16
+
+def _threshold_dtype(dtype, threshold):
+    # thresholding sets elements to 0.0, so integer cubes become float cubes
+    if threshold is None:
+        return np.dtype(dtype)
+    else:
+        return np.result_type(dtype, 0.0)
+
+def _diff_dtypes(cube_0, cube_1, in_threshold=None, out_threshold=None):
+    # (rel_diff dtype, abs_diff dtype, 'a - b' dtype); empty cubes with the
+    # same dimensionality are used, so that scalars do not upcast
+    def empty(cube):
+        return np.zeros((0, ) * min(cube.ndim, 1), dtype=_threshold_dtype(cube.dtype, in_threshold))
+    a = empty(cube_0)
+    b = empty(cube_1)
+    d = a - b
+    rel_dtype = _threshold_dtype((np.abs(d) / np.abs(a)).dtype, out_threshold)
+    abs_dtype = _threshold_dtype(np.abs(d).dtype, out_threshold)
+    return rel_dtype, abs_dtype, d.dtype
+
+class _BlockBuffers(object):
+    """_BlockBuffers(count)
+       pool of scratch blocks of 'count' elements, reused by all the blocks
+    """
+    def __init__(self, count):
+        self.count = count
+        self.buffers = {}
+
+    def get(self, name, dtype, size):
+        key = (name, np.dtype(dtype))
+        buf = self.buffers.get(key)
+        if buf is None:
+            buf = np.empty((self.count, ), dtype=key[1])
+            self.buffers[key] = buf
+        return buf[:size]
+
+def _abs_threshold_copy(block, threshold, out, buffers):
+    # same as abs_threshold_cube(block, threshold), stored in 'out'
+    np.copyto(out, block, casting='unsafe')
+    mask = buffers.get('mask', np.bool_, out.size)
+    # NaN elements are set to 0, as in abs_threshold_cube()
+    np.greater(np.absolute(out, out=buffers.get('abs', out.dtype, out.size)), threshold, out=mask)
+    np.copyto(out, 0, where=np.logical_not(mask, out=mask))
+    return out
+
+def diff_cubes(cube_0, cube_1, in_threshold=None, out_threshold=None, percentage=False,
+               rel_out=None, abs_out=None, rel_diff=True, abs_diff=True, buffer_count=None):
+    """diff_cubes(cube_0, cube_1, in_threshold=None, out_threshold=None, percentage=False,
+                  rel_out=None, abs_out=None, rel_diff=True, abs_diff=True, buffer_count=None) ->
+    (rel_diff cube, abs_diff cube)
+    computes rel_diff_cube() and abs_diff_cube() in a single pass, 'buffer_count'
+    elements at a time (by default DIFF_BUFFER_COUNT); no full size temporary is
+    created, and thresholds are applied in place.
+    The results are stored in 'rel_out' and 'abs_out', if passed; otherwise
+    they are allocated. If 'rel_diff' or 'abs_diff' is False, the related
+    output is not computed, and None is returned in its place.
+    'percentage' applies to the rel_diff only.
+    """
+    cube_0 = np.asarray(evaluate(cube_0))
+    cube_1 = np.asarray(evaluate(cube_1))
+    if buffer_count is None:
+        buffer_count = DIFF_BUFFER_COUNT
+    rel_dtype, abs_dtype, d_dtype = _diff_dtypes(cube_0, cube_1,
+                                                 in_threshold=in_threshold, out_threshold=out_threshold)
+    shape = np.broadcast(cube_0, cube_1).shape
+    if rel_diff and rel_out is None:
+        rel_out = np.empty(shape, dtype=rel_dtype)
+    if abs_diff and abs_out is None:
+        abs_out = np.empty(shape, dtype=abs_dtype)
+    operands = [cube_0, cube_1]
+    op_flags = [['readonly'], ['readonly']]
+    for out in rel_out, abs_out:
+        if out is not None:
+            operands.append(out)
+            op_flags.append(['writeonly', 'no_broadcast'])
+    a_dtype = _threshold_dtype(cube_0.dtype, in_threshold)
+    b_dtype = _threshold_dtype(cube_1.dtype, in_threshold)
+    buffers = _BlockBuffers(buffer_count)
+    iterator = np.nditer(operands,
+                         flags=['external_loop', 'buffered', 'zerosize_ok'],
+                         op_flags=op_flags,
+                         buffersize=buffer_count,
+                         order='K')
+    with iterator:
+        for blocks in iterator:
+            blocks = list(blocks)
+            a = blocks.pop(0)
+            b = blocks.pop(0)
+            size = a.size
+            if rel_out is not None:
+                r = blocks.pop(0)
+            else:
+                r = None
+            if abs_out is not None:
+                d = blocks.pop(0)
+            else:
+                d = buffers.get('abs_diff', abs_dtype, size)
+            if in_threshold is not None:
+                a = _abs_threshold_copy(a, in_threshold, buffers.get('a', a_dtype, size), buffers)
+                b = _abs_threshold_copy(b, in_threshold, buffers.get('b', b_dtype, size), buffers)
+            # | a - b |
+            if d.dtype == d_dtype:
+                s = d
+            else:
+                s = buffers.get('diff', d_dtype, size)
+            np.subtract(a, b, out=s, casting='unsafe')
+            np.absolute(s, out=d, casting='unsafe')
+            if r is not None:
+                # | a - b | / | a |
+                np.absolute(a, out=r, casting='unsafe')
+                np.divide(d, r, out=r, casting='unsafe')
+                np.nan_to_num(r, copy=False)
+                if out_threshold is not None:
+                    np.copyto(r, 0, where=np.less_equal(r, out_threshold, out=buffers.get('mask', np.bool_, size)))
+                if percentage:
+                    np.multiply(r, 100.0, out=r, casting='unsafe')
+            if abs_out is not None:
+                np.nan_to_num(d, copy=False)
+                if out_threshold is not None:
+                    np.copyto(d, 0, where=np.less_equal(d, out_threshold, out=buffers.get('mask', np.bool_, size)))
+    return rel_out, abs_out
+
+def abs_diff_cube(cube_0, cube_1, in_threshold=None, out_threshold=None, out=None):
+    """abs_diff(cube_0, cube_1, in_threshold=None, out_threshold=None, out=None) ->
     cube of absolute difference
     | a - b |
     'in_threshold': if passed, this absolute threshold is applied to 'a' and 'b';
     'out_threshold': if passed, this absolute threshold is applied to the output (the abs_diff)
+    'out': if passed, the result is stored in it
     """
-    if in_threshold is not None:
-        cube_0 = abs_threshold_cube(cube_0, threshold=in_threshold)
-        cube_1 = abs_threshold_cube(cube_1, threshold=in_threshold)
-    cube_out = np.nan_to_num(np.abs(cube_0 - cube_1))
-    if out_threshold is not None:
-        cube_out = abs_threshold_cube(cube_out, threshold=out_threshold)
-    return cube_out
-
-def rel_diff_cube(cube_0, cube_1, in_threshold=None, out_threshold=None, percentage=False):
-    """rel_diff(cube_0, cube_1, in_threshold=None, out_threshold=None, percentage=False) ->
+    return diff_cubes(cube_0, cube_1, in_threshold=in_threshold, out_threshold=out_threshold,
+                      abs_out=out, rel_diff=False)[1]
+
+def rel_diff_cube(cube_0, cube_1, in_threshold=None, out_threshold=None, percentage=False, out=None):
+    """rel_diff(cube_0, cube_1, in_threshold=None, out_threshold=None, percentage=False, out=None) ->
     cube of relative difference
     | a - b |
     _________
@@ -104,16 +228,10 @@ def rel_diff_cube(cube_0, cube_1, in_threshold=None, out_threshold=None, percent
     'in_threshold': if passed, this absolute threshold is applied to 'a' and 'b';
     'out_threshold': if passed, this absolute threshold is applied to the output (the rel_diff)
     'percentage': if True, the output is multiplied by 100.0
+    'out': if passed, the result is stored in it
     """
-    if in_threshold is not None:
-        cube_0 = abs_threshold_cube(cube_0, threshold=in_threshold)
-        cube_1 = abs_threshold_cube(cube_1, threshold=in_threshold)
-    cube_out = np.nan_to_num(np.abs(cube_0 - cube_1) / np.abs(cube_0))
-    if out_threshold is not None:
-        cube_out = abs_threshold_cube(cube_out, threshold=out_threshold)
-    if percentage:
-        cube_out *= 100.0
-    return cube_out
+    return diff_cubes(cube_0, cube_1, in_threshold=in_threshold, out_threshold=out_threshold,
+                      percentage=percentage, rel_out=out, abs_diff=False)[0]
 
 def zero_cube(cube, tolerance=0.0):
     """zero_cube(cube_in, tolerance=0.0) -> a cube with 0.0 where cube_in != 0.0 within
@@ -149,9 +267,51 @@ def where_indices(cube, condition=None):
      [ 2.  1.  0.]]
     >>> 
     """
+    cube = evaluate(cube)
     if condition is None:
         condition = cube
-    indices = np.where(condition)
-    result = np.array(indices + (np.fromiter((cube[index] for index in zip(*indices)), cube.dtype), ))
+    indices = np.nonzero(evaluate(condition))
+    return _where_records(indices, cube[indices])
+
+def _where_records(indices, values):
+    # one row per coordinate, plus the values row; the result is the transposed view
+    result = np.empty((len(indices) + 1, values.size), dtype=np.result_type(np.intp, values.dtype))
+    for row, index in zip(result, indices):
+        row[...] = index
+    result[-1] = values
     return result.T
+
+def where_indices_file(filename, shape, dtype=None, condition=None, file_format='raw',
+                       buffer_size=None, max_memory=None, read_ahead=None):
+    """where_indices_file(filename, shape, dtype=None, condition=None, file_format='raw',
+                          buffer_size=None, max_memory=None, read_ahead=None) -> iterates over arrays
+    Same as where_indices() on the content of 'filename', which is a cube with
+    'shape', but the file is read block by block (see BlockReader); for each
+    block with some matching elements, an array with the same layout as
+    the where_indices() result is yielded. Coordinates refer to the whole cube.
+    'condition' is a function returning a boolean mask for a 1D block
+    (for instance, 'lambda block: np.abs(block) > 1e-5'); if it is None,
+    the nonzero elements are matched.
+    """
+    shape = Shape(shape)
+    filename = interpolate_filename(filename, shape=shape, file_format=file_format, dtype=dtype)
+    block_reader = BlockReader(
+        count=shape,
+        dtype=dtype,
+        buffer_size=buffer_size,
+        max_memory=max_memory,
+        read_ahead=read_ahead,
+        file_format=file_format)
+    offset = 0
+    for blocks in block_reader.read([filename]):
+        block = blocks[0]
+        if condition is None:
+            mask = block
+        else:
+            mask = condition(block)
+        flat_indices = np.flatnonzero(mask)
+        if flat_indices.size:
+            indices = np.unravel_index(flat_indices + offset, shape.shape())
+            yield _where_records(indices, block[flat_indices])
+        offset += block.size
     
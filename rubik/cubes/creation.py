@@ -19,15 +19,21 @@ __author__ = "Simone Campagna"
 
 __all__ = [
            'linear_cube',
+           'linear_block',
            'random_cube',
+           'RandomFiller',
            'const_cube',
            'const_blocks_cube',
+           'const_blocks_block',
           ]
 
+from multiprocessing.pool import ThreadPool
+
 import numpy as np
 
-from .internals import output_mode_callback
+from .internals import output_mode_callback, get_default_workers, get_random_seed_sequence
 from .dtypes import as_dtype, get_dtype
+from .memory_governor import get_memory_governor
 from .utilities import interpolate_filename
 
 from ..py23 import irange, BASE_STRING
@@ -35,6 +41,41 @@ from ..errors import RubikError
 from ..shape import Shape
 from ..asfile import asfile
 
+LINEAR_CHUNK_COUNT = 2 ** 16
+
+def _check_memory(count, dtype, what):
+    get_memory_governor().check(count * np.dtype(dtype).itemsize, what=what)
+
+def linear_block(first, count, start=0.0, increment=1.0, dtype=None, out=None):
+    """linear_block(first, count, start=0.0, increment=1.0, dtype=None, out=None) -> 1D cube
+       returns the elements [first, first + count) of the linear sequence
+       'start + i * increment'; each element is computed from its index 'i',
+       so blocks of a huge sequence can be computed independently.
+       Integer sequences are computed exactly in integer arithmetic; other
+       sequences are computed in (at least) float64 precision, and then
+       converted to 'dtype', 'LINEAR_CHUNK_COUNT' elements at a time.
+       The result is stored in 'out', if passed.
+    """
+    dtype = np.dtype(get_dtype(dtype))
+    if out is None:
+        out = np.empty((count, ), dtype=dtype)
+    for chunk_start in irange(0, count, LINEAR_CHUNK_COUNT):
+        chunk_stop = min(count, chunk_start + LINEAR_CHUNK_COUNT)
+        _linear_values(np.arange(first + chunk_start, first + chunk_stop, dtype=np.int64),
+                       start, increment, out=out[chunk_start:chunk_stop])
+    return out
+
+def _linear_values(indices, start, increment, out):
+    # stores 'start + indices * increment' in 'out'
+    if issubclass(out.dtype.type, np.integer) and float(start).is_integer() and float(increment).is_integer():
+        values = indices.astype(np.int64, copy=False)
+        start, increment = int(start), int(increment)
+    else:
+        values = indices.astype(np.result_type(np.float64, out.dtype))
+    values *= increment
+    values += start
+    np.copyto(out, values, casting='unsafe')
+
 def linear_cube(shape, start=0.0, increment=1.0, dtype=None):
     """linear_cube(shape, start=0.0, increment=1.0, dtype=None) -> create a cube
        with the given shape, with elements in linear sequence, starting from
@@ -45,21 +86,109 @@ def linear_cube(shape, start=0.0, increment=1.0, dtype=None):
     shape = Shape(shape)
     count = shape.count()
     dtype = get_dtype(dtype)
-    return np.array(np.linspace(start, start + increment * (count - 1), count), dtype=dtype).reshape(shape.shape())
+    _check_memory(count, dtype, "linear_cube")
+    cube = linear_block(0, count, start=start, increment=increment, dtype=dtype).reshape(shape.shape())
+    return get_memory_governor().track(cube)
+
+class RandomFiller(object):
+    """RandomFiller(min=0.0, max=1.0, seed_sequence=None, threads=None, chunk_count=None)
+       Fills flat cubes with random elements between 'min' and 'max'.
+       The elements are generated in chunks of 'chunk_count' elements
+       (default: RandomFiller.CHUNK_COUNT); chunk #i is drawn from its own
+       numpy.random.Generator, seeded with the i-th child of 'seed_sequence'
+       (default: get_random_seed_sequence()). So, chunks are filled by
+       'threads' threads (default: get_default_workers()), and the result
+       depends neither on the number of threads nor on how the cube is split.
+       float32 and float64 elements are generated directly; other dtypes are
+       converted from float64.
+    """
+    CHUNK_COUNT = 2 ** 18
+    def __init__(self, min=0.0, max=1.0, seed_sequence=None, threads=None, chunk_count=None):
+        self.min = min
+        self.max = max
+        if seed_sequence is None:
+            seed_sequence = get_random_seed_sequence()
+        self.seed_sequence = seed_sequence
+        if threads is None:
+            threads = get_default_workers()
+        self.threads = threads
+        if chunk_count is None:
+            chunk_count = self.CHUNK_COUNT
+        self.chunk_count = chunk_count
+
+    def generator(self, chunk_index):
+        """self.generator(chunk_index) -> numpy.random.Generator for chunk 'chunk_index'"""
+        # same as the 'chunk_index'-th SeedSequence.spawn() child
+        seed_sequence = np.random.SeedSequence(
+            entropy=self.seed_sequence.entropy,
+            spawn_key=tuple(self.seed_sequence.spawn_key) + (chunk_index, ),
+            pool_size=self.seed_sequence.pool_size)
+        return np.random.Generator(np.random.PCG64(seed_sequence))
 
-def random_cube(shape, min=0.0, max=1.0, dtype=None):
-    """random_cube(shape, min=0.0, max=1.0, dtype=None) -> create a cube with
+    def fill_chunk(self, chunk_index, out, offset=0):
+        """self.fill_chunk(chunk_index, out, offset=0)
+           fills 'out' with the elements [offset, offset + out.size) of chunk 'chunk_index'"""
+        generator = self.generator(chunk_index)
+        if out.dtype == np.float32:
+            dtype = np.float32
+        else:
+            dtype = np.float64
+        if offset:
+            # skips the first 'offset' elements without generating them: a
+            # float64 uses a 64 bit draw, a float32 half of it
+            if dtype == np.float32:
+                generator.bit_generator.advance(offset // 2)
+                if offset % 2:
+                    generator.random(1, dtype=dtype)
+            else:
+                generator.bit_generator.advance(offset)
+        if out.dtype == dtype and out.flags.c_contiguous:
+            values = generator.random(out.size, dtype=dtype, out=out)
+        else:
+            values = generator.random(out.size, dtype=dtype)
+        if self.min != 0.0 or self.max != 1.0:
+            values *= (self.max - self.min)
+            values += self.min
+        if values is not out:
+            np.copyto(out, values, casting='unsafe')
+
+    def fill(self, out, start=0):
+        """self.fill(out, start=0)
+           fills the 1D cube 'out' with the elements [start, start + out.size)"""
+        stop = start + out.size
+        tasks = []
+        for chunk_index in irange(start // self.chunk_count, (stop + self.chunk_count - 1) // self.chunk_count):
+            chunk_start = max(start, chunk_index * self.chunk_count)
+            chunk_stop = min(stop, (chunk_index + 1) * self.chunk_count)
+            tasks.append((chunk_index, out[chunk_start - start:chunk_stop - start], chunk_start - chunk_index * self.chunk_count))
+        threads = min(self.threads, len(tasks))
+        if threads > 1:
+            pool = ThreadPool(threads)
+            try:
+                pool.map(lambda task: self.fill_chunk(*task), tasks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for task in tasks:
+                self.fill_chunk(*task)
+        return out
+
+def random_cube(shape, min=0.0, max=1.0, dtype=None, threads=None):
+    """random_cube(shape, min=0.0, max=1.0, dtype=None, threads=None) -> create a cube with
        random elements between 'min' and 'max'.
        The 'shape' can be a tuple (for instance, '(8, 10)') or a string
        (for instance, "8x10")
+       The cube is filled by 'threads' threads (see RandomFiller); the result
+       does not depend on the number of threads.
     """
     shape = Shape(shape)
     count = shape.count()
     dtype = get_dtype(dtype)
-    cube = np.random.rand(count).reshape(shape.shape())
-    if min != 0.0 or max != 1.0:
-        cube = min + cube * (max - min)
-    return as_dtype(cube, dtype)
+    _check_memory(count, dtype, "random_cube")
+    cube = np.empty((count, ), dtype=dtype)
+    RandomFiller(min=min, max=max, threads=threads).fill(cube)
+    return get_memory_governor().track(cube.reshape(shape.shape()))
 
 def const_cube(shape, value=0.0, dtype=None):
     """const_cube(shape, value=0.0, dtype=None) -> create a cube with all
@@ -70,6 +199,7 @@ def const_cube(shape, value=0.0, dtype=None):
     shape = Shape(shape)
     count = shape.count()
     dtype = get_dtype(dtype)
+    _check_memory(count, dtype, "const_cube")
     if value == 0.0:
         cube = np.zeros(count, dtype=dtype)
     elif value == 1.0:
@@ -78,7 +208,18 @@ def const_cube(shape, value=0.0, dtype=None):
         cube = np.empty(count, dtype=dtype)
         cube.fill(value)
     cube = cube.reshape(shape.shape())
-    return as_dtype(cube, dtype)
+    return get_memory_governor().track(as_dtype(cube, dtype))
+
+def _get_const_dims(shape, const_dims):
+    rank = shape.rank()
+    cdims = []
+    for cdim in const_dims:
+        while cdim < 0:
+            cdim += len(shape)
+        cdims.append(cdim)
+        if cdim >= rank:
+            raise RubikError("invalid dimension index {0}: max is {1} since shape is {2}".format(cdim, rank - 1, shape))
+    return cdims
 
 def const_blocks_cube(shape, start=0.0, increment=1.0, const_dims=(-2, -1), dtype=None):
     """const_blocks_cube(shape, start=0.0, increment=1.0, const_dims=None) ->
@@ -91,46 +232,52 @@ def const_blocks_cube(shape, start=0.0, increment=1.0, const_dims=(-2, -1), dtyp
        (0, 2), and so on.
     """
     shape = Shape(shape)
-    count = shape.count()
     dtype = get_dtype(dtype)
     rank = shape.rank()
     if rank <= 0:
         return np.array([], dtype=dtype)
-    cdims = []
-    for cdim in const_dims:
-        while cdim < 0:
-            cdim += len(shape)
-        cdims.append(cdim)
-        if cdim >= rank:
-            raise RubikError("invalid dimension index {0}: max is {1} since shape is {2}".format(cdim, rank - 1, shape))
-    const_dims = cdims
-
-    if not const_dims:
-        return linear_cube(shape, start=start, increment=increment, dtype=dtype)
+    const_dims = _get_const_dims(shape, const_dims)
+    # the value of an element only depends on its indices along the
+    # non-const dimensions, so the values are computed on the cube with
+    # the const dimensions collapsed, and then broadcast
+    dims = shape.shape()
+    values_dims = tuple(1 if d_index in const_dims else dim for d_index, dim in enumerate(dims))
+    values_count = 1
+    for dim in values_dims:
+        values_count *= dim
+    _check_memory(shape.count(), dtype, "const_blocks_cube")
+    values = linear_block(0, values_count, start=start, increment=increment, dtype=dtype)
+    cube = np.empty(dims, dtype=dtype)
+    cube[...] = values.reshape(values_dims)
+    return get_memory_governor().track(cube)
 
-    def _make_cube(d_index, c_shape, c_start, c_increment, c_const_dims, dtype):
-        if c_shape.rank() == 1:
-            if d_index in c_const_dims:
-                cube = const_cube(c_shape.shape(), value=c_start, dtype=dtype)
-                next_start = c_start + increment
-            else:
-                cube = linear_cube(c_shape.shape(), start=c_start, increment=c_increment, dtype=dtype)
-                next_start = c_start + increment * cube.size
-            return next_start, cube
-        else:
-            l = []
-            d_num, s_shape = c_shape.split_first()
-            r_start = c_start
-            n_start = c_start
-            for i in irange(d_num):
-                x_start, cube = _make_cube(d_index + 1, s_shape, r_start, increment, c_const_dims, dtype=dtype)
-                if d_index not in c_const_dims:
-                    r_start = x_start
-                n_start = x_start
-                l.append(cube)
-            return n_start, np.array(l, dtype=dtype)
-          
-    next_start, cube = _make_cube(0, shape, start, increment, const_dims, dtype=dtype)
-    return cube
+def const_blocks_block(first, count, shape, start=0.0, increment=1.0, const_dims=(-2, -1), dtype=None, out=None):
+    """const_blocks_block(first, count, shape, start=0.0, increment=1.0, const_dims=(-2, -1), dtype=None, out=None) -> 1D cube
+       returns the flat elements [first, first + count) of
+       const_blocks_cube(shape, start, increment, const_dims, dtype); the result
+       is stored in 'out', if passed.
+    """
+    shape = Shape(shape)
+    dtype = np.dtype(get_dtype(dtype))
+    if out is None:
+        out = np.empty((count, ), dtype=dtype)
+    const_dims = _get_const_dims(shape, const_dims)
+    dims = shape.shape()
+    # (flat stride, stride in the collapsed cube) of the non-const dimensions
+    strides = []
+    stride, values_stride = 1, 1
+    for d_index in reversed(range(len(dims))):
+        if d_index not in const_dims:
+            strides.append((d_index, stride, values_stride))
+            values_stride *= dims[d_index]
+        stride *= dims[d_index]
+    for chunk_start in irange(0, count, LINEAR_CHUNK_COUNT):
+        chunk_stop = min(count, chunk_start + LINEAR_CHUNK_COUNT)
+        flat_indices = np.arange(first + chunk_start, first + chunk_stop, dtype=np.int64)
+        indices = np.zeros_like(flat_indices)
+        for d_index, stride, values_stride in strides:
+            indices += (flat_indices // stride) % dims[d_index] * values_stride
+        _linear_values(indices, start, increment, out=out[chunk_start:chunk_stop])
+    return out
 
 
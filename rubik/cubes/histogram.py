@@ -20,12 +20,26 @@ __author__ = "Simone Campagna"
 __all__ = [
            'histogram',
            'print_histogram',
+           'histogram_file',
+           'print_histogram_file',
           ]
 
 import sys
 
 import numpy as np
 
+from .internals import output_mode_callback, get_default_workers
+from .input_output import read_cube
+from .out_of_core import BlockReader, map_ranges, worker_max_memory
+from .dtypes import get_dtype
+from .stats import StatsInfo, stats_file
+from .lazy import LazyCube
+from .memory_governor import is_memory_mapped
+from .utilities import interpolate_filename
+
+from ..errors import RubikError
+from ..shape import Shape
+
 def histogram(cube, bins=10, hlength=80, hrange=None, decimals=None, fmt=None, mode=None):
     """histogram(cube, bins=10, hlength=80, hrange=None, decimals=None, fmt=None, mode=None) -> text lines
        Returns an ASCII representation of the histogram of cube
@@ -36,14 +50,36 @@ def histogram(cube, bins=10, hlength=80, hrange=None, decimals=None, fmt=None, m
        * fmt: line format
        * mode: 'number' or 'percentage', used if 'fmt' is None
     """
-    if not isinstance(cube, np.ndarray):
-        raise RubikError("cannot make an histogram from result of type {0}: it is not a numpy.ndarray".format(type(cube).__name__))
-
     if bins is None:
         bins = 10
+    if isinstance(cube, LazyCube):
+        if hrange is None:
+            hrange = _stats_info_range(StatsInfo.stats_info(cube), cube)
+        histogram, bins = accumulate_histogram(cube.iter_blocks(), cube.dtype, bins=bins, hrange=hrange)
+    elif is_memory_mapped(cube) and cube.size > 0:
+        # chunk by chunk, so that the reads of the map are reported
+        if hrange is None:
+            hrange = _stats_info_range(StatsInfo.stats_info(cube), cube)
+        chunk_count = max(1, StatsInfo.CHUNK_SIZE // cube.dtype.itemsize)
+        histogram, bins = accumulate_histogram(StatsInfo.iter_flat_chunks(cube, chunk_count), cube.dtype, bins=bins, hrange=hrange)
+    elif isinstance(cube, np.ndarray):
+        histogram, bins = np.histogram(cube, bins=bins, range=hrange)
+    else:
+        raise RubikError("cannot make an histogram from result of type {0}: it is not a numpy.ndarray".format(type(cube).__name__))
+    return render_histogram(histogram, bins, hlength=hlength, decimals=decimals, fmt=fmt, mode=mode)
+
+def render_histogram(histogram, bins, hlength=80, decimals=None, fmt=None, mode=None):
+    """render_histogram(histogram, bins, hlength=80, decimals=None, fmt=None, mode=None) -> text lines
+       Returns an ASCII representation of the 'histogram' counts with 'bins'
+       edges, as returned by numpy.histogram
+       * hlength: horizontal length of each histogram line
+       * decimals: number of decimals
+       * fmt: line format
+       * mode: 'number' or 'percentage', used if 'fmt' is None
+    """
     if fmt is None:
         if mode is None:
-            mode is 'number'
+            mode = 'number'
         fmt_base = "{b}{s_start:{l_start}s}, {s_end:{l_end}s}{k}|{h}|"
         if mode == 'number':
             fmt = fmt_base + "{s_num:>{l_num}s}"
@@ -55,7 +91,6 @@ def histogram(cube, bins=10, hlength=80, hrange=None, decimals=None, fmt=None, m
         fmt_base = "{b}{s_start:{l_start}s}, {s_end:{l_end}s}{k}|{h}|"
         fmt_percentage = fmt_base + "{s_percentage:>{l_percentage}s}"
 
-    histogram, bins = np.histogram(cube, bins=bins, range=hrange)
     start = bins[0]
     d_min = None
     for end in bins[1:]:
@@ -85,7 +120,10 @@ def histogram(cube, bins=10, hlength=80, hrange=None, decimals=None, fmt=None, m
     num_tot = histogram.sum()
     for num, end in zip(histogram, bins[1:]):
         s_num = str(num)
-        fraction = float(num) / num_tot
+        if num_tot:
+            fraction = float(num) / num_tot
+        else:
+            fraction = 0.0
         s_percentage = "{:.2%}".format(fraction)
         s_start = fmt_float.format(start)
         s_end = fmt_float.format(end)
@@ -123,7 +161,10 @@ def histogram(cube, bins=10, hlength=80, hrange=None, decimals=None, fmt=None, m
             k = ']'
         else:
             k = ')'
-        l_l = int(0.5 + (h_max * num) / float(num_max))
+        if num_max:
+            l_l = int(0.5 + (h_max * num) / float(num_max))
+        else:
+            l_l = 0
         l_r = h_max - l_l
         h = '*' * l_l + ' ' * l_r
         output_lines.append(fmt.format(
@@ -162,3 +203,123 @@ def print_histogram(cube, bins=10, hlength=80, hrange=None, decimals=None, fmt=N
            fmt=fmt,
            mode=mode):
        print_function(line)
+
+def histogram_file(filename, shape, dtype=None, file_format='raw',
+                   bins=10, hlength=80, hrange=None, decimals=None, fmt=None, mode=None,
+                   out_of_core=True, buffer_size=None, max_memory=None,
+                   read_ahead=None, workers=None, stats_info=None):
+    """histogram_file(filename, shape, dtype=None, file_format='raw',
+                      bins=10, hlength=80, hrange=None, decimals=None, fmt=None, mode=None,
+                      out_of_core=True, buffer_size=None, max_memory=None,
+                      read_ahead=None, workers=None, stats_info=None) -> text lines
+    Returns an ASCII representation of the histogram of the content of 'filename',
+    which is a cube with 'shape'.
+    If 'out_of_core' (out-of-core) is True, the bin counts are accumulated
+    block by block, processing 'buffer_size' elements at a time. If 'hrange' is
+    not given, it is set to the min/max of 'stats_info' (a StatsInfo object
+    about the file); if 'stats_info' is not given, it is computed by a first
+    out-of-core pass on the file.
+    'read_ahead' and 'workers' have the same meaning as for stats_file().
+    """
+    shape = Shape(shape)
+    filename = interpolate_filename(filename, shape=shape, file_format=file_format, dtype=dtype)
+    if bins is None:
+        bins = 10
+    if out_of_core and file_format in ('raw', 'chunked'):
+        histogram, bins = histogram_out_of_core(filename, shape=shape, dtype=dtype, file_format=file_format,
+                                                bins=bins, hrange=hrange,
+                                                buffer_size=buffer_size, max_memory=max_memory,
+                                                read_ahead=read_ahead, workers=workers,
+                                                stats_info=stats_info)
+    else:
+        cube = read_cube(file=filename, shape=shape, dtype=dtype, file_format=file_format)
+        histogram, bins = np.histogram(cube, bins=bins, range=hrange)
+    return render_histogram(histogram, bins, hlength=hlength, decimals=decimals, fmt=fmt, mode=mode)
+
+def print_histogram_file(filename, shape, dtype=None, file_format='raw',
+                         bins=10, hlength=80, hrange=None, decimals=None, fmt=None, mode=None,
+                         out_of_core=True, buffer_size=None, max_memory=None,
+                         read_ahead=None, workers=None, stats_info=None, print_function=None):
+    """print_histogram_file(filename, shape, dtype=None, file_format='raw',
+                            bins=10, hlength=80, hrange=None, decimals=None, fmt=None, mode=None,
+                            out_of_core=True, buffer_size=None, max_memory=None,
+                            read_ahead=None, workers=None, stats_info=None, print_function=None)
+    Prints an ASCII representation of the histogram of the content of 'filename',
+    which is a cube with 'shape'; see histogram_file().
+    """
+    output_mode_callback()
+    if print_function is None:
+        print_function = lambda x: sys.stdout.write(x + '\n')
+    for line in histogram_file(
+           filename=filename,
+           shape=shape,
+           dtype=dtype,
+           file_format=file_format,
+           bins=bins,
+           hlength=hlength,
+           hrange=hrange,
+           decimals=decimals,
+           fmt=fmt,
+           mode=mode,
+           out_of_core=out_of_core,
+           buffer_size=buffer_size,
+           max_memory=max_memory,
+           read_ahead=read_ahead,
+           workers=workers,
+           stats_info=stats_info):
+       print_function(line)
+
+def accumulate_histogram(blocks, dtype, bins=10, hrange=None):
+    """accumulate_histogram(blocks, dtype, bins=10, hrange=None) -> (histogram, bins)
+       Returns the same result as numpy.histogram on the concatenation of
+       'blocks'; 'hrange' must be given.
+    """
+    histogram, bins = np.histogram(np.empty((0, ), dtype=dtype), bins=bins, range=hrange)
+    for block in blocks:
+        histogram += np.histogram(block, bins=bins, range=hrange)[0]
+    return histogram, bins
+
+def _stats_info_range(stats_info, source):
+    hrange = (stats_info.cube_min, stats_info.cube_max)
+    if hrange[0] is None or not np.all(np.isfinite(hrange)):
+        raise RubikError("cannot make an histogram of {0}: range {1} is not finite".format(source, hrange))
+    return hrange
+
+def _histogram_range(args):
+    filename, shape, dtype, file_format, buffer_size, max_memory, read_ahead, bins, hrange, start, stop = args
+    block_reader = BlockReader(
+        count=shape,
+        dtype=dtype,
+        buffer_size=buffer_size,
+        max_memory=max_memory,
+        read_ahead=read_ahead,
+        file_format=file_format)
+    blocks = (cubes[0] for cubes in block_reader.read([filename], start=start, stop=stop))
+    return accumulate_histogram(blocks, get_dtype(dtype), bins=bins, hrange=hrange)
+
+def histogram_out_of_core(filename, shape, dtype=None, file_format='raw', bins=10, hrange=None,
+                          buffer_size=None, max_memory=None, read_ahead=None, workers=None,
+                          stats_info=None):
+    """histogram_out_of_core(filename, shape, dtype=None, file_format='raw', bins=10, hrange=None,
+                             buffer_size=None, max_memory=None, read_ahead=None, workers=None,
+                             stats_info=None) -> (histogram, bins)
+    Returns the same result as numpy.histogram on the content of the 'raw' or
+    'chunked' file 'filename', reading it block by block.
+    """
+    if hrange is None:
+        if stats_info is None:
+            stats_info = stats_file(filename, shape=shape, dtype=dtype, file_format=file_format,
+                                    out_of_core=True, buffer_size=buffer_size, max_memory=max_memory,
+                                    progress_frequency=-1.0, read_ahead=read_ahead, workers=workers)
+        hrange = _stats_info_range(stats_info, "file {0}".format(filename))
+    if workers is None:
+        workers = get_default_workers()
+    args = (filename, shape, dtype, file_format, buffer_size, worker_max_memory(max_memory, workers), read_ahead, bins, hrange)
+    if workers > 1:
+        # an empty shape has no ranges
+        histogram, bins = accumulate_histogram((), dtype, bins=bins, hrange=hrange)
+        for partial_histogram, partial_bins in map_ranges(_histogram_range, shape.count(), workers, args):
+            histogram += partial_histogram
+        return histogram, bins
+    else:
+        return _histogram_range(args + (0, shape.count()))
@@ -17,16 +17,36 @@
 
 __author__ = "Simone Campagna"
 
-__all__ = ['read_cube', 'read_cube_raw', 'read_cube_text', 'read_cube_csv',
-           'write_cube', 'write_cube_raw', 'write_cube_text', 'write_cube_csv',
+__all__ = ['read_cube', 'read_cube_raw', 'read_cube_text', 'read_cube_csv', 'read_cube_chunked',
+           'read_cube_regions', 'read_cube_raw_regions',
+           'write_cube', 'write_cube_raw', 'write_cube_text', 'write_cube_csv', 'write_cube_chunked',
+           'ChunkWriter', 'ChunkRawWriter', 'ChunkCsvWriter', 'ChunkTextWriter',
+           'format_csv_values', 'format_text_rows',
+           'SplitRawWriter', 'write_cube_split_raw',
+           'copy_file_data', 'join_files',
           ]
 
+import collections
+import errno
+import io
+import itertools
+import os
+import re
+from multiprocessing.pool import ThreadPool
+
 import numpy as np
 
-from .internals import output_mode_callback
+from .internals import output_mode_callback, get_default_workers, timed_read, iter_timed_reads
+from .memory_governor import is_memory_mapped
 from .dtypes import get_dtype
 from .utilities import interpolate_filename
-from .creation import linear_cube, random_cube, const_cube
+from .creation import linear_block, const_cube, const_blocks_block, RandomFiller
+from .lazy import LazyCube
+from .chunked import ChunkedFile, ChunkedFileWriter
+from .text_reader import TextReader
+from .read_plan import ReadPlan, RegionsReadPlan
+from .read_planner import ReadPlanner
+from .out_of_core import imap_ahead
 
 from .. import conf
 from ..py23 import irange, BASE_STRING
@@ -37,6 +57,12 @@ from ..extractor import Extractor
 from ..asfile import asfile
 
 class ExtractReader(object):
+    """ExtractReader(dtype, shape, extractor, threshold_size)
+       reads the subcube extracted by 'extractor'; the read strategy is
+       chosen by a ReadPlanner.
+    """
+    FILE_FORMAT = None
+    MMAP = False
     def __init__(self, dtype, shape, extractor, threshold_size):
         dtype = get_dtype(dtype)
         self.dtype = dtype
@@ -49,14 +75,27 @@ class ExtractReader(object):
                 extractor = Extractor(extractor)
         self.extractor = extractor
         self.threshold_size = Memory(threshold_size)
-        self.threshold_size_bytes = threshold_size.get_bytes()
-        self.threshold_size_count = min(1, self.threshold_size_bytes // dtype().itemsize)
+        self.threshold_size_bytes = self.threshold_size.get_bytes()
+        self.threshold_size_count = max(1, self.threshold_size_bytes // dtype().itemsize)
+        self.read_planner = None
+
+    def get_read_planner(self):
+        """self.get_read_planner() -> ReadPlanner"""
+        return ReadPlanner(self.FILE_FORMAT, self.shape, self.dtype, self.extractor,
+                           threshold_size=self.threshold_size, mmap=self.MMAP)
 
     def read(self, input_file):
         if self.extractor is None or self.threshold_size_bytes  <= 0:
             return self.read_data(input_file, self.shape, self.extractor)
         else:
+            self.read_planner = self.get_read_planner()
+            return self.read_strategy(input_file, self.read_planner.strategy())
+
+    def read_strategy(self, input_file, strategy):
+        if strategy == ReadPlanner.STRATEGY_SEEK:
             return self.impl_read(input_file, self.shape, self.extractor)
+        else:
+            return self.read_data(input_file, self.shape, self.extractor)
 
     def impl_read(self, input_file, shape, extractor):
         assert isinstance(shape, Shape)
@@ -113,67 +152,213 @@ class ExtractRawCsvReader(ExtractReader):
         return cube
 
 class ExtractRawReader(ExtractRawCsvReader):
+    """ExtractRawReader(...)
+       reads raw cubes; with the 'coalesced' strategy, the extracted subcube
+       is read through a ReadPlan, which coalesces nearby runs of elements
+       and reads them directly into the preallocated subcube.
+    """
+    FILE_FORMAT = conf.FILE_FORMAT_RAW
     def __init__(self, dtype, shape, extractor, threshold_size):
         ExtractRawCsvReader.__init__(self, dtype, shape, extractor=extractor, threshold_size=threshold_size, sep='')
     
+    def read_data(self, input_file, shape, extractor=None):
+        with timed_read(shape.count() * self.dtype_bytes):
+            return ExtractRawCsvReader.read_data(self, input_file, shape, extractor)
+
+    def read_strategy(self, input_file, strategy):
+        if strategy == ReadPlanner.STRATEGY_COALESCED:
+            if hasattr(input_file, 'readinto'):
+                if self.read_planner is None:
+                    read_plan = ReadPlan(self.shape, self.dtype, self.extractor)
+                else:
+                    # the plan used to estimate the cost
+                    read_plan = self.read_planner.get_read_plan()
+                return read_plan.read(input_file)
+            else:
+                strategy = ReadPlanner.STRATEGY_SEEK
+        return ExtractRawCsvReader.read_strategy(self, input_file, strategy)
+
     def skip_data(self, input_file, num_indices, shape):
         if num_indices > 0:
             skip_bytes = num_indices * shape.count() * self.dtype_bytes
             #print "skipping {0} indices, {1} elements, {2} bytes".format(num_indices, num_indices * shape.count(), skip_bytes)
             input_file.seek(skip_bytes, 1)
 
-class ExtractCsvReader(ExtractRawCsvReader):
-    def __init__(self, dtype, shape, extractor, threshold_size, sep=conf.FILE_FORMAT_CSV_SEPARATOR):
-        ExtractRawCsvReader.__init__(self, dtype, shape, extractor=extractor, threshold_size=threshold_size, sep=sep)
-    
-class ExtractTextReader(ExtractReader):
-    def __init__(self, dtype, shape, extractor, threshold_size, delimiter=conf.FILE_FORMAT_TEXT_DELIMITER):
+class ExtractRawMmapReader(ExtractRawReader):
+    """ExtractRawMmapReader(...)
+       reads raw cubes through numpy.memmap; the extractor is applied to the
+       mapped cube, so the result is a view and no data is read until it is
+       accessed. The map is copy-on-write: changes to the cube are never
+       written back to the file.
+    """
+    MMAP = True
+    def read(self, input_file):
+        if self.shape.count() == 0 or not hasattr(input_file, 'fileno'):
+            return ExtractRawReader.read(self, input_file)
+        offset = input_file.tell()
+        cube = np.memmap(input_file, dtype=self.dtype, mode='c', offset=offset, shape=self.shape.shape())
+        input_file.seek(offset + cube.nbytes)
+        if self.extractor is not None:
+            cube = cube[self.extractor.index_pickers()]
+        return cube
+
+class ExtractParsedTextReader(ExtractReader):
+    """ExtractParsedTextReader(...)
+       reads text cubes through a TextReader: values are parsed chunk by
+       chunk (concurrently, by 'workers' processes) and stored into the
+       preallocated cube.
+    """
+    def __init__(self, dtype, shape, extractor, threshold_size, delimiter, comments=None, workers=None, chunk_size=None):
         ExtractReader.__init__(self, dtype, shape, extractor=extractor, threshold_size=threshold_size)
         self.delimiter = delimiter
+        self.comments = comments
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.text_reader = None
 
     def read(self, input_file):
-        # reading a subcube is not allowed
-        return self.read_data(input_file, self.shape, self.extractor)
+        with TextReader(input_file, dtype=self.dtype, delimiter=self.delimiter, comments=self.comments,
+                        chunk_size=self.chunk_size, workers=self.workers) as text_reader:
+            self.text_reader = text_reader
+            try:
+                return self.read_text(input_file)
+            finally:
+                self.text_reader = None
+
+    def read_text(self, input_file):
+        return ExtractReader.read(self, input_file)
 
     def read_data(self, input_file, shape, extractor=None):
-        cube = np.loadtxt(input_file, dtype=self.dtype, delimiter=self.delimiter).reshape(shape.shape())
+        cube = self.text_reader.read(shape.count()).reshape(shape.shape())
         if extractor is not None:
             cube = cube[extractor.index_pickers()]
         return cube
 
-def read_cube(file_format, file, shape, dtype=None, extractor=None, threshold_size=conf.DEFAULT_READ_THRESHOLD_SIZE, **n_args):
+    def skip_data(self, input_file, num_indices, shape):
+        if num_indices > 0:
+            self.text_reader.skip(num_indices * shape.count())
+
+class ExtractCsvReader(ExtractParsedTextReader):
+    FILE_FORMAT = conf.FILE_FORMAT_CSV
+    def __init__(self, dtype, shape, extractor, threshold_size, sep=conf.FILE_FORMAT_CSV_SEPARATOR, workers=None, chunk_size=None):
+        ExtractParsedTextReader.__init__(self, dtype, shape, extractor=extractor, threshold_size=threshold_size,
+                                         delimiter=sep, workers=workers, chunk_size=chunk_size)
+    
+class ExtractTextReader(ExtractParsedTextReader):
+    FILE_FORMAT = conf.FILE_FORMAT_TEXT
+    def __init__(self, dtype, shape, extractor, threshold_size, delimiter=conf.FILE_FORMAT_TEXT_DELIMITER, workers=None, chunk_size=None):
+        ExtractParsedTextReader.__init__(self, dtype, shape, extractor=extractor, threshold_size=threshold_size,
+                                         delimiter=delimiter, comments='#', workers=workers, chunk_size=chunk_size)
+
+    def read_text(self, input_file):
+        # reading a subcube is not allowed
+        return self.read_data(input_file, self.shape, self.extractor)
+
+class ExtractChunkedReader(ExtractReader):
+    """ExtractChunkedReader(...)
+       reads 'chunked' cubes; only the chunks touched by the extractor are
+       read and decompressed.
+    """
+    FILE_FORMAT = conf.FILE_FORMAT_CHUNKED
+    def read(self, input_file):
+        chunked_file = ChunkedFile(input_file)
+        chunked_file.check_shape(self.shape)
+        if self.extractor is None:
+            index_pickers = ()
+        else:
+            index_pickers = self.extractor.index_pickers()
+        cube = chunked_file.read_box(index_pickers)
+        chunked_file.seek_end()
+        return cube.astype(self.dtype, copy=False)
+
+def read_cube(file_format, file, shape, dtype=None, extractor=None, threshold_size=conf.DEFAULT_READ_THRESHOLD_SIZE, mmap=False, **n_args):
     """read_cube(file_format, file, shape, dtype=None,
-           extractor=None, threshold_size=conf.DEFAULT_READ_THRESHOLD_SIZE) ->
+           extractor=None, threshold_size=conf.DEFAULT_READ_THRESHOLD_SIZE,
+           mmap=False) ->
        read a cube from raw file file with given shape and extractor
-       file_format can be 'raw', 'text', 'csv'
+       file_format can be 'raw', 'text', 'csv', 'chunked'
        file can be a  str or a file object
        when reading less than threshold_size bytes, switch to the direct 
        read & extract algorithm
+       if mmap is True, 'raw' files are memory mapped (copy-on-write), and
+       the extracted cube is a view on the mapped file
     """
     if not isinstance(shape, Shape):
         shape = Shape(shape)
     if isinstance(file, BASE_STRING):
         filename = interpolate_filename(file, shape=shape, dtype=dtype, file_format=file_format)
         with open(filename, 'rb') as f_in:
-            return read_cube(file_format=file_format, file=f_in, shape=shape, dtype=dtype, extractor=extractor, threshold_size=threshold_size, **n_args)
+            return read_cube(file_format=file_format, file=f_in, shape=shape, dtype=dtype, extractor=extractor, threshold_size=threshold_size, mmap=mmap, **n_args)
     else:
         if file_format == conf.FILE_FORMAT_RAW:
-            ereader_class = ExtractRawReader
+            if mmap:
+                ereader_class = ExtractRawMmapReader
+            else:
+                ereader_class = ExtractRawReader
         elif file_format == conf.FILE_FORMAT_TEXT:
             ereader_class = ExtractTextReader
         elif file_format == conf.FILE_FORMAT_CSV:
             ereader_class = ExtractCsvReader
+        elif file_format == conf.FILE_FORMAT_CHUNKED:
+            ereader_class = ExtractChunkedReader
         else:
             raise RubikError("invalid file format {0}".format(file_format))
         ereader = ereader_class(dtype=dtype, shape=shape, extractor=extractor, threshold_size=threshold_size, **n_args)
         return ereader.read(file)
 
+def read_cube_regions(file_format, file, shape, extractors, dtype=None, mmap=False, **n_args):
+    """read_cube_regions(file_format, file, shape, extractors, dtype=None,
+           mmap=False) -> list of cubes
+       read from file the subcubes extracted by each of the 'extractors',
+       with a single pass over the file
+       'raw' files are read through a RegionsReadPlan: only the runs needed by
+       the regions are read, and overlapping regions are read once; the other
+       file formats are read in full, then all the extractors are applied
+       if mmap is True, 'raw' files are memory mapped, and the cubes are views
+       on the mapped file
+    """
+    if not isinstance(shape, Shape):
+        shape = Shape(shape)
+    extractors = [extractor if isinstance(extractor, Extractor) else Extractor(extractor) for extractor in extractors]
+    if isinstance(file, BASE_STRING):
+        filename = interpolate_filename(file, shape=shape, dtype=dtype, file_format=file_format)
+        with open(filename, 'rb') as f_in:
+            return read_cube_regions(file_format=file_format, file=f_in, shape=shape, extractors=extractors, dtype=dtype, mmap=mmap, **n_args)
+    if file_format == conf.FILE_FORMAT_RAW and not mmap and hasattr(file, 'readinto'):
+        return RegionsReadPlan(shape, dtype, extractors).read(file)
+    cube = read_cube(file_format=file_format, file=file, shape=shape, dtype=dtype, mmap=mmap, **n_args)
+    cubes = []
+    for extractor in extractors:
+        subcube = cube[extractor.index_pickers()]
+        if not mmap:
+            # do not keep the full cube alive
+            subcube = subcube.copy()
+        cubes.append(subcube)
+    return cubes
+
+def read_cube_raw_regions(file, shape, extractors, dtype=None, mmap=False):
+    """read_cube_raw_regions(file, shape, extractors, dtype=None, mmap=False) -> list of cubes
+       read from raw file file the subcubes extracted by each of the
+       'extractors', with a single pass over the file
+       file can be a  str or a file object
+       if mmap is True, the file is memory mapped
+    """
+    return read_cube_regions(
+        file_format=conf.FILE_FORMAT_RAW,
+        file=file,
+        shape=shape,
+        extractors=extractors,
+        dtype=dtype,
+        mmap=mmap)
+
 def read_cube_raw(file, shape, dtype=None, extractor=None,
-        threshold_size=conf.DEFAULT_READ_THRESHOLD_SIZE):
+        threshold_size=conf.DEFAULT_READ_THRESHOLD_SIZE, mmap=False):
     """read_cube_raw(file, shape, dtype=None,
-           extractor=None, threshold_size=conf.DEFAULT_READ_THRESHOLD_SIZE) ->
+           extractor=None, threshold_size=conf.DEFAULT_READ_THRESHOLD_SIZE,
+           mmap=False) ->
                read a cube from raw file file with given shape and extractor
        file can be a  str or a file object
+       if mmap is True, the file is memory mapped
     """
     return read_cube(
         file_format=conf.FILE_FORMAT_RAW,
@@ -181,16 +366,18 @@ def read_cube_raw(file, shape, dtype=None, extractor=None,
         dtype=dtype,
         shape=shape,
         extractor=extractor,
-        threshold_size=threshold_size)
+        threshold_size=threshold_size,
+        mmap=mmap)
 
 def read_cube_text(file, shape, dtype=None, extractor=None, 
         threshold_size=conf.DEFAULT_READ_THRESHOLD_SIZE,
-        delimiter=conf.FILE_FORMAT_TEXT_DELIMITER):
+        delimiter=conf.FILE_FORMAT_TEXT_DELIMITER, workers=None):
     """read_cube_text(file, shape, dtype=None,
                      extractor=None, threshold_size=conf.DEFAULT_READ_THRESHOLD_SIZE,
-                     delimiter=conf.conf.FILE_FORMAT_TEXT_DELIMITER) ->
+                     delimiter=conf.conf.FILE_FORMAT_TEXT_DELIMITER, workers=None) ->
        read a cube from text file file with given shape and extractor
        file can be a  str or a file object
+       the file is parsed by 'workers' processes (see TextReader)
     """
     return read_cube(
         file_format=conf.FILE_FORMAT_TEXT,
@@ -199,16 +386,18 @@ def read_cube_text(file, shape, dtype=None, extractor=None,
         shape=shape,
         extractor=extractor,
         threshold_size=threshold_size,
-        delimiter=delimiter)
+        delimiter=delimiter,
+        workers=workers)
 
 def read_cube_csv(file, shape, dtype=None, extractor=None,
         threshold_size=conf.DEFAULT_READ_THRESHOLD_SIZE,
-        sep=conf.FILE_FORMAT_CSV_SEPARATOR):
+        sep=conf.FILE_FORMAT_CSV_SEPARATOR, workers=None):
     """read_cube_raw(file, shape, dtype=None,
                     extractor=None, threshold_size=conf.DEFAULT_READ_THRESHOLD_SIZE,
-                    sep=conf.FILE_FORMAT_CSV_SEPARATOR) -> read a cube from
+                    sep=conf.FILE_FORMAT_CSV_SEPARATOR, workers=None) -> read a cube from
        CSV file file with given shape and extractor
        file can be a  str or a file object
+       the file is parsed by 'workers' processes (see TextReader)
     """
     return read_cube(
         file_format=conf.FILE_FORMAT_CSV,
@@ -217,59 +406,562 @@ def read_cube_csv(file, shape, dtype=None, extractor=None,
         shape=shape,
         extractor=extractor,
         threshold_size=threshold_size,
-        sep=sep)
+        sep=sep,
+        workers=workers)
+
+def read_cube_chunked(file, shape, dtype=None, extractor=None):
+    """read_cube_chunked(file, shape, dtype=None, extractor=None) ->
+       read a cube from chunked file file with given shape and extractor;
+       only the chunks needed by the extractor are read
+       file can be a  str or a file object
+    """
+    return read_cube(
+        file_format=conf.FILE_FORMAT_CHUNKED,
+        file=file,
+        dtype=dtype,
+        shape=shape,
+        extractor=extractor)
+
+class ChunkWriter(object):
+    """ChunkWriter(dtype=None, buffer_size=None)
+    Writes a cube to a file chunk by chunk: each chunk is converted to 'dtype'
+    (by default, the cube dtype) into a reusable output buffer of 'buffer_size'
+    bytes, so the whole converted cube is never allocated.
+    """
+    DEFAULT_BUFFER_SIZE = Memory('64mb')
+    def __init__(self, dtype=None, buffer_size=None):
+        if dtype is not None:
+            dtype = get_dtype(dtype)
+        self.dtype = dtype
+        if buffer_size is None:
+            buffer_size = self.DEFAULT_BUFFER_SIZE
+        self.buffer_size = Memory(buffer_size)
+
+    def get_dtype(self, cube):
+        if self.dtype is None:
+            return cube.dtype
+        else:
+            return np.dtype(self.dtype)
+
+    def get_chunk_count(self, cube):
+        return max(1, self.buffer_size.get_bytes() // self.get_dtype(cube).itemsize)
+
+    def iter_source_blocks(self, cube):
+        if isinstance(cube, LazyCube):
+            for block in cube.iter_blocks(buffer_size=self.buffer_size):
+                yield block
+        else:
+            yield cube
+
+    def iter_chunks(self, cube):
+        """self.iter_chunks(cube) -> iterates over converted 1D chunks (C order)
+           chunks are views on the output buffer: they are valid until the
+           next chunk is produced"""
+        dtype = self.get_dtype(cube)
+        chunk_count = self.get_chunk_count(cube)
+        for block in self.iter_source_blocks(cube):
+            iterator = np.nditer(block, flags=['external_loop', 'buffered', 'zerosize_ok'],
+                                 op_dtypes=[dtype], casting='unsafe',
+                                 order='C', buffersize=chunk_count)
+            if is_memory_mapped(block):
+                iterator = iter_timed_reads(iterator)
+            for chunk in iterator:
+                yield chunk
+
+    def write(self, cube, file):
+        """self.write(cube, file)
+           writes 'cube' to the file object 'file'"""
+        raise NotImplementedError("{}.write".format(type(self).__name__))
+
+class ChunkRawWriter(ChunkWriter):
+    def write(self, cube, file):
+        for chunk in self.iter_chunks(cube):
+            chunk.tofile(file)
 
-def write_cube(file_format, cube, file):
-    """write_cube(cube, file) -> write cube to file with file format 'file_format'
+_STR_FORMAT_RE = re.compile(r'%[-+ #0-9.*]*[sr]')
+
+def format_csv_values(values, sep):
+    """format_csv_values(values, sep) -> bytes
+       formats the 1D array 'values' as numpy.ndarray.tofile(sep=sep)"""
+    return sep.join(map(str, values.tolist())).encode('latin-1')
+
+def format_text_rows(rows, fmt=None, delimiter=None, newline=None):
+    """format_text_rows(rows, fmt=None, delimiter=None, newline=None) -> bytes
+       formats the 2D array 'rows' as numpy.savetxt, with a single format
+       operation for all the rows"""
+    kwargs = {}
+    for key, value in (('fmt', fmt), ('delimiter', delimiter), ('newline', newline)):
+        if value is not None:
+            kwargs[key] = value
+    if fmt is None:
+        fmt = '%.18e'
+    if delimiter is None:
+        delimiter = ' '
+    if newline is None:
+        newline = '\n'
+    num_rows, row_count = rows.shape
+    if isinstance(fmt, (list, tuple)):
+        row_fmt = delimiter.join(fmt)
+    elif fmt.count('%') == 1:
+        row_fmt = delimiter.join([fmt] * row_count)
+    else:
+        row_fmt = fmt
+    if issubclass(rows.dtype.type, np.complexfloating) or row_fmt.count('%') != row_count:
+        # numpy.savetxt handles complex values and reports invalid formats
+        output = io.BytesIO()
+        np.savetxt(output, rows, **kwargs)
+        return output.getvalue()
+    if _STR_FORMAT_RE.search(row_fmt):
+        # numpy.savetxt formats numpy scalars (str(numpy.float32(0.1)) is '0.1')
+        values = tuple(rows.ravel())
+    else:
+        values = tuple(rows.ravel().tolist())
+    return (((row_fmt + newline) * num_rows) % values).encode('latin-1')
+
+class ChunkCsvWriter(ChunkWriter):
+    """ChunkCsvWriter(dtype=None, buffer_size=None, sep=',', workers=None)
+    Writes csv cubes as numpy.ndarray.tofile(sep=sep); chunks of
+    FORMAT_CHUNK_COUNT values are formatted by 'workers' processes (default:
+    get_default_workers()) and written in order.
+    """
+    FORMAT_CHUNK_COUNT = 2 ** 18
+    def __init__(self, dtype=None, buffer_size=None, sep=conf.FILE_FORMAT_CSV_SEPARATOR, workers=None):
+        super(ChunkCsvWriter, self).__init__(dtype=dtype, buffer_size=buffer_size)
+        self.sep = sep
+        if workers is None:
+            workers = get_default_workers()
+        self.workers = workers
+
+    def get_chunk_count(self, cube):
+        return min(self.FORMAT_CHUNK_COUNT, super(ChunkCsvWriter, self).get_chunk_count(cube))
+
+    def iter_tasks(self, cube):
+        for chunk in self.iter_chunks(cube):
+            if self.workers > 1:
+                chunk = chunk.copy()
+            yield chunk, self.sep
+
+    def write(self, cube, file):
+        first = True
+        for data in imap_ahead(format_csv_values, self.iter_tasks(cube), self.workers):
+            if not first:
+                file.write(self.sep.encode())
+            file.write(data)
+            first = False
+
+class ChunkTextWriter(ChunkWriter):
+    """ChunkTextWriter(dtype=None, buffer_size=None, delimiter=None, newline=None, fmt=None, workers=None)
+    Writes text cubes as numpy.savetxt; chunks of about FORMAT_CHUNK_COUNT
+    values (whole rows) are formatted by 'workers' processes (default:
+    get_default_workers()) and written in order.
+    """
+    FORMAT_CHUNK_COUNT = 2 ** 18
+    def __init__(self, dtype=None, buffer_size=None, delimiter=None, newline=None, fmt=None, workers=None):
+        super(ChunkTextWriter, self).__init__(dtype=dtype, buffer_size=buffer_size)
+        self.delimiter = delimiter
+        self.newline = newline
+        self.fmt = fmt
+        if workers is None:
+            workers = get_default_workers()
+        self.workers = workers
+
+    def get_chunk_count(self, cube):
+        return min(self.FORMAT_CHUNK_COUNT, super(ChunkTextWriter, self).get_chunk_count(cube))
+
+    def iter_tasks(self, cube, num_rows, row_count):
+        # chunks are made of whole rows
+        rows_per_chunk = max(1, self.get_chunk_count(cube) // row_count)
+        buffer = np.empty((min(num_rows, rows_per_chunk), row_count), dtype=self.get_dtype(cube))
+        for start in irange(0, num_rows, rows_per_chunk):
+            stop = min(num_rows, start + rows_per_chunk)
+            if isinstance(cube, LazyCube):
+                rows = cube.read_block(start * row_count, stop * row_count)
+            else:
+                rows = cube[start:stop]
+            chunk = buffer[:stop - start]
+            np.copyto(chunk, rows.reshape(chunk.shape), casting='unsafe')
+            if self.workers > 1:
+                chunk = chunk.copy()
+            yield chunk, self.fmt, self.delimiter, self.newline
+
+    def write(self, cube, file):
+        # same layout as numpy.savetxt on the cube reshaped to 2D
+        if len(cube.shape) <= 1:
+            num_rows, row_count = cube.size, 1
+        else:
+            num_rows, row_count = cube.shape[0], cube.size // cube.shape[0]
+        if num_rows == 0 or row_count == 0:
+            savetxt_nargs = dict((key, value) for key, value in (('fmt', self.fmt), ('delimiter', self.delimiter), ('newline', self.newline))
+                                 if value is not None)
+            np.savetxt(file, np.asarray(cube).astype(self.get_dtype(cube)), **savetxt_nargs)
+            return
+        for data in imap_ahead(format_text_rows, self.iter_tasks(cube, num_rows, row_count), self.workers):
+            file.write(data)
+
+def write_cube(file_format, cube, file, dtype=None, buffer_size=None):
+    """write_cube(cube, file, dtype=None, buffer_size=None) -> write cube to file with file format 'file_format'
+    The cube is converted to 'dtype' and written 'buffer_size' bytes at a time
+    ('chunked' files are written one chunk at a time).
     """
     output_mode_callback()
     if file_format == 'raw':
-        return write_cube_raw(cube, file)
+        return write_cube_raw(cube, file, dtype=dtype, buffer_size=buffer_size)
     elif file_format == 'csv':
-        return write_cube_csv(cube, file)
+        return write_cube_csv(cube, file, dtype=dtype, buffer_size=buffer_size)
     elif file_format == 'text':
-        return write_cube_text(cube, file)
+        return write_cube_text(cube, file, dtype=dtype, buffer_size=buffer_size)
+    elif file_format == 'chunked':
+        return write_cube_chunked(cube, file, dtype=dtype)
     else:
         raise RubikError("invalid file format {0}".format(file_format))
 
-def write_cube_raw(cube, file):
-    """write_cube_raw(cube, file) -> write cube to raw file
+def _write_chunks(chunk_writer, cube, file, file_format):
+    if isinstance(file, BASE_STRING):
+        file = interpolate_filename(file, shape=Shape(cube.shape), dtype=chunk_writer.get_dtype(cube), file_format=file_format)
+    with asfile(file, 'wb') as f_out:
+        chunk_writer.write(cube, f_out)
+
+def write_cube_raw(cube, file, dtype=None, buffer_size=None):
+    """write_cube_raw(cube, file, dtype=None, buffer_size=None) -> write cube to raw file
     """
     output_mode_callback()
-    if isinstance(file, BASE_STRING):
-        file = interpolate_filename(file, shape=Shape(cube.shape), dtype=cube.dtype, file_format='raw')
-    cube.tofile(file)
+    _write_chunks(ChunkRawWriter(dtype=dtype, buffer_size=buffer_size), cube, file, 'raw')
 
-def write_cube_csv(cube, file, separator=None):
-    """write_cube_csv(cube, file, separator=None) -> write cube to csv file
+def write_cube_csv(cube, file, separator=None, dtype=None, buffer_size=None):
+    """write_cube_csv(cube, file, separator=None, dtype=None, buffer_size=None) -> write cube to csv file
     """
     output_mode_callback()
-    if isinstance(file, BASE_STRING):
-        file = interpolate_filename(file, shape=Shape(cube.shape), dtype=cube.dtype, file_format='csv')
     if separator is None:
         separator = conf.FILE_FORMAT_CSV_SEPARATOR
-    cube.tofile(file, sep=separator)
+    _write_chunks(ChunkCsvWriter(dtype=dtype, buffer_size=buffer_size, sep=separator), cube, file, 'csv')
+
+def write_cube_text(cube, file, delimiter=None, newline=None, converter=None, dtype=None, buffer_size=None):
+    """write_cube_text(cube, file, delimiter=" ", newline="\n", converter=None, dtype=None, buffer_size=None) -> write cube to text file
+    """
+    output_mode_callback()
+    if delimiter is None:
+        delimiter = conf.FILE_FORMAT_TEXT_DELIMITER
+    if newline is None:
+        newline = conf.FILE_FORMAT_TEXT_NEWLINE
+    if converter is None:
+        converter = conf.FILE_FORMAT_TEXT_CONVERTER
+    _write_chunks(ChunkTextWriter(dtype=dtype, buffer_size=buffer_size,
+                                  delimiter=delimiter, newline=newline, fmt=converter),
+                  cube, file, 'text')
+
+def write_cube_chunked(cube, file, dtype=None, compression=None, chunk_shape=None, chunk_size=None):
+    """write_cube_chunked(cube, file, dtype=None, compression=None, chunk_shape=None, chunk_size=None) -> write cube to chunked file
+       'compression' can be 'none', 'zlib' (default) or 'lzma'; by default,
+       chunks are slabs of about 'chunk_size' bytes
+    """
+    output_mode_callback()
+    _write_chunks(ChunkedFileWriter(dtype=dtype, compression=compression, chunk_shape=chunk_shape, chunk_size=chunk_size),
+                  cube, file, 'chunked')
+
+class SplitRawWriter(object):
+    """SplitRawWriter(axes, dtype=None, buffer_size=None, max_open_files=None, mode='wb')
+    Splits a cube over the 'axes' dimensions and writes each subcube to a
+    different 'raw' file, like write_cube_raw() on each subcube yielded by
+    split(cube, axes), but streaming: the cube is read once, in C order,
+    'buffer_size' bytes at a time (LazyCube objects are never evaluated),
+    and each slab is appended to the file of its subcube.
+    At most 'max_open_files' buffered output files are kept open; the least
+    recently used one is closed when another one is needed, and reopened
+    in append mode.
+    """
+    DEFAULT_BUFFER_SIZE = Memory('64mb')
+    DEFAULT_MAX_OPEN_FILES = 64
+    FILE_BUFFER_SIZE = Memory('1mb')
+    def __init__(self, axes, dtype=None, buffer_size=None, max_open_files=None, mode='wb'):
+        self.axes = tuple(axes)
+        if dtype is not None:
+            dtype = get_dtype(dtype)
+        self.dtype = dtype
+        if buffer_size is None:
+            buffer_size = self.DEFAULT_BUFFER_SIZE
+        self.buffer_size = Memory(buffer_size)
+        if max_open_files is None:
+            max_open_files = self.DEFAULT_MAX_OPEN_FILES
+        self.max_open_files = max(1, max_open_files)
+        self.mode = mode
+
+    def get_dtype(self, cube):
+        if self.dtype is None:
+            return cube.dtype
+        else:
+            return np.dtype(self.dtype)
+
+    def get_axes(self, shape):
+        """self.get_axes(shape) -> split axes (as in split())"""
+        return tuple(axis for axis in self.axes if 0 <= axis < len(shape))
+
+    def get_subshape(self, shape):
+        """self.get_subshape(shape) -> shape of the subcubes"""
+        axes = self.get_axes(shape)
+        return tuple(dim for axis, dim in enumerate(shape) if not axis in axes)
+
+    def iter_axes_indices(self, shape):
+        """self.iter_axes_indices(shape) -> iterates over the subcubes
+           'axes_indices', in the same order as split()"""
+        axes = self.get_axes(shape)
+        for indices in itertools.product(*[irange(shape[axis]) for axis in axes]):
+            yield tuple(zip(axes, indices))
+
+    def get_reader(self, cube):
+        if isinstance(cube, LazyCube):
+            return cube.read_block
+        else:
+            flat_cube = np.asarray(cube).reshape((-1, ))
+            return lambda start, stop: flat_cube[start:stop]
+
+    def iter_slabs(self, cube):
+        """self.iter_slabs(cube) -> iterates over (axes_indices, slab)
+           slabs are 1D blocks of a subcube; they are yielded in file order, so
+           the slabs of each subcube are yielded in the subcube C order"""
+        shape = tuple(cube.shape)
+        axes = self.get_axes(shape)
+        if not axes:
+            return
+        read = self.get_reader(cube)
+        last_axis = max(axes)
+        # the cube is seen as a 2D array: each row of 'row_count' elements
+        # belongs to a single subcube
+        outer_shape = shape[:last_axis + 1]
+        row_count = 1
+        for dim in shape[last_axis + 1:]:
+            row_count *= dim
+        num_rows = 1
+        for dim in outer_shape:
+            num_rows *= dim
+        if num_rows == 0 or row_count == 0:
+            return
+        split_dims = tuple(shape[axis] for axis in axes)
+        itemsize = np.dtype(cube.dtype).itemsize + self.get_dtype(cube).itemsize
+        block_count = max(1, self.buffer_size.get_bytes() // itemsize)
+        def get_axes_indices(row):
+            coords = np.unravel_index(row, outer_shape)
+            return tuple((axis, int(coords[axis])) for axis in axes)
+        if row_count >= block_count:
+            for row in irange(num_rows):
+                axes_indices = get_axes_indices(row)
+                row_start = row * row_count
+                for start in irange(row_start, row_start + row_count, block_count):
+                    stop = min(row_start + row_count, start + block_count)
+                    yield axes_indices, read(start, stop)
+        else:
+            block_rows = block_count // row_count
+            for row_start in irange(0, num_rows, block_rows):
+                row_stop = min(num_rows, row_start + block_rows)
+                block = read(row_start * row_count, row_stop * row_count).reshape((row_stop - row_start, row_count))
+                coords = np.unravel_index(np.arange(row_start, row_stop), outer_shape)
+                keys = np.ravel_multi_index([coords[axis] for axis in axes], split_dims)
+                order = np.argsort(keys, kind='stable')
+                sorted_keys = keys[order]
+                bounds = [0] + list(np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1) + [len(order)]
+                for group_start, group_stop in zip(bounds[:-1], bounds[1:]):
+                    rows = order[group_start:group_stop]
+                    first, last = int(rows[0]), int(rows[-1])
+                    if last - first + 1 == len(rows):
+                        slab = block[first:last + 1]
+                    else:
+                        slab = block[rows]
+                    axes_indices = get_axes_indices(row_start + first)
+                    yield axes_indices, slab.reshape((-1, ))
+
+    def write(self, cube, get_filename):
+        """self.write(cube, get_filename)
+           writes each subcube to the file get_filename(axes_indices)"""
+        dtype = self.get_dtype(cube)
+        open_files = collections.OrderedDict()
+        opened = set()
+        def get_file(filename):
+            f_out = open_files.pop(filename, None)
+            if f_out is None:
+                if len(open_files) >= self.max_open_files:
+                    open_files.popitem(last=False)[1].close()
+                if filename in opened:
+                    mode = 'ab'
+                else:
+                    mode = self.mode
+                    opened.add(filename)
+                f_out = open(filename, mode, buffering=self.FILE_BUFFER_SIZE.get_bytes())
+            open_files[filename] = f_out
+            return f_out
+        try:
+            if cube.size == 0:
+                for axes_indices in self.iter_axes_indices(tuple(cube.shape)):
+                    get_file(get_filename(axes_indices))
+            for axes_indices, slab in self.iter_slabs(cube):
+                f_out = get_file(get_filename(axes_indices))
+                f_out.write(np.ascontiguousarray(slab, dtype=dtype).data)
+        finally:
+            for f_out in open_files.values():
+                f_out.close()
+
+def write_cube_split_raw(cube, axes, file, dtype=None, buffer_size=None, max_open_files=None):
+    """write_cube_split_raw(cube, axes, file, dtype=None, buffer_size=None, max_open_files=None) -> list of filenames
+       splits 'cube' over the 'axes' dimensions (see split()) and writes each
+       subcube to a 'raw' file; the cube is read only once (see SplitRawWriter).
+       'file' can be a function returning the filename of the subcube with
+       the given 'axes_indices', or a filename interpolated with the subcube
+       shape, dtype and the 'd0', 'd1', ... keywords (for instance,
+       "sub_{shape}.{d0}.raw").
+    """
+    output_mode_callback()
+    writer = SplitRawWriter(axes, dtype=dtype, buffer_size=buffer_size, max_open_files=max_open_files)
+    if isinstance(file, BASE_STRING):
+        file_pattern = file
+        subshape = writer.get_subshape(tuple(cube.shape))
+        def file(axes_indices):
+            keywords = dict(('d{0}'.format(axis), index) for axis, index in axes_indices)
+            return interpolate_filename(file_pattern, shape=subshape, dtype=writer.get_dtype(cube), file_format='raw', keywords=keywords)
+    filenames = [file(axes_indices) for axes_indices in writer.iter_axes_indices(tuple(cube.shape))]
+    writer.write(cube, file)
+    return filenames
+
+JOIN_COPY_METHODS = ('copy_file_range', 'sendfile', 'buffered')
+_JOIN_UNSUPPORTED_ERRNOS = frozenset(getattr(errno, name) for name in ('EXDEV', 'ENOSYS', 'EINVAL', 'EOPNOTSUPP', 'ENOTSUP', 'EBADF')
+                                     if hasattr(errno, name))
+
+def _kernel_copy(method, f_in, f_out, in_offset, out_offset, size):
+    in_fd, out_fd = f_in.fileno(), f_out.fileno()
+    copied = 0
+    if method == 'sendfile':
+        os.lseek(out_fd, out_offset, os.SEEK_SET)
+    while copied < size:
+        if method == 'copy_file_range':
+            num_bytes = os.copy_file_range(in_fd, out_fd, size - copied, in_offset + copied, out_offset + copied)
+        else:
+            num_bytes = os.sendfile(out_fd, in_fd, in_offset + copied, size - copied)
+        if num_bytes == 0:
+            break
+        copied += num_bytes
+    return copied
 
-def write_cube_text(cube, file, delimiter=None, newline=None, converter=None):
-    """write_cube_text(cube, file, delimiter=" ", newline="\n", converter=None) -> write cube to text file
+def _buffered_copy(f_in, f_out, in_offset, out_offset, size, buffer_size):
+    view = memoryview(bytearray(max(1, min(size, buffer_size))))
+    f_in.seek(in_offset)
+    f_out.seek(out_offset)
+    copied = 0
+    while copied < size:
+        num_bytes = f_in.readinto(view[:size - copied])
+        if not num_bytes:
+            break
+        f_out.write(view[:num_bytes])
+        copied += num_bytes
+    f_out.flush()
+    return copied
+
+def copy_file_data(f_in, f_out, in_offset, out_offset, size, methods=None, buffer_size=None):
+    """copy_file_data(f_in, f_out, in_offset, out_offset, size, methods=None, buffer_size=None) -> method
+       copies 'size' bytes from the file object 'f_in' at 'in_offset' to the
+       file object 'f_out' at 'out_offset', and returns the method used.
+       The 'methods' list (default: JOIN_COPY_METHODS) is tried in order:
+       'copy_file_range' and 'sendfile' copy the data in the kernel, 'buffered'
+       uses a reusable buffer of 'buffer_size' bytes. Unsupported methods are
+       removed from the 'methods' list, so that they are not tried again for
+       the next files.
+    """
+    if methods is None:
+        methods = list(JOIN_COPY_METHODS)
+    if buffer_size is None:
+        buffer_size = ChunkWriter.DEFAULT_BUFFER_SIZE
+    while methods:
+        method = methods[0]
+        if method == 'buffered':
+            copied = _buffered_copy(f_in, f_out, in_offset, out_offset, size, Memory(buffer_size).get_bytes())
+        else:
+            try:
+                copied = _kernel_copy(method, f_in, f_out, in_offset, out_offset, size)
+            except (AttributeError, OSError, io.UnsupportedOperation) as err:
+                # copy_file_range/sendfile not available, or not supported by
+                # these files: nothing has been copied
+                if isinstance(err, OSError) and not isinstance(err, io.UnsupportedOperation) \
+                   and not err.errno in _JOIN_UNSUPPORTED_ERRNOS:
+                    raise
+                methods.pop(0)
+                continue
+        if copied != size:
+            raise RubikError("cannot copy {} bytes from file {!r}: file too short".format(size, getattr(f_in, 'name', f_in)))
+        return method
+    raise RubikError("no copy method available")
+
+def join_files(filenames, file, shape, dtype=None, offsets=None, accept_bigger_raw_files=False, methods=None, buffer_size=None,
+               truncate=True):
+    """join_files(filenames, file, shape, dtype=None, offsets=None, accept_bigger_raw_files=False,
+                  methods=None, buffer_size=None, truncate=True) -> joined shape
+       concatenates the 'raw' files 'filenames', containing cubes with the
+       same 'shape' and 'dtype', into the 'raw' file 'file'; the result is the
+       same as write_cube_raw(join(cubes), file), but the cube data are
+       never read into memory: they are copied in the kernel where possible
+       (see copy_file_data()).
+       'offsets', if given, are the offsets (in bytes) of the cubes in the
+       input files; a 'file' string is interpolated with the joined shape.
+       A 'file' object is written at its current position; if 'truncate' is
+       False, the data after the joined cubes are kept (for instance, when
+       writing at an offset of an existing file).
     """
     output_mode_callback()
+    filenames = tuple(filenames)
+    shape = Shape(shape)
+    dtype = get_dtype(dtype)
+    size = shape.count() * np.dtype(dtype).itemsize
+    if offsets is None:
+        offsets = (0, ) * len(filenames)
+    offsets = tuple(offsets)
+    if len(offsets) != len(filenames):
+        raise RubikError("join_files: {} offsets for {} files".format(len(offsets), len(filenames)))
+    for filename, offset in zip(filenames, offsets):
+        if not os.path.isfile(filename):
+            raise RubikError("missing input file {0}".format(filename))
+        input_bytes = os.stat(filename).st_size - offset
+        if input_bytes < size or (input_bytes > size and not accept_bigger_raw_files):
+            raise RubikError("join_files: input file {0} does not contain a {1} {2!r} cube: {3} bytes found, {4} bytes expected".format(
+                             filename, shape, dtype.__name__, input_bytes, size))
+    joined_shape = Shape((len(filenames), ) + tuple(shape.shape()))
     if isinstance(file, BASE_STRING):
-        file = interpolate_filename(file, shape=Shape(cube.shape), dtype=cube.dtype, file_format='text')
-    n_args = {}
-    if delimiter is not None:
-        n_args['delimiter'] = conf.FILE_FORMAT_TEXT_DELIMITER
-    if newline is not None:
-        n_args['newline'] = conf.FILE_FORMAT_TEXT_NEWLINE
-    if converter is not None:
-        n_args['fmt'] = conf.FILE_FORMAT_TEXT_CONVERTER
-    np.savetxt(file, cube, **n_args)
+        file = interpolate_filename(file, shape=joined_shape, dtype=dtype, file_format='raw')
+    if methods is None:
+        methods = list(JOIN_COPY_METHODS)
+    with asfile(file, 'wb') as f_out:
+        f_out.flush()
+        out_offset = f_out.tell()
+        for filename, offset in zip(filenames, offsets):
+            with open(filename, 'rb') as f_in:
+                copy_file_data(f_in, f_out, offset, out_offset, size, methods=methods, buffer_size=buffer_size)
+            out_offset += size
+        f_out.seek(out_offset)
+        if truncate:
+            f_out.truncate()
+    return joined_shape
+
+def _is_seekable(f_out):
+    seekable = getattr(f_out, 'seekable', None)
+    return seekable is None or seekable()
+
+def _pwrite_block(fileno, block, offset):
+    data = memoryview(block).cast('B')
+    while data:
+        written = os.pwrite(fileno, data, offset)
+        data = data[written:]
+        offset += written
 
 class CubeWriter(object):
-    def __init__(self, file, shape, buffer_size, dtype=None):
+    """CubeWriter(file, shape, buffer_size, dtype=None, threads=None)
+       Writes a generated cube 'buffer_size' bytes at a time; subclasses
+       implement create_block(start, stop), which returns the flat elements
+       [start, stop) of the cube.
+       If 'threads' (default: get_default_workers()) is > 1 and the file
+       supports positional writes, blocks are created and written to
+       disjoint ranges of the file by a pool of 'threads' threads; in this
+       case, 'buffer_size' is shared among the threads.
+    """
+    def __init__(self, file, shape, buffer_size, dtype=None, threads=None):
         dtype = get_dtype(dtype)
         if buffer_size is None:
             buffer_size = 1024 ** 3
+        if threads is None:
+            threads = get_default_workers()
         buffer_count = buffer_size // dtype().itemsize
         shape = Shape(shape)
         count = shape.count()
@@ -278,71 +970,118 @@ class CubeWriter(object):
             file = interpolate_filename(file, shape=shape, dtype=self.dtype, file_format='raw')
         self.buffer_size = buffer_size
         self.buffer_count = buffer_count
+        self.threads = threads
         self.count = count
         self.shape = shape
         self.file = file
 
+    def get_blocks(self, buffer_count):
+        buffer_count = max(1, buffer_count)
+        return [(start, min(self.count, start + buffer_count)) for start in irange(0, self.count, buffer_count)]
+
+    @classmethod
+    def get_fileno(cls, f_out):
+        if not hasattr(os, 'pwrite'):
+            return None
+        if not _is_seekable(f_out):
+            # pipes, stdout, ...: the blocks are written serially
+            return None
+        try:
+            return f_out.fileno()
+        except (AttributeError, IOError, ValueError):
+            return None
+
     def write(self):
-        rem = self.count
         with asfile(self.file, 'wb') as f_out:
-            while rem:
-                par_count = max(1, min(rem, self.buffer_count))
-                np_array = self.create_subcube(par_count)
-                np_array.tofile(f_out)
-                rem -= par_count
+            fileno = self.get_fileno(f_out)
+            threads = self.threads
+            if fileno is not None and threads > 1:
+                blocks = self.get_blocks(self.buffer_count // threads)
+                threads = min(threads, len(blocks))
+            if fileno is None or threads <= 1:
+                seekable = _is_seekable(f_out)
+                for start, stop in self.get_blocks(self.buffer_count):
+                    block = self.create_block(start, stop)
+                    if seekable:
+                        block.tofile(f_out)
+                    else:
+                        # numpy.ndarray.tofile needs the file position
+                        f_out.write(memoryview(block).cast('B'))
+                return
+            f_out.flush()
+            file_offset = f_out.tell()
+            itemsize = np.dtype(self.dtype).itemsize
+            def write_block(block):
+                start, stop = block
+                _pwrite_block(fileno, self.create_block(start, stop), file_offset + start * itemsize)
+            pool = ThreadPool(threads)
+            try:
+                pool.map(write_block, blocks, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+            f_out.seek(file_offset + self.count * itemsize)
         
-    def create_subcube(self, par_count):
+    def create_block(self, start, stop):
        raise NotImplementedError()
 
 class LinearCubeWriter(CubeWriter):
-    def __init__(self, file, shape, buffer_size, start, increment, dtype=None):
-       CubeWriter.__init__(self, file=file, shape=shape, buffer_size=buffer_size, dtype=dtype)
+    def __init__(self, file, shape, buffer_size, start, increment, dtype=None, threads=None):
+       CubeWriter.__init__(self, file=file, shape=shape, buffer_size=buffer_size, dtype=dtype, threads=threads)
        self.start = start
        self.increment = increment
 
-    def create_subcube(self, par_count):
-       np_array = linear_cube((par_count, ), start=self.start, increment=self.increment, dtype=self.dtype)
-       self.start += self.increment * par_count
-       return np_array
+    def create_block(self, start, stop):
+       return linear_block(start, stop - start, start=self.start, increment=self.increment, dtype=self.dtype)
     
-def write_linear_cube(file, shape, start=0.0, increment=1.0, buffer_size=None, dtype=None):
-    """write_linear_cube(file, shape, start=0.0, increment=1.0, buffer_size=None, dtype=None) -> write
+def write_linear_cube(file, shape, start=0.0, increment=1.0, buffer_size=None, dtype=None, threads=None):
+    """write_linear_cube(file, shape, start=0.0, increment=1.0, buffer_size=None, dtype=None, threads=None) -> write
        a cube with the given shape to the file 'file', with elements in linear sequence,
        starting from 'start', with increment 'increment'.
        The 'shape' can be a tuple (for instance, '(8, 10)') or a string
        (for instance, "8x10")
+       Each element is computed from its index (see linear_block()); blocks are
+       written by 'threads' threads (see CubeWriter).
     """
     output_mode_callback()
-    lcw = LinearCubeWriter(file=file, shape=shape, buffer_size=buffer_size, start=start, increment=increment, dtype=dtype)
+    lcw = LinearCubeWriter(file=file, shape=shape, buffer_size=buffer_size, start=start, increment=increment, dtype=dtype, threads=threads)
     lcw.write()
         
 class RandomCubeWriter(CubeWriter):
-    def __init__(self, file, shape, buffer_size, min, max, dtype=None):
-       CubeWriter.__init__(self, file=file, shape=shape, buffer_size=buffer_size, dtype=dtype)
+    def __init__(self, file, shape, buffer_size, min, max, dtype=None, threads=None):
+       # chunks are filled in parallel by the RandomFiller
+       CubeWriter.__init__(self, file=file, shape=shape, buffer_size=buffer_size, dtype=dtype, threads=1)
        self.min = min
        self.max = max
+       self.filler = RandomFiller(min=min, max=max, threads=threads)
+       # buffers made of whole random chunks are generated without waste
+       chunk_count = self.filler.chunk_count
+       if self.buffer_count >= chunk_count:
+           self.buffer_count -= self.buffer_count % chunk_count
 
-    def create_subcube(self, par_count):
-        return random_cube(shape=(par_count, ), min=self.min, max=self.max, dtype=self.dtype)
+    def create_block(self, start, stop):
+        return self.filler.fill(np.empty((stop - start, ), dtype=self.dtype), start=start)
     
-def write_random_cube(file, shape, min=0.0, max=1.0, buffer_size=None, dtype=None):
-    """write_random_cube(file, shape, min=0.0, max=1.0, buffer_size=None, dtype=None) -> write
+def write_random_cube(file, shape, min=0.0, max=1.0, buffer_size=None, dtype=None, threads=None):
+    """write_random_cube(file, shape, min=0.0, max=1.0, buffer_size=None, dtype=None, threads=None) -> write
        a cube with the given shape to the file 'file', with random elements
        between 'min' and 'max'.
        The 'shape' can be a tuple (for instance, '(8, 10)') or a string
        (for instance, "8x10")
+       The file content is the same as random_cube() with the same random
+       seed, for any 'buffer_size' and number of 'threads'.
     """
     output_mode_callback()
-    rcw = RandomCubeWriter(file=file, shape=shape, buffer_size=buffer_size, min=min, max=max, dtype=dtype)
+    rcw = RandomCubeWriter(file=file, shape=shape, buffer_size=buffer_size, min=min, max=max, dtype=dtype, threads=threads)
     rcw.write()
         
 class ConstCubeWriter(CubeWriter):
-    def __init__(self, file, shape, buffer_size, value, dtype=None):
-       CubeWriter.__init__(self, file=file, shape=shape, buffer_size=buffer_size, dtype=dtype)
+    def __init__(self, file, shape, buffer_size, value, dtype=None, threads=None):
+       CubeWriter.__init__(self, file=file, shape=shape, buffer_size=buffer_size, dtype=dtype, threads=threads)
        self.value = value
 
-    def create_subcube(self, par_count):
-        return const_cube(shape=(par_count, ), value=self.value, dtype=self.dtype)
+    def create_block(self, start, stop):
+        return const_cube(shape=(stop - start, ), value=self.value, dtype=self.dtype)
     
 def write_const_cube(file, shape, value=0.0, buffer_size=None, dtype=None):
     """write_const_cube(file, shape, min=0.0, max=1.0, buffer_size=None, dtype=None) -> write
@@ -355,3 +1094,25 @@ def write_const_cube(file, shape, value=0.0, buffer_size=None, dtype=None):
     rcw = ConstCubeWriter(file=file, shape=shape, buffer_size=buffer_size, value=value, dtype=dtype)
     rcw.write()
 
+class ConstBlocksCubeWriter(CubeWriter):
+    def __init__(self, file, shape, buffer_size, start, increment, const_dims, dtype=None, threads=None):
+       CubeWriter.__init__(self, file=file, shape=shape, buffer_size=buffer_size, dtype=dtype, threads=threads)
+       self.start = start
+       self.increment = increment
+       self.const_dims = const_dims
+
+    def create_block(self, start, stop):
+        return const_blocks_block(start, stop - start, self.shape, start=self.start, increment=self.increment,
+                                  const_dims=self.const_dims, dtype=self.dtype)
+
+def write_const_blocks_cube(file, shape, start=0.0, increment=1.0, const_dims=(-2, -1), buffer_size=None, dtype=None, threads=None):
+    """write_const_blocks_cube(file, shape, start=0.0, increment=1.0, const_dims=(-2, -1), buffer_size=None, dtype=None, threads=None) -> write
+       the cube const_blocks_cube(shape, start, increment, const_dims) to the file 'file'.
+       The 'shape' can be a tuple (for instance, '(8, 10)') or a string
+       (for instance, "8x10")
+       Blocks are written by 'threads' threads (see CubeWriter).
+    """
+    output_mode_callback()
+    cbw = ConstBlocksCubeWriter(file=file, shape=shape, buffer_size=buffer_size, start=start, increment=increment,
+                                const_dims=const_dims, dtype=dtype, threads=threads)
+    cbw.write()
@@ -21,13 +21,26 @@ __all__ = [
            'output_mode_callback',
            'get_output_mode_callback',
            'set_output_mode_callback',
+           'read_callback',
+           'get_read_callback',
+           'set_read_callback',
+           'timed_read',
+           'iter_timed_reads',
            'set_random_seed',
+           'get_random_seed_sequence',
+           'set_default_workers',
+           'get_default_workers',
           ]
 
+import contextlib
 import random
+import time
 import numpy as np
 
 OUTPUT_MODE_CALLBACK = None
+READ_CALLBACK = None
+DEFAULT_WORKERS = 1
+RANDOM_SEED_SEQUENCE = None
 
 def set_output_mode_callback(callback):
     global OUTPUT_MODE_CALLBACK
@@ -42,7 +55,79 @@ def output_mode_callback():
     if OUTPUT_MODE_CALLBACK is not None:
         OUTPUT_MODE_CALLBACK()
 
+_clock = getattr(time, 'perf_counter', time.time)
+
+def set_read_callback(callback):
+    """set_read_callback(callback)
+       Sets the function called as callback(num_bytes, seconds) each time
+       cube data are read from a file (None to unset)
+    """
+    global READ_CALLBACK
+    READ_CALLBACK = callback
+
+def get_read_callback():
+    global READ_CALLBACK
+    return READ_CALLBACK
+
+def read_callback(num_bytes, seconds):
+    global READ_CALLBACK
+    if READ_CALLBACK is not None:
+        READ_CALLBACK(num_bytes, seconds)
+
+@contextlib.contextmanager
+def timed_read(num_bytes):
+    """with timed_read(num_bytes): ...
+       reports 'num_bytes' and the time spent in the block to the read callback
+    """
+    start = _clock()
+    yield
+    read_callback(num_bytes, _clock() - start)
+
+def iter_timed_reads(chunks):
+    """iter_timed_reads(chunks) -> iterates over copies of the numpy arrays in 'chunks'
+       the time spent to get and copy each chunk is reported to the read
+       callback (for instance, the pages of a memory mapped cube are read
+       when the chunk is copied)
+    """
+    chunks = iter(chunks)
+    while True:
+        start = _clock()
+        chunk = next(chunks, None)
+        if chunk is None:
+            break
+        chunk = np.array(chunk)
+        read_callback(chunk.nbytes, _clock() - start)
+        yield chunk
+
 def set_random_seed(random_seed):
+    global RANDOM_SEED_SEQUENCE
     np.random.seed(random_seed)
     random.seed(random_seed)
+    RANDOM_SEED_SEQUENCE = np.random.SeedSequence(random_seed)
+
+def get_random_seed_sequence():
+    """get_random_seed_sequence() -> numpy.random.SeedSequence
+       Returns a new SeedSequence, spawned from the one set by set_random_seed()
+       (or from fresh entropy if no seed has been set); so, after
+       set_random_seed(), the n-th call always returns the same sequence.
+    """
+    global RANDOM_SEED_SEQUENCE
+    if RANDOM_SEED_SEQUENCE is None:
+        RANDOM_SEED_SEQUENCE = np.random.SeedSequence()
+    return RANDOM_SEED_SEQUENCE.spawn(1)[0]
+
+def set_default_workers(workers):
+    """set_default_workers(workers)
+       Sets the default number of worker processes for out-of-core functions
+    """
+    global DEFAULT_WORKERS
+    if workers is None:
+        workers = 1
+    if workers < 1:
+        raise ValueError("invalid number of workers {!r}: it must be >= 1".format(workers))
+    DEFAULT_WORKERS = workers
 
+def get_default_workers():
+    """get_default_workers() -> default number of worker processes"""
+    global DEFAULT_WORKERS
+    return DEFAULT_WORKERS
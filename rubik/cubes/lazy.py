@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+#
+# Copyright 2014 Simone Campagna
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+__author__ = "Simone Campagna"
+
+__all__ = [
+           'LazyCube',
+           'LazyRawFile',
+           'LazyElementwise',
+           'LazyReshape',
+           'lazy_read_cube_raw',
+           'is_lazy',
+           'evaluate',
+          ]
+
+import os
+import threading
+import weakref
+
+import numpy as np
+
+from ..errors import RubikError
+from ..shape import Shape
+from ..units import Memory
+from ..py23 import BASE_STRING
+from .dtypes import get_dtype
+from .memory_governor import get_memory_governor
+from .internals import timed_read
+
+class LazyCube(np.lib.mixins.NDArrayOperatorsMixin):
+    """LazyCube(shape, dtype)
+    A deferred cube: elementwise numpy operations on LazyCube objects build an
+    expression graph, which is evaluated block by block only when it is
+    consumed (see iter_blocks(), tofile(), stats_info(), histogram()).
+    Blocks are contiguous ranges of the cube's flat (C order) elements.
+    Any other use of a LazyCube (indexing, non elementwise numpy functions,
+    ...) evaluates the whole cube.
+    A LazyCube is read-only: item assignment and in-place methods (such as
+    fill() or sort()) raise a RubikError, since they would only change a
+    temporary evaluated copy; use evaluate() to get a writable cube.
+    The 'buffer_size' of a node, if set, limits the blocks of every
+    expression using it (see get_buffer_size()).
+    """
+    DEFAULT_BUFFER_SIZE = Memory('64mb')
+    INPLACE_METHODS = ('fill', 'itemset', 'partition', 'put', 'resize', 'setfield', 'sort')
+    def __init__(self, shape, dtype, buffer_size=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.set_buffer_size(buffer_size)
+
+    def set_buffer_size(self, buffer_size):
+        if buffer_size is not None:
+            buffer_size = Memory(buffer_size)
+        self.buffer_size = buffer_size
+
+    def get_buffer_size(self):
+        """self.get_buffer_size() -> the smallest buffer size of the nodes in
+           the expression graph (default: LazyCube.DEFAULT_BUFFER_SIZE)"""
+        buffer_sizes = [child.get_buffer_size() for child in self.children()]
+        if self.buffer_size is not None:
+            buffer_sizes.append(self.buffer_size)
+        if not buffer_sizes:
+            return self.DEFAULT_BUFFER_SIZE
+        return min(buffer_sizes, key=lambda buffer_size: buffer_size.get_bytes())
+
+    @property
+    def size(self):
+        size = 1
+        for dim in self.shape:
+            size *= dim
+        return size
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return "{}(shape={}, dtype={})".format(type(self).__name__, Shape(self.shape), self.dtype.name)
+
+    def children(self):
+        """self.children() -> LazyCube arguments of this node"""
+        return ()
+
+    def block_itemsize(self):
+        """self.block_itemsize() -> bytes needed by each element of a block,
+           for all the nodes in the expression graph"""
+        return self.dtype.itemsize + sum(child.block_itemsize() for child in self.children())
+
+    def read_block(self, start, stop):
+        """self.read_block(start, stop) -> 1D numpy.ndarray
+           returns the flat elements [start, stop) of the cube"""
+        raise NotImplementedError("{}.read_block".format(type(self).__name__))
+
+    def iter_blocks(self, buffer_size=None):
+        """self.iter_blocks(buffer_size=None) -> iterates over 1D blocks
+           the whole expression graph needs at most 'buffer_size' bytes per
+           block (default: self.get_buffer_size())"""
+        if buffer_size is None:
+            buffer_size = self.get_buffer_size()
+        block_count = max(1, Memory(buffer_size).get_bytes() // self.block_itemsize())
+        count = self.size
+        start = 0
+        while start < count:
+            stop = min(count, start + block_count)
+            yield self.read_block(start, stop)
+            start = stop
+
+    def evaluate(self):
+        """self.evaluate() -> numpy.ndarray
+           evaluates the whole cube; the memory limit is checked before"""
+        memory_governor = get_memory_governor()
+        memory_governor.check(self.size * self.dtype.itemsize, what="evaluating {!r}".format(self))
+        return memory_governor.track(self.read_block(0, self.size).reshape(self.shape))
+
+    def __array__(self, dtype=None, copy=None):
+        cube = self.evaluate()
+        if dtype is not None:
+            cube = cube.astype(dtype)
+        return cube
+
+    def __getitem__(self, key):
+        return self.evaluate()[key]
+
+    def _read_only_error(self, what):
+        return RubikError("cannot {} lazy cube {!r}: lazy cubes are read-only, evaluate it first (for instance, i0 = cb.evaluate(i0))".format(what, self))
+
+    def __setitem__(self, key, value):
+        raise self._read_only_error("assign items of")
+
+    def __getattr__(self, attr):
+        # numpy.ndarray methods and attributes not provided by LazyCube
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        if attr in self.INPLACE_METHODS:
+            raise self._read_only_error("call {}() on".format(attr))
+        return getattr(self.evaluate(), attr)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method == '__call__' and ufunc.nout == 1 and not 'out' in kwargs \
+           and LazyElementwise.accepts(self.shape, inputs):
+            return LazyElementwise(ufunc, inputs, kwargs, shape=self.shape)
+        inputs = tuple(evaluate(i) for i in inputs)
+        if 'out' in kwargs:
+            kwargs['out'] = tuple(evaluate(o) for o in kwargs['out'])
+        return getattr(ufunc, method)(*inputs, **kwargs)
+
+    def astype(self, dtype):
+        """self.astype(dtype) -> LazyCube"""
+        dtype = np.dtype(dtype)
+        return LazyElementwise(lambda block: block.astype(dtype), (self, ), {}, shape=self.shape)
+
+    def reshape(self, *shape):
+        """self.reshape(shape) -> LazyCube"""
+        if len(shape) == 1:
+            shape = shape[0]
+        return LazyReshape(self, shape)
+
+    def tofile(self, fid, sep="", format="%s", buffer_size=None):
+        """self.tofile(fid, sep="", format="%s", buffer_size=None)
+           same as numpy.ndarray.tofile, block by block"""
+        if isinstance(fid, BASE_STRING):
+            with open(fid, "wb") as f_out:
+                self.tofile(f_out, sep=sep, format=format, buffer_size=buffer_size)
+            return
+        first = True
+        for block in self.iter_blocks(buffer_size=buffer_size):
+            if sep and not first:
+                fid.write(sep.encode())
+            block.tofile(fid, sep=sep, format=format)
+            first = False
+
+class LazyRawFile(LazyCube):
+    """LazyRawFile(filename, shape, dtype=None, offset=0, buffer_size=None)
+    A LazyCube reading a 'raw' file; the file is opened once, at the first
+    read, and closed when the LazyRawFile is garbage collected"""
+    def __init__(self, filename, shape, dtype=None, offset=0, buffer_size=None):
+        dtype = get_dtype(dtype)
+        super(LazyRawFile, self).__init__(Shape(shape).shape(), dtype, buffer_size=buffer_size)
+        self.filename = filename
+        self.offset = offset
+        self._file = None
+        self._lock = threading.Lock()
+        if not os.path.isfile(filename):
+            raise RubikError("missing input file {0}".format(filename))
+
+    def read_block(self, start, stop):
+        count = stop - start
+        with self._lock, timed_read(count * self.dtype.itemsize):
+            if self._file is None:
+                self._file = open(self.filename, "rb")
+                weakref.finalize(self, self._file.close)
+            f_in = self._file
+            f_in.seek(self.offset + start * self.dtype.itemsize)
+            block = np.fromfile(f_in, dtype=self.dtype, count=count)
+        if block.size != count:
+            raise RubikError("file {}: too short: cannot read {} items at item #{}".format(self.filename, count, start))
+        return block
+
+class LazyElementwise(LazyCube):
+    """LazyElementwise(function, inputs, kwargs, shape)
+    A LazyCube applying an elementwise 'function' (for instance, a numpy
+    ufunc) to its 'inputs'; inputs can be LazyCube objects, numpy arrays with
+    the same shape, or scalars"""
+    def __init__(self, function, inputs, kwargs, shape):
+        self.function = function
+        self.inputs = tuple(self._flat_input(i) for i in inputs)
+        self.kwargs = kwargs
+        empty_inputs = []
+        for i in self.inputs:
+            if isinstance(i, LazyCube):
+                i = np.empty((0, ), dtype=i.dtype)
+            elif isinstance(i, np.ndarray) and i.ndim > 0:
+                i = i[:0]
+            empty_inputs.append(i)
+        dtype = np.asarray(self.function(*empty_inputs, **self.kwargs)).dtype
+        super(LazyElementwise, self).__init__(shape, dtype)
+
+    @classmethod
+    def accepts(cls, shape, inputs):
+        """LazyElementwise.accepts(shape, inputs) -> True if 'inputs' can be
+           lazily combined into a cube with 'shape'"""
+        for i in inputs:
+            if isinstance(i, LazyCube):
+                if i.shape != shape:
+                    return False
+            elif isinstance(i, np.ndarray):
+                if i.ndim > 0 and i.shape != shape:
+                    return False
+            elif not np.isscalar(i):
+                return False
+        return True
+
+    @classmethod
+    def _flat_input(cls, i):
+        if isinstance(i, np.ndarray) and i.ndim > 0:
+            return i.ravel()
+        else:
+            return i
+
+    def children(self):
+        return tuple(i for i in self.inputs if isinstance(i, LazyCube))
+
+    def read_block(self, start, stop):
+        args = []
+        for i in self.inputs:
+            if isinstance(i, LazyCube):
+                i = i.read_block(start, stop)
+            elif isinstance(i, np.ndarray) and i.ndim > 0:
+                i = i[start:stop]
+            args.append(i)
+        return np.asarray(self.function(*args, **self.kwargs))
+
+class LazyReshape(LazyCube):
+    """LazyReshape(cube, shape)
+    A LazyCube with the same flat elements as 'cube', and a different shape"""
+    def __init__(self, cube, shape):
+        if isinstance(shape, int):
+            shape = (shape, )
+        shape = tuple(shape)
+        if shape.count(-1) == 1:
+            known = 1
+            for dim in shape:
+                if dim != -1:
+                    known *= dim
+            if known:
+                shape = tuple(cube.size // known if dim == -1 else dim for dim in shape)
+        size = 1
+        for dim in shape:
+            size *= dim
+        if size != cube.size:
+            raise RubikError("cannot reshape {} elements to shape {}".format(cube.size, shape))
+        super(LazyReshape, self).__init__(shape, cube.dtype)
+        self.cube = cube
+
+    def children(self):
+        return (self.cube, )
+
+    def block_itemsize(self):
+        return self.cube.block_itemsize()
+
+    def read_block(self, start, stop):
+        return self.cube.read_block(start, stop)
+
+def lazy_read_cube_raw(filename, shape, dtype=None, offset=0, buffer_size=None):
+    """lazy_read_cube_raw(filename, shape, dtype=None, offset=0, buffer_size=None) -> LazyCube
+       returns a LazyCube reading 'filename' only when it is evaluated, in
+       blocks of at most 'buffer_size' bytes"""
+    return LazyRawFile(filename, shape=shape, dtype=dtype, offset=offset, buffer_size=buffer_size)
+
+def is_lazy(cube):
+    """is_lazy(cube) -> True if cube is a LazyCube"""
+    return isinstance(cube, LazyCube)
+
+def evaluate(cube):
+    """evaluate(cube) -> cube
+       evaluates 'cube' if it is a LazyCube, otherwise returns it unchanged"""
+    if isinstance(cube, LazyCube):
+        return cube.evaluate()
+    else:
+        return cube
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+#
+# Copyright 2014 Simone Campagna
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+__author__ = "Simone Campagna"
+
+__all__ = [
+           'MemoryGovernor',
+           'get_memory_governor',
+           'set_memory_limit',
+           'is_memory_mapped',
+          ]
+
+import gc
+import threading
+import weakref
+
+import numpy as np
+
+from ..errors import RubikMemoryError
+from ..units import Memory
+
+class MemoryGovernor(object):
+    """MemoryGovernor(limit=None)
+    Tracks the memory of the live cubes allocated by rubik (read, created,
+    evaluated, or computed by expressions), and enforces 'limit' before
+    new cubes are allocated. A cube is tracked until it is garbage
+    collected; views share the memory of their base cube, and memory mapped
+    cubes are not counted. A null limit means no limit.
+    """
+    def __init__(self, limit=None):
+        self._lock = threading.Lock()
+        self._cubes = {}
+        self._allocated = 0
+        self.set_limit(limit)
+
+    def set_limit(self, limit):
+        if limit is None:
+            limit = 0
+        self.limit = Memory(limit)
+        self.limit_bytes = self.limit.get_bytes()
+
+    def allocated(self):
+        """self.allocated() -> bytes of the live tracked cubes"""
+        return self._allocated
+
+    def available(self):
+        """self.available() -> bytes that can be allocated, or None if there is no limit"""
+        if self.limit_bytes <= 0:
+            return None
+        return max(0, self.limit_bytes - self._allocated)
+
+    def fits(self, num_bytes):
+        """self.fits(num_bytes) -> True if 'num_bytes' can be allocated"""
+        if self.limit_bytes <= 0:
+            return True
+        if self._allocated + num_bytes > self.limit_bytes:
+            # cubes kept alive only by reference cycles are still tracked
+            gc.collect()
+        return self._allocated + num_bytes <= self.limit_bytes
+
+    def exceeded(self):
+        """self.exceeded() -> True if the live cubes exceed the limit"""
+        return not self.fits(0)
+
+    def check(self, num_bytes, what="cube"):
+        """self.check(num_bytes, what="cube")
+           raises RubikMemoryError if 'num_bytes' cannot be allocated"""
+        if not self.fits(num_bytes):
+            raise RubikMemoryError("cannot allocate {} bytes for {}: {} bytes already allocated, memory limit is {}".format(
+                num_bytes, what, self._allocated, self.limit))
+
+    def track(self, cube):
+        """self.track(cube) -> cube
+           tracks the memory of 'cube' (any object other than a
+           numpy.ndarray is ignored) until it is garbage collected"""
+        if not isinstance(cube, np.ndarray):
+            return cube
+        base = _base_cube(cube)
+        if isinstance(base, np.memmap) or not base.flags.owndata:
+            return cube
+        key = id(base)
+        with self._lock:
+            if key in self._cubes:
+                return cube
+            num_bytes = base.nbytes
+            self._cubes[key] = num_bytes
+            self._allocated += num_bytes
+        weakref.finalize(base, self._release, key)
+        return cube
+
+    def _release(self, key):
+        with self._lock:
+            num_bytes = self._cubes.pop(key, 0)
+            self._allocated -= num_bytes
+
+def _base_cube(cube):
+    base = cube
+    while isinstance(base.base, np.ndarray):
+        base = base.base
+    return base
+
+def is_memory_mapped(cube):
+    """is_memory_mapped(cube) -> True if 'cube' is a numpy.memmap or a view of it"""
+    return isinstance(cube, np.ndarray) and isinstance(_base_cube(cube), np.memmap)
+
+MEMORY_GOVERNOR = MemoryGovernor()
+
+def get_memory_governor():
+    """get_memory_governor() -> the MemoryGovernor used by rubik"""
+    return MEMORY_GOVERNOR
+
+def set_memory_limit(limit):
+    """set_memory_limit(limit)
+       sets the memory limit of the MemoryGovernor used by rubik"""
+    MEMORY_GOVERNOR.set_limit(limit)
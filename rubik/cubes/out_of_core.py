@@ -21,17 +21,30 @@ __all__ = [
            'filelist',
            'multiopen',
            'BlockReader',
+           'split_range',
+           'map_ranges',
+           'imap_ahead',
+           'worker_max_memory',
+           'get_prefetch_pool',
+           'prefetch_pool',
           ]
 
 import numpy as np
+import collections
 import contextlib
+import multiprocessing
+import threading
 import os
+from multiprocessing.pool import ThreadPool
 
+from .. import conf
 from ..errors import RubikError
 from ..units import Memory
 from ..shape import Shape
 from ..py23 import BASE_STRING
 from .dtypes import get_dtype
+from .chunked import ChunkedFile
+from .internals import get_default_workers
 
 def filelist(filenames):
     if isinstance(filenames, BASE_STRING):
@@ -49,13 +62,80 @@ def multiopen(filenames, mode):
     yield filehandles
     for filehandle in filehandles:
         filehandle.close()
-    
+
+PREFETCH_POOL = None
+PREFETCH_POOL_USERS = {}
+PREFETCH_POOL_LOCK = threading.Lock()
+
+def _current_prefetch_pool():
+    global PREFETCH_POOL
+    threads = max(1, get_default_workers())
+    pid = os.getpid()
+    retired_pool = None
+    if PREFETCH_POOL is not None:
+        pool, pool_threads, pool_pid = PREFETCH_POOL
+        if pool_pid != pid:
+            # inherited by a forked worker process: its threads do not exist
+            PREFETCH_POOL = None
+            PREFETCH_POOL_USERS.clear()
+        elif pool_threads != threads:
+            # closed now, or by its last user
+            PREFETCH_POOL = None
+            if not PREFETCH_POOL_USERS.get(pool):
+                retired_pool = pool
+    if PREFETCH_POOL is None:
+        PREFETCH_POOL = (ThreadPool(processes=threads), threads, pid)
+    return PREFETCH_POOL[0], retired_pool
+
+def _close_pool(pool):
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+def get_prefetch_pool():
+    """get_prefetch_pool() -> multiprocessing.pool.ThreadPool
+    returns the thread pool shared by all the BlockReader objects to read
+    blocks in advance; it has get_default_workers() threads (see '--workers').
+    When the number of workers changes, a new pool is created; the old one
+    is closed when its last user (see prefetch_pool()) is done.
+    """
+    with PREFETCH_POOL_LOCK:
+        pool, retired_pool = _current_prefetch_pool()
+    _close_pool(retired_pool)
+    return pool
+
+@contextlib.contextmanager
+def prefetch_pool():
+    """with prefetch_pool() as pool: ...
+    uses the shared prefetch pool (see get_prefetch_pool()); the pool is
+    not closed while it is used"""
+    with PREFETCH_POOL_LOCK:
+        pool, retired_pool = _current_prefetch_pool()
+        PREFETCH_POOL_USERS[pool] = PREFETCH_POOL_USERS.get(pool, 0) + 1
+    _close_pool(retired_pool)
+    try:
+        yield pool
+    finally:
+        with PREFETCH_POOL_LOCK:
+            PREFETCH_POOL_USERS[pool] -= 1
+            if PREFETCH_POOL_USERS[pool] == 0 and (PREFETCH_POOL is None or PREFETCH_POOL[0] is not pool):
+                del PREFETCH_POOL_USERS[pool]
+                retired_pool = pool
+            else:
+                retired_pool = None
+        _close_pool(retired_pool)
+
 class BlockReader(object):
     """BlockReader(...)
-    A BlockReader object allows to read blocks from a list of files
+    A BlockReader object allows to read blocks from a list of files.
+    If 'read_ahead' is greater than 0, up to 'read_ahead' blocks per file are
+    read in advance by the shared thread pool (see get_prefetch_pool()),
+    while the previous blocks are still being processed; the blocks of
+    different files are read concurrently.
     """
     DEFAULT_BLOCK_SIZE = Memory('1gb')
-    def __init__(self, count, dtype=None, buffer_size=None, max_memory=None):
+    DEFAULT_READ_AHEAD = 0
+    def __init__(self, count, dtype=None, buffer_size=None, max_memory=None, read_ahead=None, file_format='raw'):
         if isinstance(count, Shape):
             count = count.count()
         if isinstance(count, (BASE_STRING, tuple)):
@@ -70,6 +150,15 @@ class BlockReader(object):
         if max_memory is not None:
             max_memory = Memory(max_memory)
         self.max_memory = max_memory
+        if read_ahead is None:
+            read_ahead = self.DEFAULT_READ_AHEAD
+        if read_ahead < 0:
+            raise RubikError("invalid read_ahead {}: it must be >= 0".format(read_ahead))
+        self.read_ahead = read_ahead
+        if not file_format in (conf.FILE_FORMAT_RAW, conf.FILE_FORMAT_CHUNKED):
+            raise RubikError("invalid file format {0!r}: BlockReader supports {1!r} and {2!r} files".format(
+                             file_format, conf.FILE_FORMAT_RAW, conf.FILE_FORMAT_CHUNKED))
+        self.file_format = file_format
         self.filesize_b = self.count * self.itemsize_b
 
     def check_files(self, filenames):
@@ -78,6 +167,13 @@ class BlockReader(object):
         for filename in filenames:
             if not os.path.exists(filename):
                 raise RubikError("file {} does not exists".format(filename))
+            if self.file_format == conf.FILE_FORMAT_CHUNKED:
+                with open(filename, 'rb') as filehandle:
+                    chunked_file = ChunkedFile(filehandle, filename)
+                if chunked_file.count != self.count:
+                    raise RubikError("file {f}: it contains {ci} items, expected {ei}".format(
+                                     f=filename, ci=chunked_file.count, ei=self.count))
+                continue
             filesize_b = os.stat(filename).st_size
             if filesize_b != self.filesize_b:
                 if filesize_b < self.filesize_b:
@@ -92,48 +188,132 @@ class BlockReader(object):
                                  ei=self.filesize_b // self.itemsize_b,
                                  eb=self.filesize_b))
         
-    def read(self, filenames):
-        """self.read(filenames) -> iterates over read blocks
-           reads and yields blocks from filenames"""
-        filenames = filelist(filenames)
-        self.check_files(filenames)
-        if not filenames:
-            return
+    def get_block_count(self, num_files):
+        """self.get_block_count(num_files) -> number of items per block
+           the memory limit is shared among all the blocks that can be alive
+           at the same time: one per file, plus the read-ahead ones"""
         if self.max_memory is None:
-            max_memory_b = self.count * self.itemsize_b * len(filenames)
+            max_memory_b = self.count * self.itemsize_b * num_files
         else:
             max_memory_b = self.max_memory.get_bytes()
+            if self.read_ahead:
+                max_memory_b //= self.read_ahead + 2
         if self.buffer_size is None:
             buffer_size = self.DEFAULT_BLOCK_SIZE.get_bytes()
         else:
             buffer_size = self.buffer_size.get_bytes()
-        max_buffer_size = min(max_memory_b // len(filenames), buffer_size)
-        block_count = max(1, max_buffer_size // self.itemsize_b)
-        expected_count = self.count
-        read_count = 0
+        max_buffer_size = min(max_memory_b // num_files, buffer_size)
+        return max(1, max_buffer_size // self.itemsize_b)
+
+    def iter_step_counts(self, block_count, start, stop):
+        """self.iter_step_counts(block_count, start, stop) -> iterates over block sizes"""
+        read_count = start
+        while read_count < stop:
+            step_count = min(stop - read_count, block_count)
+            yield read_count, step_count
+            read_count += step_count
+
+    def read_block(self, filename, filehandle, read_count, step_count):
+        """self.read_block(filename, filehandle, read_count, step_count) -> block
+           reads the next 'step_count' items from filehandle"""
+        #print "reading {} items from {}".format(step_count, filename)
+        if isinstance(filehandle, ChunkedFile):
+            return filehandle.read_flat(read_count, read_count + step_count).astype(self.dtype, copy=False)
+        block = np.fromfile(filehandle, dtype=self.dtype, count=step_count)
+        if block.size < step_count:
+            raise RubikError("file {}: too short, read {} items, expected {}".format(
+                             filename, read_count + block.size, self.count))
+        return block
+
+    def check_end(self, filename, filehandle):
+        """self.check_end(filename, filehandle)
+           raise an exception if filehandle is not at end of file"""
+        if isinstance(filehandle, ChunkedFile):
+            return
+        if filehandle.read(1):
+            raise RubikError("file {}: too long, read {} items, expected {}".format(
+                             filename, self.count + 1, self.count))
+
+    def read(self, filenames, start=0, stop=None):
+        """self.read(filenames, start=0, stop=None) -> iterates over read blocks
+           reads and yields blocks from filenames; only the items in the
+           range [start, stop) are read"""
+        filenames = filelist(filenames)
+        self.check_files(filenames)
+        if not filenames:
+            return
+        if stop is None:
+            stop = self.count
+        if not 0 <= start <= stop <= self.count:
+            raise RubikError("invalid range [{}, {}) for {} items".format(start, stop, self.count))
+        block_count = self.get_block_count(len(filenames))
         with multiopen(filenames, 'rb') as filehandles:
-            while read_count < expected_count:
-                blocks = []
-                step_count = min(expected_count - read_count, block_count)
-                if step_count == 0:
-                    break 
-                for filename, filehandle in zip(filenames, filehandles):
-                    #print "reading {} items from {}".format(step_count, filename)
-                    block = np.fromfile(filehandle, dtype=self.dtype, count=step_count)
-                    if block.size < step_count:
-                        raise RubikError("file {}: too short, read {} items, expected {}".format(
-                                         filename, read_count + block.size, expected_count))
-                    elif block.size < step_count:
-                        raise RubikError("file {}: internal error, tring to read {} items, {} read".format(
-                                         filename, step_count, block.size))
-                    blocks.append(block)
-                yield tuple(blocks)
-                read_count += step_count
+            if self.file_format == conf.FILE_FORMAT_CHUNKED:
+                filehandles = tuple(ChunkedFile(filehandle, filename) for filename, filehandle in zip(filenames, filehandles))
+            elif start:
+                for filehandle in filehandles:
+                    filehandle.seek(start * self.itemsize_b)
+            if self.read_ahead:
+                blocks_iterator = self.read_prefetch(filenames, filehandles, block_count, start, stop)
+            else:
+                blocks_iterator = self.read_serial(filenames, filehandles, block_count, start, stop)
+            try:
+                for blocks in blocks_iterator:
+                    yield blocks
+            finally:
+                blocks_iterator.close()
+
+    def read_serial(self, filenames, filehandles, block_count, start, stop):
+        for read_count, step_count in self.iter_step_counts(block_count, start, stop):
+            blocks = []
+            for filename, filehandle in zip(filenames, filehandles):
+                blocks.append(self.read_block(filename, filehandle, read_count, step_count))
+            yield tuple(blocks)
+        if stop == self.count:
             for filename, filehandle in zip(filenames, filehandles):
-                if filehandle.read(1):
-                    raise RubikError("file {}: too long, read {} items, expected {}".format(
-                                         filename, read_count + 1, expected_count))
- 
+                self.check_end(filename, filehandle)
+
+    def read_block_at(self, filename, filehandle, lock, read_count, step_count):
+        """self.read_block_at(filename, filehandle, lock, read_count, step_count) -> block
+           reads 'step_count' items starting at item 'read_count'; 'lock'
+           serializes the reads from filehandle"""
+        with lock:
+            if not isinstance(filehandle, ChunkedFile):
+                filehandle.seek(read_count * self.itemsize_b)
+            return self.read_block(filename, filehandle, read_count, step_count)
+
+    def read_prefetch(self, filenames, filehandles, block_count, start, stop):
+        with prefetch_pool() as pool:
+            locks = tuple(threading.Lock() for filehandle in filehandles)
+            step_counts = self.iter_step_counts(block_count, start, stop)
+            pending = collections.deque()
+
+            def submit():
+                for read_count, step_count in step_counts:
+                    pending.append(tuple(
+                        pool.apply_async(self.read_block_at, (filename, filehandle, lock, read_count, step_count))
+                        for filename, filehandle, lock in zip(filenames, filehandles, locks)))
+                    return True
+                return False
+
+            try:
+                while True:
+                    # the current block, and up to 'read_ahead' blocks in advance
+                    while len(pending) <= self.read_ahead and submit():
+                        pass
+                    if not pending:
+                        break
+                    yield tuple(result.get() for result in pending.popleft())
+            finally:
+                # the files are closed after the pending reads
+                for results in pending:
+                    for result in results:
+                        result.wait()
+        if stop == self.count:
+            for filename, filehandle in zip(filenames, filehandles):
+                if not isinstance(filehandle, ChunkedFile):
+                    filehandle.seek(self.filesize_b)
+                self.check_end(filename, filehandle)
 
     def reduce(self, filenames, function, *n_args, **p_args):
         """self.reduce(filenames, function, *n_args, **p_args) -> reduce result
@@ -146,3 +326,80 @@ class BlockReader(object):
             result = function(blocks, *n_args, **p_args)
         return result
 
+def split_range(count, num_parts):
+    """split_range(count, num_parts) -> list of (start, stop) ranges
+    splits the range [0, count) in 'num_parts' contiguous ranges of almost the
+    same size; empty ranges are discarded"""
+    num_parts = max(1, min(num_parts, count))
+    ranges = []
+    for part in range(num_parts):
+        start = (count * part) // num_parts
+        stop = (count * (part + 1)) // num_parts
+        if stop > start:
+            ranges.append((start, stop))
+    return ranges
+
+def worker_max_memory(max_memory, workers):
+    """worker_max_memory(max_memory, workers) -> Memory or None
+    returns the share of 'max_memory' available to each of 'workers' workers"""
+    if max_memory is None:
+        return None
+    else:
+        return Memory(max(1, Memory(max_memory).get_bytes() // workers))
+
+def map_ranges(function, count, workers, args):
+    """map_ranges(function, count, workers, args) -> iterates over results
+    splits the range [0, count) in 'workers' ranges, and executes
+    function(args + (start, stop)) for each range on a pool of 'workers'
+    processes. The results are yielded in range order.
+    'function' must be a module-level function, since it has to be pickled.
+    """
+    tasks = [tuple(args) + (start, stop) for start, stop in split_range(count, workers)]
+    pool = multiprocessing.Pool(processes=workers)
+    try:
+        for result in pool.imap(function, tasks):
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+def imap_ahead(function, tasks, workers):
+    """imap_ahead(function, tasks, workers) -> iterates over results
+    yields function(*task) for each task, in order. If 'workers' is > 1,
+    tasks are executed by a pool of 'workers' processes, up to 2 tasks per
+    worker in advance, while the results are consumed; the first task is
+    executed in this process, so a single task never starts the pool.
+    'function' must be a module-level function, and tasks must not share
+    buffers which are changed while the tasks are pending.
+    """
+    if workers <= 1:
+        for task in tasks:
+            yield function(*task)
+        return
+    max_pending = 2 * workers
+    pending = collections.deque()
+    pool = None
+    def get_result(task, async_result):
+        if async_result is None:
+            return function(*task)
+        else:
+            return async_result.get()
+    try:
+        for task in tasks:
+            if pending:
+                if pool is None:
+                    pool = multiprocessing.Pool(processes=workers)
+                pending.append((task, pool.apply_async(function, task)))
+            else:
+                pending.append((task, None))
+            while len(pending) >= max_pending:
+                yield get_result(*pending.popleft())
+        while pending:
+            yield get_result(*pending.popleft())
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+#
+# Copyright 2014 Simone Campagna
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+__author__ = "Simone Campagna"
+
+__all__ = [
+           'ReadPlan',
+           'RegionsReadPlan',
+          ]
+
+import heapq
+
+import numpy as np
+
+from ..errors import RubikError
+from ..shape import Shape
+from ..units import Memory
+from ..extractor import Extractor
+from .dtypes import get_dtype
+from .internals import timed_read
+
+def _readinto(input_file, offset, buf):
+    """_readinto(input_file, offset, buf)
+       fills the numpy array 'buf' with the bytes of 'input_file' at 'offset'"""
+    view = memoryview(buf).cast('B')
+    with timed_read(len(view)):
+        input_file.seek(offset)
+        while view:
+            num_bytes = input_file.readinto(view)
+            if not num_bytes:
+                raise RubikError("file too short: cannot read {} bytes at offset {}".format(len(view), offset))
+            view = view[num_bytes:]
+            offset += num_bytes
+
+def _prod(values):
+    result = 1
+    for value in values:
+        result *= value
+    return result
+
+class ReadPlan(object):
+    """ReadPlan(shape, dtype=None, extractor=None, max_gap=None, max_span=None)
+    The plan to read the subcube extracted by 'extractor' from a 'raw' cube
+    with the given 'shape' and 'dtype'.
+    The subcube is a lattice of 'runs': ranges of elements which are
+    contiguous both in the file and in the subcube. Each outer dimension is
+    a level of the lattice, with a count and a uniform step, so the plan
+    never stores the runs. Nearby runs are coalesced into a single read if
+    they are separated by at most 'max_gap' bytes: contiguous runs are read
+    directly into the output cube, the others into a scratch buffer of at
+    most 'max_span' bytes, from which the runs are copied.
+    """
+    DEFAULT_MAX_GAP = Memory('64kb')
+    DEFAULT_MAX_SPAN = Memory('64mb')
+    BATCH_SIZE = 65536
+    def __init__(self, shape, dtype=None, extractor=None, max_gap=None, max_span=None):
+        shape = Shape(shape)
+        self.shape = shape
+        self.dtype = np.dtype(get_dtype(dtype))
+        self.itemsize = self.dtype.itemsize
+        if max_gap is None:
+            max_gap = self.DEFAULT_MAX_GAP
+        self.max_gap = Memory(max_gap)
+        if max_span is None:
+            max_span = self.DEFAULT_MAX_SPAN
+        self.max_span = Memory(max_span)
+        if extractor is None:
+            index_pickers = ()
+        else:
+            if not isinstance(extractor, Extractor):
+                extractor = Extractor(extractor)
+            index_pickers = extractor.index_pickers()
+        dims = tuple(shape.shape())
+        if len(index_pickers) > len(dims):
+            raise RubikError("invalid extractor {} for shape {}".format(extractor, shape))
+        index_pickers = tuple(index_pickers) + (slice(None), ) * (len(dims) - len(index_pickers))
+        self.compute_levels(dims, index_pickers)
+        self.compute_reads()
+
+    def compute_levels(self, dims, index_pickers):
+        """computes the levels (count, step) of the lattice of runs"""
+        # selected indices (first, count, step), ascending, for each dimension
+        selections = []
+        subshape = []
+        flip_axes = []
+        for index_picker, dim in zip(index_pickers, dims):
+            if isinstance(index_picker, slice):
+                start, stop, step = index_picker.indices(dim)
+                num_indices = len(range(start, stop, step))
+                if step < 0:
+                    flip_axes.append(len(subshape))
+                    start += (num_indices - 1) * step
+                    step = -step
+                subshape.append(num_indices)
+            else:
+                index = index_picker
+                if index < 0:
+                    index += dim
+                if not 0 <= index < dim:
+                    raise RubikError("index {} out of range for dimension {}".format(index_picker, dim))
+                start, num_indices, step = index, 1, 1
+            selections.append((start, num_indices, step))
+        self.subshape = tuple(subshape)
+        self.flip_axes = tuple(flip_axes)
+        self.count = _prod(num_indices for start, num_indices, step in selections)
+        strides = []
+        stride = 1
+        for dim in reversed(dims):
+            strides.insert(0, stride)
+            stride *= dim
+        # the trailing dimensions which are completely selected, and the
+        # last contiguous range of indices, form the runs
+        run_count = 1
+        num_outer = len(dims)
+        while num_outer > 0:
+            start, num_indices, step = selections[num_outer - 1]
+            contiguous = num_indices == 1 or (num_indices > 1 and step == 1)
+            if not contiguous:
+                break
+            run_count *= num_indices
+            num_outer -= 1
+            if num_indices != dims[num_outer]:
+                break
+        self.run_count = run_count
+        self.base = sum(start * stride for (start, num_indices, step), stride in zip(selections, strides))
+        self.level_counts = tuple(num_indices for start, num_indices, step in selections[:num_outer])
+        self.level_steps = tuple(step * stride for (start, num_indices, step), stride in zip(selections[:num_outer], strides))
+
+    def compute_reads(self):
+        """computes the reads: each read covers 'chunk' consecutive units of
+           level 'read_level' (a unit of level d is the set of runs with the
+           same indices in the levels before d), inside the same unit of
+           level 'read_level' - 1"""
+        counts = self.level_counts
+        steps = self.level_steps
+        num_levels = len(counts)
+        max_gap_count = self.max_gap.get_bytes() // self.itemsize
+        max_span_count = self.max_span.get_bytes() // self.itemsize
+        # span and contiguity of the units of each level; the runs are the
+        # units of the innermost level
+        spans = [0] * (num_levels + 1)
+        gapless = [True] * (num_levels + 1)
+        spans[num_levels] = self.run_count
+        merged_level = num_levels
+        merging = True
+        for level in range(num_levels - 1, -1, -1):
+            count, step, sub_span = counts[level], steps[level], spans[level + 1]
+            spans[level] = (count - 1) * step + sub_span
+            gapless[level] = gapless[level + 1] and (count == 1 or step == sub_span)
+            if merging and (count == 1 or step - sub_span <= max_gap_count):
+                merged_level = level
+            else:
+                merging = False
+        # all the levels from 'merged_level' on can be read at once, but the
+        # scratch reads are limited to 'max_span'
+        read_level = merged_level
+        while not (gapless[read_level] or spans[read_level] <= max_span_count):
+            read_level += 1
+        if read_level > 0:
+            lead_count, lead_step = counts[read_level - 1], steps[read_level - 1]
+        else:
+            lead_count, lead_step = 1, 0
+        chunk = 1
+        if read_level > merged_level and lead_step > 0:
+            chunk = max(1, min(lead_count, (max_span_count - spans[read_level]) // lead_step + 1))
+        self.read_level = read_level
+        self.unit_span = spans[read_level]
+        self.unit_gapless = gapless[read_level]
+        self.unit_count = _prod(counts[read_level:]) * self.run_count
+        self.lead_count = lead_count
+        self.lead_step = lead_step
+        self.chunk = chunk
+        self.num_chunks = (lead_count + chunk - 1) // chunk
+        self.num_parents = _prod(counts[:max(0, read_level - 1)])
+
+    def read_span(self, chunk):
+        """self.read_span(chunk) -> number of elements read by a read of 'chunk' units"""
+        return (chunk - 1) * self.lead_step + self.unit_span
+
+    def is_direct(self, chunk):
+        """self.is_direct(chunk) -> True if a read of 'chunk' units goes directly to the output cube"""
+        return chunk == 1 and self.unit_gapless
+
+    def num_reads(self):
+        """self.num_reads() -> number of read operations"""
+        if self.count == 0:
+            return 0
+        return self.num_parents * self.num_chunks
+
+    def read_bytes(self):
+        """self.read_bytes() -> number of bytes read (gaps included)"""
+        if self.count == 0:
+            return 0
+        num_full, rest = divmod(self.lead_count, self.chunk)
+        read_count = num_full * self.read_span(self.chunk)
+        if rest:
+            read_count += self.read_span(rest)
+        return self.num_parents * read_count * self.itemsize
+
+    def scratch_bytes(self):
+        """self.scratch_bytes() -> size of the scratch buffer"""
+        if self.count == 0 or self.is_direct(self.chunk):
+            return 0
+        return self.read_span(self.chunk) * self.itemsize
+
+    def plan_bytes(self):
+        """self.plan_bytes() -> memory used by the plan to enumerate the reads"""
+        # starts, chunks, positions and the temporary index arrays of a batch
+        return min(self.num_reads(), self.BATCH_SIZE) * 6 * np.dtype(np.int64).itemsize
+
+    def iter_read_batches(self):
+        """self.iter_read_batches() -> iterator over (starts, chunks, positions)
+           arrays: the first element in the file, the number of units and
+           the position in the flat output cube of at most BATCH_SIZE reads"""
+        num_reads = self.num_reads()
+        parent_counts = self.level_counts[:max(0, self.read_level - 1)]
+        parent_steps = self.level_steps[:len(parent_counts)]
+        lead_size = self.lead_count * self.unit_count
+        for first in range(0, num_reads, self.BATCH_SIZE):
+            read_ids = np.arange(first, min(num_reads, first + self.BATCH_SIZE), dtype=np.int64)
+            parent_ids, chunk_ids = np.divmod(read_ids, self.num_chunks)
+            lead_indices = chunk_ids * self.chunk
+            starts = self.base + lead_indices * self.lead_step
+            if parent_counts:
+                for indices, step in zip(np.unravel_index(parent_ids, parent_counts), parent_steps):
+                    starts += indices * step
+            chunks = np.minimum(self.chunk, self.lead_count - lead_indices)
+            positions = parent_ids * lead_size + lead_indices * self.unit_count
+            yield starts, chunks, positions
+
+    def iter_reads(self):
+        """self.iter_reads() -> iterator over (start, chunk, position) of each read"""
+        for starts, chunks, positions in self.iter_read_batches():
+            for start, chunk, position in zip(starts.tolist(), chunks.tolist(), positions.tolist()):
+                yield start, chunk, position
+
+    def lattice(self, block, start, chunk):
+        """self.lattice(block, start, chunk) -> view of the runs of a read of
+           'chunk' units in 'block', where the read starts at element 'start'"""
+        itemsize = block.itemsize
+        shape = (chunk, ) + self.level_counts[self.read_level:] + (self.run_count, )
+        strides = (self.lead_step, ) + self.level_steps[self.read_level:] + (1, )
+        return np.lib.stride_tricks.as_strided(block[start:], shape=shape,
+                                               strides=tuple(stride * itemsize for stride in strides))
+
+    def copy_read(self, block, start, chunk, flat_out, position):
+        """self.copy_read(block, start, chunk, flat_out, position)
+           copies the runs of a read from 'block' to the flat output cube"""
+        source = self.lattice(block, start, chunk)
+        dest = flat_out[position:position + chunk * self.unit_count]
+        np.copyto(dest.reshape(source.shape), source)
+
+    def read(self, input_file, offset=None, out=None):
+        """self.read(input_file, offset=None, out=None) -> subcube
+           reads the subcube from the file object 'input_file', where the cube
+           starts at 'offset' (by default, the current position); at the end,
+           the file position is just after the cube"""
+        if offset is None:
+            offset = input_file.tell()
+        if out is None:
+            out = np.empty(self.subshape, dtype=self.dtype)
+        flat_out = out.reshape((-1, ))
+        itemsize = self.itemsize
+        scratch = None
+        for start, chunk, position in self.iter_reads():
+            if self.is_direct(chunk):
+                _readinto(input_file, offset + start * itemsize, flat_out[position:position + self.unit_count])
+                continue
+            span = self.read_span(chunk)
+            if scratch is None:
+                scratch = np.empty((self.read_span(self.chunk), ), dtype=self.dtype)
+            block = scratch[:span]
+            _readinto(input_file, offset + start * itemsize, block)
+            self.copy_read(block, 0, chunk, flat_out, position)
+        input_file.seek(offset + self.shape.count() * itemsize)
+        return self.finalize(out)
+
+    def finalize(self, out):
+        """self.finalize(out) -> subcube
+           restores the order of the axes extracted with negative steps"""
+        if self.flip_axes:
+            out = np.ascontiguousarray(np.flip(out, axis=self.flip_axes))
+        return out
+
+class RegionsReadPlan(object):
+    """RegionsReadPlan(shape, dtype=None, extractors=(), max_gap=None, max_span=None)
+    The plan to read the subcubes extracted by each of the 'extractors' from
+    a 'raw' cube with a single forward sweep of the file.
+    The reads of all the regions (see ReadPlan) are merged by file offset
+    and coalesced into blocks of at most 'max_span' bytes; every block is
+    shared by all the regions overlapping it, so overlapping regions are
+    read once.
+    """
+    def __init__(self, shape, dtype=None, extractors=(), max_gap=None, max_span=None):
+        self.read_plans = [ReadPlan(shape, dtype, extractor, max_gap=max_gap, max_span=max_span) for extractor in extractors]
+        read_plan = ReadPlan(shape, dtype, None, max_gap=max_gap, max_span=max_span)
+        self.shape = read_plan.shape
+        self.dtype = read_plan.dtype
+        self.itemsize = read_plan.itemsize
+        self.max_gap = read_plan.max_gap
+        self.max_span = read_plan.max_span
+
+    def iter_blocks(self):
+        """self.iter_blocks() -> iterator over (block_start, block_stop, reads),
+           where 'reads' is the list of (region, start, chunk, position) of
+           the region reads in the block [block_start, block_stop)"""
+        max_gap_count = self.max_gap.get_bytes() // self.itemsize
+        max_span_count = self.max_span.get_bytes() // self.itemsize
+        def _region_reads(region):
+            read_plan = self.read_plans[region]
+            for start, chunk, position in read_plan.iter_reads():
+                yield start, start + read_plan.read_span(chunk), region, chunk, position
+        merged_reads = heapq.merge(*[_region_reads(region) for region in range(len(self.read_plans))])
+        block_start = block_stop = None
+        reads = []
+        for start, stop, region, chunk, position in merged_reads:
+            if reads and (start - block_stop > max_gap_count or max(stop, block_stop) - block_start > max_span_count):
+                yield block_start, block_stop, reads
+                reads = []
+            if not reads:
+                block_start, block_stop = start, stop
+            else:
+                block_stop = max(block_stop, stop)
+            reads.append((region, start, chunk, position))
+        if reads:
+            yield block_start, block_stop, reads
+
+    def num_reads(self):
+        """self.num_reads() -> number of read operations"""
+        return sum(1 for block in self.iter_blocks())
+
+    def read_bytes(self):
+        """self.read_bytes() -> number of bytes read (gaps included)"""
+        return sum(block_stop - block_start for block_start, block_stop, reads in self.iter_blocks()) * self.itemsize
+
+    def read(self, input_file, offset=None):
+        """self.read(input_file, offset=None) -> list of subcubes
+           reads all the subcubes from the file object 'input_file', where the
+           cube starts at 'offset' (by default, the current position); at the
+           end, the file position is just after the cube"""
+        if offset is None:
+            offset = input_file.tell()
+        itemsize = self.itemsize
+        outs = [np.empty(read_plan.subshape, dtype=self.dtype) for read_plan in self.read_plans]
+        flat_outs = [out.reshape((-1, )) for out in outs]
+        scratch = None
+        for block_start, block_stop, reads in self.iter_blocks():
+            span = block_stop - block_start
+            if len(reads) == 1:
+                region, start, chunk, position = reads[0]
+                read_plan = self.read_plans[region]
+                if read_plan.is_direct(chunk):
+                    dest = flat_outs[region][position:position + read_plan.unit_count]
+                    _readinto(input_file, offset + start * itemsize, dest)
+                    continue
+            if scratch is None or len(scratch) < span:
+                scratch = np.empty((span, ), dtype=self.dtype)
+            block = scratch[:span]
+            _readinto(input_file, offset + block_start * itemsize, block)
+            for region, start, chunk, position in reads:
+                self.read_plans[region].copy_read(block, start - block_start, chunk, flat_outs[region], position)
+        input_file.seek(offset + self.shape.count() * itemsize)
+        return [read_plan.finalize(out) for read_plan, out in zip(self.read_plans, outs)]
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+#
+# Copyright 2014 Simone Campagna
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+__author__ = "Simone Campagna"
+
+__all__ = [
+           'ReadCost',
+           'ReadPlanner',
+          ]
+
+import collections
+
+import numpy as np
+
+from .. import conf
+from ..errors import RubikError
+from ..shape import Shape
+from ..units import Memory
+from ..extractor import Extractor
+from .dtypes import get_dtype
+from .read_plan import ReadPlan
+
+class ReadCost(collections.namedtuple('ReadCostBase', ('strategy', 'reads', 'read_bytes', 'memory_bytes', 'cost'))):
+    """ReadCost(strategy, reads, read_bytes, memory_bytes, cost)
+       the estimated cost of a read strategy: 'reads' is the number of read
+       operations (each one needs a seek), 'read_bytes' the number of bytes
+       read (None if unknown, for instance for text files), 'memory_bytes'
+       the memory needed to read the cube"""
+    __slots__ = ()
+    def __str__(self):
+        if self.read_bytes is None:
+            read_bytes = "the whole file"
+        else:
+            read_bytes = "{} bytes".format(self.read_bytes)
+        return "{}: {} reads, {} read, {} bytes of memory".format(self.strategy, self.reads, read_bytes, self.memory_bytes)
+
+class ReadPlanner(object):
+    """ReadPlanner(file_format, shape, dtype=None, extractor=None,
+           threshold_size=conf.DEFAULT_READ_THRESHOLD_SIZE, mmap=False,
+           seek_size=None)
+    Estimates the cost of each strategy available to read the subcube
+    extracted by 'extractor' from a cube with the given 'shape', 'dtype'
+    and 'file_format', and chooses the cheapest one. The cost is the
+    number of bytes read, plus 'seek_size' bytes for each read operation
+    ('seek_size' is the amount of data which can be read in the time of a
+    seek), plus the memory needed; equal costs are compared by memory.
+    The strategies are:
+    * 'full': the whole cube is read, then the extractor is applied;
+    * 'seek': the unneeded indices of the slowest dimension are skipped,
+      recursively, until the subcube is less than 'threshold_size' bytes;
+    * 'coalesced' ('raw' files): the runs of elements contiguous in the
+      file are read through a ReadPlan;
+    * 'mmap' ('raw' files, if 'mmap' is True): the file is memory mapped,
+      and data are read only when accessed; since the cube is a view on the
+      file, this is the only strategy available;
+    * 'chunked' ('chunked' files): only the touched chunks are read.
+    A null or negative 'threshold_size' forces the 'full' strategy.
+    """
+    STRATEGY_FULL = 'full'
+    STRATEGY_SEEK = 'seek'
+    STRATEGY_COALESCED = 'coalesced'
+    STRATEGY_MMAP = 'mmap'
+    STRATEGY_CHUNKED = 'chunked'
+    DEFAULT_SEEK_SIZE = Memory('256kb')
+    def __init__(self, file_format, shape, dtype=None, extractor=None,
+                 threshold_size=conf.DEFAULT_READ_THRESHOLD_SIZE, mmap=False, seek_size=None):
+        if not file_format in conf.FILE_FORMATS:
+            raise RubikError("invalid file format {0}".format(file_format))
+        self.file_format = file_format
+        if not isinstance(shape, Shape):
+            shape = Shape(shape)
+        self.shape = shape
+        self.dtype = np.dtype(get_dtype(dtype))
+        self.itemsize = self.dtype.itemsize
+        if extractor is not None and not isinstance(extractor, Extractor):
+            extractor = Extractor(extractor)
+        self.extractor = extractor
+        self.threshold_size = Memory(threshold_size)
+        self.mmap = mmap
+        if seek_size is None:
+            seek_size = self.DEFAULT_SEEK_SIZE
+        self.seek_size = Memory(seek_size)
+        self._estimates = None
+        self._read_plan = None
+
+    def get_index_pickers(self):
+        dims = self.shape.shape()
+        if self.extractor is None:
+            index_pickers = ()
+        else:
+            index_pickers = self.extractor.index_pickers()
+        return tuple(index_pickers) + (slice(None), ) * (len(dims) - len(index_pickers))
+
+    def get_counts(self):
+        """self.get_counts() -> (count, sub_count)"""
+        dims = self.shape.shape()
+        count = 1
+        sub_count = 1
+        for index_picker, dim in zip(self.get_index_pickers(), dims):
+            count *= dim
+            if isinstance(index_picker, slice):
+                sub_count *= len(range(*index_picker.indices(dim)))
+        return count, sub_count
+
+    def make_cost(self, strategy, reads, read_bytes, memory_bytes):
+        cost = reads * self.seek_size.get_bytes() + memory_bytes
+        if read_bytes is not None:
+            cost += read_bytes
+        return ReadCost(strategy=strategy, reads=reads, read_bytes=read_bytes, memory_bytes=memory_bytes, cost=cost)
+
+    def estimate_seek(self):
+        """self.estimate_seek() -> (reads, read_count, memory_count)
+           the reads of the 'seek' strategy (see ExtractReader.impl_read())"""
+        threshold_count = max(1, self.threshold_size.get_bytes() // self.itemsize)
+        dims = self.shape.shape()
+        index_pickers = self.get_index_pickers()
+        def _estimate(level):
+            sub_dims = dims[level:]
+            count = 1
+            sub_count = 1
+            for index_picker, dim in zip(index_pickers[level:], sub_dims):
+                count *= dim
+                if isinstance(index_picker, slice):
+                    sub_count *= len(range(*index_picker.indices(dim)))
+            if len(sub_dims) <= 1 or not (sub_count < count and count > threshold_count):
+                return 1, count
+            index_picker = index_pickers[level]
+            if isinstance(index_picker, slice):
+                num_indices = len(range(*index_picker.indices(dims[level])))
+            else:
+                num_indices = 1
+            reads, read_count = _estimate(level + 1)
+            return num_indices * reads, num_indices * read_count
+        reads, read_count = _estimate(0)
+        count, sub_count = self.get_counts()
+        if reads == 1:
+            # the extracted cube is a view on the read cube
+            memory_count = read_count
+        else:
+            # the extracted subcubes are stacked
+            memory_count = read_count + sub_count
+        return reads, read_count, memory_count
+
+    def get_read_plan(self):
+        """self.get_read_plan() -> the ReadPlan of the 'coalesced' strategy;
+           it is built once, from the extractor's index pickers only"""
+        if self._read_plan is None:
+            self._read_plan = ReadPlan(self.shape, self.dtype, self.extractor)
+        return self._read_plan
+
+    def estimates(self):
+        """self.estimates() -> list of ReadCost, one for each available strategy"""
+        if self._estimates is None:
+            self._estimates = self.impl_estimates()
+        return self._estimates
+
+    def impl_estimates(self):
+        itemsize = self.itemsize
+        count, sub_count = self.get_counts()
+        if self.file_format == conf.FILE_FORMAT_RAW:
+            full_cost = self.make_cost(self.STRATEGY_FULL, 1, count * itemsize, count * itemsize)
+        else:
+            full_cost = self.make_cost(self.STRATEGY_FULL, 1, None, count * itemsize)
+        if self.mmap and self.file_format == conf.FILE_FORMAT_RAW:
+            # nothing is read now
+            return [self.make_cost(self.STRATEGY_MMAP, 0, 0, 0)]
+        if self.file_format == conf.FILE_FORMAT_CHUNKED:
+            return [self.make_cost(self.STRATEGY_CHUNKED, 1, None, sub_count * itemsize)]
+        if self.extractor is None or self.threshold_size.get_bytes() <= 0 or sub_count == count:
+            return [full_cost]
+        if self.file_format == conf.FILE_FORMAT_TEXT:
+            # text files can have comments: the whole cube is parsed
+            return [full_cost]
+        seek_reads, seek_read_count, seek_memory_count = self.estimate_seek()
+        if self.file_format == conf.FILE_FORMAT_CSV:
+            # all the values are parsed: skipped values are not stored
+            seek_memory_count = min(seek_memory_count, 2 * sub_count)
+            return [full_cost,
+                    self.make_cost(self.STRATEGY_SEEK, 1, None, seek_memory_count * itemsize)]
+        read_plan = self.get_read_plan()
+        estimates = [
+            full_cost,
+            self.make_cost(self.STRATEGY_SEEK, seek_reads, seek_read_count * itemsize, seek_memory_count * itemsize),
+            self.make_cost(self.STRATEGY_COALESCED, read_plan.num_reads(), read_plan.read_bytes(),
+                           sub_count * itemsize + read_plan.scratch_bytes() + read_plan.plan_bytes()),
+        ]
+        return estimates
+
+    def best(self):
+        """self.best() -> the cheapest ReadCost"""
+        return min(self.estimates(), key=lambda read_cost: (read_cost.cost, read_cost.memory_bytes))
+
+    def strategy(self):
+        """self.strategy() -> the name of the cheapest strategy"""
+        return self.best().strategy
@@ -34,15 +34,18 @@ import sys
 import numpy as np
 import collections
 
-from .internals import output_mode_callback
+from .internals import output_mode_callback, get_default_workers, iter_timed_reads
+from .memory_governor import is_memory_mapped
 from .input_output import read_cube
-from .out_of_core import BlockReader
-from .utilities import precise_sum, interpolate_filename
+from .lazy import LazyCube
+from .out_of_core import BlockReader, map_ranges, worker_max_memory
+from .utilities import interpolate_filename
+from .dtypes import best_precise_dtype
 
 from ..errors import RubikError
 from ..shape import Shape
 from ..table import Table
-from .comparison import rel_diff_cube, abs_diff_cube
+from .comparison import diff_cubes
 
 def default_print_function(message):
     sys.stdout.write(message + '\n')
@@ -87,14 +90,16 @@ class Info(object):
 
     @classmethod
     def op_min(cls, v0, v1):
-        if v0[0] <= v1[0]:
+        # nan wins, as for numpy.argmin
+        if v0[0] <= v1[0] or v0[0] != v0[0]:
             return v0
         else:
             return v1
 
     @classmethod
     def op_max(cls, v0, v1):
-        if v0[0] >= v1[0]:
+        # nan wins, as for numpy.argmax
+        if v0[0] >= v1[0] or v0[0] != v0[0]:
             return v0
         else:
             return v1
@@ -177,6 +182,54 @@ class Info(object):
             if compare:
                 yield key
 
+class StatsAccumulator(object):
+    """StatsAccumulator(dtype)
+       accumulates the statistics of a sequence of 1D chunks of a cube with
+       'dtype'; see StatsInfo.fused_stats()
+    """
+    def __init__(self, dtype):
+        self.dtype = np.dtype(dtype)
+        self.sum_dtype = best_precise_dtype(self.dtype)
+        self.check_nan_inf = issubclass(self.dtype.type, np.inexact)
+        self.flags = np.empty((0, ), dtype=np.bool_)
+        self.chunk_offsets, self.chunk_sums = [], []
+        self.min_indices, self.min_values = [], []
+        self.max_indices, self.max_values = [], []
+        self.count = 0
+        self.count_nonzero, self.count_nan, self.count_inf = 0, 0, 0
+
+    def add(self, chunk):
+        """self.add(chunk)
+           accumulates the statistics of the next 1D chunk"""
+        self.chunk_offsets.append(self.count)
+        self.chunk_sums.append(np.sum(chunk, dtype=self.sum_dtype))
+        index = chunk.argmin()
+        self.min_indices.append(index)
+        self.min_values.append(chunk[index])
+        index = chunk.argmax()
+        self.max_indices.append(index)
+        self.max_values.append(chunk[index])
+        self.count_nonzero += np.count_nonzero(chunk)
+        if self.check_nan_inf:
+            if self.flags.size < chunk.size:
+                self.flags = np.empty((chunk.size, ), dtype=np.bool_)
+            chunk_flags = self.flags[:chunk.size]
+            self.count_nan += np.count_nonzero(np.isnan(chunk, out=chunk_flags))
+            self.count_inf += np.count_nonzero(np.isinf(chunk, out=chunk_flags))
+        self.count += chunk.size
+
+    def fused_stats(self):
+        """self.fused_stats() -> (sum, min_index, min, max_index, max,
+                                  count_nonzero, count_nan, count_inf)"""
+        # the first chunk holding the global min/max also holds its first
+        # occurrence (nan included, since argmin/argmax propagate nan)
+        chunk_min = np.array(self.min_values, dtype=self.dtype).argmin()
+        chunk_max = np.array(self.max_values, dtype=self.dtype).argmax()
+        return (np.sum(np.array(self.chunk_sums, dtype=self.sum_dtype), dtype=self.sum_dtype),
+                self.chunk_offsets[chunk_min] + self.min_indices[chunk_min], self.min_values[chunk_min],
+                self.chunk_offsets[chunk_max] + self.max_indices[chunk_max], self.max_values[chunk_max],
+                self.count_nonzero, self.count_nan, self.count_inf)
+
 class StatsInfo(Info):
     """StatsInfo(...)
        collect statistics about a cube:
@@ -195,6 +248,7 @@ class StatsInfo(Info):
         o cube_count_inf
     """
     PERCENTAGE_FORMAT = '{:.2%}'
+    CHUNK_SIZE = 2 ** 18
     KEYS = collections.OrderedDict((
         ('cube_name',			('name',	False)),
         ('cube_shape',			('shape',	True)),
@@ -297,49 +351,94 @@ class StatsInfo(Info):
         return self.cube_fraction_inf * 100.0
 
     @classmethod
-    def stats_info(cls, cube, shape=None, offset=0, name=""):
-        """stats_cube(cube, shape=None, offset=0, name="") -> StatsInfo
-           creates a StatsInfo object from a cube
+    def iter_flat_chunks(cls, cube, chunk_count):
+        """iter_flat_chunks(cube, chunk_count) -> iterates over 1D chunks
+           iterates over the flat (C order) elements of 'cube', 'chunk_count'
+           elements at a time (the last chunk can be shorter); chunks can be
+           reused buffers. 'cube' can be a LazyCube."""
+        if isinstance(cube, LazyCube):
+            block_itemsize = cube.block_itemsize()
+            block_count = max(1, cube.get_buffer_size().get_bytes() // (block_itemsize * chunk_count)) * chunk_count
+            count = cube.size
+            for block_start in range(0, count, block_count):
+                block = cube.read_block(block_start, min(count, block_start + block_count))
+                for chunk_start in range(0, block.size, chunk_count):
+                    yield block[chunk_start:chunk_start + chunk_count]
+        else:
+            iterator = np.nditer(cube, flags=['external_loop', 'buffered', 'zerosize_ok'],
+                                 order='C', buffersize=chunk_count)
+            if is_memory_mapped(cube):
+                iterator = iter_timed_reads(iterator)
+            for chunk in iterator:
+                yield chunk
+
+    @classmethod
+    def fused_stats(cls, cube, chunk_size=None):
+        """fused_stats(cube, chunk_size=None) -> (sum, min_index, min, max_index, max,
+                                                    count_nonzero, count_nan, count_inf)
+           computes all the statistics in a single pass over chunks of at most
+           chunk_size bytes (default: StatsInfo.CHUNK_SIZE); indices are
+           flat C-order indices. Results are the same as sweeping the whole
+           cube with numpy.sum, argmin, argmax, count_nonzero, isnan, isinf.
+        """
+        if chunk_size is None:
+            chunk_size = cls.CHUNK_SIZE
+        chunk_count = max(1, int(chunk_size) // cube.dtype.itemsize)
+        accumulator = StatsAccumulator(cube.dtype)
+        for chunk in cls.iter_flat_chunks(cube, chunk_count):
+            accumulator.add(chunk)
+        return accumulator.fused_stats()
+
+    @classmethod
+    def from_fused_stats(cls, fused_stats, count, shape, offset=0, name=""):
+        """from_fused_stats(fused_stats, count, shape, offset=0, name="") -> StatsInfo
+           creates a StatsInfo object from the result of fused_stats() on
+           'count' elements starting at flat index 'offset' of a cube with 'shape'
         """
-        if not isinstance(cube, np.ndarray):
-            raise RubikError("cannot stat object of type {0}: it is not a numpy.ndarray".format(type(cube).__name__))
-        if shape is None:
-            shape = cube.shape
-        cube_name = name
         cube_shape = Shape(shape)
-        cube_sum = precise_sum(cube)
-        cube_ave = None
-        cube_count = cube.size
-        if cube_count:
-            cube_ave = cube_sum / float(cube_count)
-        else:
-            cube_ave = None
-        cube_count_nonzero = np.count_nonzero(cube)
-        cube_count_zero = cube_count - cube_count_nonzero
-        cube_count_nan = np.count_nonzero(np.isnan(cube))
-        cube_count_inf = np.count_nonzero(np.isinf(cube))
-        cube_1d = cube.reshape((cube.size, ))
-        cube_min_index = cube_1d.argmin()
-        cube_min = cube_1d[cube_min_index]
-        cube_max_index = cube_1d.argmax()
-        cube_max = cube_1d[cube_max_index]
-        cube_min_index = np.unravel_index(cube_min_index + offset, cube_shape)
-        cube_max_index = np.unravel_index(cube_max_index + offset, cube_shape)
-        stats_info = StatsInfo(
-            cube_name=cube_name,
+        cube_sum, cube_min_index, cube_min, cube_max_index, cube_max, \
+            cube_count_nonzero, cube_count_nan, cube_count_inf = fused_stats
+        return cls(
+            cube_name=name,
             cube_shape=cube_shape,
             cube_sum=cube_sum,
             cube_offset=offset,
-            cube_count=cube_count,
+            cube_count=count,
             cube_min=cube_min,
-            cube_min_index=cube_min_index,
+            cube_min_index=np.unravel_index(cube_min_index + offset, cube_shape),
             cube_max=cube_max,
-            cube_max_index=cube_max_index,
-            cube_count_zero=cube_count_zero,
+            cube_max_index=np.unravel_index(cube_max_index + offset, cube_shape),
+            cube_count_zero=count - cube_count_nonzero,
             cube_count_nonzero=cube_count_nonzero,
             cube_count_nan=cube_count_nan,
             cube_count_inf=cube_count_inf,
         )
+
+    @classmethod
+    def stats_info(cls, cube, shape=None, offset=0, name=""):
+        """stats_cube(cube, shape=None, offset=0, name="") -> StatsInfo
+           creates a StatsInfo object from a cube
+        """
+        if isinstance(cube, LazyCube):
+            return cls.stats_info_lazy(cube, shape=shape, offset=offset, name=name)
+        if not isinstance(cube, np.ndarray):
+            raise RubikError("cannot stat object of type {0}: it is not a numpy.ndarray".format(type(cube).__name__))
+        if shape is None:
+            shape = cube.shape
+        return cls.from_fused_stats(cls.fused_stats(cube), cube.size, shape, offset=offset, name=name)
+
+    @classmethod
+    def stats_info_lazy(cls, cube, shape=None, offset=0, name=""):
+        """stats_info_lazy(cube, shape=None, offset=0, name="") -> StatsInfo
+           creates a StatsInfo object from a LazyCube, evaluating it block by block
+        """
+        if shape is None:
+            shape = cube.shape
+        shape = Shape(shape)
+        stats_info = StatsInfo(cube_name=name, cube_shape=shape)
+        for block in cube.iter_blocks():
+            stats_info += cls.stats_info(block, shape, offset=offset + stats_info.cube_count)
+        stats_info.cube_offset = offset
         return stats_info
 
     @property
@@ -401,6 +500,40 @@ class StatsInfo(Info):
         result += stats_info
         return result
 
+    SERIALIZED_KEYS = ('cube_name', 'cube_offset', 'cube_count', 'cube_sum',
+                       'cube_min', 'cube_min_index', 'cube_max', 'cube_max_index',
+                       'cube_count_zero', 'cube_count_nonzero', 'cube_count_nan', 'cube_count_inf')
+    def to_dict(self):
+        """self.to_dict() -> dict
+           returns a JSON-serializable dict describing self"""
+        def item(value):
+            if isinstance(value, np.generic):
+                return value.item()
+            elif isinstance(value, tuple):
+                return [int(i) for i in value]
+            else:
+                return value
+        data = dict((key, item(getattr(self, key))) for key in self.SERIALIZED_KEYS)
+        data['cube_shape'] = str(self.cube_shape)
+        return data
+
+    @classmethod
+    def from_dict(cls, data, dtype):
+        """StatsInfo.from_dict(data, dtype) -> StatsInfo
+           creates a StatsInfo from the result of to_dict() for a cube
+           with the given dtype"""
+        dtype = np.dtype(dtype)
+        n_args = dict((key, data[key]) for key in cls.SERIALIZED_KEYS)
+        n_args['cube_shape'] = Shape(data['cube_shape'])
+        n_args['cube_sum'] = np.dtype(best_precise_dtype(dtype)).type(n_args['cube_sum'])
+        for key in 'cube_min', 'cube_max':
+            if n_args[key] is not None:
+                n_args[key] = dtype.type(n_args[key])
+        for key in 'cube_min_index', 'cube_max_index':
+            if n_args[key] is not None:
+                n_args[key] = tuple(n_args[key])
+        return cls(**n_args)
+
 stats_info = StatsInfo.stats_info
 
 class DiffInfo(Info):
@@ -447,15 +580,44 @@ class DiffInfo(Info):
         return result
 
     @classmethod
-    def diff_info(cls, left, right, shape=None, offset=0, in_threshold=None, out_threshold=None):
-        rd_cube = rel_diff_cube(left, right, in_threshold=in_threshold, out_threshold=out_threshold)
-        ad_cube = abs_diff_cube(left, right, in_threshold=in_threshold, out_threshold=out_threshold)
-        return cls(
-            left=StatsInfo.stats_info(left, shape=shape, offset=offset, name="LEFT"),
-            right=StatsInfo.stats_info(right, shape=shape, offset=offset, name="RIGHT"),
-            rel_diff=StatsInfo.stats_info(rd_cube, shape=shape, offset=offset, name="REL_DIFF"),
-            abs_diff=StatsInfo.stats_info(ad_cube, shape=shape, offset=offset, name="ABS_DIFF"),
-        )
+    def diff_info(cls, left, right, shape=None, offset=0, in_threshold=None, out_threshold=None, chunk_size=None):
+        """diff_info(left, right, shape=None, offset=0, in_threshold=None, out_threshold=None,
+                     chunk_size=None) -> DiffInfo
+           creates a DiffInfo object from two cubes with the same shape (they
+           can be LazyCube objects). The cubes are processed in a single pass,
+           in chunks of at most 'chunk_size' bytes per cube (default:
+           StatsInfo.CHUNK_SIZE); the rel_diff and abs_diff of each chunk
+           are stored in reused buffers, so no full size cube is created.
+        """
+        if tuple(left.shape) != tuple(right.shape):
+            raise RubikError("cannot diff cubes with different shape {} and {}".format(
+                Shape(left.shape), Shape(right.shape)))
+        if shape is None:
+            shape = left.shape
+        if chunk_size is None:
+            chunk_size = StatsInfo.CHUNK_SIZE
+        chunk_count = max(1, int(chunk_size) // max(left.dtype.itemsize, right.dtype.itemsize))
+        accumulators = None
+        rd_buffer, ad_buffer = None, None
+        for l_chunk, r_chunk in zip(StatsInfo.iter_flat_chunks(left, chunk_count),
+                                    StatsInfo.iter_flat_chunks(right, chunk_count)):
+            size = l_chunk.size
+            if rd_buffer is None:
+                # the first chunk is the largest one
+                rd_buffer, ad_buffer = diff_cubes(l_chunk, r_chunk,
+                                                  in_threshold=in_threshold, out_threshold=out_threshold,
+                                                  buffer_count=size)
+                accumulators = [StatsAccumulator(cube.dtype) for cube in (left, right, rd_buffer, ad_buffer)]
+            else:
+                diff_cubes(l_chunk, r_chunk, in_threshold=in_threshold, out_threshold=out_threshold,
+                           rel_out=rd_buffer[:size], abs_out=ad_buffer[:size], buffer_count=size)
+            for accumulator, chunk in zip(accumulators, (l_chunk, r_chunk, rd_buffer[:size], ad_buffer[:size])):
+                accumulator.add(chunk)
+        if accumulators is None:
+            raise RubikError("cannot diff empty cubes")
+        count = accumulators[0].count
+        return cls(*[StatsInfo.from_fused_stats(accumulator.fused_stats(), count, shape, offset=offset, name=name)
+                     for accumulator, name in zip(accumulators, ("LEFT", "RIGHT", "REL_DIFF", "ABS_DIFF"))])
 
     def report(self):
         return StatsInfo.reports(
@@ -487,19 +649,25 @@ def print_diff(left, right, print_function=None):
 
 def stats_file(filename, shape, dtype=None, file_format='raw',
                out_of_core=True, buffer_size=None, max_memory=None,
-               progress_frequency=None):
+               progress_frequency=None, read_ahead=None, workers=None):
     """stats_file(filename, shape, dtype=None, file_format='raw',
                   out_of_core=True, buffer_size=None, max_memory=None,
-                  progress_frequency=None) -> StatsInfo object
+                  progress_frequency=None, read_ahead=None, workers=None) -> StatsInfo object
     returns a StatsInfo about the content of 'filename', which is a cube with 'shape'.
-    If 'out_of_core' (out-of-core) is True, process 'buffer_size' elements at a time.
+    If 'out_of_core' (out-of-core) is True, process 'buffer_size' elements at a time
+    ('raw' and 'chunked' files only); if 'read_ahead' is > 0, up to 'read_ahead' blocks are read in advance by
+    a background thread.
+    If 'workers' is > 1, the file is split in 'workers' ranges, which are
+    processed by a pool of processes; 'max_memory' is shared among the workers.
+    By default, 'workers' is get_default_workers().
     """
     shape = Shape(shape)
     filename = interpolate_filename(filename, shape=shape, file_format=file_format, dtype=dtype)
-    if out_of_core and file_format == 'raw':
-        stats_info = stats_info_out_of_core(filename, shape=shape, dtype=dtype,
+    if out_of_core and file_format in ('raw', 'chunked'):
+        stats_info = stats_info_out_of_core(filename, shape=shape, dtype=dtype, file_format=file_format,
                                             buffer_size=buffer_size, max_memory=max_memory,
-                                            progress_frequency=progress_frequency)
+                                            progress_frequency=progress_frequency,
+                                            read_ahead=read_ahead, workers=workers)
     else:
         cube = read_cube(file=filename, shape=shape, dtype=dtype, file_format=file_format)
         stats_info = StatsInfo.stats_info(cube)
@@ -507,40 +675,50 @@ def stats_file(filename, shape, dtype=None, file_format='raw',
 
 def print_stats_file(filename, shape, dtype=None, file_format='raw',
                      out_of_core=True, buffer_size=None, max_memory=None,
-                     print_function=None, progress_frequency=None):
+                     print_function=None, progress_frequency=None, read_ahead=None,
+                     workers=None):
     """print_stats_file(filename, shape, dtype=None, file_format='raw',
                         out_of_core=True, buffer_size=None, max_memory=None,
-                        print_function=None, progress_frequency=None)
+                        print_function=None, progress_frequency=None, read_ahead=None,
+                        workers=None)
     prints the StatsInfo about the content of 'filename', which is a cube with 'shape'.
     If 'out_of_core' (out-of-core) is True, process 'buffer_size' elements at a time.
     """
     output_mode_callback()
-    stats_info = stats_file(filename, shape=shape, dtype=dtype,
-                            out_of_core=out_of_core, buffer_size=buffer_size, max_memory=max_memory)
+    stats_info = stats_file(filename, shape=shape, dtype=dtype, file_format=file_format,
+                            out_of_core=out_of_core, buffer_size=buffer_size, max_memory=max_memory,
+                            progress_frequency=progress_frequency, read_ahead=read_ahead,
+                            workers=workers)
     stats_info.print_report(print_function=print_function)
     
 def diff_files(filename_l, filename_r, shape, dtype=None, file_format='raw', 
                out_of_core=True, buffer_size=None, max_memory=None, in_threshold=None, out_threshold=None,
-               progress_frequency=None):
+               progress_frequency=None, read_ahead=None, workers=None):
     """diff_files(filename_l, filename_r, shape, dtype=None, file_format='raw',
                   out_of_core=True, buffer_size=None, max_memory=None,
                   in_threshold=None, out_threshold=None,
-                  progress_frequency=None) -> DiffInfo object
+                  progress_frequency=None, read_ahead=None, workers=None) -> DiffInfo object
     returns a DiffInfo about the content of 'filename_l' and 'filename_r', which are
     two cubes with 'shape'.
     If 'out_of_core' (out-of-core) is True, the overall memory size will be less than 'memory_size',
     and the memory size per block will be less than 'buffer_size'.
     By default, 'buffer_size' is '1gb', while 'max_memory' is not set.
+    If 'read_ahead' is > 0, up to 'read_ahead' blocks per file are read in advance
+    by background threads.
+    If 'workers' is > 1, the files are split in 'workers' ranges, which are
+    processed by a pool of processes; 'max_memory' is shared among the workers.
+    By default, 'workers' is get_default_workers().
     """
     shape = Shape(shape)
     filename_l = interpolate_filename(filename_l, shape=shape, file_format=file_format, dtype=dtype)
     filename_r = interpolate_filename(filename_r, shape=shape, file_format=file_format, dtype=dtype)
     output_mode_callback()
-    if out_of_core and file_format == 'raw':
-        diff_info = diff_info_out_of_core(filename_l, filename_r, shape=shape, dtype=dtype,
+    if out_of_core and file_format in ('raw', 'chunked'):
+        diff_info = diff_info_out_of_core(filename_l, filename_r, shape=shape, dtype=dtype, file_format=file_format,
                                   buffer_size=buffer_size, max_memory=max_memory,
                                   in_threshold=in_threshold, out_threshold=out_threshold,
-                                  progress_frequency=progress_frequency)
+                                  progress_frequency=progress_frequency,
+                                  read_ahead=read_ahead, workers=workers)
     else:
         left = read_cube(file=filename_l, shape=shape, dtype=dtype, file_format=file_format)
         right = read_cube(file=filename_r, shape=shape, dtype=dtype, file_format=file_format)
@@ -551,10 +729,11 @@ def diff_files(filename_l, filename_r, shape, dtype=None, file_format='raw',
 def print_diff_files(filename_l, filename_r, shape, dtype=None,
                      out_of_core=True, buffer_size=None, max_memory=None,
                      in_threshold=None, out_threshold=None, print_function=None,
-                     progress_frequency=None):
+                     progress_frequency=None, read_ahead=None, workers=None):
     """print_diff_files(filename_l, filename_r, shape, dtype=None,
                         out_of_core=True, buffer_size=None, max_memory=None,
-                        print_function=None, progress_frequency=None)
+                        print_function=None, progress_frequency=None, read_ahead=None,
+                        workers=None)
     prints the DiffInfo about the content of 'filename_l' and 'filename_r', which are
     two cubes with 'shape'.
     If 'out_of_core' (out-of-core) is True, the overall memory size will be less than 'memory_size',
@@ -565,22 +744,64 @@ def print_diff_files(filename_l, filename_r, shape, dtype=None,
     diff_info = diff_files(filename_l, filename_r, shape=shape, dtype=dtype, out_of_core=out_of_core,
                            buffer_size=buffer_size, max_memory=max_memory,
                            in_threshold=None, out_threshold=None,
-                           progress_frequency=progress_frequency)
+                           progress_frequency=progress_frequency,
+                           read_ahead=read_ahead, workers=workers)
     diff_info.print_report(print_function=print_function)
 
-def stats_info_out_of_core(filename, shape, dtype=None, buffer_size=None, max_memory=None, progress_frequency=None):
+def _stats_info_range(args):
+    filename, shape, dtype, file_format, buffer_size, max_memory, read_ahead, start, stop = args
+    stats_info = StatsInfo(cube_shape=shape)
+    block_reader = BlockReader(
+        count=shape,
+        dtype=dtype,
+        buffer_size=buffer_size,
+        max_memory=max_memory,
+        read_ahead=read_ahead,
+        file_format=file_format)
+    for cubes in block_reader.read([filename], start=start, stop=stop):
+        stats_info += StatsInfo.stats_info(cubes[0],
+                                           shape, offset=start + stats_info.cube_count)
+    return stats_info
+
+def _diff_info_range(args):
+    filename_l, filename_r, shape, dtype, file_format, buffer_size, max_memory, read_ahead, in_threshold, out_threshold, start, stop = args
+    diff_info = DiffInfo(cube_shape=shape)
+    block_reader = BlockReader(
+        count=shape,
+        dtype=dtype,
+        buffer_size=buffer_size,
+        max_memory=max_memory,
+        read_ahead=read_ahead,
+        file_format=file_format)
+    for cubes in block_reader.read([filename_l, filename_r], start=start, stop=stop):
+        diff_info += DiffInfo.diff_info(cubes[0], cubes[1],
+                                        shape=shape, offset=start + diff_info.left.cube_count,
+                                        in_threshold=in_threshold, out_threshold=out_threshold)
+    return diff_info
+
+def stats_info_out_of_core(filename, shape, dtype=None, file_format='raw', buffer_size=None, max_memory=None, progress_frequency=None, read_ahead=None, workers=None):
     def reduce_stats_info(cubes, stats_info, info_progress, shape):
         stats_info += StatsInfo.stats_info(cubes[0],
                                            shape, offset=stats_info.cube_count)
         info_progress.dump()
 
+    if workers is None:
+        workers = get_default_workers()
     stats_info = StatsInfo(cube_shape=shape)
     info_progress = stats_info.info_progress(frequency=progress_frequency)
+    if workers > 1:
+        args = (filename, shape, dtype, file_format, buffer_size, worker_max_memory(max_memory, workers), read_ahead)
+        for partial_stats_info in map_ranges(_stats_info_range, shape.count(), workers, args):
+            stats_info += partial_stats_info
+            info_progress.dump()
+        return stats_info
     block_reader = BlockReader(
         count=shape,
         dtype=dtype,
         buffer_size=buffer_size,
-        max_memory=max_memory)
+        max_memory=max_memory,
+        read_ahead=read_ahead,
+        file_format=file_format)
     block_reader.reduce(
         filenames=[filename],
         function=reduce_stats_info,
@@ -590,22 +811,33 @@ def stats_info_out_of_core(filename, shape, dtype=None, buffer_size=None, max_me
     return stats_info
 
 def diff_info_out_of_core(filename_l, filename_r,
-                  shape, dtype=None, buffer_size=None, max_memory=None,
+                  shape, dtype=None, file_format='raw', buffer_size=None, max_memory=None,
                   progress_frequency=None,
-                  in_threshold=None, out_threshold=None):
+                  in_threshold=None, out_threshold=None, read_ahead=None, workers=None):
     def reduce_diff_info(cubes, diff_info, shape, info_progress, in_threshold=None, out_threshold=None):
         diff_info += DiffInfo.diff_info(cubes[0], cubes[1],
                                         shape=shape, offset=diff_info.left.cube_count,
                                         in_threshold=in_threshold, out_threshold=out_threshold)
         info_progress.dump()
 
+    if workers is None:
+        workers = get_default_workers()
     diff_info = DiffInfo(cube_shape=shape)
     info_progress = diff_info.info_progress(frequency=progress_frequency)
+    if workers > 1:
+        args = (filename_l, filename_r, shape, dtype, file_format, buffer_size, worker_max_memory(max_memory, workers), read_ahead,
+                in_threshold, out_threshold)
+        for partial_diff_info in map_ranges(_diff_info_range, shape.count(), workers, args):
+            diff_info += partial_diff_info
+            info_progress.dump()
+        return diff_info
     block_reader = BlockReader(
         count=shape,
         dtype=dtype,
         buffer_size=buffer_size,
-        max_memory=max_memory)
+        max_memory=max_memory,
+        read_ahead=read_ahead,
+        file_format=file_format)
     block_reader.reduce(
         filenames=[filename_l, filename_r],
         function=reduce_diff_info,
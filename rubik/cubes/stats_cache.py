@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+#
+# Copyright 2014 Simone Campagna
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+__author__ = "Simone Campagna"
+
+__all__ = [
+           'StatsCache',
+           'extractor_flat_range',
+          ]
+
+import collections
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .. import conf
+from ..errors import RubikError
+from ..shape import Shape
+from ..units import Memory
+from ..extractor import Extractor
+from .dtypes import get_dtype
+from .lazy import LazyRawFile
+from .chunked import ChunkedFile
+from .stats import StatsInfo
+
+def extractor_flat_range(shape, extractor):
+    """extractor_flat_range(shape, extractor) -> (start, stop, subshape) or None
+       if the cube extracted by 'extractor' from a cube with 'shape' is a
+       contiguous range [start, stop) of flat (C order) elements, returns it
+       with the extracted cube shape; otherwise, returns None"""
+    shape = tuple(Shape(shape).shape())
+    if extractor is None:
+        index_pickers = ()
+    else:
+        if not isinstance(extractor, Extractor):
+            extractor = Extractor(extractor)
+        index_pickers = extractor.index_pickers()
+    if len(index_pickers) > len(shape):
+        return None
+    index_pickers = tuple(index_pickers) + (slice(None), ) * (len(shape) - len(index_pickers))
+    first_indices = []
+    counts = []
+    subshape = []
+    leading = True
+    for index_picker, dim in zip(index_pickers, shape):
+        if isinstance(index_picker, slice):
+            start, stop, step = index_picker.indices(dim)
+            count = len(range(start, stop, step))
+            subshape.append(count)
+        else:
+            start = index_picker
+            if start < 0:
+                start += dim
+            if not 0 <= start < dim:
+                return None
+            count, step = 1, 1
+        if count == 0:
+            return 0, 0, tuple(subshape)
+        if leading:
+            if count != 1:
+                if step != 1:
+                    return None
+                leading = False
+        elif count != dim or start != 0 or step != 1:
+            return None
+        first_indices.append(start)
+        counts.append(count)
+    if shape:
+        start = int(np.ravel_multi_index(first_indices, shape))
+    else:
+        start = 0
+    count = 1
+    for c in counts:
+        count *= c
+    return start, start + count, tuple(subshape)
+
+class StatsCache(object):
+    """StatsCache(cache_dir=None, block_size=None)
+    Caches the StatsInfo of 'raw' and 'chunked' files. The StatsInfo of each
+    block of 'block_size' bytes is stored, so that the StatsInfo of any
+    contiguous range of the file (for instance a subcube extracted along the
+    first dimension) is obtained by merging the cached blocks; only the blocks
+    partially covered by the range are read again.
+    Records are stored in 'cache_dir', or, if 'cache_dir' is None, in sidecar
+    files next to the input files (the input filename plus SIDECAR_SUFFIX).
+    A record is used only if the file path, size, modification time, shape,
+    dtype, offset and file format are unchanged.
+    """
+    DEFAULT_BLOCK_SIZE = Memory('64mb')
+    SIDECAR_SUFFIX = '.rubik-stats'
+    VERSION = 1
+    def __init__(self, cache_dir=None, block_size=None):
+        if cache_dir is not None:
+            cache_dir = os.path.expanduser(os.path.expandvars(cache_dir))
+        self.cache_dir = cache_dir
+        if block_size is None:
+            block_size = self.DEFAULT_BLOCK_SIZE
+        self.block_size = Memory(block_size)
+
+    def __repr__(self):
+        if self.cache_dir is None:
+            where = 'sidecar'
+        else:
+            where = repr(self.cache_dir)
+        return "{}({}, block_size={})".format(type(self).__name__, where, self.block_size)
+
+    def get_key(self, filename, shape, dtype, offset=0, file_format=conf.FILE_FORMAT_RAW):
+        """self.get_key(filename, shape, dtype, offset=0, file_format='raw') -> key"""
+        filename = os.path.realpath(os.path.abspath(filename))
+        stat_result = os.stat(filename)
+        return collections.OrderedDict((
+            ('filename', filename),
+            ('size', stat_result.st_size),
+            ('mtime', stat_result.st_mtime),
+            ('shape', str(Shape(shape))),
+            ('dtype', np.dtype(get_dtype(dtype)).str),
+            ('offset', offset),
+            ('file_format', file_format),
+        ))
+
+    def get_cache_filename(self, key):
+        """self.get_cache_filename(key) -> filename of the record for 'key'"""
+        if self.cache_dir is None:
+            return key['filename'] + self.SIDECAR_SUFFIX
+        else:
+            # stale records for the same file are overwritten
+            name = [value for field, value in key.items() if not field in ('size', 'mtime')]
+            digest = hashlib.sha1(json.dumps(name).encode('utf-8')).hexdigest()
+            return os.path.join(self.cache_dir, digest + '.json')
+
+    def load(self, key):
+        """self.load(key) -> record or None"""
+        cache_filename = self.get_cache_filename(key)
+        try:
+            with open(cache_filename, 'r') as f_in:
+                record = json.load(f_in, object_pairs_hook=collections.OrderedDict)
+        except (IOError, OSError, ValueError):
+            return None
+        if record.get('version') != self.VERSION or record.get('key') != key:
+            return None
+        return record
+
+    def store(self, key, record):
+        """self.store(key, record) -> True if the record has been stored
+           the cache is optional: unwritable cache files are silently skipped"""
+        cache_filename = self.get_cache_filename(key)
+        tmp_filename = "{}.{}.tmp".format(cache_filename, os.getpid())
+        try:
+            cache_dirname = os.path.dirname(cache_filename)
+            if cache_dirname and not os.path.isdir(cache_dirname):
+                os.makedirs(cache_dirname)
+            with open(tmp_filename, 'w') as f_out:
+                json.dump(record, f_out)
+            os.rename(tmp_filename, cache_filename)
+            return True
+        except (IOError, OSError):
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+            return False
+
+    def get_reader(self, filename, shape, dtype, offset, file_format):
+        """self.get_reader(...) -> read(start, stop) function reading flat elements"""
+        if file_format == conf.FILE_FORMAT_RAW:
+            return LazyRawFile(filename, shape=shape, dtype=dtype, offset=offset).read_block
+        elif file_format == conf.FILE_FORMAT_CHUNKED:
+            def read(start, stop):
+                with open(filename, 'rb') as f_in:
+                    f_in.seek(offset)
+                    chunked_file = ChunkedFile(f_in, filename)
+                    chunked_file.check_shape(shape)
+                    return chunked_file.read_flat(start, stop).astype(dtype, copy=False)
+            return read
+        else:
+            raise RubikError("invalid file format {0!r}: stats cache supports {1!r} and {2!r} files".format(
+                             file_format, conf.FILE_FORMAT_RAW, conf.FILE_FORMAT_CHUNKED))
+
+    def get_block_count(self, dtype):
+        return max(1, self.block_size.get_bytes() // np.dtype(dtype).itemsize)
+
+    def make_record(self, key, shape, dtype, read):
+        """self.make_record(key, shape, dtype, read) -> record
+           computes the StatsInfo of all the blocks"""
+        count = shape.count()
+        block_count = self.get_block_count(dtype)
+        blocks = []
+        for block_start in range(0, count, block_count):
+            block_stop = min(count, block_start + block_count)
+            block = read(block_start, block_stop)
+            blocks.append(StatsInfo.stats_info(block, shape, offset=block_start).to_dict())
+        return collections.OrderedDict((
+            ('version', self.VERSION),
+            ('key', key),
+            ('block_count', block_count),
+            ('blocks', blocks),
+        ))
+
+    def stats_file(self, filename, shape, dtype=None, file_format=conf.FILE_FORMAT_RAW, offset=0, extractor=None, name=""):
+        """self.stats_file(filename, shape, dtype=None, file_format='raw', offset=0,
+                           extractor=None, name="") -> StatsInfo or None
+           returns the StatsInfo of the cube extracted by 'extractor' from
+           'filename', using the cache when possible; returns None if the
+           extracted cube is not a contiguous range of the file (see
+           extractor_flat_range()).
+           The records are always computed from the file, never from a cube
+           in memory, which could have been changed.
+        """
+        shape = Shape(shape)
+        dtype = np.dtype(get_dtype(dtype))
+        if offset is None:
+            offset = 0
+        if issubclass(dtype.type, np.complexfloating) or shape.count() == 0:
+            return None
+        flat_range = extractor_flat_range(shape, extractor)
+        if flat_range is None:
+            return None
+        start, stop, subshape = flat_range
+        if start == stop:
+            return None
+        file_read = self.get_reader(filename, shape, dtype, offset, file_format)
+        key = self.get_key(filename, shape=shape, dtype=dtype, offset=offset, file_format=file_format)
+        record = self.load(key)
+        if record is None:
+            record = self.make_record(key, shape, dtype, file_read)
+            self.store(key, record)
+        # merge the cached blocks, reading the partially covered ones
+        block_count = record['block_count']
+        stats_info = StatsInfo(cube_shape=shape)
+        for block_index, block_data in enumerate(record['blocks']):
+            block_start = block_index * block_count
+            block_stop = min(shape.count(), block_start + block_count)
+            if block_stop <= start or block_start >= stop:
+                continue
+            if start <= block_start and block_stop <= stop:
+                stats_info += StatsInfo.from_dict(block_data, dtype)
+            else:
+                read_start, read_stop = max(start, block_start), min(stop, block_stop)
+                stats_info += StatsInfo.stats_info(file_read(read_start, read_stop), shape, offset=read_start)
+        # indices are relative to the extracted cube
+        for key in 'cube_min_index', 'cube_max_index':
+            index = getattr(stats_info, key)
+            if index is not None:
+                flat_index = int(np.ravel_multi_index(index, shape.shape())) - start
+                setattr(stats_info, key, tuple(int(i) for i in np.unravel_index(flat_index, subshape)))
+        stats_info.cube_name = name
+        stats_info.cube_shape = Shape(subshape)
+        stats_info.cube_offset = 0
+        return stats_info
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+#
+# Copyright 2014 Simone Campagna
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+__author__ = "Simone Campagna"
+
+__all__ = [
+           'TextReader',
+           'parse_text_chunk',
+          ]
+
+import collections
+import io
+import multiprocessing
+import string
+import warnings
+
+import numpy as np
+
+from ..errors import RubikError
+from ..units import Memory
+from .dtypes import get_dtype
+from .internals import get_default_workers
+
+_WHITESPACE = string.whitespace.encode('ascii')
+
+def _byte_table(byte_values):
+    table = np.zeros(256, dtype=np.bool_)
+    table[np.frombuffer(byte_values, dtype=np.uint8)] = True
+    return table
+
+def _get_separators(delimiter):
+    if delimiter is None:
+        return _WHITESPACE
+    else:
+        return _WHITESPACE + delimiter.encode('ascii')
+
+def _token_ends(data, separators):
+    """_token_ends(data, separators) -> array of the end offsets of the tokens in 'data'"""
+    is_sep = _byte_table(separators)[np.frombuffer(data, dtype=np.uint8)]
+    is_value = np.logical_not(is_sep)
+    last = np.empty_like(is_value)
+    last[:-1] = is_value[:-1] & is_sep[1:]
+    last[-1:] = is_value[-1:]
+    return np.flatnonzero(last) + 1
+
+def _blank_comments(data, comments):
+    """_blank_comments(data, comments) -> 'data' with the comments (from
+       'comments' to the end of the line) replaced by blanks; the offsets of
+       the values do not change"""
+    marker = comments.encode('ascii')
+    if not marker in data:
+        return data
+    chars = np.frombuffer(data, dtype=np.uint8)
+    starts = np.flatnonzero(chars[:len(chars) - len(marker) + 1] == marker[0])
+    for index, byte in enumerate(marker[1:]):
+        starts = starts[chars[starts + index + 1] == byte]
+    newlines = np.flatnonzero(chars == ord('\n'))
+    stops = np.append(newlines, len(chars))[np.searchsorted(newlines, starts)]
+    inside = np.cumsum(np.bincount(starts, minlength=len(chars) + 1) - np.bincount(stops, minlength=len(chars) + 1))
+    chars = chars.copy()
+    chars[inside[:-1] > 0] = ord(' ')
+    return chars.tobytes()
+
+def _fromstring(data, dtype, sep=' '):
+    with warnings.catch_warnings():
+        # numpy warns when it stops at an invalid value
+        warnings.simplefilter('error', DeprecationWarning)
+        try:
+            return np.fromstring(data, dtype=dtype, sep=sep)
+        except (ValueError, DeprecationWarning):
+            return None
+
+def _parse_values(data, dtype, delimiter):
+    if delimiter is not None and delimiter.strip():
+        # values separated by the delimiter (and optional whitespace) are
+        # parsed directly; numpy returns garbage for trailing separators
+        # followed by whitespace, which are stripped
+        values = _fromstring(data.rstrip(_WHITESPACE), dtype, sep=delimiter)
+        if values is not None:
+            return values
+        # for instance, lines not ending with the delimiter
+        separators = _get_separators(delimiter)
+        data = data.translate(bytes.maketrans(separators, b' ' * len(separators)))
+    # numpy parses any run of whitespace
+    return _fromstring(data, dtype)
+
+def parse_text_chunk(data, dtype, delimiter=None, comments=None):
+    """parse_text_chunk(data, dtype, delimiter=None, comments=None) -> 1D numpy.ndarray
+       parses the values in the bytes 'data', separated by 'delimiter' and/or
+       whitespace; 'comments' run to the end of the line. Values are
+       converted by numpy in C; complex values are parsed by numpy.loadtxt.
+       Integer values written as floats (for instance, by numpy.savetxt) are
+       accepted, but values that are not integers raise a RubikError.
+    """
+    dtype = np.dtype(get_dtype(dtype))
+    if comments is not None:
+        data = _blank_comments(data, comments)
+    if not data or data.isspace():
+        return np.empty((0, ), dtype=dtype)
+    if issubclass(dtype.type, np.complexfloating):
+        lines = io.StringIO(data.decode('latin-1'))
+        return np.loadtxt(lines, dtype=dtype, delimiter=delimiter, comments=None, ndmin=1).reshape((-1, ))
+    values = _parse_values(data, dtype, delimiter)
+    if values is None and issubclass(dtype.type, (np.integer, np.bool_)):
+        float_values = _parse_values(data, np.float64, delimiter)
+        if float_values is not None:
+            with np.errstate(invalid='ignore'):
+                values = float_values.astype(dtype)
+            if not np.array_equal(values, float_values):
+                raise RubikError("cannot parse {!r} values: values {} are not {!r} values".format(
+                                 dtype.name, float_values[values != float_values][:3].tolist(), dtype.name))
+    if values is None:
+        raise RubikError("cannot parse {!r} values: invalid data {!r}...".format(dtype.name, data.lstrip()[:40]))
+    return values
+
+def _parse_task(args):
+    return parse_text_chunk(*args)
+
+class TextReader(object):
+    """TextReader(file, dtype, delimiter=None, comments=None, chunk_size=None, workers=None)
+    Reads values separated by 'delimiter' and/or whitespace from the text
+    file object 'file'. The file is read in chunks of about 'chunk_size'
+    bytes, split at line boundaries (or at separators, for files without
+    newlines); if 'workers' (default: get_default_workers()) is > 1, chunks
+    are parsed concurrently by a pool of 'workers' processes, while the
+    next chunks are read. The values are copied into the preallocated output
+    array in file order.
+    After close(), the file position is just after the last value read.
+    """
+    DEFAULT_CHUNK_SIZE = Memory('16mb')
+    def __init__(self, file, dtype, delimiter=None, comments=None, chunk_size=None, workers=None):
+        self.file = file
+        self.dtype = np.dtype(get_dtype(dtype))
+        self.delimiter = delimiter
+        self.comments = comments
+        self.separators = _get_separators(delimiter)
+        if chunk_size is None:
+            chunk_size = self.DEFAULT_CHUNK_SIZE
+        self.chunk_size = max(1, Memory(chunk_size).get_bytes())
+        if workers is None:
+            workers = get_default_workers()
+        self.workers = workers
+        self._pool = None
+        self._pending = collections.deque()
+        self._tail = b''
+        self._eof = False
+        try:
+            self._file_offset = file.tell()
+        except (AttributeError, IOError, ValueError):
+            self._file_offset = None
+        # current parsed chunk
+        self._chunk = None
+        self._chunk_offset = None
+        self._values = np.empty((0, ), dtype=self.dtype)
+        self._values_pos = 0
+
+    def read_chunk(self):
+        """self.read_chunk() -> (file offset, bytes) or None
+           the chunk ends at a line boundary, or, if there are no comments, at
+           a separator"""
+        while not self._eof:
+            data = self.file.read(self.chunk_size)
+            if isinstance(data, str):
+                data = data.encode('latin-1')
+            if not data:
+                self._eof = True
+                break
+            data = self._tail + data
+            split = data.rfind(b'\n') + 1
+            if split == 0 and self.comments is None:
+                # comments end at newlines: lines are never split
+                split = max(data.rfind(bytes((sep, ))) for sep in self.separators) + 1
+            if split > 0:
+                chunk, self._tail = data[:split], data[split:]
+                return self._next_chunk(chunk)
+            self._tail = data
+        if self._tail:
+            chunk, self._tail = self._tail, b''
+            return self._next_chunk(chunk)
+        return None
+
+    def _next_chunk(self, chunk):
+        offset = self._file_offset
+        if offset is not None:
+            self._file_offset += len(chunk)
+        return offset, chunk
+
+    def _submit(self):
+        chunk = self.read_chunk()
+        if chunk is None:
+            return False
+        offset, data = chunk
+        args = (data, self.dtype, self.delimiter, self.comments)
+        if self.workers > 1 and self._pending:
+            # the first chunk is parsed in this process: small files never
+            # start the pool
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(processes=self.workers)
+            result = self._pool.apply_async(_parse_task, (args, ))
+        else:
+            result = None
+        self._pending.append((offset, data, args, result))
+        return True
+
+    def _next_values(self):
+        # keep the pool busy: up to 2 chunks per worker are read ahead
+        while len(self._pending) < max(1, 2 * self.workers) and self._submit():
+            pass
+        if not self._pending:
+            return False
+        offset, data, args, result = self._pending.popleft()
+        if result is None:
+            values = _parse_task(args)
+        else:
+            values = result.get()
+        self._chunk, self._chunk_offset = data, offset
+        self._values, self._values_pos = values, 0
+        return True
+
+    def read(self, count, out=None):
+        """self.read(count, out=None) -> 1D numpy.ndarray
+           reads the next 'count' values into 'out' (by default, a new array)"""
+        if out is None:
+            out = np.empty((count, ), dtype=self.dtype)
+        self._consume(count, out)
+        return out
+
+    def skip(self, count):
+        """self.skip(count)
+           skips the next 'count' values"""
+        self._consume(count, None)
+
+    def _consume(self, count, out):
+        pos = 0
+        while pos < count:
+            available = len(self._values) - self._values_pos
+            if available == 0:
+                if not self._next_values():
+                    raise RubikError("text file too short: cannot read {} {!r} values, only {} found".format(
+                                     count, self.dtype.name, pos))
+                continue
+            num = min(available, count - pos)
+            if out is not None:
+                out[pos:pos + num] = self._values[self._values_pos:self._values_pos + num]
+            self._values_pos += num
+            pos += num
+
+    def close(self):
+        """self.close()
+           stops the workers and moves the file position just after the last
+           value read"""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        if self._values_pos < len(self._values):
+            if self._chunk_offset is None:
+                position = None
+            else:
+                position = self._chunk_offset
+                if self._values_pos > 0:
+                    chunk = self._chunk
+                    if self.comments is not None:
+                        chunk = _blank_comments(chunk, self.comments)
+                    position += int(_token_ends(chunk, self.separators)[self._values_pos - 1])
+        elif self._pending:
+            position = self._pending[0][0]
+        else:
+            position = self._file_offset
+        if position is not None:
+            try:
+                self.file.seek(position)
+            except (AttributeError, IOError, ValueError):
+                pass
+        self._pending.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -25,6 +25,7 @@ __all__ = [
            'get_input',
            'decode',
            'iteritems',
+           'queue',
           ]
 
 import sys
@@ -45,3 +46,5 @@ if sys.version_info[0] == 2: # pragma: no cover
 
     def iteritems(dct):
         return dct.iteritems()
+
+    import Queue as queue
@@ -26,13 +26,14 @@ __all__ = [
            'get_input',
            'decode',
            'iteritems',
+           'queue',
           ]
 
 import sys
 
 if sys.version_info[0] == 2: # pragma: no cover
     PY3 = False
-    from .py2 import lrange, irange, BASE_STRING, StringIO, get_input, decode, iteritems
+    from .py2 import lrange, irange, BASE_STRING, StringIO, get_input, decode, iteritems, queue
 else: # pragma: no cover
     PY3 = True
-    from .py3 import lrange, irange, BASE_STRING, StringIO, get_input, decode, iteritems
+    from .py3 import lrange, irange, BASE_STRING, StringIO, get_input, decode, iteritems, queue
@@ -25,6 +25,7 @@ __all__ = [
            'get_input',
            'decode',
            'iteritems',
+           'queue',
           ]
 
 import sys
@@ -46,3 +47,5 @@ if sys.version_info[0] == 3: # pragma: no cover
 
     def iteritems(dct):
         return dct.items()
+
+    import queue
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+#
+# Copyright 2014 Simone Campagna
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+__author__ = "Simone Campagna"
+
+__all__ = [
+           'main',
+          ]
+
+import sys
+import argparse
+
+from rubik import conf
+from rubik import utils
+from rubik.errors import RubikError
+from rubik.application import log as rubik_log
+from rubik.cubes.api import set_random_seed
+
+from . import log
+from ..rubik_bench import RubikBench, dump_results, load_results, load_environment, check_environment, \
+                          compare_results, results_table, comparisons_table
+
+DEFAULT_THRESHOLD = 0.1
+
+def main(arguments=None):
+    if arguments is None:
+        arguments = sys.argv[1:]
+
+    description = """\
+================================================================================
+Rubik benchmark system {version}
+================================================================================
+This is the command line interface to the rubik benchmark system.
+
+Fixture cubes are generated for each dtype, rank and size; then read_cube
+(whole cubes and extractor patterns), stats_file, diff_files, histogram_file
+and write_cube are timed, reporting bandwidth and elements per second.
+
+The results can be saved as JSON (--output/-o), and compared with a baseline
+saved by a previous run with the same size (--baseline/-b): the return code is
+the number of benchmarks whose throughput is less than 1 / (1 + THRESHOLD) times
+the baseline one.
+
+""".format(version=conf.VERSION)
+    epilog = ""
+
+    parser = argparse.ArgumentParser(
+        description=description,
+        epilog=epilog,
+        add_help=True,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    parser.add_argument("--verbose", "-v",
+        dest="verbose_level",
+        action="count",
+        default=1,
+        help="increase verbose level")
+
+    parser.add_argument("--verbose-level",
+        metavar="VL",
+        dest="verbose_level",
+        type=int,
+        default=1,
+        help="set verbose level")
+
+    parser.add_argument("--quiet", "--silent", "-q",
+        dest="verbose_level",
+        action="store_const",
+        const=0,
+        default=0,
+        help="set quiet mode (warning messages are disabled)")
+
+    parser.add_argument("--list", "-l",
+        dest="list",
+        action="store_true",
+        default=False,
+        help="list available benchmarks")
+
+    parser.add_argument("--size", "-s",
+        dest="size",
+        choices=tuple(RubikBench.SIZES),
+        default=RubikBench.DEFAULT_SIZE,
+        help="set the size of the fixture cubes [default: %(default)s]")
+
+    parser.add_argument("--dtype", "-t",
+        dest="dtypes",
+        action="append",
+        default=[],
+        help="add a dtype [default: {}]".format(', '.join(RubikBench.DEFAULT_DTYPES)))
+
+    parser.add_argument("--rank", "-r",
+        dest="ranks",
+        type=int,
+        action="append",
+        default=[],
+        help="add a rank [default: {}]".format(', '.join(str(rank) for rank in RubikBench.DEFAULT_RANKS)))
+
+    parser.add_argument("--extractor", "-x",
+        dest="extractors",
+        choices=tuple(RubikBench.EXTRACTORS),
+        action="append",
+        default=[],
+        help="add an extractor pattern [default: all]")
+
+    parser.add_argument("--file-format", "-f",
+        dest="file_formats",
+        choices=conf.FILE_FORMATS,
+        action="append",
+        default=[],
+        help="add a file format [default: {}]".format(', '.join(RubikBench.DEFAULT_FILE_FORMATS)))
+
+    parser.add_argument("--warmup", "-w",
+        dest="warmup",
+        type=int,
+        default=RubikBench.DEFAULT_WARMUP,
+        help="set the number of untimed runs [default: %(default)s]")
+
+    parser.add_argument("--repeats", "-n",
+        dest="repeats",
+        type=int,
+        default=RubikBench.DEFAULT_REPEATS,
+        help="set the number of timed runs [default: %(default)s]")
+
+    parser.add_argument("--directory", "-D",
+        dest="directory",
+        default=None,
+        help="set the fixture directory [default: a temporary directory]")
+
+    parser.add_argument("--output", "-o",
+        dest="output",
+        default=None,
+        help="write the results as JSON to OUTPUT")
+
+    parser.add_argument("--baseline", "-b",
+        dest="baseline",
+        default=None,
+        help="compare the results with the JSON file BASELINE")
+
+    parser.add_argument("--threshold", "-T",
+        dest="threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="set the regression threshold, as a fraction of the baseline throughput [default: %(default)s]")
+
+    parser.add_argument("--version",
+        action="version",
+        version='{program} {version}'.format(program=conf.PROGRAM_NAME, version=conf.VERSION))
+
+    parser.add_argument("bench_patterns",
+        type=str,
+        nargs='*',
+        help="add a benchmark pattern; if preceded by ! or ^, skip matching benchmarks; if no patterns are specified, the default is '*'")
+
+    try:
+        args = parser.parse_args(arguments)
+    except Exception as err:
+        sys.stderr.write("error: {0}: {1}\n".format(err.__class__.__name__, err))
+        return 1
+
+    PRINT = rubik_log.PRINT
+    bench_logger = log.set_test_logger(args.verbose_level)
+
+    # reproducible fixtures
+    set_random_seed(100)
+
+    patterns = utils.flatten_list(args.bench_patterns, depth=1)
+    try:
+        baseline = None
+        if args.baseline:
+            baseline = load_results(args.baseline)
+            baseline_environment = load_environment(args.baseline)
+        rubik_bench = RubikBench(size=args.size,
+                                 dtypes=args.dtypes or None,
+                                 ranks=args.ranks or None,
+                                 extractors=args.extractors or None,
+                                 file_formats=args.file_formats or None,
+                                 warmup=args.warmup,
+                                 repeats=args.repeats,
+                                 directory=args.directory,
+                                 logger=bench_logger)
+        with rubik_bench:
+            if baseline is not None:
+                check_environment(baseline_environment, rubik_bench.environment())
+            if args.list:
+                for bench_num, bench_case in enumerate(rubik_bench.filter_cases(patterns)):
+                    PRINT("{:5d}) {}".format(bench_num, bench_case.name))
+                return 0
+            results = rubik_bench.run(patterns)
+            environment = rubik_bench.environment()
+    except RubikError as err:
+        sys.stderr.write("error: {0}\n".format(err))
+        return 1
+
+    PRINT(results_table(results))
+    if args.output:
+        dump_results(results, args.output, environment=environment)
+    return_code = 0
+    if baseline is not None:
+        comparisons = compare_results(baseline, results, threshold=args.threshold)
+        PRINT(comparisons_table(comparisons))
+        return_code = sum(1 for comparison in comparisons if comparison.is_regression())
+    return return_code
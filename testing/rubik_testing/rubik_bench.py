@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+#
+# Copyright 2014 Simone Campagna
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+__author__ = "Simone Campagna"
+
+__all__ = [
+           'BenchCase',
+           'BenchResult',
+           'BenchComparison',
+           'RubikBench',
+           'dump_results',
+           'load_results',
+           'load_environment',
+           'check_environment',
+           'compare_results',
+           'results_table',
+           'comparisons_table',
+          ]
+
+import collections
+import fnmatch
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from rubik import conf
+from rubik.errors import RubikError
+from rubik.extractor import Extractor
+from rubik.shape import Shape
+from rubik.table import Table
+from rubik.units import Bandwidth
+from rubik.cubes import api as cb
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+class BenchCase(object):
+    """BenchCase(name, function, num_bytes, num_elements, setup=None, **attributes)
+    A benchmark case: 'function' is called without arguments, and processes
+    'num_bytes' bytes and 'num_elements' elements; 'setup', if given, is
+    called without arguments before the case is run (for instance, to
+    generate the fixtures), and is not timed; 'attributes' (operation,
+    file_format, dtype, shape, extractor, ...) describe the case.
+    """
+    def __init__(self, name, function, num_bytes, num_elements, setup=None, **attributes):
+        self.name = name
+        self.function = function
+        self.setup = setup
+        self.num_bytes = num_bytes
+        self.num_elements = num_elements
+        self.attributes = attributes
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, self.name)
+
+class BenchResult(collections.namedtuple('BenchResultBase', ('name', 'num_bytes', 'num_elements', 'times', 'attributes'))):
+    """BenchResult(name, num_bytes, num_elements, times, attributes)
+       the timings of a BenchCase; the throughput is computed on the best
+       (minimum) time, which is the least sensitive to system noise"""
+    __slots__ = ()
+    def best(self):
+        return min(self.times)
+
+    def mean(self):
+        return sum(self.times) / len(self.times)
+
+    def bytes_per_second(self):
+        best = self.best()
+        if best <= 0.0:
+            return float('inf')
+        return self.num_bytes / best
+
+    def elements_per_second(self):
+        best = self.best()
+        if best <= 0.0:
+            return float('inf')
+        return self.num_elements / best
+
+    def bandwidth(self):
+        """self.bandwidth() -> Bandwidth"""
+        return Bandwidth(float(self.bytes_per_second()), 'b/s')
+
+    def as_dict(self):
+        dct = collections.OrderedDict()
+        dct['name'] = self.name
+        dct.update(self.attributes)
+        dct['num_bytes'] = self.num_bytes
+        dct['num_elements'] = self.num_elements
+        dct['times'] = list(self.times)
+        dct['best'] = self.best()
+        dct['mean'] = self.mean()
+        dct['bytes_per_second'] = self.bytes_per_second()
+        dct['elements_per_second'] = self.elements_per_second()
+        return dct
+
+    @classmethod
+    def from_dict(cls, dct):
+        dct = dict(dct)
+        name = dct.pop('name')
+        num_bytes = dct.pop('num_bytes')
+        num_elements = dct.pop('num_elements')
+        times = tuple(dct.pop('times'))
+        for key in 'best', 'mean', 'bytes_per_second', 'elements_per_second':
+            dct.pop(key, None)
+        return cls(name=name, num_bytes=num_bytes, num_elements=num_elements, times=times, attributes=dct)
+
+class BenchComparison(collections.namedtuple('BenchComparisonBase', ('name', 'baseline', 'result', 'ratio', 'status'))):
+    """BenchComparison(name, baseline, result, ratio, status)
+       'ratio' is the throughput (bytes per second) of 'result' over the
+       throughput of 'baseline'; 'status' is one of 'ok', 'improved',
+       'regression', 'new', 'missing'"""
+    __slots__ = ()
+    STATUS_OK = 'ok'
+    STATUS_IMPROVED = 'improved'
+    STATUS_REGRESSION = 'regression'
+    STATUS_NEW = 'new'
+    STATUS_MISSING = 'missing'
+
+    def is_regression(self):
+        return self.status == self.STATUS_REGRESSION
+
+def _extracted_count(shape, extractor):
+    sub_count = 1
+    for index_picker, dim in zip(Extractor(extractor).index_pickers(), shape.shape()):
+        if isinstance(index_picker, slice):
+            sub_count *= len(range(*index_picker.indices(dim)))
+    return sub_count
+
+def _format_bandwidth(bytes_per_second):
+    if bytes_per_second is None:
+        return "-"
+    return "{:.2f}mb/s".format(Bandwidth(float(bytes_per_second), 'b/s').get_value('mb/s'))
+
+def _format_rate(elements_per_second):
+    if elements_per_second is None:
+        return "-"
+    return "{:.3g}/s".format(elements_per_second)
+
+class RubikBench(object):
+    """RubikBench(size='small', dtypes=None, ranks=None, extractors=None,
+                  file_formats=None, warmup=1, repeats=5, directory=None, logger=None)
+    Benchmarks the rubik cubes I/O and analysis functions. Fixture cubes
+    with 'SIZES[size]' elements, for each of 'dtypes' and 'ranks', are
+    generated by write_linear_cube() and write_random_cube() in 'directory'
+    (by default, a temporary directory removed by cleanup()). The benchmark
+    cases are:
+    * 'read': read_cube() of the whole cube, for each of 'file_formats';
+    * 'extract': read_cube() of a 'raw' cube with each of the 'extractors'
+      patterns (see EXTRACTORS);
+    * 'stats', 'diff', 'histogram': stats_file(), diff_files() and
+      histogram_file() of 'raw' cubes;
+    * 'write': write_cube(), for each of 'file_formats'.
+    Case names contain the dtype and the shape of the fixture cube.
+    The fixtures of all the selected cases are generated before any case is
+    run; then each case is run 'warmup' times, and timed 'repeats' times.
+    The number of bytes of a case is the size of the cube(s) processed
+    ('extract' cases: the size of the extracted cube).
+    """
+    SIZES = collections.OrderedDict((
+        ('tiny',	2 ** 12),
+        ('small',	2 ** 18),
+        ('medium',	2 ** 22),
+        ('large',	2 ** 25),
+    ))
+    DEFAULT_SIZE = 'small'
+    DEFAULT_DTYPES = ('float32', 'float64')
+    DEFAULT_RANKS = (2, 3, 4)
+    # pattern name -> function(dims) -> extractor string
+    EXTRACTORS = collections.OrderedDict((
+        ('slab',	lambda dims: 'x'.join([str(dims[0] // 2)] + [':'] * (len(dims) - 1))),
+        ('plane',	lambda dims: 'x'.join([':'] * (len(dims) - 1) + [str(dims[-1] // 2)])),
+        ('strided',	lambda dims: 'x'.join(['::2'] * len(dims))),
+        ('box',	lambda dims: 'x'.join('{}:{}'.format(dim // 4, (3 * dim) // 4) for dim in dims)),
+    ))
+    DEFAULT_FILE_FORMATS = ('raw', 'csv', 'text')
+    DEFAULT_WARMUP = 1
+    DEFAULT_REPEATS = 5
+    def __init__(self, size=None, dtypes=None, ranks=None, extractors=None, file_formats=None,
+                 warmup=None, repeats=None, directory=None, logger=None):
+        if size is None:
+            size = self.DEFAULT_SIZE
+        if not size in self.SIZES:
+            raise RubikError("invalid bench size {!r}: available sizes are {}".format(size, ', '.join(self.SIZES)))
+        self.size = size
+        if dtypes is None:
+            dtypes = self.DEFAULT_DTYPES
+        self.dtypes = tuple(cb.get_dtype(dtype) for dtype in dtypes)
+        if ranks is None:
+            ranks = self.DEFAULT_RANKS
+        self.ranks = tuple(ranks)
+        if extractors is None:
+            extractors = tuple(self.EXTRACTORS)
+        for extractor in extractors:
+            if not extractor in self.EXTRACTORS:
+                raise RubikError("invalid extractor pattern {!r}: available patterns are {}".format(extractor, ', '.join(self.EXTRACTORS)))
+        self.extractors = tuple(extractors)
+        if file_formats is None:
+            file_formats = self.DEFAULT_FILE_FORMATS
+        for file_format in file_formats:
+            if not file_format in conf.FILE_FORMATS:
+                raise RubikError("invalid file format {!r}".format(file_format))
+        self.file_formats = tuple(file_formats)
+        if warmup is None:
+            warmup = self.DEFAULT_WARMUP
+        self.warmup = warmup
+        if repeats is None:
+            repeats = self.DEFAULT_REPEATS
+        if repeats < 1:
+            raise RubikError("invalid number of repeats {}".format(repeats))
+        self.repeats = repeats
+        self._remove_directory = directory is None
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix='rubik_bench.')
+        elif not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.logger = logger
+        self._fixtures = {}
+
+    def log(self, message):
+        if self.logger is not None:
+            self.logger.info(message)
+
+    def cleanup(self):
+        """self.cleanup()
+           removes the temporary fixture directory"""
+        if self._remove_directory and os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+
+    def get_shape(self, rank):
+        """self.get_shape(rank) -> Shape with about SIZES[size] elements"""
+        side = max(2, int(round(self.SIZES[self.size] ** (1.0 / rank))))
+        return Shape((side, ) * rank)
+
+    def get_fixture(self, kind, file_format, dtype, shape):
+        """self.get_fixture(kind, file_format, dtype, shape) -> filename
+           'kind' is 'linear' or 'random'; fixtures are generated once"""
+        key = (kind, file_format, dtype, str(shape))
+        if not key in self._fixtures:
+            filename = os.path.join(self.directory, "{}_{}_{}.{}".format(kind, shape, dtype.__name__, file_format))
+            self.log("generating fixture {}...".format(filename))
+            if file_format == conf.FILE_FORMAT_RAW:
+                if kind == 'linear':
+                    cb.write_linear_cube(filename, shape=shape, start=1.0, dtype=dtype)
+                else:
+                    cb.write_random_cube(filename, shape=shape, dtype=dtype)
+            else:
+                cube = cb.read_cube_raw(self.get_fixture(kind, conf.FILE_FORMAT_RAW, dtype, shape), shape=shape, dtype=dtype)
+                cb.write_cube(file_format, cube, filename)
+            self._fixtures[key] = filename
+        return self._fixtures[key]
+
+    def bench_cases(self):
+        """self.bench_cases() -> iterator over the BenchCase objects"""
+        for dtype in self.dtypes:
+            itemsize = np.dtype(dtype).itemsize
+            for rank in self.ranks:
+                shape = self.get_shape(rank)
+                count = shape.count()
+                num_bytes = count * itemsize
+                attributes = collections.OrderedDict((
+                    ('dtype', dtype.__name__),
+                    ('shape', str(shape)),
+                ))
+                suffix = "{}.{}".format(dtype.__name__, shape)
+                for file_format in self.file_formats:
+                    yield self._read_case("read.{}.{}".format(file_format, suffix),
+                                          file_format, dtype, shape, None, num_bytes, count, attributes)
+                for pattern in self.extractors:
+                    extractor = self.EXTRACTORS[pattern](shape.shape())
+                    sub_count = _extracted_count(shape, extractor)
+                    yield self._read_case("extract.raw.{}.{}".format(suffix, pattern),
+                                          conf.FILE_FORMAT_RAW, dtype, shape, extractor,
+                                          sub_count * itemsize, sub_count, attributes)
+                yield self._file_case("stats.raw.{}".format(suffix), 'stats', dtype, shape, num_bytes, count, attributes)
+                yield self._file_case("diff.raw.{}".format(suffix), 'diff', dtype, shape, 2 * num_bytes, 2 * count, attributes)
+                yield self._file_case("histogram.raw.{}".format(suffix), 'histogram', dtype, shape, num_bytes, count, attributes)
+                for file_format in self.file_formats:
+                    yield self._write_case("write.{}.{}".format(file_format, suffix),
+                                           file_format, dtype, shape, num_bytes, count, attributes)
+
+    def _read_case(self, name, file_format, dtype, shape, extractor, num_bytes, num_elements, attributes):
+        def setup():
+            self.get_fixture('random', file_format, dtype, shape)
+        def function():
+            filename = self.get_fixture('random', file_format, dtype, shape)
+            cb.read_cube(file_format, filename, shape=shape, dtype=dtype, extractor=extractor)
+        operation = 'read' if extractor is None else 'extract'
+        return BenchCase(name, function, num_bytes, num_elements, setup=setup,
+                         operation=operation, file_format=file_format, extractor=extractor, **attributes)
+
+    def _file_case(self, name, operation, dtype, shape, num_bytes, num_elements, attributes):
+        def setup():
+            self.get_fixture('random', conf.FILE_FORMAT_RAW, dtype, shape)
+            if operation == 'diff':
+                self.get_fixture('linear', conf.FILE_FORMAT_RAW, dtype, shape)
+        def function():
+            filename = self.get_fixture('random', conf.FILE_FORMAT_RAW, dtype, shape)
+            if operation == 'stats':
+                cb.stats_file(filename, shape=shape, dtype=dtype)
+            elif operation == 'diff':
+                filename_l = self.get_fixture('linear', conf.FILE_FORMAT_RAW, dtype, shape)
+                cb.diff_files(filename_l, filename, shape=shape, dtype=dtype)
+            else:
+                cb.histogram_file(filename, shape=shape, dtype=dtype)
+        return BenchCase(name, function, num_bytes, num_elements, setup=setup,
+                         operation=operation, file_format=conf.FILE_FORMAT_RAW, extractor=None, **attributes)
+
+    def _write_case(self, name, file_format, dtype, shape, num_bytes, num_elements, attributes):
+        key = ('write', dtype, str(shape))
+        def setup():
+            if not key in self._fixtures:
+                self._fixtures[key] = cb.read_cube_raw(self.get_fixture('random', conf.FILE_FORMAT_RAW, dtype, shape),
+                                                       shape=shape, dtype=dtype)
+        def function():
+            filename = os.path.join(self.directory, "write_{}_{}.{}".format(shape, dtype.__name__, file_format))
+            cb.write_cube(file_format, self._fixtures[key], filename)
+        return BenchCase(name, function, num_bytes, num_elements, setup=setup,
+                         operation='write', file_format=file_format, extractor=None, **attributes)
+
+    def filter_cases(self, patterns=None):
+        """self.filter_cases(patterns=None) -> list of BenchCase
+           selects the cases whose name matches any of the fnmatch 'patterns';
+           patterns starting with '!' or '^' exclude the matching cases"""
+        if not patterns:
+            patterns = ['*']
+        include = [pattern for pattern in patterns if pattern[:1] not in ('!', '^')]
+        exclude = [pattern[1:] for pattern in patterns if pattern[:1] in ('!', '^')]
+        if not include:
+            include = ['*']
+        cases = []
+        for case in self.bench_cases():
+            if any(fnmatch.fnmatchcase(case.name, pattern) for pattern in include) and \
+               not any(fnmatch.fnmatchcase(case.name, pattern) for pattern in exclude):
+                cases.append(case)
+        return cases
+
+    def run_case(self, case):
+        """self.run_case(case) -> BenchResult"""
+        if case.setup is not None:
+            case.setup()
+        for i in range(self.warmup):
+            case.function()
+        times = []
+        for i in range(self.repeats):
+            t0 = _clock()
+            case.function()
+            times.append(_clock() - t0)
+        result = BenchResult(name=case.name, num_bytes=case.num_bytes, num_elements=case.num_elements,
+                             times=tuple(times), attributes=case.attributes)
+        self.log("{}: best {:.6f}s, {}".format(case.name, result.best(), _format_bandwidth(result.bytes_per_second())))
+        return result
+
+    def run(self, patterns=None):
+        """self.run(patterns=None) -> list of BenchResult"""
+        cases = self.filter_cases(patterns)
+        for case in cases:
+            if case.setup is not None:
+                case.setup()
+        return [self.run_case(case) for case in cases]
+
+    def environment(self):
+        """self.environment() -> dict describing the benchmark environment"""
+        env = collections.OrderedDict()
+        env['rubik'] = conf.VERSION
+        env['python'] = platform.python_version()
+        env['numpy'] = np.__version__
+        env['platform'] = platform.platform()
+        env['size'] = self.size
+        env['warmup'] = self.warmup
+        env['repeats'] = self.repeats
+        return env
+
+# environment keys which must match to compare results
+COMPARABLE_ENVIRONMENT = ('size', )
+
+def check_environment(baseline_environment, environment):
+    """check_environment(baseline_environment, environment)
+       raises RubikError if the results of the two environments cannot be
+       compared (see COMPARABLE_ENVIRONMENT)"""
+    for key in COMPARABLE_ENVIRONMENT:
+        baseline_value = baseline_environment.get(key, None)
+        value = environment.get(key, None)
+        if baseline_value != value:
+            raise RubikError("cannot compare with baseline: {} is {!r}, baseline {} is {!r}".format(
+                key, value, key, baseline_value))
+
+def dump_results(results, file, environment=None):
+    """dump_results(results, file, environment=None)
+       writes the BenchResult list 'results' as JSON to 'file' (a filename or a file object)"""
+    document = collections.OrderedDict()
+    document['environment'] = environment or {}
+    document['results'] = [result.as_dict() for result in results]
+    if isinstance(file, str):
+        with open(file, 'w') as f_out:
+            json.dump(document, f_out, indent=2)
+            f_out.write('\n')
+    else:
+        json.dump(document, file, indent=2)
+        file.write('\n')
+
+def _load_document(file):
+    try:
+        if isinstance(file, str):
+            with open(file, 'r') as f_in:
+                document = json.load(f_in)
+        else:
+            document = json.load(file)
+        return document, [BenchResult.from_dict(dct) for dct in document['results']]
+    except (ValueError, KeyError, TypeError) as err:
+        raise RubikError("invalid bench results file {!r}: {}: {}".format(getattr(file, 'name', file), err.__class__.__name__, err))
+
+def load_results(file):
+    """load_results(file) -> list of BenchResult
+       reads the results written by dump_results()"""
+    document, results = _load_document(file)
+    return results
+
+def load_environment(file):
+    """load_environment(file) -> dict
+       reads the environment written by dump_results()"""
+    document, results = _load_document(file)
+    return document.get('environment', {})
+
+def compare_results(baseline, results, threshold=0.1):
+    """compare_results(baseline, results, threshold=0.1) -> list of BenchComparison
+       a result is a regression if its throughput (computed on the best
+       time) is less than 1 / (1 + 'threshold') times the baseline throughput,
+       an improvement if it is more than (1 + 'threshold') times"""
+    baseline_d = collections.OrderedDict((result.name, result) for result in baseline)
+    comparisons = []
+    for result in results:
+        baseline_result = baseline_d.pop(result.name, None)
+        if baseline_result is None:
+            comparisons.append(BenchComparison(result.name, None, result, None, BenchComparison.STATUS_NEW))
+            continue
+        baseline_throughput = baseline_result.bytes_per_second()
+        throughput = result.bytes_per_second()
+        if baseline_throughput <= 0.0 or baseline_throughput == throughput:
+            ratio = 1.0
+        else:
+            ratio = throughput / baseline_throughput
+        if ratio < 1.0 / (1.0 + threshold):
+            status = BenchComparison.STATUS_REGRESSION
+        elif ratio > 1.0 + threshold:
+            status = BenchComparison.STATUS_IMPROVED
+        else:
+            status = BenchComparison.STATUS_OK
+        comparisons.append(BenchComparison(result.name, baseline_result, result, ratio, status))
+    for baseline_result in baseline_d.values():
+        comparisons.append(BenchComparison(baseline_result.name, baseline_result, None, None, BenchComparison.STATUS_MISSING))
+    return comparisons
+
+def results_table(results):
+    """results_table(results) -> text table of the BenchResult list 'results'"""
+    table = Table(headers=("name", "best", "mean", "bandwidth", "elements"))
+    for result in results:
+        table.add_row((result.name,
+                       "{:.6f}s".format(result.best()),
+                       "{:.6f}s".format(result.mean()),
+                       _format_bandwidth(result.bytes_per_second()),
+                       _format_rate(result.elements_per_second())))
+    return table.render()
+
+def comparisons_table(comparisons):
+    """comparisons_table(comparisons) -> text table of the BenchComparison list 'comparisons'"""
+    table = Table(headers=("name", "baseline", "current", "change", "status"))
+    for comparison in comparisons:
+        if comparison.baseline is None:
+            baseline = None
+        else:
+            baseline = comparison.baseline.bytes_per_second()
+        if comparison.result is None:
+            current = None
+        else:
+            current = comparison.result.bytes_per_second()
+        if comparison.ratio is None:
+            change = "-"
+        else:
+            change = "{:+.1f}%".format((comparison.ratio - 1.0) * 100.0)
+        table.add_row((comparison.name, _format_bandwidth(baseline), _format_bandwidth(current),
+                       change, comparison.status))
+    return table.render()
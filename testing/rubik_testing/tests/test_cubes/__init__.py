@@ -40,8 +40,14 @@ SUITE_CUBES.register_test_class(RubikTestDiff)
 from .rubik_test_histogram import RubikTestHistogram
 SUITE_CUBES.register_test_class(RubikTestHistogram)
 
+from .rubik_test_lazy import RubikTestLazy
+SUITE_CUBES.register_test_class(RubikTestLazy)
+
 from .rubik_test_creation import RubikTestCreation
 SUITE_CUBES.register_test_class(RubikTestCreation)
 
 from .rubik_test_comparison import RubikTestComparison
 SUITE_CUBES.register_test_class(RubikTestComparison)
+
+from .rubik_test_bench import RubikTestBench
+SUITE_CUBES.register_test_class(RubikTestBench)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+#
+# Copyright 2014 Simone Campagna
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+__author__ = "Simone Campagna"
+
+__all__ = [
+           'RubikTestBench',
+          ]
+
+import io
+import os
+
+from ...rubik_test_case import RubikTestCase, testmethod
+from rubik.errors import RubikError
+
+from ...rubik_bench import RubikBench, BenchResult, BenchComparison, \
+                           dump_results, load_results, load_environment, check_environment, compare_results
+
+class RubikTestBench(RubikTestCase):
+    METHOD_NAMES = []
+
+    @testmethod
+    def bench_run(self):
+        with RubikBench(size='tiny', dtypes=('float32', ), ranks=(3, ), warmup=0, repeats=2) as rubik_bench:
+            directory = rubik_bench.directory
+            names = [bench_case.name for bench_case in rubik_bench.filter_cases(['*raw*', '!stats*'])]
+            self.assertIn('read.raw.float32.16x16x16', names)
+            self.assertIn('extract.raw.float32.16x16x16.strided', names)
+            self.assertNotIn('stats.raw.float32.16x16x16', names)
+            self.assertNotIn('read.csv.float32.16x16x16', names)
+            # the fixtures are generated by the (untimed) setup of the cases
+            self.assertEqual(os.listdir(directory), [])
+            rubik_bench.filter_cases(['read.raw.*'])[0].setup()
+            self.assertEqual(len(os.listdir(directory)), 1)
+            results = rubik_bench.run(['read.raw.*', 'extract.raw.*.strided', 'diff.*', 'write.raw.*'])
+            self.assertEqual([result.name for result in results],
+                             ['read.raw.float32.16x16x16', 'extract.raw.float32.16x16x16.strided', 'diff.raw.float32.16x16x16', 'write.raw.float32.16x16x16'])
+            # 16x16x16 float32 cube; the strided extractor picks 8x8x8 elements
+            self.assertEqual(results[0].num_bytes, 16 ** 3 * 4)
+            self.assertEqual(results[1].num_elements, 8 ** 3)
+            for result in results:
+                self.assertEqual(len(result.times), 2)
+                self.assertGreater(result.elements_per_second(), 0.0)
+            stream = io.StringIO()
+            dump_results(results, stream, environment=rubik_bench.environment())
+        self.assertFalse(os.path.exists(directory))
+        stream.seek(0)
+        loaded_results = load_results(stream)
+        self.assertEqual(loaded_results, results)
+        stream.seek(0)
+        environment = load_environment(stream)
+        self.assertEqual(environment['size'], 'tiny')
+        check_environment(environment, dict(environment))
+        with self.assertRaises(RubikError):
+            check_environment(environment, dict(environment, size='medium'))
+
+    @testmethod
+    def bench_compare(self):
+        def make_result(name, best):
+            return BenchResult(name=name, num_bytes=1000, num_elements=250, times=(best, 2.0 * best), attributes={})
+        baseline = [make_result('a', 1.0), make_result('b', 1.0), make_result('c', 1.0), make_result('d', 1.0)]
+        results = [make_result('a', 1.05), make_result('b', 1.5), make_result('c', 0.5), make_result('e', 1.0)]
+        comparisons = compare_results(baseline, results, threshold=0.1)
+        self.assertEqual([(comparison.name, comparison.status) for comparison in comparisons],
+                         [('a', BenchComparison.STATUS_OK),
+                          ('b', BenchComparison.STATUS_REGRESSION),
+                          ('c', BenchComparison.STATUS_IMPROVED),
+                          ('e', BenchComparison.STATUS_NEW),
+                          ('d', BenchComparison.STATUS_MISSING)])
+        self.assertEqual(sum(1 for comparison in comparisons if comparison.is_regression()), 1)
+        self.assertAlmostEqual(results[1].bytes_per_second(), 1000 / 1.5)
+        # throughputs are compared, not times
+        baseline = [make_result('a', 1.0)]
+        results = [BenchResult(name='a', num_bytes=12000, num_elements=3000, times=(2.0, ), attributes={})]
+        comparisons = compare_results(baseline, results, threshold=0.1)
+        self.assertEqual(comparisons[0].status, BenchComparison.STATUS_IMPROVED)
+        self.assertAlmostEqual(comparisons[0].ratio, 6.0)
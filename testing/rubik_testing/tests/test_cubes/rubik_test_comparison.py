@@ -252,6 +252,35 @@ class RubikTestComparison(RubikTestCase):
         cube = cb.rel_diff_cube(c0, c1, percentage=True)
         self.assertAlmostEqual(cube[0], 50.0)
 
+    @testmethod
+    def diff_cubes_out(self):
+        shape = (20, 30, 10)
+        c0 = cb.random_cube(shape, dtype=np.float64)[:, ::3, 1:]
+        c1 = cb.random_cube(shape, dtype=np.float64)[:, ::3, 1:]
+        rel_out = np.zeros(c0.shape, dtype=np.float64)
+        abs_out = np.zeros(c0.shape, dtype=np.float64)
+        rd_cube, ad_cube = cb.diff_cubes(c0, c1, in_threshold=0.1, out_threshold=0.05,
+                                         rel_out=rel_out, abs_out=abs_out, buffer_count=77)
+        self.assertIs(rd_cube, rel_out)
+        self.assertIs(ad_cube, abs_out)
+        c0t = np.where(np.abs(c0) > 0.1, c0, 0.0)
+        c1t = np.where(np.abs(c1) > 0.1, c1, 0.0)
+        ad = np.abs(c0t - c1t)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rd = np.nan_to_num(ad / np.abs(c0t))
+        self.assertCubesAreEqual(rd_cube, np.where(rd > 0.05, rd, 0.0))
+        self.assertCubesAreEqual(ad_cube, np.where(ad > 0.05, ad, 0.0))
+
+    @testmethod
+    def abs_diff_cube_int_scalar(self):
+        c0 = np.array([3, -2, 5], dtype=np.int32)
+        cube = cb.abs_diff_cube(c0, 4)
+        self.assertEqual(cube.dtype, np.int32)
+        self.assertCubesAreEqual(cube, np.array([1, 6, 1]))
+        cube = cb.abs_diff_cube(c0, 4, out_threshold=1)
+        self.assertEqual(cube.dtype, np.float64)
+        self.assertCubesAreEqual(cube, np.array([0.0, 6.0, 0.0]))
+
     @testmethod
     def zero_cube(self):
         #c0: [0.0, 0.0,   e, 1.0, 1.0 + e,     1.0],
@@ -307,5 +336,34 @@ class RubikTestComparison(RubikTestCase):
         self.assertEqual(cube.shape, (2, 3))
         self.assertCubesAreEqual(cube[0], np.array([1.0, 2.0, -2.0]))
         self.assertCubesAreEqual(cube[1], np.array([2.0, 1.0,  2.0]))
-      
-        
+
+    @testmethod
+    def where_indices_dtype(self):
+        a = np.arange(12, dtype=np.int32).reshape((3, 4))
+        cube = cb.where_indices(a, a % 5 == 0)
+        self.assertEqual(cube.dtype, np.result_type(np.intp, np.int32))
+        self.assertCubesAreEqual(cube, np.array([[0, 0, 0], [1, 1, 5], [2, 2, 10]]))
+
+    def impl_where_indices_file(self, file_format, condition=None):
+        shape = Shape("13x7x5")
+        cube = cb.random_cube(shape)
+        cube[cube < 0.8] = 0.0
+        filename = "where_indices_file.{}".format(file_format)
+        cb.write_cube(file_format=file_format, cube=cube, file=filename)
+        if condition is None:
+            o_cube = cb.where_indices(cube)
+        else:
+            o_cube = cb.where_indices(cube, condition(cube))
+        records = list(cb.where_indices_file(filename, shape, dtype=cube.dtype, condition=condition,
+                                             file_format=file_format, buffer_size=37 * cube.itemsize))
+        self.assertGreater(len(records), 1)
+        self.assertCubesAreEqual(np.concatenate(records), o_cube)
+        self.remove_files(filename)
+
+    @testmethod
+    def where_indices_file_raw(self):
+        self.impl_where_indices_file('raw')
+
+    @testmethod
+    def where_indices_file_chunked_condition(self):
+        self.impl_where_indices_file('chunked', condition=lambda block: block > 0.9)
@@ -25,6 +25,7 @@ import numpy as np
 
 from rubik.cubes import api as cb
 from rubik.shape import Shape
+from rubik.errors import RubikMemoryError
 
 from ...rubik_test_case import RubikTestCase, testmethod
 
@@ -71,6 +72,46 @@ class RubikTestCreation(RubikTestCase):
     def random_cube_18x19_float32_n300_n100(self):
         return self.impl_random_cube(shape="18x19", dtype="float32", min=-300.0, max=100.0)
 
+    def impl_random_cube_threads(self, shape, dtype, chunk_count):
+        shape = Shape(shape)
+        seed_sequence = np.random.SeedSequence(100)
+        cubes = []
+        for threads in 1, 3:
+            cube = np.empty((shape.count(), ), dtype=dtype)
+            cb.RandomFiller(min=-2.0, max=5.0, seed_sequence=seed_sequence,
+                            threads=threads, chunk_count=chunk_count).fill(cube)
+            cubes.append(cube)
+        # unaligned blocks
+        filler = cb.RandomFiller(min=-2.0, max=5.0, seed_sequence=seed_sequence, chunk_count=chunk_count)
+        cube = np.empty((shape.count(), ), dtype=dtype)
+        for start in range(0, shape.count(), 17):
+            filler.fill(cube[start:start + 17], start=start)
+        cubes.append(cube)
+        for cube in cubes[1:]:
+            self.assertCubesAreEqual(cube, cubes[0])
+        self.assertTrue((cubes[0] >= -2.0).all())
+        self.assertTrue((cubes[0] <= 5.0).all())
+
+    @testmethod
+    def random_cube_threads_float32(self):
+        self.impl_random_cube_threads(shape="18x19", dtype=np.float32, chunk_count=40)
+
+    @testmethod
+    def random_cube_threads_int64(self):
+        self.impl_random_cube_threads(shape="18x19", dtype=np.int64, chunk_count=33)
+
+    @testmethod
+    def random_cube_seed(self):
+        cb.set_random_seed(100)
+        cube_a0 = cb.random_cube("4x5")
+        cube_a1 = cb.random_cube("4x5")
+        cb.set_random_seed(100)
+        cube_b0 = cb.random_cube("4x5", threads=2)
+        cube_b1 = cb.random_cube("4x5")
+        self.assertCubesAreEqual(cube_a0, cube_b0)
+        self.assertCubesAreEqual(cube_a1, cube_b1)
+        self.assertFalse((cube_a0 == cube_a1).all())
+
     ##### const cube
     def impl_const_cube(self, shape, dtype, value):
         dtype = cb.get_dtype(dtype)
@@ -126,7 +167,7 @@ class RubikTestCreation(RubikTestCase):
             increment=increment,
             const_dims="+".join(repr(d) for d in const_dims),
         )
-        filename = filename_format.format(shape=shape, dtype=dtype, format=file_format)
+        filename = filename_format.format(shape=shape, dtype=dtype.__name__, format=file_format)
         cube = cb.const_blocks_cube(shape=shape, dtype=dtype,
             start=start, increment=increment, const_dims=const_dims)
         
@@ -135,6 +176,15 @@ class RubikTestCreation(RubikTestCase):
         self.assertEqual(cube_min, start)
         self.assertEqual(cb.not_equals_num(cube, cmp_cube), 0)
 
+        for threads in 1, 2:
+            cb.write_const_blocks_cube(filename_format, shape=shape, dtype=dtype,
+                start=start, increment=increment, const_dims=const_dims,
+                buffer_size=5 * dtype().itemsize, threads=threads)
+            self.assertFileExistsAndHasShape(filename, shape=shape, dtype=dtype)
+            ooc_cube = cb.read_cube_raw(filename, shape=shape, dtype=dtype)
+            self.assertCubesAreEqual(ooc_cube, cube)
+            self.remove_files(filename)
+
     # 3x2x4, 0.5, 2.5, ()
     @testmethod
     def const_blocks_cube_3x2x4_0p5_2p5_(self):
@@ -312,3 +362,29 @@ class RubikTestCreation(RubikTestCase):
         cubes = (cube0, cube1, cube2)
         result = np.array(cubes)
         return self.impl_join(cubes, result)
+
+    ##### memory governor
+    @testmethod
+    def memory_governor(self):
+        governor = cb.MemoryGovernor("1kb")
+        cube = governor.track(np.zeros((100, ), dtype=np.float64))
+        view = governor.track(cube[10:20])
+        self.assertEqual(governor.allocated(), 800)
+        self.assertTrue(governor.fits(224))
+        self.assertFalse(governor.fits(225))
+        with self.assertRaises(RubikMemoryError):
+            governor.check(225)
+        del cube, view
+        self.assertEqual(governor.allocated(), 0)
+
+    @testmethod
+    def memory_limit_creation(self):
+        cb.set_memory_limit("1kb")
+        try:
+            cube = cb.linear_cube(shape="8x8", dtype="float32")
+            self.assertEqual(cb.get_memory_governor().allocated(), 256)
+            with self.assertRaises(RubikMemoryError):
+                cb.const_cube(shape="10x10", value=1.0, dtype="float64")
+            del cube
+        finally:
+            cb.set_memory_limit(0)
@@ -24,7 +24,9 @@ __all__ = [
 import numpy as np
 
 from rubik.cubes import api as cb
+from rubik.cubes.out_of_core import BlockReader, get_prefetch_pool
 from rubik.shape import Shape
+from rubik.errors import RubikError
 
 from ...rubik_test_case import RubikTestCase, testmethod
 
@@ -61,7 +63,7 @@ class RubikTestDiff(RubikTestCase):
         for key in cb.StatsInfo.get_keys():
             self.assertAlmostEqual(getattr(stats_info_a, key), getattr(stats_info_b, key))
 
-    def diff_cubes(self, kind, shape, dtype, cube_l, cube_r, buffer_size):
+    def diff_cubes(self, kind, shape, dtype, cube_l, cube_r, buffer_size, read_ahead=None, workers=None):
         diff_info_cubes = cb.diff_info(cube_l, cube_r)
         stats_info_cube_l = cb.stats_info(cube_l)
         stats_info_cube_r = cb.stats_info(cube_r)
@@ -91,7 +93,9 @@ class RubikTestDiff(RubikTestCase):
             dtype=dtype,
             out_of_core=True,
             buffer_size=buffer_size,
-            progress_frequency=-1.0)
+            progress_frequency=-1.0,
+            read_ahead=read_ahead,
+            workers=workers)
         self.assertEqual(diff_info_oc, diff_info_cubes)
 
         diff_info_oc_report = diff_info_oc.report()
@@ -103,7 +107,7 @@ class RubikTestDiff(RubikTestCase):
             buffer_size = int(shape.count() * dtype().itemsize / chunks)
         return buffer_size
 
-    def impl_diff_random_files(self, shape, dtype, buffer_size):
+    def impl_diff_random_files(self, shape, dtype, buffer_size, read_ahead=None, workers=None):
         cube_l, cube_r = self.create_random_cubes(shape=shape, dtype=dtype)
         self.diff_cubes(
             kind='random',
@@ -111,9 +115,11 @@ class RubikTestDiff(RubikTestCase):
             dtype=dtype,
             cube_l=cube_l,
             cube_r=cube_r,
-            buffer_size=buffer_size)
+            buffer_size=buffer_size,
+            read_ahead=read_ahead,
+            workers=workers)
     
-    def impl_diff_linear_files(self, shape, dtype, buffer_size):
+    def impl_diff_linear_files(self, shape, dtype, buffer_size, read_ahead=None, workers=None):
         cube_l, cube_r = self.create_linear_cubes(shape=shape, dtype=dtype)
         self.diff_cubes(
             kind='linear',
@@ -121,7 +127,9 @@ class RubikTestDiff(RubikTestCase):
             dtype=dtype,
             cube_l=cube_l,
             cube_r=cube_r,
-            buffer_size=buffer_size)
+            buffer_size=buffer_size,
+            read_ahead=read_ahead,
+            workers=workers)
     
     ### tests 
 
@@ -191,3 +199,134 @@ class RubikTestDiff(RubikTestCase):
         self.impl_diff_linear_files(shape=shape, dtype=dtype,
             buffer_size=self.get_buffer_size(shape=shape, dtype=dtype, chunks=3))
 
+    # read ahead
+    # 12x8x19x5, float32, buffer_size=(total_size // 5), read_ahead=2
+    @testmethod
+    def diff_random_files_12x8x19x5_5chunks_read_ahead(self):
+        dtype = np.float32
+        shape = Shape("12x8x19x5")
+        self.impl_diff_random_files(shape=shape, dtype=dtype,
+            buffer_size=self.get_buffer_size(shape=shape, dtype=dtype, chunks=5),
+            read_ahead=2)
+
+    # 12x8x19x5, float64, buffer_size=(total_size // 7), read_ahead=1
+    @testmethod
+    def diff_linear_files_12x8x19x5_7chunks_read_ahead(self):
+        dtype = np.float64
+        shape = Shape("12x8x19x5")
+        self.impl_diff_linear_files(shape=shape, dtype=dtype,
+            buffer_size=self.get_buffer_size(shape=shape, dtype=dtype, chunks=7),
+            read_ahead=1)
+
+    # 12x8x19x5, float32, buffer_size=(total_size // 5), read_ahead=2, workers=2
+    @testmethod
+    def diff_random_files_12x8x19x5_5chunks_read_ahead_workers(self):
+        dtype = np.float32
+        shape = Shape("12x8x19x5")
+        self.impl_diff_random_files(shape=shape, dtype=dtype,
+            buffer_size=self.get_buffer_size(shape=shape, dtype=dtype, chunks=5),
+            read_ahead=2, workers=2)
+
+    @testmethod
+    def block_reader_prefetch_pool(self):
+        shape = Shape("6x5x4")
+        filenames = []
+        cubes = []
+        for i in range(4):
+            filename = "brp_{}.raw".format(i)
+            cube = cb.random_cube(shape=shape, dtype=np.float32)
+            cube.tofile(filename)
+            filenames.append(filename)
+            cubes.append(cube.ravel())
+        pool = get_prefetch_pool()
+        for read_ahead in 1, 3:
+            block_reader = BlockReader(count=shape, dtype=np.float32, buffer_size=28, read_ahead=read_ahead)
+            read_blocks = list(block_reader.read(filenames, start=5))
+            self.assertEqual(len(read_blocks), 115 // 7 + 1)
+            for cube, blocks in zip(cubes, zip(*read_blocks)):
+                self.assertCubesAreEqual(np.concatenate(blocks), cube[5:])
+            # a partial read
+            for blocks in block_reader.read(filenames):
+                break
+        # all the readers share the same pool
+        self.assertIs(get_prefetch_pool(), pool)
+        self.remove_files(*filenames)
+
+    @testmethod
+    def block_reader_prefetch_pool_workers(self):
+        shape = Shape("6x5x4")
+        filename = "brpw.raw"
+        cube = cb.random_cube(shape=shape, dtype=np.float32)
+        cube.tofile(filename)
+        workers = cb.get_default_workers()
+        try:
+            cb.set_default_workers(2)
+            block_reader = BlockReader(count=shape, dtype=np.float32, buffer_size=28, read_ahead=2)
+            reader = block_reader.read([filename])
+            blocks = [next(reader)]
+            pool = get_prefetch_pool()
+            # the pool is replaced, but kept alive for the running reader
+            cb.set_default_workers(3)
+            other_blocks = list(block_reader.read([filename]))
+            self.assertIsNot(get_prefetch_pool(), pool)
+            blocks.extend(reader)
+            for read_blocks in blocks, other_blocks:
+                self.assertCubesAreEqual(np.concatenate([b for b, in read_blocks]), cube.ravel())
+        finally:
+            cb.set_default_workers(workers)
+        self.remove_files(filename)
+
+    # workers
+    # 12x8x19x5, float32, buffer_size=(total_size // 5), workers=3
+    @testmethod
+    def diff_random_files_12x8x19x5_5chunks_workers(self):
+        dtype = np.float32
+        shape = Shape("12x8x19x5")
+        self.impl_diff_random_files(shape=shape, dtype=dtype,
+            buffer_size=self.get_buffer_size(shape=shape, dtype=dtype, chunks=5),
+            workers=3)
+
+    # 12x8x19x5, float64, buffer_size=(total_size // 3), workers=2
+    @testmethod
+    def diff_linear_files_12x8x19x5_3chunks_workers(self):
+        dtype = np.float64
+        shape = Shape("12x8x19x5")
+        self.impl_diff_linear_files(shape=shape, dtype=dtype,
+            buffer_size=self.get_buffer_size(shape=shape, dtype=dtype, chunks=3),
+            workers=2)
+
+    # single pass diff_info
+    def impl_diff_info_chunks(self, cube_l, cube_r, in_threshold=None, out_threshold=None):
+        diff_info = cb.DiffInfo.diff_info(cube_l, cube_r,
+                                          in_threshold=in_threshold, out_threshold=out_threshold,
+                                          chunk_size=cube_l.dtype.itemsize * 13)
+        e_cube_l, e_cube_r = cb.evaluate(cube_l), cb.evaluate(cube_r)
+        self.assertAlmostEqualStatsInfo(diff_info.left, cb.stats_info(e_cube_l))
+        self.assertAlmostEqualStatsInfo(diff_info.right, cb.stats_info(e_cube_r))
+        self.assertAlmostEqualStatsInfo(diff_info.abs_diff, cb.stats_info(cb.abs_diff_cube(e_cube_l, e_cube_r,
+            in_threshold=in_threshold, out_threshold=out_threshold)))
+        self.assertAlmostEqualStatsInfo(diff_info.rel_diff, cb.stats_info(cb.rel_diff_cube(e_cube_l, e_cube_r,
+            in_threshold=in_threshold, out_threshold=out_threshold)))
+
+    @testmethod
+    def diff_info_chunks_view_thresholds(self):
+        cube_l, cube_r = self.create_random_cubes(shape=Shape("12x8x19"), dtype=np.float64)
+        self.impl_diff_info_chunks(cube_l[:, ::2, 3:], cube_r[:, ::2, 3:], in_threshold=0.2, out_threshold=0.1)
+
+    @testmethod
+    def diff_info_chunks_lazy(self):
+        shape = Shape("12x8x19")
+        cube_l, cube_r = self.create_linear_cubes(shape=shape, dtype=np.float32)
+        cube_l_filename = "cube_l_lazy_{shape}.raw".format(shape=shape)
+        cube_r_filename = "cube_r_lazy_{shape}.raw".format(shape=shape)
+        cube_l.tofile(cube_l_filename)
+        cube_r.tofile(cube_r_filename)
+        lazy_l = cb.lazy_read_cube_raw(cube_l_filename, shape=shape, dtype=np.float32)
+        lazy_r = cb.lazy_read_cube_raw(cube_r_filename, shape=shape, dtype=np.float32)
+        self.impl_diff_info_chunks(lazy_l * 2.0, lazy_r)
+        self.remove_files(cube_l_filename, cube_r_filename)
+
+    @testmethod
+    def diff_info_shape_mismatch(self):
+        with self.assertRaises(RubikError):
+            cb.diff_info(np.zeros((3, 4)), np.zeros((4, 3)))
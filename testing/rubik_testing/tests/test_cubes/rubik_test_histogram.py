@@ -64,3 +64,39 @@ class RubikTestHistogram(RubikTestCase):
     def histogram_4x4_int64_80_101_percentage(self):
         self.impl_histogram("4x4", "int64", hlength=80, bins=101, mode='percentage')
         
+    def impl_histogram_file(self, shape, dtype, bins, chunks, hrange=None, read_ahead=None, workers=None):
+        dtype = cb.get_dtype(dtype)
+        shape = Shape(shape)
+        filename = "histogram_{shape}_{dtype}.raw".format(shape=shape, dtype=dtype)
+        cube = cb.random_cube(shape=shape, dtype=dtype)
+        cube.tofile(filename)
+        buffer_size = int(shape.count() * dtype().itemsize / chunks)
+        output_lines_cube = cb.histogram(cube, bins=bins, hrange=hrange, mode='number')
+        output_lines_file = cb.histogram_file(filename, shape=shape, dtype=dtype, bins=bins,
+                                              hrange=hrange, mode='number',
+                                              buffer_size=buffer_size,
+                                              read_ahead=read_ahead, workers=workers)
+        self.assertEqual(output_lines_file, output_lines_cube)
+
+    @testmethod
+    def histogram_file_12x8x19x5_float32_10_3chunks(self):
+        self.impl_histogram_file("12x8x19x5", "float32", bins=10, chunks=3)
+
+    @testmethod
+    def histogram_file_12x8x19x5_float64_17_4chunks_range(self):
+        self.impl_histogram_file("12x8x19x5", "float64", bins=17, chunks=4, hrange=(0.1, 0.9))
+
+    @testmethod
+    def histogram_file_12x8x19x5_float32_10_5chunks_workers(self):
+        self.impl_histogram_file("12x8x19x5", "float32", bins=10, chunks=5, read_ahead=2, workers=3)
+
+    @testmethod
+    def histogram_file_0x4_float32_workers(self):
+        filename = "histogram_0x4.raw"
+        open(filename, "wb").close()
+        for workers in 1, 2:
+            output_lines = cb.histogram_file(filename, shape=Shape("0x4"), dtype="float32",
+                                             hrange=(0, 1), mode='number', workers=workers)
+            self.assertEqual(len(output_lines), 10)
+        self.remove_files(filename)
+        
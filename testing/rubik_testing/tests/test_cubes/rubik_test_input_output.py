@@ -21,11 +21,21 @@ __all__ = [
            'RubikTestInputOutput',
           ]
 
+import os
+import threading
+import warnings
+from io import BytesIO
+
 import numpy as np
 
+from rubik import conf
 from rubik.cubes import api as cb
 from rubik.cubes import utilities
+from rubik.cubes.text_reader import parse_text_chunk
 from rubik.shape import Shape
+from rubik.units import Memory
+from rubik.extractor import Extractor
+from rubik.errors import RubikError
 
 from ...rubik_test_case import RubikTestCase, testmethod
 
@@ -315,6 +325,26 @@ class RubikTestInputOutput(RubikTestCase):
         cube = cb.random_cube(shape="4x5x6", dtype='float32')
         self.impl_write_read_cube(file_format='raw', cube=cube, filename_format="wr_{shape}_{dtype}.{format}")
 
+    def impl_read_cube_mmap(self, shape, extractor, dtype, filename_format):
+        cube_w = cb.linear_cube(shape=shape, dtype=dtype)
+        cb.write_cube_raw(cube=cube_w, file=filename_format)
+        cube_r = cb.read_cube_raw(shape=shape, dtype=dtype, extractor=extractor, file=filename_format)
+        cube_m = cb.read_cube_raw(shape=shape, dtype=dtype, extractor=extractor, file=filename_format, mmap=True)
+        self.assertIsInstance(cube_m, np.memmap)
+        self.assertEqual(cube_m.shape, cube_r.shape)
+        self.assertCubesAreEqual(cube_m, cube_r)
+        # copy-on-write: the file is left unchanged
+        cube_m[...] = -1
+        self.assertCubesAreEqual(cb.read_cube_raw(shape=shape, dtype=dtype, file=filename_format), cube_w)
+
+    @testmethod
+    def read_cube_mmap_4x5x6_float32(self):
+        self.impl_read_cube_mmap(shape="4x5x6", extractor="1:3,::2,2", dtype='float32', filename_format="mm_{shape}_{dtype}.{format}")
+
+    @testmethod
+    def read_cube_mmap_10x3x8x6_float64(self):
+        self.impl_read_cube_mmap(shape="10x3x8x6", extractor="::3,1,:,-2:", dtype='float64', filename_format="mm_{shape}_{dtype}.{format}")
+
     @testmethod
     def write_read_cube_file_format_csv(self):
         cube = cb.random_cube(shape="4x5x6", dtype='float32')
@@ -335,3 +365,336 @@ class RubikTestInputOutput(RubikTestCase):
         cube = cb.random_cube(shape="5x6", dtype='float32')
         self.impl_write_read_cube(file_format='text', cube=cube, filename_format="wr_{shape}_{dtype}.{format}")
         
+
+    def impl_write_cube_chunks(self, file_format, cube, dtype, buffer_size):
+        filename = "wc_{}.{}".format(buffer_size, file_format)
+        ref_filename = "wc_ref.{}".format(file_format)
+        cb.write_cube(file_format, cube, filename, dtype=dtype, buffer_size=buffer_size)
+        ref_cube = cube.astype(dtype)
+        if file_format == 'raw':
+            ref_cube.tofile(ref_filename)
+        elif file_format == 'csv':
+            ref_cube.tofile(ref_filename, sep=',')
+        else:
+            if ref_cube.ndim > 2:
+                ref_cube = ref_cube.reshape((ref_cube.shape[0], ref_cube.size // ref_cube.shape[0]))
+            np.savetxt(ref_filename, ref_cube)
+        self.assertFilesAreEqual(filename, ref_filename)
+
+    @testmethod
+    def write_cube_chunks_raw(self):
+        cube = cb.random_cube(shape="4x5x6", dtype='float64')
+        for buffer_size in 12, 100, 10000:
+            self.impl_write_cube_chunks('raw', cube, np.float32, buffer_size)
+        self.impl_write_cube_chunks('raw', cube[:, ::2, 1:], np.float32, 12)
+
+    @testmethod
+    def write_cube_chunks_csv(self):
+        cube = cb.random_cube(shape="4x5x6", dtype='float64')
+        for buffer_size in 12, 100, 10000:
+            self.impl_write_cube_chunks('csv', cube, np.float32, buffer_size)
+
+    @testmethod
+    def write_cube_chunks_text(self):
+        cube = cb.random_cube(shape="4x5x6", dtype='float64')
+        for buffer_size in 12, 100, 10000:
+            self.impl_write_cube_chunks('text', cube, np.float32, buffer_size)
+        self.impl_write_cube_chunks('text', cube[:, ::2, 1:], np.float32, 100)
+        self.impl_write_cube_chunks('text', cube[0, 0], np.float32, 8)
+
+    @testmethod
+    def write_cube_chunks_text_workers(self):
+        cube = cb.random_cube(shape="40x5x6", dtype='float32')
+        for fmt in None, '%s', '%8.3f':
+            for workers in 1, 3:
+                output = BytesIO()
+                writer = cb.ChunkTextWriter(buffer_size=96, delimiter=',', newline=';\n', fmt=fmt, workers=workers)
+                writer.write(cube, output)
+                ref_output = BytesIO()
+                nargs = dict(delimiter=',', newline=';\n')
+                if fmt is not None:
+                    nargs['fmt'] = fmt
+                np.savetxt(ref_output, cube.reshape((40, 30)), **nargs)
+                self.assertEqual(output.getvalue(), ref_output.getvalue())
+
+    @testmethod
+    def write_cube_chunks_csv_workers(self):
+        cube = cb.random_cube(shape="40x5x6", dtype='float32')
+        cube.tofile("wcw_ref.csv", sep=';')
+        with open("wcw_ref.csv", "rb") as f_ref:
+            ref_data = f_ref.read()
+        for workers in 1, 3:
+            output = BytesIO()
+            cb.ChunkCsvWriter(buffer_size=96, sep=';', workers=workers).write(cube, output)
+            self.assertEqual(output.getvalue(), ref_data)
+        self.remove_files("wcw_ref.csv")
+
+    @testmethod
+    def write_read_cube_file_format_chunked(self):
+        cube = cb.random_cube(shape="4x5x6", dtype='float32')
+        self.impl_write_read_cube_file_format(file_format='chunked', cube=cube, filename_format="wr_{shape}_{dtype}.{format}")
+
+    @testmethod
+    def write_read_cube_chunked(self):
+        cube = cb.random_cube(shape="4x5x6", dtype='float32')
+        self.impl_write_read_cube(file_format='chunked', cube=cube, filename_format="wr_{shape}_{dtype}.{format}")
+
+    def impl_read_cube_chunked(self, shape, extractor, dtype, compression, chunk_shape):
+        filename = "ck_{}_{}.chunked".format(compression, chunk_shape)
+        cube_w = cb.linear_cube(shape=shape, dtype=dtype)
+        cb.write_cube_chunked(cube=cube_w, file=filename, compression=compression, chunk_shape=chunk_shape)
+        cube_r = cb.read_cube_chunked(shape=shape, dtype=dtype, extractor=extractor, file=filename)
+        cube_x = cube_w[Extractor(extractor).index_pickers()]
+        self.assertEqual(cube_r.shape, cube_x.shape)
+        self.assertCubesAreEqual(cube_r, cube_x)
+
+    @testmethod
+    def read_cube_chunked_extractor(self):
+        for compression in 'none', 'zlib', 'lzma':
+            for chunk_shape in None, "2x3x4", "1x1x6":
+                self.impl_read_cube_chunked(shape="4x5x6", extractor="1:3,::2,2", dtype='float32',
+                                            compression=compression, chunk_shape=chunk_shape)
+        self.impl_read_cube_chunked(shape="10x3x8x6", extractor="::-3,1,:,-2:", dtype='float64',
+                                    compression='zlib', chunk_shape="3x2x3x4")
+
+    @testmethod
+    def chunked_file_read_flat(self):
+        shape = Shape("6x7x8")
+        cube = cb.linear_cube(shape=shape, dtype='float32')
+        cb.write_cube_chunked(cube=cube, file="rf.chunked", chunk_shape="4x3x5")
+        with open("rf.chunked", "rb") as f_in:
+            chunked_file = cb.ChunkedFile(f_in)
+            decompress = chunked_file._decompress
+            decompressed = []
+            def _counting_decompress(data):
+                decompressed.append(data)
+                return decompress(data)
+            chunked_file._decompress = _counting_decompress
+            # small consecutive flat ranges decompress each chunk once
+            blocks = [chunked_file.read_flat(start, min(shape.count(), start + 5)) for start in range(0, shape.count(), 5)]
+        self.assertCubesAreEqual(np.concatenate(blocks), cube.ravel())
+        self.assertEqual(len(decompressed), 2 * 3 * 2)
+        self.remove_files("rf.chunked")
+
+    @testmethod
+    def stats_file_chunked(self):
+        cube = cb.random_cube(shape="6x7x8", dtype='float32')
+        cb.write_cube_raw(cube=cube, file="sf.raw")
+        cb.write_cube_chunked(cube=cube, file="sf.chunked", chunk_shape="4x3x5")
+        stats_info_raw = cb.stats_file("sf.raw", shape="6x7x8", dtype='float32')
+        for buffer_size in 20, 100, 10000:
+            stats_info_chunked = cb.stats_file("sf.chunked", shape="6x7x8", dtype='float32', file_format='chunked',
+                                               buffer_size=buffer_size, progress_frequency=-1.0)
+            self.assertEqual(stats_info_chunked, stats_info_raw)
+
+    def impl_write_linear_cube_threads(self, dtype, start, increment):
+        shape = Shape("13x17x11")
+        count = shape.count()
+        e_cube = (start + increment * np.arange(count, dtype=np.float64)).astype(dtype)
+        for threads in 1, 3:
+            filename = "lt_{}_{}.raw".format(threads, cb.get_dtype(dtype).__name__)
+            cb.write_linear_cube(filename, shape=shape, start=start, increment=increment, dtype=dtype,
+                                 buffer_size=37 * np.dtype(dtype).itemsize, threads=threads)
+            self.assertFileExistsAndHasShape(filename, shape=shape, dtype=cb.get_dtype(dtype))
+            self.assertCubesAreEqual(np.fromfile(filename, dtype=dtype), e_cube)
+            self.remove_files(filename)
+        # files which cannot seek (pipes) are written serially
+        read_fd, write_fd = os.pipe()
+        data = []
+        reader = threading.Thread(target=lambda: data.append(os.fdopen(read_fd, 'rb').read()))
+        reader.start()
+        with os.fdopen(write_fd, 'wb') as f_out:
+            cb.write_linear_cube(f_out, shape=shape, start=start, increment=increment, dtype=dtype,
+                                 buffer_size=37 * np.dtype(dtype).itemsize, threads=3)
+        reader.join()
+        self.assertCubesAreEqual(np.frombuffer(data[0], dtype=dtype), e_cube)
+
+    @testmethod
+    def write_linear_cube_threads_float32(self):
+        self.impl_write_linear_cube_threads('float32', start=0.5, increment=0.25)
+
+    @testmethod
+    def write_linear_cube_threads_int64(self):
+        self.impl_write_linear_cube_threads('int64', start=-7, increment=3)
+
+    @testmethod
+    def linear_block_large_index(self):
+        first = 10 ** 11
+        block = cb.linear_block(first, 4, start=0.5, increment=0.25, dtype=np.float64)
+        self.assertCubesAreEqual(block, 0.5 + 0.25 * np.arange(first, first + 4, dtype=np.float64))
+        block = cb.linear_block(first, 4, start=3, increment=7, dtype=np.int64)
+        self.assertEqual(int(block[-1]), 3 + 7 * (first + 3))
+
+    def impl_write_cube_split_raw(self, shape, axes, buffer_size):
+        cube = cb.random_cube(shape=shape, dtype='float32')
+        cb.write_cube_raw(cube=cube, file="ss.raw")
+        lazy_cube = cb.lazy_read_cube_raw("ss.raw", shape=shape, dtype='float32')
+        for source in cube, lazy_cube:
+            filenames = cb.write_cube_split_raw(source, axes, "ss_{shape}_" + "_".join("{{d{0}}}".format(axis) for axis in axes) + ".raw",
+                                                dtype='float64', buffer_size=buffer_size, max_open_files=2)
+            subcubes = list(cb.split(cube, axes))
+            self.assertEqual(len(filenames), len(subcubes))
+            for filename, (subcube, axes_indices) in zip(filenames, subcubes):
+                self.assertFileExistsAndHasShape(filename, shape=Shape(subcube.shape), dtype=np.float64)
+                self.assertCubesAreEqual(np.fromfile(filename, dtype=np.float64).reshape(subcube.shape),
+                                         subcube.astype(np.float64))
+            self.remove_files(*filenames)
+        self.remove_files("ss.raw")
+
+    @testmethod
+    def write_cube_split_raw_first(self):
+        self.impl_write_cube_split_raw("5x3x4x6", (0, ), buffer_size=100)
+
+    @testmethod
+    def write_cube_split_raw_interleaved(self):
+        for buffer_size in 12, 100, 10000:
+            self.impl_write_cube_split_raw("5x3x4x6", (2, 0), buffer_size=buffer_size)
+
+    @testmethod
+    def join_files(self):
+        shape = Shape("6x7")
+        cubes = [cb.random_cube(shape=shape, dtype='float32') for i in range(4)]
+        filenames = []
+        for i, cube in enumerate(cubes):
+            filename = "jf_{}.raw".format(i)
+            cb.write_cube_raw(cube=cube, file=filename)
+            filenames.append(filename)
+        e_cube = cb.join(cubes)
+        for methods in None, ['sendfile', 'buffered'], ['buffered']:
+            joined_shape = cb.join_files(filenames, "jf_{shape}.raw", shape=shape, dtype='float32',
+                                         methods=methods, buffer_size=40)
+            self.assertEqual(joined_shape, Shape("4x6x7"))
+            self.assertFileExistsAndHasShape("jf_4x6x7.raw", shape=joined_shape, dtype=np.float32)
+            self.assertCubesAreEqual(np.fromfile("jf_4x6x7.raw", dtype=np.float32).reshape(e_cube.shape), e_cube)
+        with self.assertRaises(RubikError):
+            cb.join_files(filenames, "jf_bad.raw", shape="6x8", dtype='float32')
+        self.remove_files("jf_4x6x7.raw", *filenames)
+
+    @testmethod
+    def read_cube_text_csv_workers(self):
+        shape = Shape("9x8x7")
+        cube = cb.random_cube(shape=shape, dtype='float64')
+        cb.write_cube_text(cube=cube, file="tw.text")
+        cb.write_cube_csv(cube=cube, file="tw.csv")
+        for workers in 1, 3:
+            for chunk_size in 100, 100000:
+                cube_text = cb.read_cube(conf.FILE_FORMAT_TEXT, "tw.text", shape=shape, dtype='float64',
+                                         workers=workers, chunk_size=chunk_size)
+                self.assertCubesAreEqual(cube_text, cube)
+                cube_csv = cb.read_cube(conf.FILE_FORMAT_CSV, "tw.csv", shape=shape, dtype='float64',
+                                        extractor="2:5,::3,4", workers=workers, chunk_size=chunk_size)
+                self.assertCubesAreEqual(cube_csv, cube[2:5, ::3, 4])
+        self.remove_files("tw.text", "tw.csv")
+
+    @testmethod
+    def text_reader(self):
+        f_in = BytesIO(b"# comment\n1 2 3\n4.5 5 nan\n\n7 8 9\n10 11")
+        with cb.TextReader(f_in, dtype='float32', comments='#', chunk_size=4, workers=1) as text_reader:
+            self.assertCubesAreEqual(text_reader.read(4), np.array([1, 2, 3, 4.5], dtype=np.float32))
+            text_reader.skip(2)
+            self.assertCubesAreEqual(text_reader.read(2), np.array([7, 8], dtype=np.float32))
+        self.assertEqual(f_in.read(), b" 9\n10 11")
+        f_in = BytesIO(b"1,2,3.0,4,5,x")
+        with cb.TextReader(f_in, dtype='int64', delimiter=',', chunk_size=3, workers=1) as text_reader:
+            self.assertCubesAreEqual(text_reader.read(5), np.array([1, 2, 3, 4, 5], dtype=np.int64))
+            with self.assertRaises(RubikError):
+                text_reader.read(1)
+        f_in = BytesIO(b"1 2 # 3 4\n5 6\n")
+        with cb.TextReader(f_in, dtype='float32', comments='#', workers=1) as text_reader:
+            self.assertCubesAreEqual(text_reader.read(3), np.array([1, 2, 5], dtype=np.float32))
+        self.assertEqual(f_in.read(), b" 6\n")
+
+    @testmethod
+    def parse_text_chunk(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            self.assertEqual(parse_text_chunk(b"# comment\n  # another one\n", 'float32', comments='#').size, 0)
+        self.assertCubesAreEqual(parse_text_chunk(b"1 2 # 3 4\n5 #\n6", 'float32', comments='#'),
+                                 np.array([1, 2, 5, 6], dtype=np.float32))
+        self.assertCubesAreEqual(parse_text_chunk(b"1, 2\n3,4,\n", 'int32', delimiter=','),
+                                 np.array([1, 2, 3, 4], dtype=np.int32))
+        self.assertCubesAreEqual(parse_text_chunk(b"1.0 2e0 -3.", 'int16'),
+                                 np.array([1, 2, -3], dtype=np.int16))
+        for data in b"1 2.5", b"1 nan", b"1e10":
+            with self.assertRaises(RubikError):
+                parse_text_chunk(data, 'int32')
+
+    @testmethod
+    def read_plan(self):
+        shape = Shape("6x5x4x3")
+        cube = cb.linear_cube(shape, dtype=np.float32)
+        data = b"head" + cube.tobytes() + b"tail"
+        for x_text in "::2,1:3,:,:", "1,::-2,1:,::2", "-1::-3,:,2,1", "2:4", ":,:,:,:":
+            extractor = Extractor(x_text)
+            for max_gap, max_span in (None, None), (0, None), ('16b', '64b'):
+                read_plan = cb.ReadPlan(shape, 'float32', extractor, max_gap=max_gap, max_span=max_span)
+                f_in = BytesIO(data)
+                f_in.seek(4)
+                self.assertCubesAreEqual(read_plan.read(f_in), cube[extractor.index_pickers()])
+                self.assertEqual(f_in.read(), b"tail")
+        # nearby runs are coalesced into a single read
+        read_plan = cb.ReadPlan(shape, 'float32', Extractor(":,:,::2,:"))
+        self.assertEqual(read_plan.num_reads(), 1)
+        read_plan = cb.ReadPlan(shape, 'float32', Extractor(":,:,::2,:"), max_gap=0)
+        self.assertEqual(read_plan.num_reads(), 6 * 5 * 2)
+
+    @testmethod
+    def read_cube_raw_extractor(self):
+        shape = Shape("7x6x5x4")
+        cube = cb.random_cube(shape, dtype=np.float64)
+        extractor = Extractor("1::3,::-2,1:4,2")
+        f_in = BytesIO(cube.tobytes())
+        subcube = cb.read_cube_raw(f_in, shape, dtype=np.float64, extractor=extractor, threshold_size=Memory('1b'))
+        self.assertCubesAreEqual(subcube, cube[extractor.index_pickers()])
+        self.assertEqual(f_in.tell(), cube.nbytes)
+
+    @testmethod
+    def read_cube_raw_regions(self):
+        shape = Shape("8x6x10")
+        cube = cb.random_cube(shape, dtype=np.float32)
+        extractors = [Extractor(x_text) for x_text in (":2,:,:", "1:3,::-2,4", "6,2:5,::3", "1:3,::-2,4")]
+        f_in = BytesIO(cube.tobytes())
+        subcubes = cb.read_cube_raw_regions(f_in, shape, extractors, dtype=np.float32)
+        self.assertEqual(len(subcubes), len(extractors))
+        for subcube, extractor in zip(subcubes, extractors):
+            self.assertCubesAreEqual(subcube, cube[extractor.index_pickers()])
+        self.assertEqual(f_in.tell(), cube.nbytes)
+        # nearby and overlapping regions are read at once
+        regions_read_plan = cb.RegionsReadPlan(shape, np.float32, extractors)
+        self.assertEqual(regions_read_plan.num_reads(), 1)
+        self.assertLessEqual(regions_read_plan.read_bytes(), cube.nbytes)
+
+    @testmethod
+    def read_cube_regions_csv(self):
+        shape = Shape("4x5")
+        cube = cb.linear_cube(shape, dtype=np.int64)
+        extractors = ["1:3,::2", ":,-1"]
+        f_in = BytesIO(",".join(str(value) for value in cube.ravel()).encode())
+        subcubes = cb.read_cube_regions(conf.FILE_FORMAT_CSV, f_in, shape, extractors, dtype=np.int64)
+        for subcube, extractor in zip(subcubes, extractors):
+            self.assertCubesAreEqual(subcube, cube[Extractor(extractor).index_pickers()])
+
+    @testmethod
+    def read_planner(self):
+        read_planner = cb.ReadPlanner(conf.FILE_FORMAT_RAW, "10x10x10", np.float64, "5:,::2,3")
+        self.assertEqual([read_cost.strategy for read_cost in read_planner.estimates()], ['full', 'seek', 'coalesced'])
+        read_cost = read_planner.best()
+        self.assertEqual(read_cost.strategy, 'coalesced')
+        self.assertEqual(read_cost.reads, 1)
+        self.assertEqual(read_cost.read_bytes, (4 * 100 + 8 * 10 + 1) * 8)
+        read_plan = read_planner.get_read_plan()
+        self.assertEqual(read_cost.memory_bytes, 5 * 5 * 8 + read_plan.scratch_bytes() + read_plan.plan_bytes())
+        # the plan does not depend on the number of runs
+        read_planner = cb.ReadPlanner(conf.FILE_FORMAT_RAW, "4000x1000x1000", np.float32, ":,:,::2")
+        self.assertEqual(read_planner.strategy(), 'coalesced')
+        self.assertLessEqual(read_planner.get_read_plan().plan_bytes(), cb.ReadPlan.BATCH_SIZE * 64)
+        # nearly the whole cube: the full read needs less memory
+        read_planner = cb.ReadPlanner(conf.FILE_FORMAT_RAW, "10x10x10", np.float64, ":,:,1:")
+        self.assertEqual(read_planner.strategy(), 'full')
+        read_planner = cb.ReadPlanner(conf.FILE_FORMAT_RAW, "10x10x10", np.float64, "5:,::2,3", mmap=True)
+        self.assertEqual(read_planner.strategy(), 'mmap')
+        read_planner = cb.ReadPlanner(conf.FILE_FORMAT_RAW, "10x10x10", np.float64, "5:,::2,3", threshold_size=0)
+        self.assertEqual(read_planner.strategy(), 'full')
+        read_planner = cb.ReadPlanner(conf.FILE_FORMAT_CSV, "10x10x10", np.float64, "5:,::2,3")
+        self.assertEqual(read_planner.strategy(), 'seek')
+        self.assertIsNone(read_planner.best().read_bytes)
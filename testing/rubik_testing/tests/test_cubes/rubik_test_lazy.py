@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+#
+# Copyright 2014 Simone Campagna
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+__author__ = "Simone Campagna"
+
+__all__ = [
+           'RubikTestLazy',
+          ]
+
+import numpy as np
+
+from rubik.cubes import api as cb
+from rubik.shape import Shape
+from rubik.errors import RubikError
+
+from ...rubik_test_case import RubikTestCase, testmethod
+
+class RubikTestLazy(RubikTestCase):
+    METHOD_NAMES = []
+
+    def setUp(self):
+        super(RubikTestLazy, self).setUp()
+        self.shape = Shape("12x8x19x5")
+        self.dtype = np.float32
+        self.cubes = []
+        self.lazy_cubes = []
+        for i in range(3):
+            filename = "lazy_{i}_{shape}.raw".format(i=i, shape=self.shape)
+            cube = cb.random_cube(shape=self.shape, dtype=self.dtype)
+            cube.tofile(filename)
+            self.cubes.append(cube)
+            self.lazy_cubes.append(cb.lazy_read_cube_raw(filename, shape=self.shape, dtype=self.dtype))
+        # small blocks, in order to evaluate many blocks
+        self.buffer_size = 1000
+
+    def impl_expression(self, a, b, c):
+        return a * b + np.sqrt(c) - 2
+
+    @testmethod
+    def lazy_expression(self):
+        lazy_cube = self.impl_expression(*self.lazy_cubes)
+        self.assertTrue(cb.is_lazy(lazy_cube))
+        self.assertEqual(lazy_cube.shape, self.shape.shape())
+        cube = self.impl_expression(*self.cubes)
+        self.assertEqual(lazy_cube.dtype, cube.dtype)
+        self.assertCubesAreEqual(cb.evaluate(lazy_cube), cube)
+        blocks = list(lazy_cube.iter_blocks(buffer_size=self.buffer_size))
+        self.assertGreater(len(blocks), 1)
+        self.assertCubesAreEqual(np.concatenate(blocks), cube.ravel())
+
+    @testmethod
+    def lazy_expression_eager_fallback(self):
+        lazy_cube = self.lazy_cubes[0]
+        cube = self.cubes[0]
+        self.assertCubesAreEqual(lazy_cube[1, 2:4], cube[1, 2:4])
+        self.assertEqual(lazy_cube.sum(), cube.sum())
+        self.assertCubesAreEqual(np.add(lazy_cube, cube[0]), np.add(cube, cube[0]))
+
+    @testmethod
+    def lazy_read_only(self):
+        lazy_cube = self.lazy_cubes[0]
+        with self.assertRaises(RubikError):
+            lazy_cube[1, 2:4] = 0.0
+        with self.assertRaises(RubikError):
+            lazy_cube.fill(0.0)
+        cube = cb.evaluate(lazy_cube)
+        cube[1, 2:4] = 0.0
+        self.assertCubesAreEqual(cb.evaluate(lazy_cube), self.cubes[0])
+
+    @testmethod
+    def lazy_tofile(self):
+        lazy_cube = self.impl_expression(*self.lazy_cubes).astype(np.float64)
+        cube = self.impl_expression(*self.cubes).astype(np.float64)
+        for sep in "", ",":
+            lazy_cube.tofile("lazy.out", sep=sep, buffer_size=self.buffer_size)
+            cube.tofile("cube.out", sep=sep)
+            self.assertFilesAreEqual("lazy.out", "cube.out")
+
+    @testmethod
+    def lazy_stats_info(self):
+        lazy_cube = self.impl_expression(*self.lazy_cubes)
+        cube = self.impl_expression(*self.cubes)
+        self.assertAlmostEqualStatsInfo(cb.stats_info(lazy_cube), cb.stats_info(cube))
+
+    @testmethod
+    def lazy_histogram(self):
+        lazy_cube = self.impl_expression(*self.lazy_cubes)
+        cube = self.impl_expression(*self.cubes)
+        self.assertEqual(cb.histogram(lazy_cube, bins=7, mode='number'),
+                         cb.histogram(cube, bins=7, mode='number'))
@@ -21,17 +21,20 @@ __all__ = [
            'RubikTestInputOutput',
           ]
 
+import os
+
 import numpy as np
 
 from rubik.cubes import api as cb
 from rubik.shape import Shape
+from rubik.extractor import Extractor
 
 from ...rubik_test_case import RubikTestCase, testmethod
 
 class RubikTestStats(RubikTestCase):
     METHOD_NAMES = []
 
-    def impl_stats_random_file(self, shape, dtype, buffer_size):
+    def impl_stats_random_file(self, shape, dtype, buffer_size, read_ahead=None, workers=None):
         dtype = cb.get_dtype(dtype)
         shape = Shape(shape)
         file_format = 'raw'
@@ -53,13 +56,14 @@ class RubikTestStats(RubikTestCase):
         self.assertAlmostEqualStatsInfo(stats_info_oc, stats_info_cube)
 
         stats_info_ooc = cb.stats_file(filename, shape=shape, dtype=dtype, file_format=file_format,
-                                       out_of_core=True, progress_frequency=-1.0, buffer_size=buffer_size)
+                                       out_of_core=True, progress_frequency=-1.0, buffer_size=buffer_size,
+                                       read_ahead=read_ahead, workers=workers)
        
         self.assertAlmostEqualStatsInfo(stats_info_ooc, stats_info_cube)
 
         self.assertEqual(stats_info_oc.report(), stats_info_ooc.report())
 
-    def impl_stats_const_file(self, shape, dtype, buffer_size):
+    def impl_stats_const_file(self, shape, dtype, buffer_size, read_ahead=None, workers=None):
         dtype = cb.get_dtype(dtype)
         shape = Shape(shape)
         file_format = 'raw'
@@ -108,10 +112,28 @@ class RubikTestStats(RubikTestCase):
         self.assertEqual(stats_info_oc, stats_info_cube)
 
         stats_info_ooc = cb.stats_file(filename, shape=shape, dtype=dtype, file_format=file_format,
-                                       out_of_core=True, progress_frequency=-1.0, buffer_size=buffer_size)
+                                       out_of_core=True, progress_frequency=-1.0, buffer_size=buffer_size,
+                                       read_ahead=read_ahead, workers=workers)
        
         self.assertEqual(stats_info_ooc, stats_info_cube)
 
+    def impl_fused_stats(self, cube, chunk_size):
+        cube_1d = cube.reshape((cube.size, ))
+        cube_min_index = cube_1d.argmin()
+        cube_max_index = cube_1d.argmax()
+        cube_sum, fused_min_index, fused_min, fused_max_index, fused_max, \
+            count_nonzero, count_nan, count_inf = cb.StatsInfo.fused_stats(cube, chunk_size=chunk_size)
+        precise_sum = cb.precise_sum(cube)
+        if np.isnan(precise_sum):
+            self.assertTrue(np.isnan(cube_sum))
+        else:
+            self.assertAlmostEqual(cube_sum, precise_sum)
+        self.assertEqual(fused_min_index, cube_min_index)
+        self.assertEqual(fused_max_index, cube_max_index)
+        self.assertEqual(count_nonzero, np.count_nonzero(cube))
+        self.assertEqual(count_nan, np.count_nonzero(np.isnan(cube)))
+        self.assertEqual(count_inf, np.count_nonzero(np.isinf(cube)))
+
     def get_buffer_size(self, shape, dtype, buffer_size=None, chunks=2):
         if buffer_size is None:
             buffer_size = int(shape.count() * dtype().itemsize / chunks)
@@ -185,3 +207,92 @@ class RubikTestStats(RubikTestCase):
         self.impl_stats_const_file(shape=shape, dtype=dtype,
             buffer_size=self.get_buffer_size(shape=shape, dtype=dtype, chunks=3))
 
+    # read ahead
+    # 12x8x19x5, float32, buffer_size=(total_size // 6), read_ahead=2
+    @testmethod
+    def stats_random_file_12x8x19x5_float32_6chunks_read_ahead(self):
+        dtype = np.float32
+        shape = Shape("12x8x19x5")
+        self.impl_stats_random_file(shape=shape, dtype=dtype,
+            buffer_size=self.get_buffer_size(shape=shape, dtype=dtype, chunks=6),
+            read_ahead=2)
+
+    # 12x8x19x5, float64, buffer_size=(total_size // 4), read_ahead=3
+    @testmethod
+    def stats_const_file_12x8x19x5_float64_4chunks_read_ahead(self):
+        dtype = np.float64
+        shape = Shape("12x8x19x5")
+        self.impl_stats_const_file(shape=shape, dtype=dtype,
+            buffer_size=self.get_buffer_size(shape=shape, dtype=dtype, chunks=4),
+            read_ahead=3)
+
+    # workers
+    # 12x8x19x5, float32, buffer_size=(total_size // 7), workers=3
+    @testmethod
+    def stats_random_file_12x8x19x5_float32_7chunks_workers(self):
+        dtype = np.float32
+        shape = Shape("12x8x19x5")
+        self.impl_stats_random_file(shape=shape, dtype=dtype,
+            buffer_size=self.get_buffer_size(shape=shape, dtype=dtype, chunks=7),
+            workers=3)
+
+    # 12x8x19x5, float64, buffer_size=(total_size // 4), workers=4
+    @testmethod
+    def stats_const_file_12x8x19x5_float64_4chunks_workers(self):
+        dtype = np.float64
+        shape = Shape("12x8x19x5")
+        self.impl_stats_const_file(shape=shape, dtype=dtype,
+            buffer_size=self.get_buffer_size(shape=shape, dtype=dtype, chunks=4),
+            workers=4)
+
+    # fused stats
+    # 12x8x19x5, float32, nan/inf, chunk_size=64
+    @testmethod
+    def fused_stats_12x8x19x5_float32_nan_inf(self):
+        cube = cb.random_cube(shape="12x8x19x5", dtype=np.float32)
+        cube[3, 2, 1, 0] = np.inf
+        cube[5, 4, 3, 2] = np.nan
+        cube[7, 6, 5, 4] = -np.inf
+        cube[1, 1, 1, 1] = 0.0
+        self.impl_fused_stats(cube, chunk_size=64)
+
+    # 12x8x19x5, int64 non contiguous, chunk_size=100
+    @testmethod
+    def fused_stats_12x8x19x5_int64_view(self):
+        cube = cb.linear_cube(shape="12x8x19x5", dtype=np.int64) % 17
+        self.impl_fused_stats(cube[::2, 1:, ::3], chunk_size=100)
+
+    # stats cache
+    def impl_stats_cache(self, stats_cache, file_format):
+        shape = Shape("12x8x19x5")
+        cube = cb.random_cube(shape=shape, dtype=np.float32)
+        cube[3, 2, 1, 0] = np.nan
+        filename = "stats_cache.{}".format(file_format)
+        cb.write_cube(file_format, cube, filename)
+        for extractor in None, "2:7,:,:,:", "4,3:6,:,:", "4,3,1:2,:":
+            if extractor is None:
+                subcube = cube
+            else:
+                subcube = cube[Extractor(extractor).index_pickers()]
+            for i in range(2):
+                stats_info = stats_cache.stats_file(filename, shape=shape, dtype=np.float32,
+                                                    file_format=file_format, extractor=extractor)
+                self.assertEqual(stats_info.report(), cb.stats_info(subcube).report())
+        self.assertIs(stats_cache.stats_file(filename, shape=shape, dtype=np.float32,
+                                             file_format=file_format, extractor="::2,:,:,:"), None)
+        # the cache is not used for changed files
+        cube[0, 0, 0, 0] = -1.0
+        cb.write_cube(file_format, cube, filename)
+        os.utime(filename, (0, 0))
+        stats_info = stats_cache.stats_file(filename, shape=shape, dtype=np.float32, file_format=file_format)
+        self.assertEqual(stats_info.report(), cb.stats_info(cube).report())
+
+    @testmethod
+    def stats_cache_dir_raw(self):
+        self.impl_stats_cache(cb.StatsCache("stats_cache_dir", block_size=1000), 'raw')
+        self.assertEqual(len(os.listdir("stats_cache_dir")), 1)
+
+    @testmethod
+    def stats_cache_sidecar_chunked(self):
+        self.impl_stats_cache(cb.StatsCache(block_size=1000), 'chunked')
+        self.assertTrue(os.path.exists("stats_cache.chunked" + cb.StatsCache.SIDECAR_SUFFIX))
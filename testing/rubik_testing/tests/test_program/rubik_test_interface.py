@@ -83,6 +83,13 @@ class RubikTestInterface(RubikTestProgram):
         returncode, output, error = self.run_program("-e 'cb.random_cube((4, 5))' --histogram --histogram-bins=8 --histogram-range 0.1 0.9")
         self.assertEqual(returncode, 0)
 
+    @testmethod
+    def histogram_file(self):
+        returncode, output, error = self.run_program("-e 'cb.write_random_cube(\"h_{shape}.{format}\", (4, 5))'")
+        self.assertEqual(returncode, 0)
+        returncode, output, error = self.run_program("-e 'print_histogram_file(\"h_{shape}.{format}\", (4, 5), buffer_size=\"32b\")' --histogram-bins=8")
+        self.assertEqual(returncode, 0)
+
     @testmethod
     def help_expression(self):
         returncode, output, error = self.run_program("--help-expression")
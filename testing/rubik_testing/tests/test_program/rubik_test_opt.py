@@ -22,6 +22,7 @@ __all__ = [
           ]
 
 import os
+import json
 
 from rubik.shape import Shape
 from rubik.extractor import Extractor
@@ -96,3 +97,158 @@ class RubikTestOpt(RubikTestProgram):
     @testmethod
     def random_40x50x60x8_float32_1k(self):
         self.impl_read(shape="40x50x60x8", extractor="::2,:,:,:", dtype="float32", threshold_size="1k")
+
+    @testmethod
+    def timing_file(self):
+        shape = Shape("8x10x12")
+        in_filename = 'xtmp_timing_in.raw'
+        out_filename = 'xtmp_timing_out.raw'
+        timing_filename = 'xtmp_timing.json'
+        returncode, output, error = self.run_program(
+            """-e 'cb.linear_cube("{s}")' -o '{i}'""".format(s=shape, i=in_filename))
+        self.assertEqual(returncode, 0)
+        returncode, output, error = self.run_program(
+            """-i '{i}' -s {s} -x '::2x:x:' -e 'i0 + 1' -o '{o}' --timing --timing-file '{t}'""".format(
+                s=shape, i=in_filename, o=out_filename, t=timing_filename))
+        self.assertEqual(returncode, 0)
+        self.assertIn("### Timing", output)
+        with open(timing_filename, 'r') as f_in:
+            timing = json.load(f_in)
+        phases = [record['phase'] for record in timing['records']]
+        self.assertEqual(phases, ['initialize', 'evaluate', 'read', 'evaluate', 'evaluate', 'write', 'finalize'])
+        num_bytes = 4 * 10 * 12 * 4
+        # the bytes read from the file, not the bytes extracted
+        read_bytes = cb.ReadPlanner('raw', shape, 'float32', Extractor('::2x:x:')).best().read_bytes
+        self.assertGreaterEqual(read_bytes, num_bytes)
+        read_record = timing['records'][2]
+        self.assertEqual(read_record['read_bytes'], read_bytes)
+        write_record = timing['records'][5]
+        self.assertEqual(write_record['written_bytes'], num_bytes)
+        self.assertGreaterEqual(write_record['wall_time'], 0.0)
+        totals = dict((total['phase'], total) for total in timing['totals'])
+        self.assertEqual(totals['read']['read_bytes'], read_bytes)
+
+    @testmethod
+    def timing_lazy_mmap(self):
+        shape = Shape("8x10x12")
+        in_filename = 'xtmp_timing_lazy_in.raw'
+        timing_filename = 'xtmp_timing_lazy.json'
+        returncode, output, error = self.run_program(
+            """-e 'cb.linear_cube("{s}")' -o '{i}'""".format(s=shape, i=in_filename))
+        self.assertEqual(returncode, 0)
+        # lazy and memory mapped cubes are read by the phase computing the stats
+        for options, num_bytes in ("--lazy", 8 * 10 * 12 * 4), ("--mmap -x '::2,:,:'", 4 * 10 * 12 * 4):
+            returncode, output, error = self.run_program(
+                """-i '{i}' -s {s} {o} --stats --timing-file '{t}'""".format(
+                    s=shape, i=in_filename, o=options, t=timing_filename))
+            self.assertEqual(returncode, 0)
+            with open(timing_filename, 'r') as f_in:
+                timing = json.load(f_in)
+            read_records = [record for record in timing['records'] if record['read_bytes']]
+            self.assertGreater(len(read_records), 0)
+            self.assertEqual(sum(record['read_bytes'] for record in read_records), num_bytes)
+            for record in read_records:
+                self.assertNotEqual(record['phase'], 'read')
+                self.assertGreaterEqual(record['read_wall_time'], 0.0)
+            self.assertGreater(timing['io_wall_time'], 0.0)
+
+    @testmethod
+    def memory_limit_fallback(self):
+        shape = Shape("8x10x12")
+        in_filename = 'xtmp_memory_limit.raw'
+        returncode, output, error = self.run_program(
+            """-e 'cb.linear_cube("{s}")' -o '{i}'""".format(s=shape, i=in_filename))
+        self.assertEqual(returncode, 0)
+        # the cube (3840 bytes) does not fit the memory limit: it is read
+        # lazily, or memory mapped if extracted, with the same stats
+        for extractor, message in (None, "is read lazily"), ("::2,:,:", "is memory mapped"):
+            x_option = ""
+            if extractor is not None:
+                x_option = "-x '{}'".format(extractor)
+            returncode, expected_output, error = self.run_program(
+                """-i '{i}' -s {s} {x} --stats""".format(s=shape, i=in_filename, x=x_option))
+            self.assertEqual(returncode, 0)
+            returncode, output, error = self.run_program(
+                """--verbose-level=1 -i '{i}' -s {s} {x} -m 1kb --stats""".format(s=shape, i=in_filename, x=x_option))
+            self.assertEqual(returncode, 0)
+            self.assertIn(message, output)
+            for line in expected_output.splitlines():
+                self.assertIn(line, output)
+        # no memory is available: the blocks have a minimum size
+        returncode, expected_output, error = self.run_program(
+            """-i '{i}' -s {s} --stats""".format(s=shape, i=in_filename))
+        self.assertEqual(returncode, 0)
+        returncode, output, error = self.run_program(
+            """--verbose-level=1 -e 'x = cb.const_cube("10x25", 1.0)' -i '{i}' -s {s} -m 1kb --stats""".format(s=shape, i=in_filename))
+        self.assertEqual(returncode, 0)
+        self.assertIn("is read lazily", output)
+        for line in expected_output.splitlines():
+            self.assertIn(line, output)
+        returncode, output, error = self.run_program(
+            """--verbose-level=1 -i '{i}' -i '{i}' -s {s} -m 1kb -e i0 --diff -e 'i1 * 2' --diff""".format(s=shape, i=in_filename))
+        self.assertEqual(returncode, 0)
+        self.assertEqual(output.count("is read lazily"), 2)
+        self.assertIn("REL_DIFF", output)
+
+    @testmethod
+    def histogram_input_file(self):
+        shape = Shape("8x10x12")
+        in_filename = 'xtmp_histogram_in.raw'
+        returncode, output, error = self.run_program(
+            """-e 'cb.random_cube("{s}")' -o '{i}'""".format(s=shape, i=in_filename))
+        self.assertEqual(returncode, 0)
+        returncode, expected_output, error = self.run_program(
+            """-i '{i}' -s {s} --histogram -Hb 7""".format(s=shape, i=in_filename))
+        self.assertEqual(returncode, 0)
+        # input files not in memory are read block by block by histogram_file
+        for options in "--lazy", "--mmap", "-m 1kb", "--lazy --workers 2":
+            returncode, output, error = self.run_program(
+                """-v -i '{i}' -s {s} {o} --histogram -Hb 7""".format(s=shape, i=in_filename, o=options))
+            self.assertEqual(returncode, 0)
+            self.assertIn("histogram of input file", output)
+            for line in expected_output.splitlines():
+                self.assertIn(line, output)
+
+    @testmethod
+    def join_files_output_mode(self):
+        shape = Shape("8x6x4")
+        filenames = ['xtmp_join_0.raw', 'xtmp_join_1.raw']
+        for filename in filenames:
+            returncode, output, error = self.run_program(
+                """-e 'cb.random_cube("{s}")' -o '{f}'""".format(s=shape, f=filename))
+            self.assertEqual(returncode, 0)
+        datas = []
+        for filename in filenames:
+            with open(filename, 'rb') as f_in:
+                datas.append(f_in.read())
+        out_filename = 'xtmp_join_out.raw'
+        # the existing data before the joined cubes are kept
+        for options, head in ("", b""), ("-Om a", datas[0]), ("-Oo 100", datas[0][:100]):
+            with open(out_filename, 'wb') as f_out:
+                f_out.write(datas[0])
+            returncode, output, error = self.run_program(
+                """-i '{f0}' -i '{f1}' -s {s} {o} -J '{j}'""".format(
+                    s=shape, f0=filenames[0], f1=filenames[1], o=options, j=out_filename))
+            self.assertEqual(returncode, 0)
+            with open(out_filename, 'rb') as f_in:
+                data = f_in.read()
+            self.assertEqual(data, head + datas[0] + datas[1])
+
+    @testmethod
+    def stats_cache_changed_cube(self):
+        shape = Shape("4x4")
+        in_filename = 'xtmp_stats_cache.raw'
+        returncode, output, error = self.run_program(
+            """-e 'cb.linear_cube("{s}")' -o '{i}'""".format(s=shape, i=in_filename))
+        self.assertEqual(returncode, 0)
+        returncode, expected_output, error = self.run_program(
+            """-i '{i}' -s {s} --stats""".format(s=shape, i=in_filename))
+        self.assertEqual(returncode, 0)
+        # changing the input cube in memory does not change the cached stats
+        returncode, output, error = self.run_program(
+            """-i '{i}' -s {s} -e 'i0[...] = 100' -e i0 --stats --stats-cache xtmp_sc""".format(s=shape, i=in_filename))
+        self.assertEqual(returncode, 0)
+        returncode, output, error = self.run_program(
+            """-i '{i}' -s {s} --stats --stats-cache xtmp_sc""".format(s=shape, i=in_filename))
+        self.assertEqual(returncode, 0)
+        self.assertEqual(output, expected_output)
@@ -21,6 +21,8 @@ __all__ = [
            'RubikTestWork',
           ]
 
+import os
+
 from rubik.conf import VERSION
 from rubik.shape import Shape
 
@@ -120,6 +122,75 @@ class RubikTestWork(RubikTestProgram):
                 o=out_filename_format))
         self.assertFileExistsAndHasShape(out_filename, self.im_shape)
 
+    @testmethod
+    def og_slice_mmap(self):
+        out_filename_format = 'og0_{shape}.{format}'
+        out_filename = out_filename_format.format(shape=self.im_shape, format=self.file_format)
+        mm_filename_format = 'og0mm_{shape}.{format}'
+        mm_filename = mm_filename_format.format(shape=self.im_shape, format=self.file_format)
+        for options, o_format in (('', out_filename_format), ('--mmap', mm_filename_format)):
+            returncode, output, error = self.run_program(
+                """{opts} -i '{og}' -s '{s}' -x '{x}' -o '{o}'""".format(
+                    opts=options,
+                    s=self.og_shape,
+                    x=":,:,{h},:".format(h=self.H//2),
+                    og=self.og_filename_format,
+                    o=o_format))
+        self.assertFileExistsAndHasShape(mm_filename, self.im_shape)
+        self.assertFilesAreEqual(mm_filename, out_filename)
+
+    @testmethod
+    def im_c_expression_lazy(self):
+        out_filename_format = 'imc_{shape}.{format}'
+        out_filename = out_filename_format.format(shape=self.im_shape, format=self.file_format)
+        lz_filename_format = 'imclz_{shape}.{format}'
+        lz_filename = lz_filename_format.format(shape=self.im_shape, format=self.file_format)
+        for options, o_format in (('', out_filename_format), ('--lazy', lz_filename_format)):
+            returncode, output, error = self.run_program(
+                """{opts} -i '{im}' -i '{c}' -s '{s}' -e 'i0 * i1 + np.sqrt(i0) - 2' -o '{o}'""".format(
+                    opts=options,
+                    s=self.im_shape,
+                    im=self.im_filename_format,
+                    c=self.c_filename_format,
+                    o=o_format))
+            self.assertEqual(returncode, 0)
+        self.assertFileExistsAndHasShape(lz_filename, self.im_shape)
+        self.assertFilesAreEqual(lz_filename, out_filename)
+
+    @testmethod
+    def im_stats_cache(self):
+        for extractor in ':,:,:', '1:3,:,:':
+            outputs = []
+            for options in '', '--stats-cache imsc', '--stats-cache imsc --lazy', '--stats-sidecar':
+                returncode, output, error = self.run_program(
+                    """{opts} -i '{im}' -s '{s}' -x '{x}' --stats""".format(
+                        opts=options,
+                        s=self.im_shape,
+                        x=extractor,
+                        im=self.im_filename_format))
+                self.assertEqual(returncode, 0)
+                outputs.append(output)
+            for output in outputs[1:]:
+                self.assertEqual(output, outputs[0])
+        self.assertEqual(len(os.listdir('imsc')), 1)
+
+    @testmethod
+    def im_write_buffer_size(self):
+        out_filename = 'imwb.{format}'.format(format=self.file_format)
+        wb_filename = 'imwb_small.{format}'.format(format=self.file_format)
+        for options, o_filename in (('', out_filename), ('--write-buffer-size 100b', wb_filename)):
+            for mode, offset in (('w', 0), ('a', 0), ('r+b', 128)):
+                returncode, output, error = self.run_program(
+                    """{opts} -i '{im}' -s '{s}' -o '{o}' -Ot float64 -Om {m} -Oo {b}""".format(
+                        opts=options,
+                        s=self.im_shape,
+                        im=self.im_filename_format,
+                        o=o_filename,
+                        m=mode,
+                        b=offset))
+                self.assertEqual(returncode, 0)
+        self.assertFilesAreEqual(wb_filename, out_filename)
+
     @testmethod
     def og_extract_and_split(self):
         out_filename_format = 'og_h{d2}_{shape}.{format}'
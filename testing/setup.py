@@ -22,6 +22,7 @@ import sys
 
 scripts = [
 	'bin/rubik_test',
+	'bin/rubik_bench',
 ]
 
 try: